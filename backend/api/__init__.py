@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from backend.api import users, auth, cash, grain, purchases, leases, farmer_contracts, dashboard, vouchers, fields, people, admin
+from backend.api import users, auth, cash, grain, purchases, leases, farmer_contracts, dashboard, vouchers, fields, people, admin, exports
 
 router = APIRouter()
 
@@ -16,4 +16,5 @@ router.include_router(vouchers.router, prefix="/vouchers", tags=["vouchers"])
 router.include_router(fields.router, prefix="/fields", tags=["fields"])
 router.include_router(people.router, prefix="/people", tags=["people"])
 router.include_router(admin.router, prefix="/admin", tags=["admin"])
+router.include_router(exports.router, prefix="/exports", tags=["exports"])
 
@@ -1,34 +1,129 @@
 """Адмін-ендпоінти (лише super_admin)."""
+import json
 from datetime import datetime
+from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select
 
-from backend.auth import get_current_super_admin
-from backend.models import User
-from backend.backup import make_backup
+from backend.auth import get_current_super_admin, user_cache_stats
+from backend.database import get_session
+from backend.models import JobRun, User
+from backend.backup import list_backups, stream_backup
+from backend.reference_cache import reference_cache
+from backend.scheduler import scheduler
+from backend.balances import (
+    rebuild_farmer_balances,
+    rebuild_person_balances,
+    verify_farmer_balances,
+    verify_person_balances,
+)
 
 router = APIRouter()
 
 
 @router.get("/db/backup/download")
-async def download_db_backup(current_admin: User = Depends(get_current_super_admin)):
-    """Скачати ПОТОЧНУ резервну копію БД (.sql).
+async def download_db_backup(
+    format: Literal["plain", "custom"] = Query("plain", description="plain — .sql, custom — .dump для pg_restore"),
+    current_admin: User = Depends(get_current_super_admin),
+):
+    """Скачати ПОТОЧНУ резервну копію БД.
 
-    На кожне натискання знімається свіжий `pg_dump` — щоб оператор завжди
-    отримував БД у тому стані, в якому вона зараз. Фоновий планувальник
-    (`backup_scheduler`) лишається як страховка на випадок аварії, але кнопка
-    тепер не залежить від нього."""
+    На кожне натискання запускається свіжий `pg_dump`, і його вихід одразу
+    передається клієнту — без проміжного файлу і без очікування кінця дампу.
+    Щодобові копії (задача `backup` планувальника) лишаються як страховка
+    на випадок аварії — див. `GET /admin/db/backups`."""
     try:
-        path = await make_backup()
+        chunks = await stream_backup(format)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Не вдалося підготувати резервну копію: {e}",
         )
     stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    return FileResponse(
-        path,
-        media_type="application/sql",
-        filename=f"zerno_backup_{stamp}.sql",
+    extension = "sql" if format == "plain" else "dump"
+    return StreamingResponse(
+        chunks,
+        media_type="application/sql" if format == "plain" else "application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="zerno_backup_{stamp}.{extension}"'},
     )
+
+
+@router.get("/db/backups")
+def list_db_backups(current_admin: User = Depends(get_current_super_admin)):
+    """Щодобові копії на сервері (від новіших): ім'я, час, розмір.
+    Розмір і тривалість кожного запуску — у `GET /admin/jobs?job=backup`."""
+    return [
+        {"name": b["name"], "created_at": b["created_at"], "size_bytes": b["size_bytes"]}
+        for b in list_backups()
+    ]
+
+
+@router.get("/balances/verify")
+def verify_balances(
+    session: Session = Depends(get_session),
+    current_admin: User = Depends(get_current_super_admin),
+):
+    """Звірка матеріалізованих балансів (`farmer_balances`, `person_grain_balances`)
+    з сирою історією. Порожній `mismatches` — журнал коректний."""
+    result = {}
+    for name, verify in (
+        ("farmer_balances", verify_farmer_balances),
+        ("person_grain_balances", verify_person_balances),
+    ):
+        mismatches = verify(session)
+        result[name] = {"ok": not mismatches, "mismatches": mismatches}
+    return result
+
+
+@router.post("/balances/rebuild")
+def rebuild_balances(
+    session: Session = Depends(get_session),
+    current_admin: User = Depends(get_current_super_admin),
+):
+    """Перебудова матеріалізованих балансів з історії (одна транзакція)."""
+    return {
+        "farmer_balances": {"rows": rebuild_farmer_balances(session)},
+        "person_grain_balances": {"rows": rebuild_person_balances(session)},
+    }
+
+
+@router.get("/cache/stats")
+def cache_stats(current_admin: User = Depends(get_current_super_admin)):
+    """Лічильники кешів поточного воркера (довідники, автентифіковані
+    користувачі): попадання, промахи, інвалідації. У кожного воркера uvicorn
+    свій кеш — числа з різних запитів можуть відрізнятися."""
+    return {"reference": reference_cache.stats(), "users": user_cache_stats()}
+
+
+@router.get("/jobs")
+def list_job_runs(
+    job: Optional[str] = Query(None, description="Назва задачі (backup, export_cleanup, ...)"),
+    limit: int = Query(50, ge=1, le=500),
+    session: Session = Depends(get_session),
+    current_admin: User = Depends(get_current_super_admin),
+):
+    """Періодичні задачі: стан планувальника поточного воркера (чи він лідер,
+    коли наступні запуски) і журнал останніх запусків з усіх воркерів."""
+    query = select(JobRun)
+    if job:
+        query = query.where(JobRun.job == job)
+    runs = session.exec(query.order_by(JobRun.started_at.desc(), JobRun.id.desc()).limit(limit)).all()
+    return {
+        "scheduler": scheduler.status(),
+        "runs": [
+            {
+                "id": run.id,
+                "job": run.job,
+                "status": run.status,
+                "worker": run.worker,
+                "started_at": run.started_at,
+                "finished_at": run.finished_at,
+                "duration_ms": run.duration_ms,
+                "error": run.error,
+                "details": json.loads(run.details) if run.details else None,
+            }
+            for run in runs
+        ],
+    }
@@ -1,23 +1,32 @@
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import Session, select
-from backend.database import get_session
+from backend.database import engine
 from backend.models import User
 from backend.schemas import LoginRequest, TokenResponse
-from backend.auth import verify_password, create_access_token, get_current_user
+from backend.auth import verify_password_async, create_access_token, get_current_user
 
 router = APIRouter()
 
 
+def _load_user(username: str) -> Optional[User]:
+    """Користувач для логіну — у власній короткій сесії: з'єднання
+    повертається в пул до перевірки пароля, а не тримається на час bcrypt."""
+    with Session(engine) as session:
+        return session.exec(select(User).where(User.username == username)).first()
+
+
 @router.post("/login", response_model=TokenResponse)
-async def login(
-    login_data: LoginRequest,
-    session: Session = Depends(get_session)
-):
-    """Вход в систему и получение JWT токена"""
+async def login(login_data: LoginRequest):
+    """Вход в систему и получение JWT токена.
+
+    async: запит до БД — у threadpool, bcrypt — у пулі хешування
+    (`backend.auth`), тож логін не займає ні слот threadpool, ні з'єднання з
+    БД, поки чекає на bcrypt."""
     # Поиск пользователя
-    user = session.exec(
-        select(User).where(User.username == login_data.username)
-    ).first()
+    user = await run_in_threadpool(_load_user, login_data.username)
     
     if not user:
         raise HTTPException(
@@ -26,7 +35,7 @@ async def login(
         )
     
     # Проверка пароля
-    if not verify_password(login_data.password, user.password_hash):
+    if not await verify_password_async(login_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Невірне ім'я користувача або пароль"
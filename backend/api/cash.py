@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlmodel import Session, select
-from backend.database import get_session
+from backend.cash_ledger import BALANCE_FIELDS, get_cash_register, record_cash_movement
+from backend.database import get_session, stream_rows
+from backend.exports import XlsxExport, MONEY_FORMAT
+from backend.pagination import paginate
+from backend.reference_cache import reference_names
 from backend.models import CashRegister, Transaction, Currency, TransactionType, User
 from backend.schemas import (
     CashRegisterResponse,
@@ -10,9 +13,7 @@ from backend.schemas import (
 )
 from backend.auth import get_current_super_admin, get_current_admin_or_manager, get_current_user
 from datetime import datetime, date, time
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.styles import PatternFill
 
 router = APIRouter()
 
@@ -35,7 +36,7 @@ def get_or_create_cash_register(session: Session) -> CashRegister:
 
 
 @router.get("/balance", response_model=CashRegisterResponse)
-async def get_balance(
+def get_balance(
     session: Session = Depends(get_session)
 ):
     """Получение текущих балансов кассы (доступно всем авторизованным)"""
@@ -44,59 +45,37 @@ async def get_balance(
 
 
 @router.post("/update-balance", response_model=TransactionResponse)
-async def update_balance(
+def update_balance(
     update_request: BalanceUpdateRequest,
     session: Session = Depends(get_session),
     current_admin: User = Depends(get_current_admin_or_manager)
 ):
     """Зміна балансу каси (super_admin або manager)"""
-    cash_register = get_or_create_cash_register(session)
-    
-    # Определяем, какое поле баланса нужно изменить
-    balance_field_map = {
-        Currency.UAH: "uah_balance",
-        Currency.USD: "usd_balance",
-        Currency.EUR: "eur_balance"
-    }
     currency_label_map = {
         Currency.UAH: "UAH (гривня)",
         Currency.USD: "USD (долар США)",
         Currency.EUR: "EUR (євро)"
     }
-    
-    balance_field = balance_field_map[update_request.currency]
-    current_balance = getattr(cash_register, balance_field)
-    
-    # Вычисляем новый баланс
-    if update_request.transaction_type == TransactionType.ADD:
-        new_balance = current_balance + update_request.amount
-    else:  # SUBTRACT
-        new_balance = current_balance - update_request.amount
-        # Проверка на отрицательный баланс
-        if new_balance < 0:
-            currency_label = currency_label_map[update_request.currency]
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Недостатньо коштів. Поточний баланс {currency_label}: {current_balance}"
-            )
-    
-    # Атомарно: оновлюємо баланс + створюємо запис у журналі транзакцій.
-    # Один commit на всю операцію — якщо посередині щось впаде, відкочуємо все.
-    setattr(cash_register, balance_field, new_balance)
-    cash_register.updated_at = datetime.utcnow()
-    session.add(cash_register)
 
-    transaction = Transaction(
-        currency=update_request.currency,
-        amount=update_request.amount,
-        transaction_type=update_request.transaction_type,
-        user_id=current_admin.id,
-        description=update_request.description,
-        uah_balance_after=new_balance if update_request.currency == Currency.UAH else cash_register.uah_balance,
-        usd_balance_after=new_balance if update_request.currency == Currency.USD else cash_register.usd_balance,
-        eur_balance_after=new_balance if update_request.currency == Currency.EUR else cash_register.eur_balance,
+    # Атомарно: баланс змінюється одним UPDATE ... RETURNING (з перевіркою на
+    # відʼємний баланс у тому ж statement) + запис у журналі транзакцій.
+    # Один commit на всю операцію — якщо посередині щось впаде, відкочуємо все.
+    transaction = record_cash_movement(
+        session,
+        update_request.currency,
+        update_request.amount,
+        update_request.transaction_type,
+        current_admin.id,
+        update_request.description,
+        non_negative=update_request.transaction_type == TransactionType.SUBTRACT,
     )
-    session.add(transaction)
+    if transaction is None:
+        currency_label = currency_label_map[update_request.currency]
+        current_balance = getattr(get_cash_register(session), BALANCE_FIELDS[update_request.currency])
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недостатньо коштів. Поточний баланс {currency_label}: {current_balance}"
+        )
 
     try:
         session.commit()
@@ -121,21 +100,23 @@ async def update_balance(
 
 
 @router.get("/transactions", response_model=list[TransactionResponse])
-async def get_transactions(
+def get_transactions(
     response: Response,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
-    limit: int = 100,
-    offset: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: str | None = None,
+    with_total: bool = False,
     start_date: str | None = None,
     end_date: str | None = None,
 ):
     """Получение истории транзакций.
-    Підтримує діапазон дат (`start_date`/`end_date` ISO). Без дат — повертає
-    усі за обраним `limit`/`offset`. Загальна кількість — у `X-Total-Count` header.
+    Підтримує діапазон дат (`start_date`/`end_date` ISO). Наступна сторінка —
+    за курсором з `X-Next-Cursor`; загальна кількість у `X-Total-Count` header
+    лише при `with_total=true`.
     """
-    from sqlalchemy import func as _f
-    query = select(Transaction).order_by(Transaction.created_at.desc())
+    query = select(Transaction)
     if start_date:
         try:
             start_dt = datetime.combine(date.fromisoformat(start_date), time.min)
@@ -148,13 +129,12 @@ async def get_transactions(
             query = query.where(Transaction.created_at <= end_dt)
         except ValueError:
             raise HTTPException(status_code=400, detail="Некоректний формат end_date")
-    total = session.exec(select(_f.count()).select_from(query.subquery())).first() or 0
-    response.headers["X-Total-Count"] = str(total)
-    transactions = session.exec(query.limit(limit).offset(offset)).all()
+    transactions = paginate(
+        session, response, query, Transaction,
+        limit=limit, offset=offset, cursor=cursor, with_total=with_total,
+    )
 
-    user_ids = {item.user_id for item in transactions if item.user_id}
-    users = session.exec(select(User).where(User.id.in_(list(user_ids)))).all() if user_ids else []
-    user_map = {user.id: user.full_name for user in users}
+    user_map = reference_names(session, "users")
 
     return [
         TransactionResponse(
@@ -175,14 +155,24 @@ async def get_transactions(
 
 
 @router.get("/transactions/export")
-async def export_transactions(
+def export_transactions(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     start_date: str | None = None,
     end_date: str | None = None
 ):
     """Експорт транзакцій у Excel"""
-    query = select(Transaction).order_by(Transaction.created_at.desc())
+    query = select(
+        Transaction.created_at,
+        Transaction.user_id,
+        Transaction.currency,
+        Transaction.amount,
+        Transaction.transaction_type,
+        Transaction.description,
+        Transaction.uah_balance_after,
+        Transaction.usd_balance_after,
+        Transaction.eur_balance_after,
+    ).order_by(Transaction.created_at.desc())
 
     if start_date:
         try:
@@ -204,51 +194,36 @@ async def export_transactions(
             )
         query = query.where(Transaction.created_at <= end_dt)
 
-    transactions = session.exec(query).all()
-    user_ids = {item.user_id for item in transactions if item.user_id}
-    users = session.exec(select(User).where(User.id.in_(list(user_ids)))).all() if user_ids else []
-    user_map = {user.id: user.full_name for user in users}
-
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = "Операції"
-
-    headers = [
-        "Дата",
-        "Користувач",
-        "Валюта",
-        "Сума",
-        "Тип",
-        "Опис",
-        "Баланс UAH",
-        "Баланс USD",
-        "Баланс EUR"
-    ]
-    sheet.append(headers)
-
-    header_fill = PatternFill("solid", fgColor="1F2937")
-    header_font = Font(color="FFFFFF", bold=True)
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style="thin", color="E5E7EB"),
-        right=Side(style="thin", color="E5E7EB"),
-        top=Side(style="thin", color="E5E7EB"),
-        bottom=Side(style="thin", color="E5E7EB")
-    )
-
-    for col in range(1, len(headers) + 1):
-        cell = sheet.cell(row=1, column=col)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-        cell.border = thin_border
+    user_map = reference_names(session, "users")
 
     type_label_map = {
         TransactionType.ADD.value: "Додано",
         TransactionType.SUBTRACT.value: "Віднято"
     }
+    add_fill = PatternFill("solid", fgColor="BBF7D0")
+    subtract_fill = PatternFill("solid", fgColor="FECACA")
+
+    book = XlsxExport()
+    sheet = book.sheet(
+        "Операції",
+        [
+            "Дата",
+            "Користувач",
+            "Валюта",
+            "Сума",
+            "Тип",
+            "Опис",
+            "Баланс UAH",
+            "Баланс USD",
+            "Баланс EUR"
+        ],
+        widths=[20, 22, 12, 14, 12, 30, 14, 14, 14],
+        number_formats={4: MONEY_FORMAT, 7: MONEY_FORMAT, 8: MONEY_FORMAT, 9: MONEY_FORMAT},
+        centered=(5,),
+    )
 
-    for item in transactions:
+    for item in stream_rows(session, query):
+        type_fill = add_fill if item.transaction_type.value == TransactionType.ADD.value else subtract_fill
         sheet.append([
             item.created_at.strftime("%Y-%m-%d %H:%M:%S"),
             user_map.get(item.user_id) or "-",
@@ -259,51 +234,14 @@ async def export_transactions(
             item.uah_balance_after,
             item.usd_balance_after,
             item.eur_balance_after
-        ])
-
-    alt_fill = PatternFill("solid", fgColor="F8FAFC")
-    add_fill = PatternFill("solid", fgColor="BBF7D0")
-    subtract_fill = PatternFill("solid", fgColor="FECACA")
-
-    for row in range(2, sheet.max_row + 1):
-        row_fill = alt_fill if row % 2 == 0 else None
-        transaction_type = sheet.cell(row=row, column=5).value
-        type_fill = add_fill if transaction_type == type_label_map[TransactionType.ADD.value] else subtract_fill
-
-        for col in range(1, len(headers) + 1):
-            cell = sheet.cell(row=row, column=col)
-            if col == 5:
-                cell.fill = type_fill
-                cell.alignment = Alignment(horizontal="center")
-            elif col == 4:
-                cell.fill = type_fill
-            elif row_fill:
-                cell.fill = row_fill
-            cell.border = thin_border
-            if col in (4, 7, 8, 9):
-                cell.number_format = "#,##0.00"
-
-    sheet.freeze_panes = "A2"
-    sheet.auto_filter.ref = f"A1:I{sheet.max_row}"
-
-    column_widths = [20, 22, 12, 14, 12, 30, 14, 14, 14]
-    for idx, width in enumerate(column_widths, start=1):
-        sheet.column_dimensions[chr(64 + idx)].width = width
-
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
+        ], fills={4: type_fill, 5: type_fill})
 
     filename = f"cash_report_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-    )
+    return book.to_response(filename)
 
 
 @router.get("/transactions/{transaction_id}", response_model=TransactionResponse)
-async def get_transaction(
+def get_transaction(
     transaction_id: int,
     session: Session = Depends(get_session),
     current_admin: User = Depends(get_current_super_admin)
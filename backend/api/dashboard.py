@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, Query, status
 from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select, func
 from sqlalchemy import and_, or_
 from backend.database import get_session
+from backend.pagination import parse_date
 from backend.models import (
     CashRegister, GrainStock, GrainCulture, GrainIntake, GrainShipment,
     FarmerContract, FarmerContractStatus, FarmerContractType, GrainOwner, Transaction,
@@ -12,9 +13,10 @@ from backend.models import (
     LeasePayment, LeasePaymentGrainItem, Person
 )
 from backend.auth import get_current_user, User
-from datetime import datetime, timedelta, date, time as dtime
+from backend.schemas import UTCDateTime
+from datetime import datetime, timedelta
 from io import BytesIO
-from typing import Optional
+from typing import Callable, Optional
 from pydantic import BaseModel
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
@@ -22,6 +24,16 @@ from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 router = APIRouter()
 
 
+class RecentTransaction(BaseModel):
+    """Остання транзакція каси на дашборді"""
+    id: int
+    currency: str
+    amount: float
+    type: str
+    description: str
+    created_at: UTCDateTime
+
+
 class DashboardStatsResponse(BaseModel):
     """Статистика для дашборда"""
     # Каса
@@ -49,7 +61,7 @@ class DashboardStatsResponse(BaseModel):
     shipments_today: int
     
     # Последние транзакции кассы
-    recent_transactions: list[dict]
+    recent_transactions: list[RecentTransaction]
     
     # Закупки
     purchases_stock_total: float  # Общее количество закупок на складе
@@ -90,11 +102,15 @@ def get_or_create_cash_register(session: Session) -> CashRegister:
 
 
 @router.get("/stats")
-async def get_dashboard_stats(
+def get_dashboard_stats(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
-    """Получение статистики для дашборда"""
+    """Получение статистики для дашборда.
+
+    Лічильники й суми рахує БД (COUNT/SUM ... FILTER) — фіксований набір
+    агрегатних запитів замість завантаження всіх контрактів, фермерів,
+    закупівель і талонів у Python."""
     
     # ── Каса ──
     cash_register = get_or_create_cash_register(session)
@@ -105,83 +121,91 @@ async def get_dashboard_stats(
     }
     
     # ── Склад ──
-    stocks = session.exec(select(GrainStock)).all()
-    total_stock_kg = sum(s.quantity_kg for s in stocks)
-    
-    # Создаем словарь для быстрого поиска по culture_id
-    stock_dict = {s.culture_id: s for s in stocks}
-    
-    # Получаем все культуры
-    all_cultures = session.exec(select(GrainCulture)).all()
-    
-    stock_by_culture = []
-    for culture in all_cultures:
-        stock = stock_dict.get(culture.id)
-        if stock:
-            stock_by_culture.append({
-                "name": culture.name,
-                "quantity_kg": round(stock.quantity_kg, 2),
-                "own_quantity_kg": round(stock.own_quantity_kg, 2),
-                "farmer_quantity_kg": round(stock.farmer_quantity_kg, 2)
-            })
-        else:
-            # Если нет записи в GrainStock, добавляем с нулевыми значениями
-            stock_by_culture.append({
-                "name": culture.name,
-                "quantity_kg": 0.0,
-                "own_quantity_kg": 0.0,
-                "farmer_quantity_kg": 0.0
-            })
+    # Усі культури; без запису в GrainStock — з нульовими значеннями
+    culture_rows = session.exec(
+        select(
+            GrainCulture.name,
+            func.coalesce(GrainStock.quantity_kg, 0.0),
+            func.coalesce(GrainStock.own_quantity_kg, 0.0),
+            func.coalesce(GrainStock.farmer_quantity_kg, 0.0),
+        )
+        .outerjoin(GrainStock, GrainStock.culture_id == GrainCulture.id)
+        .order_by(GrainCulture.id)
+    ).all()
+    stock_by_culture = [
+        {
+            "name": name,
+            "quantity_kg": round(quantity_kg, 2),
+            "own_quantity_kg": round(own_kg, 2),
+            "farmer_quantity_kg": round(farmer_kg, 2)
+        }
+        for name, quantity_kg, own_kg, farmer_kg in culture_rows
+    ]
+    total_stock_kg = sum(row[1] for row in culture_rows)
+    own_stock_kg = sum(row[2] for row in culture_rows)
+    farmer_stock_kg = sum(row[3] for row in culture_rows)
     
     # Сортируем по количеству и берем топ-5
     top_cultures = sorted(stock_by_culture, key=lambda x: x["quantity_kg"], reverse=True)[:5]
     
     # ── Контракти фермерів ──
-    all_contracts = session.exec(select(FarmerContract)).all()
-    contracts_total = len(all_contracts)
-    contracts_open = sum(1 for c in all_contracts if c.status == FarmerContractStatus.OPEN)
-    contracts_closed = sum(1 for c in all_contracts if c.status == FarmerContractStatus.CLOSED)
-    contracts_total_value = sum(c.total_value_uah for c in all_contracts)
-    contracts_balance = sum(c.balance_uah for c in all_contracts)
+    is_open = FarmerContract.status == FarmerContractStatus.OPEN.value
+    (
+        contracts_total,
+        contracts_open,
+        contracts_closed,
+        contracts_total_value,
+        contracts_balance,
+        farmers_active,
+    ) = session.exec(
+        select(
+            func.count(FarmerContract.id),
+            func.count(FarmerContract.id).filter(is_open),
+            func.count(FarmerContract.id).filter(FarmerContract.status == FarmerContractStatus.CLOSED.value),
+            func.coalesce(func.sum(FarmerContract.total_value_uah), 0.0),
+            func.coalesce(func.sum(FarmerContract.balance_uah), 0.0),
+            # Фермери з активними (відкритими) контрактами
+            func.count(func.distinct(FarmerContract.owner_id)).filter(is_open),
+        )
+    ).one()
     
     # ── Фермери ──
-    all_farmers = session.exec(select(GrainOwner)).all()
-    farmers_total = len(all_farmers)
-    
-    # Фермеры с активными (открытыми) контрактами
-    active_farmer_ids = {c.owner_id for c in all_contracts if c.status == FarmerContractStatus.OPEN}
-    farmers_active = len(active_farmer_ids)
+    farmers_total = session.exec(select(func.count(GrainOwner.id))).one()
     
-    # ── Операції (сегодня) ──
+    # ── Операції (сьогодні) ──
     today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     today_end = today_start + timedelta(days=1)
     
-    intakes_today = session.exec(
-        select(func.count(GrainIntake.id))
-        .where(and_(
-            GrainIntake.created_at >= today_start,
-            GrainIntake.created_at < today_end,
-            GrainIntake.is_farmer_transfer == False,
-        ))
-    ).one() or 0
-    
-    intakes_pending = session.exec(
-        select(func.count(GrainIntake.id))
-        .where(
-            or_(
-                GrainIntake.pending_quality == True,
-                GrainIntake.pending_tare == True,
-            )
+    intake_today = and_(
+        GrainIntake.created_at >= today_start,
+        GrainIntake.created_at < today_end,
+        GrainIntake.is_farmer_transfer == False,
+    )
+    is_pending = or_(GrainIntake.pending_quality == True, GrainIntake.pending_tare == True)
+    intakes_today, intakes_pending, intakes_today_kg = session.exec(
+        select(
+            func.count(GrainIntake.id).filter(intake_today),
+            func.count(GrainIntake.id).filter(is_pending),
+            # Тоннаж за сьогодні — лише картки, що вже пішли на склад
+            func.coalesce(
+                func.sum(func.coalesce(GrainIntake.accepted_weight_kg, 0.0)).filter(
+                    intake_today, ~is_pending
+                ),
+                0.0,
+            ),
         )
-    ).one() or 0
+    ).one()
     
-    shipments_today = session.exec(
-        select(func.count(GrainShipment.id))
+    shipments_today, shipments_today_kg = session.exec(
+        select(
+            func.count(GrainShipment.id),
+            func.coalesce(func.sum(GrainShipment.quantity_kg), 0.0),
+        )
         .where(and_(
             GrainShipment.created_at >= today_start,
             GrainShipment.created_at < today_end
         ))
-    ).one() or 0
+    ).one()
     
     # ── Последние транзакции кассы ──
     recent_trans = session.exec(
@@ -190,28 +214,29 @@ async def get_dashboard_stats(
         .limit(5)
     ).all()
     
-    recent_transactions = []
-    for t in recent_trans:
-        recent_transactions.append({
-            "id": t.id,
-            "currency": t.currency.value,
-            "amount": round(t.amount, 2),
-            "type": t.transaction_type.value,
-            "description": t.description or "",
-            "created_at": t.created_at.isoformat() if t.created_at else None
-        })
+    recent_transactions = [
+        RecentTransaction(
+            id=t.id,
+            currency=t.currency.value,
+            amount=round(t.amount, 2),
+            type=t.transaction_type.value,
+            description=t.description or "",
+            created_at=t.created_at,
+        )
+        for t in recent_trans
+    ]
     
     # ── Закупки ──
-    purchases_stock = session.exec(select(PurchaseStock)).all()
-    purchases_stock_total = sum(p.quantity_kg for p in purchases_stock)
-    
     # По категориям
+    category_rows = session.exec(
+        select(PurchaseStock.category, func.coalesce(func.sum(PurchaseStock.quantity_kg), 0.0))
+        .group_by(PurchaseStock.category)
+    ).all()
+    purchases_stock_total = sum(quantity_kg for _, quantity_kg in category_rows)
     purchases_by_category = {}
-    for p in purchases_stock:
-        cat_name = p.category.value if p.category else "Інше"
-        if cat_name not in purchases_by_category:
-            purchases_by_category[cat_name] = 0.0
-        purchases_by_category[cat_name] += p.quantity_kg
+    for category, quantity_kg in category_rows:
+        cat_name = category.value if category else "Інше"
+        purchases_by_category[cat_name] = purchases_by_category.get(cat_name, 0.0) + quantity_kg
     
     purchases_by_category_list = [
         {"category": k, "quantity_kg": round(v, 2)}
@@ -220,60 +245,38 @@ async def get_dashboard_stats(
     
     # ── Зерно у фермерів ──
     # Выкупленное зерно: сумма quantity_kg из платежей типа goods_receive (не отмененных)
-    purchased_payments = session.exec(
-        select(FarmerContractPayment)
+    grain_purchased_from_farmers_kg = session.exec(
+        select(func.coalesce(func.sum(FarmerContractPayment.quantity_kg), 0.0))
         .where(and_(
             FarmerContractPayment.payment_type == FarmerContractPaymentType.GOODS_RECEIVE.value,
             FarmerContractPayment.is_cancelled == False,
             FarmerContractPayment.quantity_kg.isnot(None)
         ))
-    ).all()
-    grain_purchased_from_farmers_kg = sum(p.quantity_kg for p in purchased_payments if p.quantity_kg)
+    ).one()
     
     # Невыкупленное зерно: сумма (quantity_kg - delivered_kg) из позиций контрактов типа FROM_FARMER
-    farmer_items = session.exec(
-        select(FarmerContractItem)
-        .where(FarmerContractItem.direction == FarmerContractItemDirection.FROM_FARMER.value)
-    ).all()
-    grain_not_purchased_from_farmers_kg = sum(
-        max(0.0, item.quantity_kg - item.delivered_kg)
-        for item in farmer_items
-    )
-    
-    # ── Тоннаж за сегодня ──
-    today_intakes = session.exec(
-        select(GrainIntake)
-        .where(and_(
-            GrainIntake.created_at >= today_start,
-            GrainIntake.created_at < today_end,
-            GrainIntake.is_farmer_transfer == False,
-        ))
-    ).all()
-    intakes_today_kg = sum(
-        (i.accepted_weight_kg or 0.0)
-        for i in today_intakes
-        if not i.pending_quality and not i.pending_tare
-    )
-    
-    today_shipments = session.exec(
-        select(GrainShipment)
-        .where(and_(
-            GrainShipment.created_at >= today_start,
-            GrainShipment.created_at < today_end
+    grain_not_purchased_from_farmers_kg = session.exec(
+        select(func.coalesce(
+            func.sum(func.greatest(FarmerContractItem.quantity_kg - FarmerContractItem.delivered_kg, 0.0)),
+            0.0,
         ))
-    ).all()
-    shipments_today_kg = sum(s.quantity_kg for s in today_shipments if s.quantity_kg)
-    
-    # ── Доля собственного/фермерского ──
-    own_stock_kg = sum(s.own_quantity_kg for s in stocks)
-    farmer_stock_kg = sum(s.farmer_quantity_kg for s in stocks)
+        .where(FarmerContractItem.direction == FarmerContractItemDirection.FROM_FARMER.value)
+    ).one()
 
     # ── Талони (хлібний завод) ──
-    vouchers = session.exec(select(GrainVoucher)).all()
-    vouchers_total_value_uah = sum(v.total_value_uah for v in vouchers)
-    vouchers_remaining_uah = sum(v.remaining_value_uah for v in vouchers)
-    vouchers_count = len(vouchers)
-    vouchers_open_count = sum(1 for v in vouchers if not v.is_closed)
+    (
+        vouchers_count,
+        vouchers_open_count,
+        vouchers_total_value_uah,
+        vouchers_remaining_uah,
+    ) = session.exec(
+        select(
+            func.count(GrainVoucher.id),
+            func.count(GrainVoucher.id).filter(GrainVoucher.is_closed == False),
+            func.coalesce(func.sum(GrainVoucher.total_value_uah), 0.0),
+            func.coalesce(func.sum(GrainVoucher.remaining_value_uah), 0.0),
+        )
+    ).one()
     
     return DashboardStatsResponse(
         cash_balances=cash_balances,
@@ -313,18 +316,18 @@ async def get_dashboard_stats(
 #  • Список боргів — відкриті контракти з невиплаченим балансом
 # ============================================================
 
-def _parse_date(value: Optional[str], end: bool = False) -> Optional[datetime]:
-    if not value:
-        return None
-    try:
-        d = date.fromisoformat(value)
-    except ValueError:
-        raise HTTPException(status_code=400, detail=f"Некоректна дата: {value}")
-    return datetime.combine(d, dtime.max if end else dtime.min)
+def _period_conditions(column, start_dt: Optional[datetime], end_dt: Optional[datetime]) -> list:
+    """SQL-предикати періоду для колонки дати (NULL-дата не потрапляє в обмежений період)."""
+    conditions = []
+    if start_dt:
+        conditions.append(column >= start_dt)
+    if end_dt:
+        conditions.append(column <= end_dt)
+    return conditions
 
 
 @router.get("/period-report")
-async def period_report(
+def period_report(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     start_date: Optional[str] = Query(default=None, description="ISO date"),
@@ -339,8 +342,8 @@ async def period_report(
        перекази між фермерами/людьми, списання, поточний залишок на балансі фермерів.
     3) `debts` — відкриті контракти з ненульовим балансом + сума, що вже сплачена.
     """
-    start_dt = _parse_date(start_date, end=False)
-    end_dt = _parse_date(end_date, end=True)
+    start_dt = parse_date(start_date, end=False)
+    end_dt = parse_date(end_date, end=True)
 
     cultures = session.exec(
         select(GrainCulture).where(GrainCulture.is_active == True).order_by(GrainCulture.name)
@@ -351,125 +354,162 @@ async def period_report(
 
     cash = get_or_create_cash_register(session)
 
-    def in_period(ts):
-        if start_dt and (ts is None or ts < start_dt):
-            return False
-        if end_dt and (ts is None or ts > end_dt):
-            return False
-        return True
-
     # ─── Прихід (intake) ───
-    intakes = session.exec(
-        select(GrainIntake).where(
+    # Агрегація в SQL: GROUP BY культура × власне/фермерське, фільтр періоду — у WHERE.
+    # Синтетичні intake-и від трансферу між фермерами — не реальний прихід.
+    intake_rows = session.exec(
+        select(
+            GrainIntake.culture_id,
+            GrainIntake.is_own_grain,
+            func.coalesce(func.sum(GrainIntake.accepted_weight_kg), 0.0),
+            func.coalesce(func.sum(func.greatest(
+                func.coalesce(GrainIntake.net_weight_kg, 0.0)
+                - func.coalesce(GrainIntake.accepted_weight_kg, 0.0),
+                0.0,
+            )), 0.0),
+        )
+        .where(
             GrainIntake.pending_quality == False,
             GrainIntake.pending_tare == False,
+            GrainIntake.is_farmer_transfer.is_not(True),
+            *_period_conditions(GrainIntake.created_at, start_dt, end_dt),
         )
+        .group_by(GrainIntake.culture_id, GrainIntake.is_own_grain)
     ).all()
 
     received_from_farmers: dict[int, float] = {}
     received_from_own: dict[int, float] = {}
     losses_by_culture: dict[int, float] = {}
-    for i in intakes:
-        if not in_period(i.created_at):
-            continue
-        if i.is_farmer_transfer:
-            # Синтетичний intake від трансферу між фермерами — не реальний прихід.
-            continue
-        kg = i.accepted_weight_kg or 0.0
-        if i.is_own_grain:
-            received_from_own[i.culture_id] = received_from_own.get(i.culture_id, 0.0) + kg
-        else:
-            received_from_farmers[i.culture_id] = received_from_farmers.get(i.culture_id, 0.0) + kg
-        loss = (i.net_weight_kg or 0.0) - kg
+    for cid, is_own, kg, loss in intake_rows:
+        target = received_from_own if is_own else received_from_farmers
+        target[cid] = target.get(cid, 0.0) + float(kg)
         if loss > 0:
-            losses_by_culture[i.culture_id] = losses_by_culture.get(i.culture_id, 0.0) + loss
+            losses_by_culture[cid] = losses_by_culture.get(cid, 0.0) + float(loss)
 
     # ─── Відвантаження компаніям ───
-    shipments = session.exec(select(GrainShipment)).all()
+    payment_format = func.lower(func.coalesce(GrainShipment.payment_format, "none"))
+    shipment_rows = session.exec(
+        select(
+            GrainShipment.culture_id,
+            payment_format,
+            func.coalesce(func.sum(GrainShipment.quantity_kg), 0.0),
+        )
+        .where(*_period_conditions(GrainShipment.created_at, start_dt, end_dt))
+        .group_by(GrainShipment.culture_id, payment_format)
+    ).all()
     shipped_total: dict[int, float] = {}
     shipped_cash: dict[int, float] = {}
     shipped_cashless: dict[int, float] = {}
-    for s in shipments:
-        if not in_period(s.created_at):
-            continue
-        cid = s.culture_id
-        kg = s.quantity_kg or 0.0
+    for cid, fmt, kg in shipment_rows:
+        kg = float(kg)
         shipped_total[cid] = shipped_total.get(cid, 0.0) + kg
-        fmt = (s.payment_format or "none").lower()
         if fmt == "cash":
             shipped_cash[cid] = shipped_cash.get(cid, 0.0) + kg
         elif fmt == "cashless":
             shipped_cashless[cid] = shipped_cashless.get(cid, 0.0) + kg
 
     # ─── Платежі по контрактах ───
-    fc_payments = session.exec(
-        select(FarmerContractPayment).where(FarmerContractPayment.is_cancelled == False)
-    ).all()
+    # Дата платежу — payment_date, а якщо не вказана — created_at.
+    payment_ts = func.coalesce(FarmerContractPayment.payment_date, FarmerContractPayment.created_at)
+    payment_period = _period_conditions(payment_ts, start_dt, end_dt)
 
     issued_via_contracts: dict[int, float] = {}            # всі GOODS_ISSUE GRAIN — зерно фізично пішло клієнту
     bought_back_via_payments: dict[int, float] = {}        # GRAIN + GOODS_RECEIVE — викуп зерна з балансу фермера
-    land_service_uah_total: float = 0.0
-    for p in fc_payments:
-        if not in_period(p.payment_date or p.created_at):
-            continue
-        if p.payment_type == FarmerContractPaymentType.GOODS_ISSUE.value:
-            if p.culture_id and p.quantity_kg:
-                issued_via_contracts[p.culture_id] = issued_via_contracts.get(p.culture_id, 0.0) + p.quantity_kg
-            if (p.item_name or "").startswith("Обробка землі"):
-                land_service_uah_total += p.amount_uah or 0.0
-        elif p.payment_type in (
-            FarmerContractPaymentType.GRAIN.value,
-            FarmerContractPaymentType.GOODS_RECEIVE.value,
-        ):
-            if p.culture_id and p.quantity_kg:
-                bought_back_via_payments[p.culture_id] = bought_back_via_payments.get(p.culture_id, 0.0) + p.quantity_kg
+    grain_payment_rows = session.exec(
+        select(
+            FarmerContractPayment.payment_type,
+            FarmerContractPayment.culture_id,
+            func.coalesce(func.sum(FarmerContractPayment.quantity_kg), 0.0),
+        )
+        .where(
+            FarmerContractPayment.is_cancelled == False,
+            FarmerContractPayment.culture_id.is_not(None),
+            FarmerContractPayment.quantity_kg.is_not(None),
+            FarmerContractPayment.payment_type.in_([
+                FarmerContractPaymentType.GOODS_ISSUE.value,
+                FarmerContractPaymentType.GRAIN.value,
+                FarmerContractPaymentType.GOODS_RECEIVE.value,
+            ]),
+            *payment_period,
+        )
+        .group_by(FarmerContractPayment.payment_type, FarmerContractPayment.culture_id)
+    ).all()
+    for ptype, cid, kg in grain_payment_rows:
+        target = issued_via_contracts if ptype == FarmerContractPaymentType.GOODS_ISSUE.value else bought_back_via_payments
+        target[cid] = target.get(cid, 0.0) + float(kg)
+
+    land_service_uah_total = float(session.exec(
+        select(func.coalesce(func.sum(FarmerContractPayment.amount_uah), 0.0))
+        .where(
+            FarmerContractPayment.is_cancelled == False,
+            FarmerContractPayment.payment_type == FarmerContractPaymentType.GOODS_ISSUE.value,
+            FarmerContractPayment.item_name.like("Обробка землі%"),
+            *payment_period,
+        )
+    ).one())
 
     # ─── Викуп через PAYMENT-контракти (миттєвий, без окремого payment) ───
     bought_back_via_payment_contracts: dict[int, float] = {}
-    payment_contracts = session.exec(
-        select(FarmerContract).where(
-            FarmerContract.contract_type == FarmerContractType.PAYMENT.value
+    payment_contract_rows = session.exec(
+        select(
+            FarmerContractItem.culture_id,
+            func.coalesce(func.sum(FarmerContractItem.quantity_kg), 0.0),
+        )
+        .join(FarmerContract, FarmerContract.id == FarmerContractItem.contract_id)
+        .where(
+            FarmerContract.contract_type == FarmerContractType.PAYMENT.value,
+            FarmerContractItem.direction == FarmerContractItemDirection.FROM_FARMER.value,
+            FarmerContractItem.item_type == FarmerContractItemType.GRAIN.value,
+            FarmerContractItem.culture_id.is_not(None),
+            *_period_conditions(FarmerContract.created_at, start_dt, end_dt),
         )
+        .group_by(FarmerContractItem.culture_id)
     ).all()
-    payment_contract_ids = [c.id for c in payment_contracts if in_period(c.created_at)]
-    if payment_contract_ids:
-        farmer_grain_items = session.exec(
-            select(FarmerContractItem).where(
-                FarmerContractItem.contract_id.in_(payment_contract_ids),
-                FarmerContractItem.direction == FarmerContractItemDirection.FROM_FARMER.value,
-                FarmerContractItem.item_type == FarmerContractItemType.GRAIN.value,
-            )
-        ).all()
-        for it in farmer_grain_items:
-            if it.culture_id and it.quantity_kg:
-                bought_back_via_payment_contracts[it.culture_id] = bought_back_via_payment_contracts.get(it.culture_id, 0.0) + it.quantity_kg
+    for cid, kg in payment_contract_rows:
+        bought_back_via_payment_contracts[cid] = float(kg)
 
     # ─── Виплати оренди зерном ───
-    lease_grain_items = session.exec(select(LeasePaymentGrainItem)).all()
-    lease_payments_kg: dict[int, float] = {}
-    for li in lease_grain_items:
-        parent = session.get(LeasePayment, li.payment_id)
-        if not parent or parent.is_cancelled:
-            continue
-        if not in_period(parent.payment_date):
-            continue
-        lease_payments_kg[li.culture_id] = lease_payments_kg.get(li.culture_id, 0.0) + (li.quantity_kg or 0.0)
+    # JOIN з батьківською виплатою замість session.get() на кожну позицію.
+    lease_rows = session.exec(
+        select(
+            LeasePaymentGrainItem.culture_id,
+            func.coalesce(func.sum(LeasePaymentGrainItem.quantity_kg), 0.0),
+        )
+        .join(LeasePayment, LeasePayment.id == LeasePaymentGrainItem.payment_id)
+        .where(
+            LeasePayment.is_cancelled == False,
+            *_period_conditions(LeasePayment.payment_date, start_dt, end_dt),
+        )
+        .group_by(LeasePaymentGrainItem.culture_id)
+    ).all()
+    lease_payments_kg: dict[int, float] = {cid: float(kg) for cid, kg in lease_rows}
 
     # ─── Переміщення фермерського зерна ───
-    movements = session.exec(select(FarmerGrainMovement)).all()
+    movement_rows = session.exec(
+        select(
+            FarmerGrainMovement.culture_id,
+            FarmerGrainMovement.to_person_id.is_not(None),
+            FarmerGrainMovement.to_owner_id.is_not(None),
+            func.coalesce(func.sum(FarmerGrainMovement.quantity_kg), 0.0),
+        )
+        .where(*_period_conditions(FarmerGrainMovement.created_at, start_dt, end_dt))
+        .group_by(
+            FarmerGrainMovement.culture_id,
+            FarmerGrainMovement.to_person_id.is_not(None),
+            FarmerGrainMovement.to_owner_id.is_not(None),
+        )
+    ).all()
     transfer_between_farmers: dict[int, float] = {}    # to_owner_id IS NOT NULL — лишається на складі
     transfer_to_people: dict[int, float] = {}          # to_person_id IS NOT NULL — фізично йде
     deducted: dict[int, float] = {}                    # списання
-    for m in movements:
-        if not in_period(m.created_at):
-            continue
-        kg = m.quantity_kg or 0.0
-        if m.to_person_id:
-            transfer_to_people[m.culture_id] = transfer_to_people.get(m.culture_id, 0.0) + kg
-        elif m.to_owner_id:
-            transfer_between_farmers[m.culture_id] = transfer_between_farmers.get(m.culture_id, 0.0) + kg
+    for cid, to_person, to_owner, kg in movement_rows:
+        if to_person:
+            target = transfer_to_people
+        elif to_owner:
+            target = transfer_between_farmers
         else:
-            deducted[m.culture_id] = deducted.get(m.culture_id, 0.0) + kg
+            target = deducted
+        target[cid] = target.get(cid, 0.0) + float(kg)
 
     # ─── Борги (відкриті контракти) ───
     # Контракт вважаємо боргом тільки якщо одночасно: status == OPEN
@@ -482,14 +522,21 @@ async def period_report(
             FarmerContract.balance_uah > 0.01,
         )
     ).all()
+    # Імена контрагентів — двома IN-запитами на весь список, а не get() на контракт.
+    owner_ids = {c.owner_id for c in open_contracts if c.owner_id}
+    person_ids = {c.person_id for c in open_contracts if c.person_id}
+    owner_names = dict(session.exec(
+        select(GrainOwner.id, GrainOwner.full_name).where(GrainOwner.id.in_(owner_ids))
+    ).all()) if owner_ids else {}
+    person_names = dict(session.exec(
+        select(Person.id, Person.full_name).where(Person.id.in_(person_ids))
+    ).all()) if person_ids else {}
     for c in open_contracts:
         if c.owner_id:
-            owner = session.get(GrainOwner, c.owner_id)
-            name = owner.full_name if owner else f"#{c.owner_id}"
+            name = owner_names.get(c.owner_id) or f"#{c.owner_id}"
             is_person = False
         elif c.person_id:
-            person = session.get(Person, c.person_id)
-            name = person.full_name if person else f"#{c.person_id}"
+            name = person_names.get(c.person_id) or f"#{c.person_id}"
             is_person = True
         else:
             continue
@@ -500,7 +547,7 @@ async def period_report(
             "name": name,
             "is_person": is_person,
             "type": c.contract_type,
-            "created_at": c.created_at.isoformat() if c.created_at else None,
+            "created_at": c.created_at,
             "total_uah": round(total, 2),
             "paid_uah": round(max(0.0, total - balance), 2),
             "balance_uah": round(balance, 2),
@@ -639,19 +686,55 @@ _CONTRACT_TYPE_LABELS = {
 
 
 @router.get("/period-report/export")
-async def export_period_report(
+def export_period_report(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     start_date: Optional[str] = Query(default=None, description="ISO date"),
     end_date: Optional[str] = Query(default=None, description="ISO date"),
 ):
-    """Excel-звіт по дашборду: каса + 3 таблиці (рух, розрахунки, борги)."""
-    data = await period_report(
+    """Excel-звіт по дашборду: каса + 3 таблиці (рух, розрахунки, борги).
+    Фоновий варіант — `POST /api/exports/jobs` (kind=period_report)."""
+    wb = build_period_report_workbook(session, current_user, start_date, end_date)
+    buffer = BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+
+    return StreamingResponse(
+        buffer,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f'attachment; filename="{period_report_filename(start_date, end_date)}"'},
+    )
+
+
+def period_report_filename(start_date: Optional[str], end_date: Optional[str]) -> str:
+    """dashboard_2026-05-01_2026-05-09.xlsx або dashboard_all_time.xlsx"""
+    if start_date and end_date:
+        period_label = f"{start_date}_{end_date}"
+    elif start_date:
+        period_label = f"from_{start_date}"
+    elif end_date:
+        period_label = f"to_{end_date}"
+    else:
+        period_label = "all_time"
+    return f"dashboard_{period_label}.xlsx"
+
+
+def build_period_report_workbook(
+    session: Session,
+    current_user: Optional[User],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    progress: Optional[Callable[[int], None]] = None,
+) -> Workbook:
+    """Будує книгу звіту за період. `progress(pct)` — колбек для фонових експортів."""
+    data = period_report(
         session=session,
         current_user=current_user,
         start_date=start_date,
         end_date=end_date,
     )
+    if progress:
+        progress(60)
 
     wb = Workbook()
 
@@ -776,12 +859,7 @@ async def export_period_report(
     _style_header_row(s3, row_index=1, ncols=8)
     for d in data["debts"]:
         name = d["name"] + (" (людина)" if d.get("is_person") else "")
-        date_str = "—"
-        if d.get("created_at"):
-            try:
-                date_str = datetime.fromisoformat(d["created_at"]).strftime("%Y-%m-%d")
-            except (TypeError, ValueError):
-                date_str = "—"
+        date_str = d["created_at"].strftime("%Y-%m-%d") if d.get("created_at") else "—"
         s3.append([
             d["contract_id"],
             name,
@@ -807,23 +885,6 @@ async def export_period_report(
     ):
         s3.column_dimensions[chr(64 + col_idx)].width = width
 
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    # Filename: dashboard_2026-05-01_2026-05-09.xlsx або dashboard_all_time.xlsx
-    if start_date and end_date:
-        period_label = f"{start_date}_{end_date}"
-    elif start_date:
-        period_label = f"from_{start_date}"
-    elif end_date:
-        period_label = f"to_{end_date}"
-    else:
-        period_label = "all_time"
-    filename = f"dashboard_{period_label}.xlsx"
-
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    if progress:
+        progress(90)
+    return wb
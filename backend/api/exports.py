@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlmodel import Session, select
+from datetime import date
+from pathlib import Path
+
+from backend.database import get_session
+from backend.exports import file_response
+from backend.export_jobs import EXPORT_KINDS, create_export_job
+from backend.models import ExportJob, ExportJobStatus, User, UserRole
+from backend.schemas import ExportJobCreate, ExportJobResponse
+from backend.auth import get_current_user
+
+router = APIRouter()
+
+
+def _get_job(session: Session, job_id: int, current_user: User) -> ExportJob:
+    """Задача доступна автору та супер адміну."""
+    job = session.get(ExportJob, job_id)
+    if not job or (
+        job.created_by_user_id != current_user.id and current_user.role != UserRole.SUPER_ADMIN
+    ):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Експорт не знайдено")
+    return job
+
+
+@router.post("/jobs", response_model=ExportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def create_job(
+    payload: ExportJobCreate,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Замовити фонове формування Excel-звіту. Статус — `GET /jobs/{id}`."""
+    if payload.kind not in EXPORT_KINDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Невідомий тип звіту. Доступні: {', '.join(EXPORT_KINDS)}"
+        )
+    # Дати перевіряємо одразу, а не в дочірньому процесі — щоб одразу віддати 400.
+    for label, value in (("початку", payload.start_date), ("завершення", payload.end_date)):
+        if value:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Некоректний формат дати {label}"
+                )
+    params = {"start_date": payload.start_date, "end_date": payload.end_date}
+    return create_export_job(session, payload.kind, params, current_user)
+
+
+@router.get("/jobs", response_model=list[ExportJobResponse])
+def list_jobs(
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Останні фонові експорти поточного користувача."""
+    return session.exec(
+        select(ExportJob)
+        .where(ExportJob.created_by_user_id == current_user.id)
+        .order_by(ExportJob.created_at.desc())
+        .limit(limit)
+    ).all()
+
+
+@router.get("/jobs/{job_id}", response_model=ExportJobResponse)
+def get_job(
+    job_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Статус і прогрес фонового експорту."""
+    return _get_job(session, job_id, current_user)
+
+
+@router.get("/jobs/{job_id}/download")
+def download_job(
+    job_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Скачати готовий файл фонового експорту."""
+    job = _get_job(session, job_id, current_user)
+    if job.status != ExportJobStatus.DONE.value:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Звіт ще не готовий" if job.status != ExportJobStatus.FAILED.value
+            else f"Звіт не сформовано: {job.error or 'помилка'}"
+        )
+    if not job.file_path or not Path(job.file_path).is_file():
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Файл звіту вже видалено — сформуйте звіт повторно"
+        )
+    return file_response(job.file_path, job.filename or Path(job.file_path).name)
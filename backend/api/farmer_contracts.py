@@ -1,7 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
-from sqlalchemy import func
 from typing import Optional
 from datetime import datetime, date, time as dtime
 from io import BytesIO
@@ -9,14 +8,15 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 
 from backend.database import get_session
+from backend.exports import XlsxExport
+from backend.cash_ledger import record_cash_movement
+from backend.stock import change_grain_stock, get_grain_stock
+from backend.voucher_allocation import allocate_voucher_payment, lock_voucher_allocation
 from backend.models import (
     GrainOwner,
     GrainCulture,
-    GrainIntake,
     GrainStock,
     PurchaseStock,
-    CashRegister,
-    Transaction,
     TransactionType,
     Currency,
     FarmerContract,
@@ -42,6 +42,14 @@ from backend.schemas import (
     ReserveActivateRequest,
 )
 from backend.auth import get_current_user, get_current_super_admin
+from backend.balances import (
+    add_farmer_deduction,
+    apply_person_grain_payment,
+    apply_person_item_delivery,
+    delete_farmer_deduction,
+    get_farmer_balance,
+    get_person_balance,
+)
 
 router = APIRouter()
 
@@ -74,100 +82,17 @@ def _compute_contract_balance_uah(session: Session, contract_id: int, total_valu
     return max(0.0, (total_value_uah or 0) - paid)
 
 
-def _get_or_create_grain_stock(session: Session, culture_id: int) -> GrainStock:
-    stock = session.exec(select(GrainStock).where(GrainStock.culture_id == culture_id)).first()
-    if not stock:
-        stock = GrainStock(
-            culture_id=culture_id,
-            quantity_kg=0.0,
-            own_quantity_kg=0.0,
-            farmer_quantity_kg=0.0,
-            reserved_kg=0.0
-        )
-        session.add(stock)
-        session.flush()
-    return stock
-
-
-def _get_cash_register(session: Session) -> CashRegister:
-    register = session.exec(select(CashRegister)).first()
-    if not register:
-        register = CashRegister(uah_balance=0.0, usd_balance=0.0, eur_balance=0.0)
-        session.add(register)
-        session.flush()
-    return register
-
-
 def _get_farmer_balance(session: Session, owner_id: int, culture_id: int) -> float:
-    total = session.exec(
-        select(func.sum(GrainIntake.accepted_weight_kg)).where(
-            GrainIntake.owner_id == owner_id,
-            GrainIntake.culture_id == culture_id,
-            GrainIntake.is_own_grain == False,
-            GrainIntake.pending_quality == False,
-            GrainIntake.pending_tare == False,
-        )
-    ).first() or 0.0
-    deductions = session.exec(
-        select(func.sum(FarmerGrainDeduction.quantity_kg)).where(
-            FarmerGrainDeduction.owner_id == owner_id,
-            FarmerGrainDeduction.culture_id == culture_id
-        )
-    ).first() or 0.0
-    return float(total) - float(deductions)
+    """Баланс фермера з журналу `farmer_balances`. Викликається лише у write-шляхах,
+    тому рядок блокується до commit — два паралельні списання не пройдуть перевірку обидва."""
+    return get_farmer_balance(session, owner_id, culture_id, for_update=True)
 
 
 def _get_person_balance(session: Session, person_id: int, culture_id: int) -> float:
-    """Баланс зерна людини по культурі.
-    Прибутки: переказів to_person_id за цю культуру.
-    Витрати:
-      1) активні GRAIN-оплати по DEBT-контрактах цієї людини за цю культуру;
-      2) FROM_FARMER GRAIN-позиції у PAYMENT-контрактах цієї людини (викуп —
-         зерно одразу йде у нас, незалежно від типу оплати).
-    Скасовані контракти/оплати не враховуються.
-    """
-    from backend.models import FarmerGrainMovement, FarmerContract, FarmerContractItem
-    incoming = session.exec(
-        select(func.sum(FarmerGrainMovement.quantity_kg)).where(
-            FarmerGrainMovement.to_person_id == person_id,
-            FarmerGrainMovement.culture_id == culture_id,
-            FarmerGrainMovement.movement_type == "transfer",
-        )
-    ).first() or 0.0
-
-    # OUT-перекази від цієї людини (наприклад, людина → підприємство або людина → фермер)
-    outgoing_transfer = session.exec(
-        select(func.sum(FarmerGrainMovement.quantity_kg)).where(
-            FarmerGrainMovement.from_person_id == person_id,
-            FarmerGrainMovement.culture_id == culture_id,
-            FarmerGrainMovement.movement_type == "transfer",
-        )
-    ).first() or 0.0
-
-    contract_ids_query = select(FarmerContract.id).where(
-        FarmerContract.person_id == person_id,
-        FarmerContract.status != FarmerContractStatus.CANCELLED.value,
-    )
-    grain_spent = session.exec(
-        select(func.sum(FarmerContractPayment.quantity_kg)).where(
-            FarmerContractPayment.contract_id.in_(contract_ids_query),
-            FarmerContractPayment.payment_type == FarmerContractPaymentType.GRAIN.value,
-            FarmerContractPayment.culture_id == culture_id,
-            FarmerContractPayment.is_cancelled == False,
-        )
-    ).first() or 0.0
-
-    # Викуп (PAYMENT-контракт): зерно йде у нас одразу при створенні контракту.
-    payment_spent = session.exec(
-        select(func.sum(FarmerContractItem.delivered_kg)).where(
-            FarmerContractItem.contract_id.in_(contract_ids_query),
-            FarmerContractItem.direction == FarmerContractItemDirection.FROM_FARMER.value,
-            FarmerContractItem.item_type == FarmerContractItemType.GRAIN.value,
-            FarmerContractItem.culture_id == culture_id,
-        )
-    ).first() or 0.0
-
-    return float(incoming) - float(outgoing_transfer) - float(grain_spent) - float(payment_spent)
+    """Баланс зерна людини з журналу `person_grain_balances` (перекази до/від людини
+    мінус GRAIN-оплати і викуп по її контрактах). Як і `_get_farmer_balance`,
+    блокує рядок до commit."""
+    return get_person_balance(session, person_id, culture_id, for_update=True)
 
 
 def _normalize_name_for_match(name: str) -> str:
@@ -242,7 +167,7 @@ def _find_or_create_purchase_stock_by_name(session: Session, name: str, category
 
 
 @router.get("", response_model=list[FarmerContractResponse])
-async def list_farmer_contracts(
+def list_farmer_contracts(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     owner_id: Optional[int] = Query(None),
@@ -280,7 +205,7 @@ async def list_farmer_contracts(
 
 
 @router.get("/payments", response_model=list[FarmerContractPaymentResponse])
-async def list_all_farmer_contract_payments(
+def list_all_farmer_contract_payments(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     owner_id: Optional[int] = Query(None),
@@ -350,7 +275,7 @@ def _fc_to_response(workbook, filename):
 
 
 @router.get("/export")
-async def export_farmer_contracts(
+def export_farmer_contracts(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     owner_id: Optional[int] = Query(None),
@@ -476,7 +401,7 @@ async def export_farmer_contracts(
 
 
 @router.get("/payments/export")
-async def export_farmer_contract_payments(
+def export_farmer_contract_payments(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     owner_id: Optional[int] = Query(None),
@@ -512,11 +437,23 @@ async def export_farmer_contract_payments(
 
     payments = session.exec(query.order_by(FarmerContractPayment.payment_date.desc())).all()
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Виплати по контрактах"
-    headers = ["Дата", "Фермер", "Контракт", "Тип", "Позиція", "Кількість, кг", "Сума", "Валюта", "Курс", "Сума, грн", "Статус"]
-    _fc_apply_header(ws, headers)
+    contract_ids = {p.contract_id for p in payments}
+    contract_owner = dict(session.exec(
+        select(FarmerContract.id, FarmerContract.owner_id).where(FarmerContract.id.in_(contract_ids))
+    ).all()) if contract_ids else {}
+    owner_ids = {oid for oid in contract_owner.values() if oid}
+    owner_names = dict(session.exec(
+        select(GrainOwner.id, GrainOwner.full_name).where(GrainOwner.id.in_(owner_ids))
+    ).all()) if owner_ids else {}
+
+    status_col = 11
+    book = XlsxExport()
+    sheet = book.sheet(
+        "Виплати по контрактах",
+        ["Дата", "Фермер", "Контракт", "Тип", "Позиція", "Кількість, кг", "Сума", "Валюта", "Курс", "Сума, грн", "Статус"],
+        widths=[14, 30, 12, 14, 25, 16, 14, 10, 10, 16, 14],
+        centered=(status_col,),
+    )
 
     type_labels = {
         "goods_issue": "Видача",
@@ -529,13 +466,12 @@ async def export_farmer_contract_payments(
     cancelled_fill = PatternFill("solid", fgColor="FECACA")
 
     for p in payments:
-        contract = session.get(FarmerContract, p.contract_id)
         owner_name = "-"
-        if contract:
-            owner = session.get(GrainOwner, contract.owner_id)
-            owner_name = owner.full_name if owner else f"#{contract.owner_id}"
+        if p.contract_id in contract_owner:
+            owner_id = contract_owner[p.contract_id]
+            owner_name = owner_names.get(owner_id) or f"#{owner_id}"
 
-        ws.append([
+        sheet.append([
             p.payment_date.strftime("%d.%m.%Y") if p.payment_date else "-",
             owner_name,
             f"#{p.contract_id}",
@@ -547,28 +483,13 @@ async def export_farmer_contract_payments(
             p.exchange_rate if p.exchange_rate else "-",
             round(p.amount_uah, 2) if p.amount_uah else "-",
             "Скасовано" if p.is_cancelled else "Активна"
-        ])
-
-    for row in range(2, ws.max_row + 1):
-        status_cell = ws.cell(row=row, column=11)
-        if status_cell.value == "Скасовано":
-            status_cell.fill = cancelled_fill
-        else:
-            status_cell.fill = active_fill
-        status_cell.alignment = Alignment(horizontal="center")
-
-    _fc_apply_body_style(ws, len(headers))
-    ws.freeze_panes = "A2"
-    ws.auto_filter.ref = f"A1:{chr(64 + len(headers))}{ws.max_row}"
-    widths = [14, 30, 12, 14, 25, 16, 14, 10, 10, 16, 14]
-    for idx, w in enumerate(widths, 1):
-        ws.column_dimensions[chr(64 + idx)].width = w
+        ], fills={status_col: cancelled_fill if p.is_cancelled else active_fill})
 
-    return _fc_to_response(wb, f"farmer_payments_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx")
+    return book.to_response(f"farmer_payments_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx")
 
 
 @router.get("/{contract_id}/export")
-async def export_single_farmer_contract(
+def export_single_farmer_contract(
     contract_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -706,7 +627,7 @@ async def export_single_farmer_contract(
 
 
 @router.get("/{contract_id}", response_model=FarmerContractDetailResponse)
-async def get_farmer_contract(
+def get_farmer_contract(
     contract_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -728,7 +649,7 @@ async def get_farmer_contract(
 
 
 @router.post("", response_model=FarmerContractDetailResponse)
-async def create_farmer_contract(
+def create_farmer_contract(
     payload: FarmerContractCreate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -862,39 +783,23 @@ async def create_farmer_contract(
 
         # Рухи на складі: зерно контрагента → наше.
         for item in items_to_create:
-            stock = _get_or_create_grain_stock(session, item.culture_id)
-            if person:
-                stock.person_quantity_kg = max(0.0, (stock.person_quantity_kg or 0.0) - item.quantity_kg)
-            else:
-                stock.farmer_quantity_kg = max(0.0, stock.farmer_quantity_kg - item.quantity_kg)
-            stock.own_quantity_kg += item.quantity_kg
-            session.add(stock)
-            # Списання з балансу фермера — лише для фермера. Балас людини
-            # автоматично перерахується через GRAIN-payments + transfers.
+            bucket = "person_quantity_kg" if person else "farmer_quantity_kg"
+            change_grain_stock(
+                session, item.culture_id, clamp=(bucket,),
+                **{bucket: -item.quantity_kg}, own_quantity_kg=item.quantity_kg,
+            )
+            # Списання з балансу: фермер — через FarmerGrainDeduction,
+            # людина — через delivered_kg FROM_FARMER-позиції.
             if not person:
-                session.add(FarmerGrainDeduction(
-                    owner_id=payload.owner_id,
-                    culture_id=item.culture_id,
-                    quantity_kg=item.quantity_kg
-                ))
+                add_farmer_deduction(session, payload.owner_id, item.culture_id, item.quantity_kg)
+            else:
+                apply_person_item_delivery(session, contract, item, item.delivered_kg)
 
         # Списуємо гроші з каси
-        cash_register = _get_cash_register(session)
-        balance_field_map = {Currency.UAH: "uah_balance", Currency.USD: "usd_balance", Currency.EUR: "eur_balance"}
-        field = balance_field_map[currency_enum]
-        new_balance = getattr(cash_register, field) - payout_amount
-        setattr(cash_register, field, new_balance)
-        session.add(cash_register)
-        session.add(Transaction(
-            currency=currency_enum,
-            amount=payout_amount,
-            transaction_type=TransactionType.SUBTRACT,
-            user_id=current_user.id,
-            description=f"Виплата за контрактом #{contract.id} ({counterparty_label})",
-            uah_balance_after=cash_register.uah_balance,
-            usd_balance_after=cash_register.usd_balance,
-            eur_balance_after=cash_register.eur_balance
-        ))
+        record_cash_movement(
+            session, currency_enum, payout_amount, TransactionType.SUBTRACT, current_user.id,
+            f"Виплата за контрактом #{contract.id} ({counterparty_label})",
+        )
 
         # Запис виплати (settlement)
         settlement = FarmerContractPayment(
@@ -940,9 +845,7 @@ async def create_farmer_contract(
                     if not culture:
                         raise HTTPException(status_code=404, detail="Культуру не знайдено")
                     item_name = culture.name
-                    stock = _get_or_create_grain_stock(session, ci.culture_id)
-                    stock.reserved_kg += ci.quantity_kg
-                    session.add(stock)
+                    change_grain_stock(session, ci.culture_id, reserved_kg=ci.quantity_kg)
                 else:
                     raise HTTPException(status_code=400, detail="Оберіть культуру")
             elif ci.item_type == FarmerContractItemType.PURCHASE:
@@ -1026,12 +929,16 @@ async def create_farmer_contract(
             price = item.price_per_kg or culture.price_per_kg
             item_name = culture.name
             if direction == FarmerContractItemDirection.FROM_COMPANY:
-                stock = _get_or_create_grain_stock(session, item.culture_id)
                 # Дозволяємо контракт на всю наявну кількість на складі (в т.ч. невикуплене зерно фермерів)
-                available = stock.quantity_kg - stock.reserved_kg
-                if item.quantity_kg > available + 0.01:
+                stock = change_grain_stock(
+                    session, item.culture_id,
+                    where=[GrainStock.quantity_kg - GrainStock.reserved_kg >= item.quantity_kg - 0.01],
+                    reserved_kg=item.quantity_kg,
+                )
+                if stock is None:
+                    current = get_grain_stock(session, item.culture_id)
+                    available = current.quantity_kg - current.reserved_kg
                     raise HTTPException(status_code=400, detail=f"Недостатньо зерна {culture.name} на складі. Доступно: {available:.2f}")
-                stock.reserved_kg += item.quantity_kg
             else:
                 available = _get_farmer_balance(session, payload.owner_id, item.culture_id)
                 if item.quantity_kg > available + 0.01:
@@ -1130,7 +1037,7 @@ async def create_farmer_contract(
 
 
 @router.post("/{contract_id}/settle", response_model=FarmerContractDetailResponse)
-async def settle_payment_contract(
+def settle_payment_contract(
     contract_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -1202,40 +1109,26 @@ async def settle_payment_contract(
         qty = item.quantity_kg or 0.0
         if qty <= 0:
             continue
-        stock = _get_or_create_grain_stock(session, item.culture_id)
-        if is_person:
-            stock.person_quantity_kg = max(0.0, (stock.person_quantity_kg or 0.0) - qty)
-        else:
-            stock.farmer_quantity_kg = max(0.0, stock.farmer_quantity_kg - qty)
-        stock.own_quantity_kg += qty
-        session.add(stock)
+        bucket = "person_quantity_kg" if is_person else "farmer_quantity_kg"
+        change_grain_stock(
+            session, item.culture_id, clamp=(bucket,),
+            **{bucket: -qty}, own_quantity_kg=qty,
+        )
+        delivered_delta = qty - (item.delivered_kg or 0.0)
         item.delivered_kg = qty
         session.add(item)
-        # Списання з балансу фермера (для людини deduction-ів немає)
+        # Списання з балансу фермера (для людини deduction-ів немає — її баланс іде через delivered_kg)
         if not is_person:
-            session.add(FarmerGrainDeduction(
-                owner_id=contract.owner_id,
-                culture_id=item.culture_id,
-                quantity_kg=qty
-            ))
+            add_farmer_deduction(session, contract.owner_id, item.culture_id, qty)
+        else:
+            apply_person_item_delivery(session, contract, item, delivered_delta)
 
     # Списуємо гроші з каси + Transaction
-    cash_register = _get_cash_register(session)
-    balance_field_map = {Currency.UAH: "uah_balance", Currency.USD: "usd_balance", Currency.EUR: "eur_balance"}
-    field = balance_field_map[currency_enum]
-    setattr(cash_register, field, getattr(cash_register, field) - payout_amount)
-    session.add(cash_register)
     counterparty_label = (person.full_name if person else (owner.full_name if owner else "?"))
-    session.add(Transaction(
-        currency=currency_enum,
-        amount=payout_amount,
-        transaction_type=TransactionType.SUBTRACT,
-        user_id=current_user.id,
-        description=f"Виплата за контрактом #{contract.id} ({counterparty_label})",
-        uah_balance_after=cash_register.uah_balance,
-        usd_balance_after=cash_register.usd_balance,
-        eur_balance_after=cash_register.eur_balance
-    ))
+    record_cash_movement(
+        session, currency_enum, payout_amount, TransactionType.SUBTRACT, current_user.id,
+        f"Виплата за контрактом #{contract.id} ({counterparty_label})",
+    )
 
     # Settlement payment
     session.add(FarmerContractPayment(
@@ -1270,7 +1163,7 @@ async def settle_payment_contract(
 
 
 @router.post("/{contract_id}/activate", response_model=FarmerContractResponse)
-async def activate_reserve_contract(
+def activate_reserve_contract(
     contract_id: int,
     payload: Optional[ReserveActivateRequest] = None,
     session: Session = Depends(get_session),
@@ -1294,8 +1187,9 @@ async def activate_reserve_contract(
     # Перевіряємо наявність на складі (враховуємо всю кількість, в т.ч. невикуплене зерно)
     for item in items:
         if item.item_type == FarmerContractItemType.GRAIN.value and item.culture_id:
-            stock = _get_or_create_grain_stock(session, item.culture_id)
-            available = stock.quantity_kg - (stock.reserved_kg - item.quantity_kg)
+            stock = get_grain_stock(session, item.culture_id)
+            quantity, reserved = (stock.quantity_kg, stock.reserved_kg) if stock else (0.0, 0.0)
+            available = quantity - (reserved - item.quantity_kg)
             if item.quantity_kg > available + 0.01:
                 raise HTTPException(
                     status_code=400,
@@ -1368,7 +1262,7 @@ async def activate_reserve_contract(
 
 
 @router.post("/{contract_id}/close", response_model=FarmerContractResponse)
-async def close_farmer_contract(
+def close_farmer_contract(
     contract_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -1391,9 +1285,7 @@ async def close_farmer_contract(
         if item.direction != FarmerContractItemDirection.FROM_COMPANY.value:
             continue
         if item.item_type == FarmerContractItemType.GRAIN.value and item.culture_id:
-            stock = _get_or_create_grain_stock(session, item.culture_id)
-            stock.reserved_kg = max(0.0, stock.reserved_kg - unreserve_qty)
-            session.add(stock)
+            change_grain_stock(session, item.culture_id, clamp=("reserved_kg",), reserved_kg=-unreserve_qty)
         elif item.item_type == FarmerContractItemType.PURCHASE.value and item.purchase_stock_id:
             pstock = session.get(PurchaseStock, item.purchase_stock_id)
             if pstock:
@@ -1408,7 +1300,7 @@ async def close_farmer_contract(
 
 
 @router.get("/{contract_id}/payments", response_model=list[FarmerContractPaymentResponse])
-async def list_farmer_contract_payments(
+def list_farmer_contract_payments(
     contract_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -1448,7 +1340,7 @@ def _check_contract_completion(session: Session, contract: FarmerContract):
 
 
 @router.post("/{contract_id}/payments", response_model=FarmerContractPaymentResponse)
-async def create_farmer_contract_payment(
+def create_farmer_contract_payment(
     contract_id: int,
     payload: FarmerContractPaymentCreate,
     session: Session = Depends(get_session),
@@ -1506,11 +1398,13 @@ async def create_farmer_contract_payment(
 
         # Списуємо зі складу
         if item.item_type == FarmerContractItemType.GRAIN.value and item.culture_id:
-            stock = _get_or_create_grain_stock(session, item.culture_id)
-            stock.reserved_kg = max(0.0, stock.reserved_kg - payload.quantity_kg)
-            stock.own_quantity_kg = max(0.0, stock.own_quantity_kg - payload.quantity_kg)
-            stock.quantity_kg = max(0.0, stock.quantity_kg - payload.quantity_kg)
-            session.add(stock)
+            change_grain_stock(
+                session, item.culture_id,
+                clamp=("reserved_kg", "own_quantity_kg", "quantity_kg"),
+                reserved_kg=-payload.quantity_kg,
+                own_quantity_kg=-payload.quantity_kg,
+                quantity_kg=-payload.quantity_kg,
+            )
         elif item.item_type == FarmerContractItemType.PURCHASE.value and item.purchase_stock_id:
             pstock = session.get(PurchaseStock, item.purchase_stock_id)
             if pstock:
@@ -1518,28 +1412,11 @@ async def create_farmer_contract_payment(
                 pstock.quantity_kg = max(0.0, pstock.quantity_kg - payload.quantity_kg)
                 session.add(pstock)
         elif item.item_type == FarmerContractItemType.CASH.value:
-            cash_register = _get_cash_register(session)
-            currency_str = getattr(item, "currency", None) or "UAH"
-            try:
-                currency_enum = Currency(currency_str)
-            except ValueError:
-                currency_enum = Currency.UAH
-            balance_field_map = {Currency.UAH: "uah_balance", Currency.USD: "usd_balance", Currency.EUR: "eur_balance"}
-            field = balance_field_map[currency_enum]
-            current_bal = getattr(cash_register, field)
             # Дозволяємо касі йти в мінус при виплаті
-            setattr(cash_register, field, current_bal - payload.quantity_kg)
-            session.add(cash_register)
-            session.add(Transaction(
-                currency=currency_enum,
-                amount=payload.quantity_kg,
-                transaction_type=TransactionType.SUBTRACT,
-                user_id=current_user.id,
-                description=f"Видача за контрактом фермера #{contract_id}",
-                uah_balance_after=cash_register.uah_balance,
-                usd_balance_after=cash_register.usd_balance,
-                eur_balance_after=cash_register.eur_balance
-            ))
+            record_cash_movement(
+                session, getattr(item, "currency", None), payload.quantity_kg, TransactionType.SUBTRACT,
+                current_user.id, f"Видача за контрактом фермера #{contract_id}",
+            )
 
         item.delivered_kg += payload.quantity_kg
         session.add(item)
@@ -1599,27 +1476,19 @@ async def create_farmer_contract_payment(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Недостатньо зерна на балансі фермера. Доступно: {available:.2f}"
                 )
-            stock = _get_or_create_grain_stock(session, item.culture_id)
-            stock.farmer_quantity_kg -= payload.quantity_kg
-            stock.own_quantity_kg += payload.quantity_kg
-            session.add(stock)
+            change_grain_stock(
+                session, item.culture_id,
+                farmer_quantity_kg=-payload.quantity_kg, own_quantity_kg=payload.quantity_kg,
+            )
         elif item.item_type == FarmerContractItemType.CASH.value:
-            cash_register = _get_cash_register(session)
-            cash_register.uah_balance += payload.quantity_kg
-            session.add(cash_register)
-            session.add(Transaction(
-                currency=Currency.UAH,
-                amount=payload.quantity_kg,
-                transaction_type=TransactionType.ADD,
-                user_id=current_user.id,
-                description=f"Прийом за контрактом фермера #{contract_id}",
-                uah_balance_after=cash_register.uah_balance,
-                usd_balance_after=cash_register.usd_balance,
-                eur_balance_after=cash_register.eur_balance
-            ))
+            record_cash_movement(
+                session, Currency.UAH, payload.quantity_kg, TransactionType.ADD,
+                current_user.id, f"Прийом за контрактом фермера #{contract_id}",
+            )
 
         item.delivered_kg += payload.quantity_kg
         session.add(item)
+        apply_person_item_delivery(session, contract, item, payload.quantity_kg)
 
         payment = FarmerContractPayment(
             contract_id=contract_id,
@@ -1638,12 +1507,7 @@ async def create_farmer_contract_payment(
         # Для зерна — запис списання з балансу фермера
         if item.item_type == FarmerContractItemType.GRAIN.value and item.culture_id:
             session.flush()
-            session.add(FarmerGrainDeduction(
-                owner_id=contract.owner_id,
-                culture_id=item.culture_id,
-                quantity_kg=payload.quantity_kg,
-                payment_id=payment.id
-            ))
+            add_farmer_deduction(session, contract.owner_id, item.culture_id, payload.quantity_kg, payment_id=payment.id)
         # Прийом НЕ зменшує balance_uah
 
     # ─── CASH: фермер платить грошима (зменшує борг) ───
@@ -1660,26 +1524,10 @@ async def create_farmer_contract_payment(
         if amount_uah > contract.balance_uah + 0.01:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Сума перевищує залишок боргу")
 
-        cash_register = _get_cash_register(session)
-        balance_field_map = {
-            Currency.UAH: "uah_balance",
-            Currency.USD: "usd_balance",
-            Currency.EUR: "eur_balance"
-        }
-        balance_field = balance_field_map[payload.currency]
-        new_balance = getattr(cash_register, balance_field) + payload.amount
-        setattr(cash_register, balance_field, new_balance)
-        session.add(Transaction(
-            currency=payload.currency,
-            amount=payload.amount,
-            transaction_type=TransactionType.ADD,
-            user_id=current_user.id,
-            description=f"Оплата боргу фермера #{contract_id}",
-            uah_balance_after=cash_register.uah_balance,
-            usd_balance_after=cash_register.usd_balance,
-            eur_balance_after=cash_register.eur_balance
-        ))
-        session.add(cash_register)
+        record_cash_movement(
+            session, payload.currency, payload.amount, TransactionType.ADD,
+            current_user.id, f"Оплата боргу фермера #{contract_id}",
+        )
 
         payment = FarmerContractPayment(
             contract_id=contract_id,
@@ -1719,15 +1567,18 @@ async def create_farmer_contract_payment(
         if amount_uah > contract.balance_uah + 0.01:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Сума перевищує залишок боргу")
 
-        stock = _get_or_create_grain_stock(session, payload.culture_id)
         if person:
             # У людини зерно лежить у person_quantity_kg — переносимо у own.
-            stock.person_quantity_kg = max(0.0, (stock.person_quantity_kg or 0.0) - payload.quantity_kg)
+            change_grain_stock(
+                session, payload.culture_id, clamp=("person_quantity_kg",),
+                person_quantity_kg=-payload.quantity_kg, own_quantity_kg=payload.quantity_kg,
+            )
         else:
             # У фермера — у farmer_quantity_kg.
-            stock.farmer_quantity_kg -= payload.quantity_kg
-        stock.own_quantity_kg += payload.quantity_kg
-        session.add(stock)
+            change_grain_stock(
+                session, payload.culture_id,
+                farmer_quantity_kg=-payload.quantity_kg, own_quantity_kg=payload.quantity_kg,
+            )
 
         payment = FarmerContractPayment(
             contract_id=contract_id,
@@ -1745,12 +1596,9 @@ async def create_farmer_contract_payment(
         if not person:
             # FarmerGrainDeduction — лише для фермерів (їхній баланс рахується через ці записи).
             # Баланс людини рахується з FarmerContractPayment(GRAIN), деduction не потрібен.
-            session.add(FarmerGrainDeduction(
-                owner_id=contract.owner_id,
-                culture_id=payload.culture_id,
-                quantity_kg=payload.quantity_kg,
-                payment_id=payment.id
-            ))
+            add_farmer_deduction(session, contract.owner_id, payload.culture_id, payload.quantity_kg, payment_id=payment.id)
+        else:
+            apply_person_grain_payment(session, contract, payment)
         contract.balance_uah = max(0.0, contract.balance_uah - amount_uah)
 
     # ─── VOUCHER: талон на зерно (хлібний завод) ───
@@ -1814,7 +1662,9 @@ async def create_farmer_contract_payment(
         session.add(payment)
         session.flush()
 
-        # Создаём талон
+        # Создаём талон. Під блокуванням розподілу: одночасна виплата по
+        # талонах не має бачити чергу FIFO наполовину зміненою.
+        lock_voucher_allocation(session)
         voucher = GrainVoucher(
             farmer_contract_id=contract_id,
             farmer_contract_payment_id=payment.id,
@@ -1851,7 +1701,7 @@ async def create_farmer_contract_payment(
 
 
 @router.post("/payments/{payment_id}/cancel", response_model=FarmerContractPaymentResponse)
-async def cancel_farmer_contract_payment(
+def cancel_farmer_contract_payment(
     payment_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -1880,11 +1730,10 @@ async def cancel_farmer_contract_payment(
             session.add(item)
 
             if item.item_type == FarmerContractItemType.GRAIN.value and item.culture_id:
-                stock = _get_or_create_grain_stock(session, item.culture_id)
-                stock.own_quantity_kg += qty
-                stock.quantity_kg += qty
-                stock.reserved_kg += qty
-                session.add(stock)
+                change_grain_stock(
+                    session, item.culture_id,
+                    own_quantity_kg=qty, quantity_kg=qty, reserved_kg=qty,
+                )
             elif item.item_type == FarmerContractItemType.PURCHASE.value and item.purchase_stock_id:
                 pstock = session.get(PurchaseStock, item.purchase_stock_id)
                 if pstock:
@@ -1892,19 +1741,10 @@ async def cancel_farmer_contract_payment(
                     pstock.reserved_kg += qty
                     session.add(pstock)
             elif item.item_type == FarmerContractItemType.CASH.value:
-                cash_register = _get_cash_register(session)
-                cash_register.uah_balance += qty
-                session.add(cash_register)
-                session.add(Transaction(
-                    currency=Currency.UAH,
-                    amount=qty,
-                    transaction_type=TransactionType.ADD,
-                    user_id=current_user.id,
-                    description=f"Скасування видачі за контрактом #{contract.id} ({owner.full_name if owner else '?'})",
-                    uah_balance_after=cash_register.uah_balance,
-                    usd_balance_after=cash_register.usd_balance,
-                    eur_balance_after=cash_register.eur_balance
-                ))
+                record_cash_movement(
+                    session, Currency.UAH, qty, TransactionType.ADD, current_user.id,
+                    f"Скасування видачі за контрактом #{contract.id} ({owner.full_name if owner else '?'})",
+                )
 
     # ─── GOODS_RECEIVE: фермер передавав товар нам → повертаємо фермеру ───
     elif payment.payment_type == FarmerContractPaymentType.GOODS_RECEIVE.value:
@@ -1912,14 +1752,16 @@ async def cancel_farmer_contract_payment(
         qty = payment.quantity_kg or 0.0
 
         if item and qty > 0:
+            old_delivered = item.delivered_kg
             item.delivered_kg = max(0.0, item.delivered_kg - qty)
             session.add(item)
+            apply_person_item_delivery(session, contract, item, item.delivered_kg - old_delivered)
 
             if item.item_type == FarmerContractItemType.GRAIN.value and item.culture_id:
-                stock = _get_or_create_grain_stock(session, item.culture_id)
-                stock.own_quantity_kg = max(0.0, stock.own_quantity_kg - qty)
-                stock.farmer_quantity_kg += qty
-                session.add(stock)
+                change_grain_stock(
+                    session, item.culture_id, clamp=("own_quantity_kg",),
+                    own_quantity_kg=-qty, farmer_quantity_kg=qty,
+                )
 
                 # Видаляємо списання з балансу фермера
                 deduction = session.exec(
@@ -1928,50 +1770,23 @@ async def cancel_farmer_contract_payment(
                     )
                 ).first()
                 if deduction:
-                    session.delete(deduction)
+                    delete_farmer_deduction(session, deduction)
 
             elif item.item_type == FarmerContractItemType.CASH.value:
-                cash_register = _get_cash_register(session)
-                cash_register.uah_balance = max(0.0, cash_register.uah_balance - qty)
-                session.add(cash_register)
-                session.add(Transaction(
-                    currency=Currency.UAH,
-                    amount=qty,
-                    transaction_type=TransactionType.SUBTRACT,
-                    user_id=current_user.id,
-                    description=f"Скасування прийому за контрактом #{contract.id} ({owner.full_name if owner else '?'})",
-                    uah_balance_after=cash_register.uah_balance,
-                    usd_balance_after=cash_register.usd_balance,
-                    eur_balance_after=cash_register.eur_balance
-                ))
+                record_cash_movement(
+                    session, Currency.UAH, qty, TransactionType.SUBTRACT, current_user.id,
+                    f"Скасування прийому за контрактом #{contract.id} ({owner.full_name if owner else '?'})",
+                    clamp=True,
+                )
 
     # ─── CASH: фермер платив грошима → повертаємо з каси ───
     elif payment.payment_type == FarmerContractPaymentType.CASH.value:
         if payment.amount and payment.amount > 0:
-            cash_register = _get_cash_register(session)
-            currency_str = payment.currency.value if hasattr(payment.currency, 'value') else (payment.currency or "UAH")
-            balance_field_map = {"UAH": "uah_balance", "USD": "usd_balance", "EUR": "eur_balance"}
-            balance_field = balance_field_map.get(currency_str, "uah_balance")
-
-            current_balance = getattr(cash_register, balance_field)
-            setattr(cash_register, balance_field, max(0.0, current_balance - payment.amount))
-            session.add(cash_register)
-
-            try:
-                currency_enum = Currency(currency_str)
-            except ValueError:
-                currency_enum = Currency.UAH
-
-            session.add(Transaction(
-                currency=currency_enum,
-                amount=payment.amount,
-                transaction_type=TransactionType.SUBTRACT,
-                user_id=current_user.id,
-                description=f"Скасування оплати боргу фермера #{contract.id} ({owner.full_name if owner else '?'})",
-                uah_balance_after=cash_register.uah_balance,
-                usd_balance_after=cash_register.usd_balance,
-                eur_balance_after=cash_register.eur_balance
-            ))
+            record_cash_movement(
+                session, payment.currency, payment.amount, TransactionType.SUBTRACT, current_user.id,
+                f"Скасування оплати боргу фермера #{contract.id} ({owner.full_name if owner else '?'})",
+                clamp=True,
+            )
 
         # Повертаємо борг
         contract.balance_uah += payment.amount_uah
@@ -1982,22 +1797,23 @@ async def cancel_farmer_contract_payment(
         qty = payment.quantity_kg or 0.0
 
         if qty > 0 and payment.culture_id:
-            stock = _get_or_create_grain_stock(session, payment.culture_id)
-            stock.own_quantity_kg = max(0.0, stock.own_quantity_kg - qty)
+            # Повертаємо у бакет людини на складі або фермеру — у farmer_quantity_kg.
+            bucket = "person_quantity_kg" if contract.person_id else "farmer_quantity_kg"
+            change_grain_stock(
+                session, payment.culture_id, clamp=("own_quantity_kg",),
+                own_quantity_kg=-qty, **{bucket: qty},
+            )
             if contract.person_id:
-                # Повертаємо у бакет людини на складі.
-                stock.person_quantity_kg = (stock.person_quantity_kg or 0.0) + qty
+                apply_person_grain_payment(session, contract, payment, -1.0)
             else:
-                # Фермеру повертаємо у farmer_quantity_kg + видаляємо deduction-запис.
-                stock.farmer_quantity_kg += qty
+                # Фермеру додатково видаляємо deduction-запис.
                 deduction = session.exec(
                     select(FarmerGrainDeduction).where(
                         FarmerGrainDeduction.payment_id == payment.id
                     )
                 ).first()
                 if deduction:
-                    session.delete(deduction)
-            session.add(stock)
+                    delete_farmer_deduction(session, deduction)
 
         # Повертаємо борг
         contract.balance_uah += payment.amount_uah
@@ -2016,7 +1832,10 @@ async def cancel_farmer_contract_payment(
 
         # Видача талону не змінює balance_uah, тому й при скасуванні борг не коригуємо.
 
-        # Видаляємо або закриваємо пов'язаний талон
+        # Видаляємо або закриваємо пов'язаний талон. Блокування розподілу —
+        # до читання талону: інакше паралельна виплата по талонах може змінити
+        # paid_value_uah між читанням і перерозподілом.
+        lock_voucher_allocation(session)
         voucher = session.exec(
             select(GrainVoucher).where(
                 GrainVoucher.farmer_contract_payment_id == payment.id
@@ -2037,6 +1856,10 @@ async def cancel_farmer_contract_payment(
                     detail="Неможливо скасувати: по талону вже є активні виплати. Спершу скасуйте виплати по талону."
                 )
             session.delete(voucher)
+            if voucher.paid_value_uah > 0:
+                # Сума, що гасила цей талон за FIFO, переходить на наступні.
+                session.flush()
+                allocate_voucher_payment(session, voucher.paid_value_uah)
 
         session.add(contract)
 
@@ -2057,16 +1880,16 @@ async def cancel_farmer_contract_payment(
             if qty <= 0:
                 continue
 
-            stock = _get_or_create_grain_stock(session, item.culture_id)
-            stock.own_quantity_kg = max(0.0, stock.own_quantity_kg - qty)
-            if contract.person_id:
-                stock.person_quantity_kg = (stock.person_quantity_kg or 0.0) + qty
-            else:
-                stock.farmer_quantity_kg += qty
-            session.add(stock)
+            bucket = "person_quantity_kg" if contract.person_id else "farmer_quantity_kg"
+            change_grain_stock(
+                session, item.culture_id, clamp=("own_quantity_kg",),
+                own_quantity_kg=-qty, **{bucket: qty},
+            )
 
-            item.delivered_kg = max(0.0, (item.delivered_kg or 0.0) - qty)
+            old_delivered = item.delivered_kg or 0.0
+            item.delivered_kg = max(0.0, old_delivered - qty)
             session.add(item)
+            apply_person_item_delivery(session, contract, item, item.delivered_kg - old_delivered)
 
             # Видаляємо запис списання з балансу фермера (для людини deduction-ів немає)
             if not contract.person_id and contract.owner_id:
@@ -2078,39 +1901,21 @@ async def cancel_farmer_contract_payment(
                     ).order_by(FarmerGrainDeduction.created_at.desc()).limit(1)
                 ).first()
                 if deduction:
-                    session.delete(deduction)
+                    delete_farmer_deduction(session, deduction)
 
         # Повертаємо гроші у касу
         amount = payment.amount or 0.0
         if amount > 0:
-            cash_register = _get_cash_register(session)
-            currency_str = payment.currency.value if hasattr(payment.currency, 'value') else (payment.currency or "UAH")
-            balance_field_map = {"UAH": "uah_balance", "USD": "usd_balance", "EUR": "eur_balance"}
-            balance_field = balance_field_map.get(currency_str, "uah_balance")
-            current_balance = getattr(cash_register, balance_field)
-            setattr(cash_register, balance_field, current_balance + amount)
-            session.add(cash_register)
-            try:
-                currency_enum = Currency(currency_str)
-            except ValueError:
-                currency_enum = Currency.UAH
-
             if contract.person_id:
                 p = session.get(Person, contract.person_id)
                 counterparty_label = p.full_name if p else "Людина"
             else:
                 counterparty_label = owner.full_name if owner else "?"
 
-            session.add(Transaction(
-                currency=currency_enum,
-                amount=amount,
-                transaction_type=TransactionType.ADD,
-                user_id=current_user.id,
-                description=f"Скасування розрахунку за контрактом #{contract.id} ({counterparty_label})",
-                uah_balance_after=cash_register.uah_balance,
-                usd_balance_after=cash_register.usd_balance,
-                eur_balance_after=cash_register.eur_balance
-            ))
+            record_cash_movement(
+                session, payment.currency, amount, TransactionType.ADD, current_user.id,
+                f"Скасування розрахунку за контрактом #{contract.id} ({counterparty_label})",
+            )
 
         # Контракт стає відкритим з нульовим балансом — зерно і гроші повернули,
         # ніхто нікому нічого не винен. Оператор може створити нову операцію.
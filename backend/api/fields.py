@@ -16,7 +16,7 @@ router = APIRouter()
 
 
 @router.get("", response_model=list[AgriFieldResponse])
-async def list_fields(
+def list_fields(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -26,7 +26,7 @@ async def list_fields(
 
 
 @router.post("", response_model=AgriFieldResponse)
-async def create_field(
+def create_field(
     payload: AgriFieldCreate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -51,7 +51,7 @@ async def create_field(
 
 
 @router.patch("/{field_id}", response_model=AgriFieldResponse)
-async def update_field(
+def update_field(
     field_id: int,
     payload: AgriFieldCreate,
     session: Session = Depends(get_session),
@@ -76,7 +76,7 @@ async def update_field(
 
 
 @router.delete("/{field_id}", response_model=AgriFieldResponse)
-async def delete_field(
+def delete_field(
     field_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -92,7 +92,7 @@ async def delete_field(
 
 
 @router.get("/export")
-async def export_fields(
+def export_fields(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -2,11 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
 from sqlalchemy import func, or_
-from typing import Optional
+from typing import Callable, Optional
 from datetime import datetime, date, time, timedelta
 from io import BytesIO
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+import heapq
 import math
 
 
@@ -18,7 +19,11 @@ def _round_kg(value: float) -> float:
     """
     return float(math.floor((value or 0.0) + 0.5))
 
-from backend.database import get_session
+from backend.database import get_session, stream_rows
+from backend.exports import XlsxExport, MONEY_FORMAT, PERCENT_FORMAT
+from backend.pagination import paginate
+from backend.reference_cache import reference_names
+from backend.stock import change_grain_stock, deduct_shipped_grain, get_grain_stock
 from backend.models import (
     GrainCulture,
     VehicleType,
@@ -32,16 +37,8 @@ from backend.models import (
     TransactionType,
     StockAdjustmentLog,
     StockAdjustmentType,
-    FarmerGrainDeduction,
+    FarmerBalance,
     FarmerGrainMovement,
-    Person,
-    FarmerContract,
-    FarmerContractStatus,
-    FarmerContractPayment,
-    FarmerContractPaymentType,
-    FarmerContractItem,
-    FarmerContractItemDirection,
-    FarmerContractItemType,
     User
 )
 from backend.schemas import (
@@ -61,6 +58,9 @@ from backend.schemas import (
     FarmerGrainMovementResponse,
     GrainIntakeCreate,
     GrainIntakeResponse,
+    GrainIntakeBatchCreate,
+    GrainIntakeBatchError,
+    GrainIntakeBatchResponse,
     GrainReserveRequest,
     GrainQualityUpdateRequest,
     GrainIntakeUpdateRequest,
@@ -72,6 +72,18 @@ from backend.schemas import (
     StockAdjustmentResponse
 )
 from backend.auth import get_current_user, get_current_super_admin, get_current_admin_or_manager
+from backend.balances import (
+    BALANCE_EPS,
+    add_farmer_deduction,
+    apply_farmer_balance_delta,
+    apply_farmer_intake,
+    apply_person_movement,
+    farmer_intake_share,
+    get_farmer_balance,
+    get_person_balance,
+    list_farmer_balances,
+    list_person_balances,
+)
 
 router = APIRouter()
 
@@ -81,29 +93,30 @@ def _intake_on_stock(intake: GrainIntake) -> bool:
     return not intake.pending_quality and not intake.pending_tare
 
 
-def _get_or_create_stock(session: Session, culture_id: int, *, commit: bool = True) -> GrainStock:
-    """`commit=True` (default) — старе поведінка, ідемпотентне створення з власним commit.
-    `commit=False` — flush замість commit, щоб callers могли об'єднати все в одну транзакцію.
-    """
-    stock = session.exec(
-        select(GrainStock).where(GrainStock.culture_id == culture_id)
-    ).first()
-    if not stock:
-        stock = GrainStock(
-            culture_id=culture_id,
-            quantity_kg=0.0,
-            own_quantity_kg=0.0,
-            farmer_quantity_kg=0.0,
-            reserved_kg=0.0
-        )
-        session.add(stock)
-        if commit:
-            session.commit()
-            session.refresh(stock)
-        else:
-            # flush присвоює PK без завершення транзакції — callers продовжують додавати мутації
-            session.flush()
-    return stock
+# Колонки карток приходу для експортів: select по колонках замість моделі —
+# серверний курсор віддає легкі Row без ORM-об'єктів (див. `stream_rows`).
+_INTAKE_EXPORT_COLUMNS = (
+    GrainIntake.created_at,
+    GrainIntake.culture_id,
+    GrainIntake.vehicle_type_id,
+    GrainIntake.field_id,
+    GrainIntake.is_own_grain,
+    GrainIntake.owner_full_name,
+    GrainIntake.owner_phone,
+    GrainIntake.is_internal_driver,
+    GrainIntake.driver_id,
+    GrainIntake.external_driver_name,
+    GrainIntake.has_trailer,
+    GrainIntake.is_own_combine,
+    GrainIntake.gross_weight_kg,
+    GrainIntake.tare_weight_kg,
+    GrainIntake.net_weight_kg,
+    GrainIntake.impurity_percent,
+    GrainIntake.pending_quality,
+    GrainIntake.pending_tare,
+    GrainIntake.accepted_weight_kg,
+    GrainIntake.note,
+)
 
 
 def _get_or_create_driver_stat(
@@ -115,7 +128,8 @@ def _get_or_create_driver_stat(
     *,
     commit: bool = True,
 ) -> DriverStat:
-    """`commit` — див. `_get_or_create_stock`."""
+    """`commit=True` — ідемпотентне створення з власним commit; `commit=False` —
+    flush, щоб callers могли об'єднати все в одну транзакцію."""
     stat = session.exec(
         select(DriverStat).where(
             DriverStat.driver_id == driver_id,
@@ -150,19 +164,17 @@ def _apply_stock_delta(
     is_own_grain: bool = False,
     *,
     commit: bool = True,
-) -> None:
+) -> GrainStock:
     """Обновление склада с учетом разделения на наше и фермерское зерно.
+    Один атомарний UPDATE ... RETURNING (див. `backend.stock`); повертає рядок
+    після зміни — `quantity_before` для журналу = `quantity_kg - delta_kg`.
     `commit=False` для атомарних handler-ів (transactional refactor).
     """
-    stock = _get_or_create_stock(session, culture_id, commit=commit)
-    stock.quantity_kg += delta_kg
-    if is_own_grain:
-        stock.own_quantity_kg += delta_kg
-    else:
-        stock.farmer_quantity_kg += delta_kg
-    session.add(stock)
+    bucket = "own_quantity_kg" if is_own_grain else "farmer_quantity_kg"
+    stock = change_grain_stock(session, culture_id, quantity_kg=delta_kg, **{bucket: delta_kg})
     if commit:
         session.commit()
+    return stock
 
 
 def _apply_driver_stat_delta(
@@ -194,7 +206,7 @@ def _apply_driver_stat_delta(
 
 
 @router.get("/cultures", response_model=list[GrainCultureResponse])
-async def list_cultures(
+def list_cultures(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -203,7 +215,7 @@ async def list_cultures(
 
 
 @router.post("/cultures", response_model=GrainCultureResponse)
-async def create_culture(
+def create_culture(
     payload: GrainCultureCreate,
     session: Session = Depends(get_session),
     current_admin: User = Depends(get_current_super_admin)
@@ -225,7 +237,7 @@ async def create_culture(
 
 
 @router.patch("/cultures/{culture_id}/price", response_model=GrainCultureResponse)
-async def update_culture_price(
+def update_culture_price(
     culture_id: int,
     payload: GrainCulturePriceUpdate,
     session: Session = Depends(get_session),
@@ -246,7 +258,7 @@ async def update_culture_price(
 
 
 @router.get("/vehicle-types", response_model=list[VehicleTypeResponse])
-async def list_vehicle_types(
+def list_vehicle_types(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -255,7 +267,7 @@ async def list_vehicle_types(
 
 
 @router.get("/drivers", response_model=list[DriverResponse])
-async def list_drivers(
+def list_drivers(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -264,7 +276,7 @@ async def list_drivers(
 
 
 @router.get("/drivers/export")
-async def export_drivers(
+def export_drivers(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -330,7 +342,7 @@ async def export_drivers(
 
 
 @router.post("/drivers", response_model=DriverResponse)
-async def create_driver(
+def create_driver(
     payload: DriverCreate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -344,7 +356,7 @@ async def create_driver(
 
 
 @router.patch("/drivers/{driver_id}", response_model=DriverResponse)
-async def update_driver(
+def update_driver(
     driver_id: int,
     payload: DriverUpdate,
     session: Session = Depends(get_session),
@@ -377,7 +389,7 @@ async def update_driver(
 
 
 @router.delete("/drivers/{driver_id}", response_model=DriverResponse)
-async def delete_driver(
+def delete_driver(
     driver_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -397,7 +409,7 @@ async def delete_driver(
 
 
 @router.get("/owners", response_model=list[GrainOwnerResponse])
-async def list_owners(
+def list_owners(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     q: Optional[str] = Query(None, description="Пошук за ПІБ")
@@ -410,8 +422,22 @@ async def list_owners(
     return session.exec(query.order_by(GrainOwner.full_name)).all()
 
 
+def _owner_balance_rows(session: Session, owner_id: int) -> list[tuple[int, str, float]]:
+    """Позитивні залишки фермера з журналу `farmer_balances`: [(culture_id, культура, кг)]."""
+    rows = session.exec(
+        select(GrainCulture.id, GrainCulture.name, FarmerBalance.qty_kg)
+        .join(FarmerBalance, FarmerBalance.culture_id == GrainCulture.id)
+        .where(
+            FarmerBalance.owner_id == owner_id,
+            FarmerBalance.qty_kg > BALANCE_EPS,
+        )
+        .order_by(GrainCulture.name)
+    ).all()
+    return [(culture_id, name, float(qty)) for culture_id, name, qty in rows]
+
+
 @router.get("/owners/{owner_id}/balance", response_model=list[FarmerBalanceItem])
-async def get_owner_balance(
+def get_owner_balance(
     owner_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -424,53 +450,14 @@ async def get_owner_balance(
             detail="Фермера не знайдено"
         )
 
-    rows = session.exec(
-        select(
-            GrainCulture.id,
-            GrainCulture.name,
-            func.sum(GrainIntake.accepted_weight_kg)
-        )
-        .join(GrainIntake, GrainIntake.culture_id == GrainCulture.id)
-        .where(
-            GrainIntake.owner_id == owner_id,
-            GrainIntake.is_own_grain == False,
-            GrainIntake.pending_quality == False,
-            GrainIntake.pending_tare == False,
-        )
-        .group_by(GrainCulture.id, GrainCulture.name)
-        .having(func.sum(GrainIntake.accepted_weight_kg) > 0)
-        .order_by(GrainCulture.name)
-    ).all()
-
-    deductions = session.exec(
-        select(
-            FarmerGrainDeduction.culture_id,
-            func.sum(FarmerGrainDeduction.quantity_kg)
-        )
-        .where(FarmerGrainDeduction.owner_id == owner_id)
-        .group_by(FarmerGrainDeduction.culture_id)
-    ).all()
-    deduction_map = {row[0]: float(row[1] or 0) for row in deductions}
-
-    result = []
-    for row in rows:
-        culture_id = row[0]
-        total = float(row[2] or 0)
-        total -= deduction_map.get(culture_id, 0.0)
-        if total <= 0:
-            continue
-        result.append(
-            FarmerBalanceItem(
-                culture_id=culture_id,
-                culture_name=row[1],
-                quantity_kg=total
-            )
-        )
-    return result
+    return [
+        FarmerBalanceItem(culture_id=culture_id, culture_name=culture_name, quantity_kg=qty)
+        for culture_id, culture_name, qty in _owner_balance_rows(session, owner_id)
+    ]
 
 
 @router.get("/owners/{owner_id}/balance/export")
-async def export_owner_balance(
+def export_owner_balance(
     owner_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -483,33 +470,7 @@ async def export_owner_balance(
             detail="Фермера не знайдено"
         )
 
-    rows = session.exec(
-        select(
-            GrainCulture.id,
-            GrainCulture.name,
-            func.sum(GrainIntake.accepted_weight_kg)
-        )
-        .join(GrainIntake, GrainIntake.culture_id == GrainCulture.id)
-        .where(
-            GrainIntake.owner_id == owner_id,
-            GrainIntake.is_own_grain == False,
-            GrainIntake.pending_quality == False,
-            GrainIntake.pending_tare == False,
-        )
-        .group_by(GrainCulture.id, GrainCulture.name)
-        .having(func.sum(GrainIntake.accepted_weight_kg) > 0)
-        .order_by(GrainCulture.name)
-    ).all()
-
-    deductions = session.exec(
-        select(
-            FarmerGrainDeduction.culture_id,
-            func.sum(FarmerGrainDeduction.quantity_kg)
-        )
-        .where(FarmerGrainDeduction.owner_id == owner_id)
-        .group_by(FarmerGrainDeduction.culture_id)
-    ).all()
-    deduction_map = {row[0]: float(row[1] or 0) for row in deductions}
+    rows = _owner_balance_rows(session, owner_id)
 
     workbook = Workbook()
     sheet = workbook.active
@@ -538,9 +499,6 @@ async def export_owner_balance(
     alt_fill = PatternFill("solid", fgColor="F8FAFC")
 
     for culture_id, culture_name, quantity in rows:
-        quantity = float(quantity or 0) - deduction_map.get(culture_id, 0.0)
-        if quantity <= 0:
-            continue
         sheet.append([
             owner.full_name,
             culture_name,
@@ -579,40 +537,14 @@ def _compute_owner_balances(session: Session):
     """Спільний розрахунок залишків зерна у фермерів (для Excel і JSON).
     Повертає (rows, totals_by_culture, cultures_map), де rows = list[(фермер, культура, залишок)]
     лише з позитивним залишком, відсортовані за фермером/культурою."""
-    received = session.exec(
-        select(
-            GrainIntake.owner_id,
-            GrainIntake.culture_id,
-            func.sum(GrainIntake.accepted_weight_kg),
-        )
-        .where(
-            GrainIntake.owner_id.is_not(None),
-            GrainIntake.is_own_grain == False,
-            GrainIntake.pending_quality == False,
-            GrainIntake.pending_tare == False,
-        )
-        .group_by(GrainIntake.owner_id, GrainIntake.culture_id)
-    ).all()
-
-    deducted = session.exec(
-        select(
-            FarmerGrainDeduction.owner_id,
-            FarmerGrainDeduction.culture_id,
-            func.sum(FarmerGrainDeduction.quantity_kg),
-        )
-        .group_by(FarmerGrainDeduction.owner_id, FarmerGrainDeduction.culture_id)
-    ).all()
-    deduct_map = {(d[0], d[1]): float(d[2] or 0) for d in deducted}
-
-    owners_map = {o.id: o.full_name for o in session.exec(select(GrainOwner)).all()}
-    cultures_map = {c.id: c.name for c in session.exec(select(GrainCulture)).all()}
+    owners_map = reference_names(session, "owners")
+    cultures_map = reference_names(session, "cultures")
 
     rows = []
     totals_by_culture: dict[int, float] = {}
-    for owner_id, culture_id, qty in received:
-        balance = float(qty or 0) - deduct_map.get((owner_id, culture_id), 0.0)
-        if balance <= 0.0001:
-            continue
+    # Журнал farmer_balances вже містить залишок (прихід − списання) — без SUM по історії
+    for ledger_row in list_farmer_balances(session):
+        owner_id, culture_id, balance = ledger_row.owner_id, ledger_row.culture_id, ledger_row.qty_kg
         rows.append((owners_map.get(owner_id, f"#{owner_id}"), cultures_map.get(culture_id, "—"), balance))
         totals_by_culture[culture_id] = totals_by_culture.get(culture_id, 0.0) + balance
 
@@ -621,7 +553,7 @@ def _compute_owner_balances(session: Session):
 
 
 @router.get("/owners/balances")
-async def list_owners_balances(
+def list_owners_balances(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -727,7 +659,7 @@ def _build_balances_pivot_xlsx(rows, totals_by_culture, cultures_map, *, sheet_t
 
 
 @router.get("/owners/balances/export")
-async def export_all_owners_balances(
+def export_all_owners_balances(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -745,91 +677,18 @@ async def export_all_owners_balances(
 
 
 def _compute_person_balances(session: Session):
-    """Залишки зерна у людей (для Excel і JSON). Те саме, що get_person_balance, але
-    одразу по всіх людях. Залишок = перекази to_person (transfer) мінус GRAIN-витрати
-    у не-скасованих контрактах людини. Повертає (rows, totals_by_culture, cultures_map),
-    rows = list[(людина, культура, залишок)] лише з позитивним залишком."""
-    persons_map = {p.id: p.full_name for p in session.exec(select(Person)).all()}
-    cultures_map = {c.id: c.name for c in session.exec(select(GrainCulture)).all()}
-
-    balances: dict[tuple[int, int], float] = {}
-
-    # Надходження: перекази to_person (transfer)
-    incoming = session.exec(
-        select(
-            FarmerGrainMovement.to_person_id,
-            FarmerGrainMovement.culture_id,
-            func.sum(FarmerGrainMovement.quantity_kg),
-        )
-        .where(
-            FarmerGrainMovement.to_person_id.is_not(None),
-            FarmerGrainMovement.movement_type == "transfer",
-        )
-        .group_by(FarmerGrainMovement.to_person_id, FarmerGrainMovement.culture_id)
-    ).all()
-    for person_id, culture_id, qty in incoming:
-        if culture_id is None:
-            continue
-        balances[(person_id, culture_id)] = balances.get((person_id, culture_id), 0.0) + float(qty or 0.0)
-
-    # Контракти людей (не скасовані): contract_id -> person_id
-    contracts = session.exec(
-        select(FarmerContract.id, FarmerContract.person_id).where(
-            FarmerContract.person_id.is_not(None),
-            FarmerContract.status != FarmerContractStatus.CANCELLED.value,
-        )
-    ).all()
-    contract_person = {cid: pid for cid, pid in contracts}
-    contract_ids = list(contract_person.keys())
-
-    if contract_ids:
-        # GRAIN-оплати по контрактах
-        pays = session.exec(
-            select(
-                FarmerContractPayment.contract_id,
-                FarmerContractPayment.culture_id,
-                func.sum(FarmerContractPayment.quantity_kg),
-            )
-            .where(
-                FarmerContractPayment.contract_id.in_(contract_ids),
-                FarmerContractPayment.payment_type == FarmerContractPaymentType.GRAIN.value,
-                FarmerContractPayment.is_cancelled == False,
-                FarmerContractPayment.culture_id.is_not(None),
-            )
-            .group_by(FarmerContractPayment.contract_id, FarmerContractPayment.culture_id)
-        ).all()
-        for contract_id, culture_id, qty in pays:
-            pid = contract_person.get(contract_id)
-            if pid is None:
-                continue
-            balances[(pid, culture_id)] = balances.get((pid, culture_id), 0.0) - float(qty or 0.0)
-
-        # FROM_FARMER GRAIN-позиції (викуп: зерно одразу йде у нас)
-        items = session.exec(
-            select(
-                FarmerContractItem.contract_id,
-                FarmerContractItem.culture_id,
-                func.sum(FarmerContractItem.delivered_kg),
-            )
-            .where(
-                FarmerContractItem.contract_id.in_(contract_ids),
-                FarmerContractItem.direction == FarmerContractItemDirection.FROM_FARMER.value,
-                FarmerContractItem.item_type == FarmerContractItemType.GRAIN.value,
-                FarmerContractItem.culture_id.is_not(None),
-            )
-            .group_by(FarmerContractItem.contract_id, FarmerContractItem.culture_id)
-        ).all()
-        for contract_id, culture_id, qty in items:
-            pid = contract_person.get(contract_id)
-            if pid is None:
-                continue
-            balances[(pid, culture_id)] = balances.get((pid, culture_id), 0.0) - float(qty or 0.0)
+    """Залишки зерна у людей (для Excel і JSON) з журналу `person_grain_balances` —
+    та сама формула, що й у перевірці контрактів (перекази до/від людини мінус
+    GRAIN-оплати і викуп по її не скасованих контрактах). Повертає
+    (rows, totals_by_culture, cultures_map), rows = list[(людина, культура, залишок)]
+    лише з позитивним залишком."""
+    persons_map = reference_names(session, "people")
+    cultures_map = reference_names(session, "cultures")
 
     rows = []
     totals_by_culture: dict[int, float] = {}
-    for (person_id, culture_id), bal in balances.items():
-        if bal <= 0.0001:
-            continue
+    for ledger_row in list_person_balances(session):
+        person_id, culture_id, bal = ledger_row.person_id, ledger_row.culture_id, ledger_row.qty_kg
         rows.append((persons_map.get(person_id, f"#{person_id}"), cultures_map.get(culture_id, "—"), bal))
         totals_by_culture[culture_id] = totals_by_culture.get(culture_id, 0.0) + bal
 
@@ -838,7 +697,7 @@ def _compute_person_balances(session: Session):
 
 
 @router.get("/persons/balances")
-async def list_persons_balances(
+def list_persons_balances(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -856,7 +715,7 @@ async def list_persons_balances(
 
 
 @router.get("/persons/balances/export")
-async def export_all_persons_balances(
+def export_all_persons_balances(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -874,7 +733,7 @@ async def export_all_persons_balances(
 
 
 @router.get("/farmer-movements", response_model=list[FarmerGrainMovementResponse])
-async def list_farmer_grain_movements(
+def list_farmer_grain_movements(
     response: Response,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
@@ -882,9 +741,11 @@ async def list_farmer_grain_movements(
     end_date: Optional[str] = Query(None, description="ISO YYYY-MM-DD включно"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Курсор з X-Next-Cursor попередньої сторінки"),
+    with_total: bool = Query(False, description="Порахувати X-Total-Count"),
 ):
     """Список переміщень зерна фермерів. `start_date`/`end_date` — необовʼязковий діапазон."""
-    query = select(FarmerGrainMovement).order_by(FarmerGrainMovement.created_at.desc())
+    query = select(FarmerGrainMovement)
     if start_date:
         try:
             query = query.where(FarmerGrainMovement.created_at >= datetime.combine(date.fromisoformat(start_date), time.min))
@@ -895,13 +756,14 @@ async def list_farmer_grain_movements(
             query = query.where(FarmerGrainMovement.created_at <= datetime.combine(date.fromisoformat(end_date), time.max))
         except ValueError:
             raise HTTPException(status_code=400, detail="Некоректний end_date")
-    total = session.exec(select(func.count()).select_from(query.subquery())).first() or 0
-    response.headers["X-Total-Count"] = str(total)
-    return session.exec(query.limit(limit).offset(offset)).all()
+    return paginate(
+        session, response, query, FarmerGrainMovement,
+        limit=limit, offset=offset, cursor=cursor, with_total=with_total,
+    )
 
 
 @router.get("/farmer-movements/export")
-async def export_farmer_grain_movements(
+def export_farmer_grain_movements(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     start_date: str | None = None,
@@ -911,7 +773,15 @@ async def export_farmer_grain_movements(
     culture_id: int | None = None,
 ):
     """Експорт переміщень зерна фермерів у Excel"""
-    query = select(FarmerGrainMovement).order_by(FarmerGrainMovement.created_at.desc())
+    query = select(
+        FarmerGrainMovement.created_at,
+        FarmerGrainMovement.movement_type,
+        FarmerGrainMovement.from_owner_id,
+        FarmerGrainMovement.to_owner_id,
+        FarmerGrainMovement.culture_id,
+        FarmerGrainMovement.quantity_kg,
+        FarmerGrainMovement.note,
+    ).order_by(FarmerGrainMovement.created_at.desc())
 
     if start_date:
         try:
@@ -935,84 +805,40 @@ async def export_farmer_grain_movements(
     if culture_id:
         query = query.where(FarmerGrainMovement.culture_id == culture_id)
 
-    movements = session.exec(query).all()
-
-    owner_map = {o.id: o.full_name for o in session.exec(select(GrainOwner)).all()}
-    culture_map = {c.id: c.name for c in session.exec(select(GrainCulture)).all()}
-
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = "Переміщення зерна"
-
-    headers = ["Дата", "Тип", "Від фермера", "До фермера", "Культура", "Кількість, кг", "Примітка"]
-    sheet.append(headers)
-
-    header_fill = PatternFill("solid", fgColor="1F2937")
-    header_font = Font(color="FFFFFF", bold=True)
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style="thin", color="E5E7EB"),
-        right=Side(style="thin", color="E5E7EB"),
-        top=Side(style="thin", color="E5E7EB"),
-        bottom=Side(style="thin", color="E5E7EB"),
+    owner_map = reference_names(session, "owners")
+    culture_map = reference_names(session, "cultures")
+
+    type_col = 2
+    book = XlsxExport()
+    sheet = book.sheet(
+        "Переміщення зерна",
+        ["Дата", "Тип", "Від фермера", "До фермера", "Культура", "Кількість, кг", "Примітка"],
+        widths=[20, 16, 28, 28, 20, 16, 30],
+        number_formats={6: MONEY_FORMAT},
+        centered=(type_col,),
     )
-    for col in range(1, len(headers) + 1):
-        cell = sheet.cell(row=1, column=col)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-        cell.border = thin_border
 
-    alt_fill = PatternFill("solid", fgColor="F8FAFC")
     deduct_fill = PatternFill("solid", fgColor="FFEDD5")
     transfer_fill = PatternFill("solid", fgColor="DBEAFE")
 
-    for m in movements:
-        type_label = "Переміщення" if m.movement_type == "transfer" else "Списання"
+    for m in stream_rows(session, query):
+        is_transfer = m.movement_type == "transfer"
         sheet.append([
             m.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            type_label,
+            "Переміщення" if is_transfer else "Списання",
             owner_map.get(m.from_owner_id, "—"),
             owner_map.get(m.to_owner_id, "—") if m.to_owner_id else "—",
             culture_map.get(m.culture_id, "—"),
             m.quantity_kg,
             m.note or "",
-        ])
-
-    for row in range(2, sheet.max_row + 1):
-        row_fill = alt_fill if row % 2 == 0 else None
-        type_val = sheet.cell(row=row, column=2).value
-        type_fill = transfer_fill if type_val == "Переміщення" else deduct_fill
-        for col in range(1, len(headers) + 1):
-            cell = sheet.cell(row=row, column=col)
-            if col == 2:
-                cell.fill = type_fill
-                cell.alignment = Alignment(horizontal="center")
-            elif row_fill:
-                cell.fill = row_fill
-            cell.border = thin_border
-            if col == 6:
-                cell.number_format = "#,##0.00"
+        ], fills={type_col: transfer_fill if is_transfer else deduct_fill})
 
-    sheet.freeze_panes = "A2"
-    sheet.auto_filter.ref = f"A1:G{sheet.max_row}"
-    column_widths = [20, 16, 28, 28, 20, 16, 30]
-    for idx, width in enumerate(column_widths, start=1):
-        sheet.column_dimensions[chr(64 + idx)].width = width
-
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
     filename = f"farmer_movements_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    return book.to_response(filename)
 
 
 @router.post("/farmer-movements/deduct", response_model=FarmerGrainMovementResponse)
-async def deduct_farmer_grain(
+def deduct_farmer_grain(
     payload: FarmerGrainDeductRequest,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -1026,9 +852,8 @@ async def deduct_farmer_grain(
     if not culture:
         raise HTTPException(status_code=404, detail="Культуру не знайдено")
 
-    balance = await get_owner_balance(payload.owner_id, session, current_user)
-    culture_balance = next((b for b in balance if b.culture_id == payload.culture_id), None)
-    available = culture_balance.quantity_kg if culture_balance else 0.0
+    # for_update — рядок балансу блокується до commit, паралельне списання чекає
+    available = get_farmer_balance(session, payload.owner_id, payload.culture_id, for_update=True)
 
     if payload.quantity_kg > available:
         raise HTTPException(
@@ -1036,13 +861,7 @@ async def deduct_farmer_grain(
             detail=f"Недостатньо зерна. Доступно: {available:.2f} кг"
         )
 
-    deduction = FarmerGrainDeduction(
-        owner_id=payload.owner_id,
-        culture_id=payload.culture_id,
-        quantity_kg=payload.quantity_kg,
-        payment_id=None
-    )
-    session.add(deduction)
+    add_farmer_deduction(session, payload.owner_id, payload.culture_id, payload.quantity_kg)
 
     movement = FarmerGrainMovement(
         movement_type="deduct",
@@ -1060,7 +879,7 @@ async def deduct_farmer_grain(
 
 
 @router.post("/farmer-movements/transfer", response_model=FarmerGrainMovementResponse)
-async def transfer_farmer_grain(
+def transfer_farmer_grain(
     payload: FarmerGrainTransferRequest,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -1134,15 +953,9 @@ async def transfer_farmer_grain(
 
     # Доступний баланс джерела
     if has_from_owner:
-        balance = await get_owner_balance(payload.from_owner_id, session, current_user)
-        culture_balance = next((b for b in balance if b.culture_id == payload.culture_id), None)
-        available = culture_balance.quantity_kg if culture_balance else 0.0
+        available = get_farmer_balance(session, payload.from_owner_id, payload.culture_id, for_update=True)
     else:
-        # _get_person_balance: incoming transfers − витрати по контрактах.
-        # Не враховує OUT-перекази між людьми — тут ми додаємо саме такий рух;
-        # компенсуємо у запиті балансу у farmer_contracts._get_person_balance.
-        from backend.api.farmer_contracts import _get_person_balance
-        available = _get_person_balance(session, payload.from_person_id, payload.culture_id)
+        available = get_person_balance(session, payload.from_person_id, payload.culture_id, for_update=True)
 
     if payload.quantity_kg > available + 0.01:
         raise HTTPException(
@@ -1152,30 +965,23 @@ async def transfer_farmer_grain(
 
     # ─── Списання у джерела (для фермера — через FarmerGrainDeduction) ───
     if has_from_owner:
-        session.add(FarmerGrainDeduction(
-            owner_id=payload.from_owner_id,
-            culture_id=payload.culture_id,
-            quantity_kg=payload.quantity_kg,
-            payment_id=None
-        ))
+        add_farmer_deduction(session, payload.from_owner_id, payload.culture_id, payload.quantity_kg)
 
     # ─── Рух бакетів складу залежно від комбінації ───
-    stock = session.exec(
-        select(GrainStock).where(GrainStock.culture_id == payload.culture_id)
-    ).first()
+    # Бакет джерела не опускається нижче нуля; рядка складу немає — не рухаємо.
+    qty = payload.quantity_kg
+    source_bucket = "farmer_quantity_kg" if has_from_owner else "person_quantity_kg"
 
     if has_to_owner:
         # Призначення — фермер: у джерела зменшуємо бакет (farmer або person),
         # отримувач накопичує баланс через GrainIntake.is_farmer_transfer.
-        if stock:
-            if has_from_owner:
-                # farmer→farmer: зерно фізично лишається у farmer-бакеті — не рухаємо
-                pass
-            else:
-                # person→farmer: переходить з person-бакета у farmer-бакет
-                stock.person_quantity_kg = max(0.0, (stock.person_quantity_kg or 0.0) - payload.quantity_kg)
-                stock.farmer_quantity_kg += payload.quantity_kg
-                session.add(stock)
+        # farmer→farmer: зерно фізично лишається у farmer-бакеті — не рухаємо.
+        if not has_from_owner:
+            # person→farmer: переходить з person-бакета у farmer-бакет
+            change_grain_stock(
+                session, payload.culture_id, create=False, clamp=("person_quantity_kg",),
+                person_quantity_kg=-qty, farmer_quantity_kg=qty,
+            )
         session.add(GrainIntake(
             culture_id=payload.culture_id,
             vehicle_type_id=1,
@@ -1196,24 +1002,21 @@ async def transfer_farmer_grain(
             is_farmer_transfer=True,
             created_by_user_id=current_user.id
         ))
+        apply_farmer_balance_delta(session, payload.to_owner_id, payload.culture_id, payload.quantity_kg)
     elif has_to_person:
         # Призначення — людина: бакет person+=qty, бакет джерела -=qty.
-        if stock:
-            if has_from_owner:
-                stock.farmer_quantity_kg = max(0.0, stock.farmer_quantity_kg - payload.quantity_kg)
-            else:
-                stock.person_quantity_kg = max(0.0, (stock.person_quantity_kg or 0.0) - payload.quantity_kg)
-            stock.person_quantity_kg = (stock.person_quantity_kg or 0.0) + payload.quantity_kg
-            session.add(stock)
+        if has_from_owner:
+            change_grain_stock(
+                session, payload.culture_id, create=False, clamp=("farmer_quantity_kg",),
+                farmer_quantity_kg=-qty, person_quantity_kg=qty,
+            )
+        # person→person: person-бакет не змінюється (-qty +qty)
     else:
         # Призначення — підприємство: бакет own+=qty, бакет джерела -=qty.
-        if stock:
-            if has_from_owner:
-                stock.farmer_quantity_kg = max(0.0, stock.farmer_quantity_kg - payload.quantity_kg)
-            else:
-                stock.person_quantity_kg = max(0.0, (stock.person_quantity_kg or 0.0) - payload.quantity_kg)
-            stock.own_quantity_kg += payload.quantity_kg
-            session.add(stock)
+        change_grain_stock(
+            session, payload.culture_id, create=False, clamp=(source_bucket,),
+            **{source_bucket: -qty}, own_quantity_kg=qty,
+        )
 
     movement = FarmerGrainMovement(
         movement_type="transfer",
@@ -1228,13 +1031,14 @@ async def transfer_farmer_grain(
         created_by_user_id=current_user.id
     )
     session.add(movement)
+    apply_person_movement(session, movement)
     session.commit()
     session.refresh(movement)
     return movement
 
 
 @router.post("/owners", response_model=GrainOwnerResponse)
-async def create_owner(
+def create_owner(
     payload: GrainOwnerCreate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -1248,7 +1052,7 @@ async def create_owner(
 
 
 @router.patch("/owners/{owner_id}", response_model=GrainOwnerResponse)
-async def update_owner(
+def update_owner(
     owner_id: int,
     payload: GrainOwnerCreate,
     session: Session = Depends(get_session),
@@ -1276,7 +1080,7 @@ async def update_owner(
 
 
 @router.get("/owners/export")
-async def export_owners(
+def export_owners(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     search: Optional[str] = Query(None, description="Пошук за ПІБ")
@@ -1290,7 +1094,6 @@ async def export_owners(
 
     # Підрахувати кількість приходів та загальну вагу для кожного фермера
     intakes = session.exec(select(GrainIntake).where(GrainIntake.is_own_grain == False)).all()
-    culture_map = {c.id: c.name for c in session.exec(select(GrainCulture)).all()}
 
     owner_stats: dict[int, dict] = {}
     for intake in intakes:
@@ -1367,7 +1170,7 @@ async def export_owners(
 
 
 @router.get("/owners/intakes/export")
-async def export_owner_intakes(
+def export_owner_intakes(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     owner_id: Optional[int] = Query(None, description="Фільтр за фермером"),
@@ -1377,7 +1180,7 @@ async def export_owner_intakes(
     period: Optional[str] = Query(None, description="Період: today|week|month")
 ):
     """Експорт приходів фермерів у Excel"""
-    query = select(GrainIntake).where(
+    query = select(*_INTAKE_EXPORT_COLUMNS).where(
         GrainIntake.is_own_grain == False,
         GrainIntake.is_farmer_transfer == False
     ).order_by(GrainIntake.created_at.desc())
@@ -1413,43 +1216,22 @@ async def export_owner_intakes(
             start_dt = datetime.combine(now.date(), time.min) - timedelta(days=30)
             query = query.where(GrainIntake.created_at >= start_dt)
 
-    intakes = session.exec(query).all()
-
-    culture_map = {c.id: c.name for c in session.exec(select(GrainCulture)).all()}
-
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = "Приходи фермерів"
-
-    headers = ["Дата", "Фермер", "Телефон", "Культура", "Брутто, кг", "Тара, кг", "Нетто, кг", "Втрати, %", "Прийнято, кг", "Примітка"]
-    sheet.append(headers)
+    culture_map = reference_names(session, "cultures")
 
-    header_fill = PatternFill("solid", fgColor="1F2937")
-    header_font = Font(color="FFFFFF", bold=True)
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style="thin", color="E5E7EB"),
-        right=Side(style="thin", color="E5E7EB"),
-        top=Side(style="thin", color="E5E7EB"),
-        bottom=Side(style="thin", color="E5E7EB")
+    book = XlsxExport()
+    sheet = book.sheet(
+        "Приходи фермерів",
+        ["Дата", "Фермер", "Телефон", "Культура", "Брутто, кг", "Тара, кг", "Нетто, кг", "Втрати, %", "Прийнято, кг", "Примітка"],
+        widths=[20, 28, 16, 16, 14, 14, 14, 12, 14, 30],
+        number_formats={5: MONEY_FORMAT, 6: MONEY_FORMAT, 7: MONEY_FORMAT, 8: PERCENT_FORMAT, 9: MONEY_FORMAT},
     )
 
-    for col in range(1, len(headers) + 1):
-        cell = sheet.cell(row=1, column=col)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    alt_fill = PatternFill("solid", fgColor="F8FAFC")
-
-    for intake in intakes:
-        culture_name = culture_map.get(intake.culture_id, "-")
+    for intake in stream_rows(session, query):
         sheet.append([
             intake.created_at.strftime("%Y-%m-%d %H:%M:%S"),
             intake.owner_full_name or "-",
             intake.owner_phone or "-",
-            culture_name,
+            culture_map.get(intake.culture_id, "-"),
             intake.gross_weight_kg,
             intake.tare_weight_kg,
             intake.net_weight_kg,
@@ -1458,40 +1240,12 @@ async def export_owner_intakes(
             intake.note or ""
         ])
 
-    for row in range(2, sheet.max_row + 1):
-        row_fill = alt_fill if row % 2 == 0 else None
-        for col in range(1, len(headers) + 1):
-            cell = sheet.cell(row=row, column=col)
-            if row_fill:
-                cell.fill = row_fill
-            cell.border = thin_border
-            if col in (5, 6, 7, 9):
-                cell.number_format = "#,##0.00"
-            if col == 8:
-                cell.number_format = "0.00"
-
-    sheet.freeze_panes = "A2"
-    sheet.auto_filter.ref = f"A1:J{sheet.max_row}"
-
-    column_widths = [20, 28, 16, 16, 14, 14, 14, 12, 14, 30]
-    for idx, width in enumerate(column_widths, start=1):
-        col_letter = chr(64 + idx)
-        sheet.column_dimensions[col_letter].width = width
-
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
-
     filename = f"farmer_intakes_report_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-    )
+    return book.to_response(filename)
 
 
 @router.get("/stock", response_model=list[GrainStockResponse])
-async def get_stock(
+def get_stock(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -1524,7 +1278,7 @@ async def get_stock(
 
 
 @router.patch("/stock/{culture_id}/adjust", response_model=GrainStockResponse)
-async def adjust_stock(
+def adjust_stock(
     culture_id: int,
     payload: StockAdjustRequest,
     session: Session = Depends(get_session),
@@ -1538,28 +1292,6 @@ async def adjust_stock(
             detail="Культуру не знайдено"
         )
 
-    stock = session.exec(
-        select(GrainStock).where(GrainStock.culture_id == culture_id)
-    ).first()
-    if not stock:
-        stock = GrainStock(
-            culture_id=culture_id,
-            quantity_kg=0.0,
-            own_quantity_kg=0.0,
-            farmer_quantity_kg=0.0
-        )
-        session.add(stock)
-        session.flush()
-
-    delta = payload.amount if payload.transaction_type == TransactionType.ADD else -payload.amount
-    quantity_before = stock.quantity_kg
-    new_quantity = quantity_before + delta
-    if new_quantity < 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Недостатньо залишку для списання"
-        )
-
     # Важливо: `farmer_quantity_kg` — це "невикуплене у фермерів" (борг/лічильник),
     # а фізичне зерно на складі = own + farmer.
     #
@@ -1567,19 +1299,27 @@ async def adjust_stock(
     # і лише коли воно закінчилось — зачіпаємо `farmer_quantity_kg`.
     # Це узгоджується з логікою відправок/виплат, де `farmer_quantity_kg` не повинен
     # "стискатися пропорційно" при зменшенні фізичної кількості.
+    amount = float(payload.amount)
     if payload.transaction_type == TransactionType.SUBTRACT:
-        remaining = float(payload.amount)
-        take_own = min(float(stock.own_quantity_kg or 0.0), remaining)
-        remaining -= take_own
-        take_farmer = remaining
-        stock.own_quantity_kg = max(0.0, float(stock.own_quantity_kg or 0.0) - take_own)
-        stock.farmer_quantity_kg = max(0.0, float(stock.farmer_quantity_kg or 0.0) - take_farmer)
-        stock.quantity_kg = max(0.0, float(stock.own_quantity_kg or 0.0) + float(stock.farmer_quantity_kg or 0.0))
+        take_own = func.least(func.greatest(func.coalesce(GrainStock.own_quantity_kg, 0.0), 0.0), amount)
+        stock = change_grain_stock(
+            session, culture_id,
+            where=[GrainStock.quantity_kg >= amount],
+            clamp=("own_quantity_kg", "farmer_quantity_kg"),
+            quantity_kg=-amount,
+            own_quantity_kg=-take_own,
+            farmer_quantity_kg=-(amount - take_own),
+        )
+        if stock is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Недостатньо залишку для списання"
+            )
+        delta = -amount
     else:
         # ADD: за замовчуванням додаємо в "наше" зерно
-        stock.own_quantity_kg = max(0.0, float(stock.own_quantity_kg or 0.0) + float(payload.amount))
-        stock.quantity_kg = max(0.0, float(stock.own_quantity_kg or 0.0) + float(stock.farmer_quantity_kg or 0.0))
-    session.add(stock)
+        stock = change_grain_stock(session, culture_id, quantity_kg=amount, own_quantity_kg=amount)
+        delta = amount
     session.add(
         StockAdjustmentLog(
             stock_type=StockAdjustmentType.GRAIN,
@@ -1589,8 +1329,8 @@ async def adjust_stock(
             item_name=culture.name,
             transaction_type=payload.transaction_type,
             amount=payload.amount,
-            quantity_before=quantity_before,
-            quantity_after=new_quantity,
+            quantity_before=stock.quantity_kg - delta,
+            quantity_after=stock.quantity_kg,
             user_id=current_admin.id,
             user_full_name=current_admin.full_name,
             source="manual"
@@ -1612,7 +1352,7 @@ async def adjust_stock(
 
 
 @router.post("/stock/{culture_id}/reserve", response_model=GrainStockResponse)
-async def reserve_stock(
+def reserve_stock(
     culture_id: int,
     payload: GrainReserveRequest,
     session: Session = Depends(get_session),
@@ -1622,15 +1362,18 @@ async def reserve_stock(
     culture = session.get(GrainCulture, culture_id)
     if not culture:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Культуру не знайдено")
-    stock = _get_or_create_stock(session, culture_id)
-    available = stock.own_quantity_kg - stock.reserved_kg
-    if payload.quantity_kg > available:
+    stock = change_grain_stock(
+        session, culture_id,
+        where=[GrainStock.own_quantity_kg - GrainStock.reserved_kg >= payload.quantity_kg],
+        reserved_kg=payload.quantity_kg,
+    )
+    if stock is None:
+        current = get_grain_stock(session, culture_id)
+        available = current.own_quantity_kg - current.reserved_kg
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Недостатньо доступного зерна. Доступно: {available}"
         )
-    stock.reserved_kg += payload.quantity_kg
-    session.add(stock)
     session.commit()
     session.refresh(stock)
     return GrainStockResponse(
@@ -1646,7 +1389,7 @@ async def reserve_stock(
 
 
 @router.post("/stock/{culture_id}/reserve/release", response_model=GrainStockResponse)
-async def release_stock_reserve(
+def release_stock_reserve(
     culture_id: int,
     payload: GrainReserveRequest,
     session: Session = Depends(get_session),
@@ -1656,14 +1399,17 @@ async def release_stock_reserve(
     culture = session.get(GrainCulture, culture_id)
     if not culture:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Культуру не знайдено")
-    stock = _get_or_create_stock(session, culture_id)
-    if payload.quantity_kg > stock.reserved_kg:
+    stock = change_grain_stock(
+        session, culture_id,
+        where=[GrainStock.reserved_kg >= payload.quantity_kg],
+        reserved_kg=-payload.quantity_kg,
+    )
+    if stock is None:
+        current = get_grain_stock(session, culture_id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Недостатньо заброньованого зерна. Заброньовано: {stock.reserved_kg}"
+            detail=f"Недостатньо заброньованого зерна. Заброньовано: {current.reserved_kg}"
         )
-    stock.reserved_kg -= payload.quantity_kg
-    session.add(stock)
     session.commit()
     session.refresh(stock)
     return GrainStockResponse(
@@ -1679,7 +1425,7 @@ async def release_stock_reserve(
 
 
 @router.get("/stock/adjustments", response_model=list[StockAdjustmentResponse])
-async def list_grain_stock_adjustments(
+def list_grain_stock_adjustments(
     response: Response,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
@@ -1710,7 +1456,7 @@ async def list_grain_stock_adjustments(
 
 
 @router.get("/stock/adjustments/export")
-async def export_stock_adjustments(
+def export_stock_adjustments(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     start_date: str | None = None,
@@ -1729,7 +1475,18 @@ async def export_stock_adjustments(
     else:
         stock_types = [StockAdjustmentType.GRAIN, StockAdjustmentType.PURCHASE]
     
-    query = select(StockAdjustmentLog).where(
+    query = select(
+        StockAdjustmentLog.created_at,
+        StockAdjustmentLog.stock_type,
+        StockAdjustmentLog.category,
+        StockAdjustmentLog.item_name,
+        StockAdjustmentLog.transaction_type,
+        StockAdjustmentLog.amount,
+        StockAdjustmentLog.quantity_after,
+        StockAdjustmentLog.user_full_name,
+        StockAdjustmentLog.source,
+        StockAdjustmentLog.destination,
+    ).where(
         StockAdjustmentLog.stock_type.in_(stock_types)
     ).order_by(StockAdjustmentLog.created_at.desc())
 
@@ -1764,47 +1521,20 @@ async def export_stock_adjustments(
             )
         query = query.where(StockAdjustmentLog.created_at <= end_dt)
 
-    logs = session.exec(query).all()
-
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = "Журнал змін"
-
-    headers = [
-        "Дата",
-        "Тип",
-        "Позиція",
-        "Зміна, кг",
-        "Стало, кг",
-        "Користувач",
-        "Примітка"
-    ]
-    sheet.append(headers)
-
-    header_fill = PatternFill("solid", fgColor="1F2937")
-    header_font = Font(color="FFFFFF", bold=True)
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style="thin", color="E5E7EB"),
-        right=Side(style="thin", color="E5E7EB"),
-        top=Side(style="thin", color="E5E7EB"),
-        bottom=Side(style="thin", color="E5E7EB")
+    book = XlsxExport()
+    sheet = book.sheet(
+        "Журнал змін",
+        ["Дата", "Тип", "Позиція", "Зміна, кг", "Стало, кг", "Користувач", "Примітка"],
+        widths=[20, 14, 28, 14, 14, 22, 30],
+        number_formats={4: "+0.00;-0.00", 5: MONEY_FORMAT},
     )
 
-    for col in range(1, len(headers) + 1):
-        cell = sheet.cell(row=1, column=col)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    alt_fill = PatternFill("solid", fgColor="F8FAFC")
     category_map = {
         "fertilizer": "Добрива",
         "seed": "Посівне"
     }
 
-    for log in logs:
+    for log in stream_rows(session, query):
         if log.stock_type == StockAdjustmentType.GRAIN:
             type_label = "Зерно"
         else:
@@ -1827,57 +1557,64 @@ async def export_stock_adjustments(
             note
         ])
 
-    for row in range(2, sheet.max_row + 1):
-        row_fill = alt_fill if row % 2 == 0 else None
-        for col in range(1, len(headers) + 1):
-            cell = sheet.cell(row=row, column=col)
-            if row_fill:
-                cell.fill = row_fill
-            cell.border = thin_border
-            if col == 4:
-                cell.number_format = "+0.00;-0.00"
-            if col == 5:
-                cell.number_format = "#,##0.00"
-
-    sheet.freeze_panes = "A2"
-    sheet.auto_filter.ref = f"A1:G{sheet.max_row}"
-    column_widths = [20, 14, 28, 14, 14, 22, 30]
-    for idx, width in enumerate(column_widths, start=1):
-        sheet.column_dimensions[chr(64 + idx)].width = width
-
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
-
     filename = f"stock_adjustments_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-    )
+    return book.to_response(filename)
+
+
+def _load_intake_refs(session: Session, payloads: list[GrainIntakeCreate]) -> dict:
+    """Довідники для карток приходу: по одному запиту на таблицю на весь набір
+    карток (і для одиночної картки, і для пакета з вагової)."""
+    def by_id(model, ids) -> dict:
+        ids = {i for i in ids if i}
+        if not ids:
+            return {}
+        return {row.id: row for row in session.exec(select(model).where(model.id.in_(ids))).all()}
+
+    # Нові власники шукаються за (ПІБ, телефон); телефон може бути NULL,
+    # тому вибираємо по ПІБ, а пару звіряємо вже тут.
+    names = {
+        p.owner_full_name for p in payloads
+        if not p.is_own_grain and not p.owner_id and p.owner_full_name
+    }
+    owners_by_name = {}
+    if names:
+        for owner in session.exec(
+            select(GrainOwner).where(GrainOwner.full_name.in_(names)).order_by(GrainOwner.id)
+        ).all():
+            owners_by_name.setdefault((owner.full_name, owner.phone), owner)
+
+    return {
+        "cultures": by_id(GrainCulture, (p.culture_id for p in payloads)),
+        "vehicle_types": by_id(VehicleType, (p.vehicle_type_id for p in payloads)),
+        "fields": by_id(AgriField, (p.field_id for p in payloads if p.is_own_grain)),
+        "owners": by_id(GrainOwner, (p.owner_id for p in payloads if not p.is_own_grain)),
+        "owners_by_name": owners_by_name,
+        "drivers": by_id(Driver, (p.driver_id for p in payloads if p.is_internal_driver)),
+    }
 
 
-@router.post("/intakes", response_model=GrainIntakeResponse)
-async def create_intake(
+def _build_intake(
+    session: Session,
     payload: GrainIntakeCreate,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_super_admin)
-):
-    """Створення картки приходу"""
-    culture = session.get(GrainCulture, payload.culture_id)
-    if not culture:
+    refs: dict,
+    current_user: User,
+) -> GrainIntake:
+    """Перевіряє картку приходу і повертає (ще не додану в сесію) GrainIntake.
+    Усі перевірки — до будь-яких змін у сесії: якщо картка відхилена
+    (HTTPException), після неї не лишається ні нового власника, ні зміненого телефону."""
+    if payload.culture_id not in refs["cultures"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Культуру не знайдено"
         )
 
-    vehicle_type = session.get(VehicleType, payload.vehicle_type_id)
-    if not vehicle_type:
+    if payload.vehicle_type_id not in refs["vehicle_types"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Тип транспорту не знайдено"
         )
 
+    owner = None
     if payload.is_own_grain:
         if payload.owner_id or payload.owner_full_name or payload.owner_phone:
             raise HTTPException(
@@ -1889,57 +1626,25 @@ async def create_intake(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Оберіть поле, з якого привезли зерно"
             )
-        field = session.get(AgriField, payload.field_id)
-        if not field:
+        if payload.field_id not in refs["fields"]:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Поле не знайдено"
             )
-        owner_id = None
-        owner_full_name = None
-        owner_phone = None
     else:
-        owner_id = payload.owner_id
-        owner_full_name = payload.owner_full_name
-        owner_phone = payload.owner_phone
-
-        if not owner_id and not owner_full_name:
+        if not payload.owner_id and not payload.owner_full_name:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Потрібно вказати власника"
             )
 
-        if owner_id:
-            owner = session.get(GrainOwner, owner_id)
+        if payload.owner_id:
+            owner = refs["owners"].get(payload.owner_id)
             if not owner:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Власника не знайдено"
                 )
-            # Якщо оператор у формі картки виправив/дописав телефон існуючому
-            # фермеру — оновлюємо його у довіднику. Порівнюємо з пробілами:
-            # порожній рядок і None трактуємо однаково.
-            incoming_phone = (payload.owner_phone or "").strip() or None
-            current_phone = (owner.phone or "").strip() or None
-            if incoming_phone and incoming_phone != current_phone:
-                owner.phone = incoming_phone
-                session.add(owner)
-        else:
-            owner = session.exec(
-                select(GrainOwner).where(
-                    GrainOwner.full_name == owner_full_name,
-                    GrainOwner.phone == owner_phone
-                )
-            ).first()
-            if not owner:
-                owner = GrainOwner(full_name=owner_full_name, phone=owner_phone)
-                session.add(owner)
-                # flush — отримуємо owner.id, але не комітимо: контракт інтейку має йти однією транзакцією
-                session.flush()
-            owner_id = owner.id
-
-        owner_full_name = owner.full_name
-        owner_phone = owner.phone
 
     if payload.is_internal_driver:
         if not payload.driver_id:
@@ -1947,13 +1652,12 @@ async def create_intake(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Потрібно вибрати водія підприємства"
             )
-        driver = session.get(Driver, payload.driver_id)
-        if not driver:
+        if payload.driver_id not in refs["drivers"]:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Водія не знайдено"
             )
-        driver_id = driver.id
+        driver_id = payload.driver_id
         external_driver_name = None
     else:
         if payload.driver_id:
@@ -1981,15 +1685,41 @@ async def create_intake(
         else:
             accepted_weight = _round_kg(net_weight * (1 - payload.impurity_percent / 100))
 
-    field_id = payload.field_id if payload.is_own_grain else None
+    # Картка пройшла перевірки — тепер можна чіпати довідник власників.
+    if payload.is_own_grain:
+        owner_id = None
+        owner_full_name = None
+        owner_phone = None
+    else:
+        if owner:
+            # Якщо оператор у формі картки виправив/дописав телефон існуючому
+            # фермеру — оновлюємо його у довіднику. Порівнюємо з пробілами:
+            # порожній рядок і None трактуємо однаково.
+            incoming_phone = (payload.owner_phone or "").strip() or None
+            current_phone = (owner.phone or "").strip() or None
+            if incoming_phone and incoming_phone != current_phone:
+                owner.phone = incoming_phone
+                session.add(owner)
+        else:
+            key = (payload.owner_full_name, payload.owner_phone)
+            owner = refs["owners_by_name"].get(key)
+            if not owner:
+                owner = GrainOwner(full_name=payload.owner_full_name, phone=payload.owner_phone)
+                session.add(owner)
+                # flush — отримуємо owner.id, але не комітимо: контракт інтейку має йти однією транзакцією
+                session.flush()
+                refs["owners_by_name"][key] = owner
+        owner_id = owner.id
+        owner_full_name = owner.full_name
+        owner_phone = owner.phone
 
-    intake = GrainIntake(
+    return GrainIntake(
         culture_id=payload.culture_id,
         vehicle_type_id=payload.vehicle_type_id,
         has_trailer=payload.has_trailer,
         is_own_combine=payload.is_own_combine,
         is_own_grain=payload.is_own_grain,
-        field_id=field_id,
+        field_id=payload.field_id if payload.is_own_grain else None,
         owner_id=owner_id,
         owner_full_name=owner_full_name,
         owner_phone=owner_phone,
@@ -2006,39 +1736,56 @@ async def create_intake(
         note=payload.note,
         created_by_user_id=current_user.id
     )
+
+
+def _intake_stock_log(intake: GrainIntake, culture_name: str, quantity_before: float, current_user: User) -> StockAdjustmentLog:
+    """Запис журналу складу для картки, що лягла на склад."""
+    owner_label = "Підприємство" if intake.is_own_grain else (intake.owner_full_name or "Фермер")
+    return StockAdjustmentLog(
+        stock_type=StockAdjustmentType.GRAIN,
+        culture_id=intake.culture_id,
+        purchase_stock_id=None,
+        category=None,
+        item_name=culture_name,
+        transaction_type=TransactionType.ADD,
+        amount=intake.accepted_weight_kg,
+        quantity_before=quantity_before,
+        quantity_after=quantity_before + intake.accepted_weight_kg,
+        user_id=current_user.id,
+        user_full_name=current_user.full_name,
+        source="intake",
+        destination=owner_label,
+    )
+
+
+@router.post("/intakes", response_model=GrainIntakeResponse)
+def create_intake(
+    payload: GrainIntakeCreate,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_super_admin)
+):
+    """Створення картки приходу"""
+    refs = _load_intake_refs(session, [payload])
+    intake = _build_intake(session, payload, refs, current_user)
     session.add(intake)
     # flush для отримання intake.id у можливих наступних мутаціях. Без commit — атомарність.
     session.flush()
+    apply_farmer_intake(session, intake)
 
-    if not payload.pending_quality and not payload.pending_tare:
-        stock = _get_or_create_stock(session, payload.culture_id, commit=False)
-        quantity_before = stock.quantity_kg
-        _apply_stock_delta(session, payload.culture_id, accepted_weight, payload.is_own_grain, commit=False)
-        owner_label = "Підприємство" if payload.is_own_grain else (owner_full_name or "Фермер")
-        session.add(StockAdjustmentLog(
-            stock_type=StockAdjustmentType.GRAIN,
-            culture_id=payload.culture_id,
-            purchase_stock_id=None,
-            category=None,
-            item_name=culture.name,
-            transaction_type=TransactionType.ADD,
-            amount=accepted_weight,
-            quantity_before=quantity_before,
-            quantity_after=stock.quantity_kg,
-            user_id=current_user.id,
-            user_full_name=current_user.full_name,
-            source="intake",
-            destination=owner_label,
-        ))
-        if payload.is_internal_driver and driver_id:
+    if _intake_on_stock(intake):
+        accepted_weight = intake.accepted_weight_kg
+        stock = _apply_stock_delta(session, intake.culture_id, accepted_weight, intake.is_own_grain, commit=False)
+        culture_name = refs["cultures"][intake.culture_id].name
+        session.add(_intake_stock_log(intake, culture_name, stock.quantity_kg - accepted_weight, current_user))
+        if intake.is_internal_driver and intake.driver_id:
             _apply_driver_stat_delta(
                 session,
-                driver_id=driver_id,
-                vehicle_type_id=payload.vehicle_type_id,
-                culture_id=payload.culture_id,
-                has_trailer=payload.has_trailer,
+                driver_id=intake.driver_id,
+                vehicle_type_id=intake.vehicle_type_id,
+                culture_id=intake.culture_id,
+                has_trailer=intake.has_trailer,
                 delta_trips=1,
-                delta_net_kg=net_weight,
+                delta_net_kg=intake.net_weight_kg,
                 delta_accepted_kg=accepted_weight,
                 commit=False,
             )
@@ -2054,8 +1801,101 @@ async def create_intake(
     return intake
 
 
+@router.post("/intakes/batch", response_model=GrainIntakeBatchResponse)
+def create_intakes_batch(
+    payload: GrainIntakeBatchCreate,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_super_admin)
+):
+    """Пакетне створення карток приходу (черга машин на вагах у жнива).
+
+    Довідники читаються одним запитом на таблицю для всього пакета, картки і
+    журнал складу вставляються разом, склад, баланси фермерів і статистика
+    водіїв змінюються один раз на ключ, commit — один. Картки, що не пройшли
+    перевірку, не створюються і повертаються в `errors` з позицією в `items`;
+    решта пакета зберігається.
+    """
+    refs = _load_intake_refs(session, payload.items)
+    intakes = []
+    errors = []
+    for index, item in enumerate(payload.items):
+        try:
+            intakes.append(_build_intake(session, item, refs, current_user))
+        except HTTPException as exc:
+            errors.append(GrainIntakeBatchError(index=index, detail=str(exc.detail)))
+    if not intakes:
+        return GrainIntakeBatchResponse(created=[], errors=errors)
+
+    session.add_all(intakes)
+    session.flush()
+
+    farmer_deltas: dict[tuple[int, int], float] = {}
+    stock_deltas: dict[int, dict[str, float]] = {}
+    driver_deltas: dict[tuple[int, int, int, bool], list] = {}
+    on_stock = [intake for intake in intakes if _intake_on_stock(intake)]
+    for intake in on_stock:
+        share = farmer_intake_share(intake)
+        if share:
+            owner_id, culture_id, qty = share
+            farmer_deltas[(owner_id, culture_id)] = farmer_deltas.get((owner_id, culture_id), 0.0) + qty
+        bucket = "own_quantity_kg" if intake.is_own_grain else "farmer_quantity_kg"
+        deltas = stock_deltas.setdefault(
+            intake.culture_id, {"quantity_kg": 0.0, "own_quantity_kg": 0.0, "farmer_quantity_kg": 0.0}
+        )
+        deltas["quantity_kg"] += intake.accepted_weight_kg
+        deltas[bucket] += intake.accepted_weight_kg
+        if intake.is_internal_driver and intake.driver_id:
+            key = (intake.driver_id, intake.vehicle_type_id, intake.culture_id, intake.has_trailer)
+            stat = driver_deltas.setdefault(key, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += intake.net_weight_kg
+            stat[2] += intake.accepted_weight_kg
+
+    # Ключі — у стабільному порядку: два паралельні пакети блокують рядки
+    # складу / балансів в одній послідовності і не впираються один в одного.
+    for (owner_id, culture_id), qty in sorted(farmer_deltas.items()):
+        apply_farmer_balance_delta(session, owner_id, culture_id, qty)
+
+    quantity_before = {}
+    for culture_id, deltas in sorted(stock_deltas.items()):
+        stock = change_grain_stock(session, culture_id, **deltas)
+        quantity_before[culture_id] = stock.quantity_kg - deltas["quantity_kg"]
+    logs = []
+    for intake in on_stock:
+        before = quantity_before[intake.culture_id]
+        logs.append(_intake_stock_log(intake, refs["cultures"][intake.culture_id].name, before, current_user))
+        quantity_before[intake.culture_id] = before + intake.accepted_weight_kg
+    session.add_all(logs)
+
+    for (driver_id, vehicle_type_id, culture_id, has_trailer), (trips, net_kg, accepted_kg) in sorted(driver_deltas.items()):
+        _apply_driver_stat_delta(
+            session,
+            driver_id=driver_id,
+            vehicle_type_id=vehicle_type_id,
+            culture_id=culture_id,
+            has_trailer=has_trailer,
+            delta_trips=trips,
+            delta_net_kg=net_kg,
+            delta_accepted_kg=accepted_kg,
+            commit=False,
+        )
+
+    intake_ids = [intake.id for intake in intakes]
+    try:
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    # Після commit об'єкти прострочені — перечитуємо всі картки одним запитом,
+    # а не refresh-ем кожної.
+    created = session.exec(
+        select(GrainIntake).where(GrainIntake.id.in_(intake_ids)).order_by(GrainIntake.id)
+    ).all()
+    return GrainIntakeBatchResponse(created=created, errors=errors)
+
+
 @router.get("/intakes", response_model=list[GrainIntakeResponse])
-async def list_intakes(
+def list_intakes(
     response: Response,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
@@ -2067,15 +1907,18 @@ async def list_intakes(
     end_date: Optional[str] = Query(None, description="Фільтр до дати (ISO YYYY-MM-DD), включно"),
     include_pending: bool = Query(True, description="Включати pending-картки (без часу) навіть якщо за діапазоном"),
     limit: int = Query(100, ge=1, le=1000, description="Розмір сторінки"),
-    offset: int = Query(0, ge=0, description="Зміщення для пагінації"),
+    offset: int = Query(0, ge=0, description="Зміщення для пагінації (застаріле — краще cursor)"),
+    cursor: Optional[str] = Query(None, description="Курсор з X-Next-Cursor попередньої сторінки"),
+    with_total: bool = Query(False, description="Порахувати X-Total-Count"),
 ):
     """Список карток приходу.
 
     `start_date`/`end_date` — необовʼязковий діапазон. Без них повертається все.
     `include_pending=True` гарантує що pending-картки (очікують тару/якість) завжди
     видимі — вони критичні для оператора незалежно від обраного періоду.
+    Пагінація — курсором (`X-Next-Cursor` → `cursor`), див. `backend.pagination`.
     """
-    query = select(GrainIntake).order_by(GrainIntake.created_at.desc())
+    query = select(GrainIntake)
     if not include_transfers:
         query = query.where(GrainIntake.is_farmer_transfer == False)
     if pending_only:
@@ -2116,20 +1959,40 @@ async def list_intakes(
         else:
             for cond in date_filter:
                 query = query.where(cond)
-    # Загальний count для пагінації — без limit/offset
-    total = session.exec(select(func.count()).select_from(query.subquery())).first() or 0
-    response.headers["X-Total-Count"] = str(total)
-    return session.exec(query.limit(limit).offset(offset)).all()
+    return paginate(
+        session, response, query, GrainIntake,
+        limit=limit, offset=offset, cursor=cursor, with_total=with_total,
+    )
 
 
 @router.get("/intakes/summary-export")
-async def export_intakes_summary(
+def export_intakes_summary(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     start_date: str | None = None,
     end_date: str | None = None,
 ):
-    """Спец-звіт: зведена таблиця приходів по культурах з розбивкою фермери / підприємство"""
+    """Спец-звіт: зведена таблиця приходів по культурах з розбивкою фермери / підприємство.
+    Для великих періодів — фоновий варіант `POST /api/exports/jobs` (kind=intakes_summary)."""
+    workbook = build_intakes_summary_workbook(session, start_date, end_date)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    filename = f"intakes_summary_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return StreamingResponse(
+        buffer,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def build_intakes_summary_workbook(
+    session: Session,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Workbook:
+    """Будує книгу спец-звіту приходів. `progress(pct)` — колбек для фонових експортів."""
     query = (
         select(GrainIntake)
         .where(
@@ -2155,15 +2018,14 @@ async def export_intakes_summary(
         query = query.where(GrainIntake.created_at <= end_dt)
 
     intakes = session.exec(query).all()
+    if progress:
+        progress(40)
 
     cultures = session.exec(select(GrainCulture).order_by(GrainCulture.name)).all()
     culture_map = {c.id: c.name for c in cultures}
-    owners = session.exec(select(GrainOwner)).all()
-    owner_map = {o.id: o.full_name for o in owners}
-    drivers = session.exec(select(Driver)).all()
-    driver_map = {d.id: d.full_name for d in drivers}
-    vehicles = session.exec(select(VehicleType)).all()
-    vehicle_map = {v.id: v.name for v in vehicles}
+    owner_map = reference_names(session, "owners")
+    driver_map = reference_names(session, "drivers")
+    vehicle_map = reference_names(session, "vehicle_types")
 
     data_by_culture = {}
     for c in cultures:
@@ -2398,19 +2260,13 @@ async def export_intakes_summary(
     sheet.column_dimensions["I"].width = 16
     sheet.column_dimensions["J"].width = 22
 
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
-    filename = f"intakes_summary_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    if progress:
+        progress(90)
+    return workbook
 
 
 @router.get("/intakes/export")
-async def export_intakes(
+def export_intakes(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     start_date: str | None = None,
@@ -2426,7 +2282,7 @@ async def export_intakes(
 ):
     """Експорт карток приходу у Excel"""
     query = (
-        select(GrainIntake)
+        select(*_INTAKE_EXPORT_COLUMNS)
         .where(GrainIntake.is_farmer_transfer == False)
         .order_by(GrainIntake.created_at.desc())
     )
@@ -2486,23 +2342,11 @@ async def export_intakes(
     if is_own_combine is not None:
         query = query.where(GrainIntake.is_own_combine == is_own_combine)
 
-    intakes = session.exec(query).all()
-
-    culture_map = {
-        item.id: item.name for item in session.exec(select(GrainCulture)).all()
-    }
-    vehicle_map = {
-        item.id: item.name for item in session.exec(select(VehicleType)).all()
-    }
-    driver_items = session.exec(select(Driver)).all()
-    driver_map = {item.id: item.full_name for item in driver_items}
-    driver_phone_map = {item.id: item.phone for item in driver_items}
-    fields = session.exec(select(AgriField)).all()
-    field_map = {f.id: f.name for f in fields}
-
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = "Прихід зерна"
+    culture_map = reference_names(session, "cultures")
+    vehicle_map = reference_names(session, "vehicle_types")
+    driver_map = reference_names(session, "drivers")
+    driver_phone_map = reference_names(session, "driver_phones")
+    field_map = reference_names(session, "fields")
 
     headers = [
         "Дата",
@@ -2525,30 +2369,20 @@ async def export_intakes(
         "Прийнято, кг",
         "Примітка"
     ]
-    sheet.append(headers)
-
-    header_fill = PatternFill("solid", fgColor="1F2937")
-    header_font = Font(color="FFFFFF", bold=True)
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style="thin", color="E5E7EB"),
-        right=Side(style="thin", color="E5E7EB"),
-        top=Side(style="thin", color="E5E7EB"),
-        bottom=Side(style="thin", color="E5E7EB")
+    status_col = 17  # "Очікує %"
+    book = XlsxExport()
+    sheet = book.sheet(
+        "Прихід зерна",
+        headers,
+        widths=[20, 16, 16, 10, 12, 18, 20, 24, 16, 14, 22, 16, 14, 14, 14, 12, 14, 14, 30],
+        number_formats={13: MONEY_FORMAT, 14: MONEY_FORMAT, 15: MONEY_FORMAT, 16: PERCENT_FORMAT, 18: MONEY_FORMAT},
+        centered=(status_col,),
     )
 
-    for col in range(1, len(headers) + 1):
-        cell = sheet.cell(row=1, column=col)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    alt_fill = PatternFill("solid", fgColor="F8FAFC")
     pending_fill = PatternFill("solid", fgColor="FEF3C7")
     confirmed_fill = PatternFill("solid", fgColor="BBF7D0")
 
-    for intake in intakes:
+    for intake in stream_rows(session, query):
         culture_name = culture_map.get(intake.culture_id, "-")
         vehicle_name = vehicle_map.get(intake.vehicle_type_id, "-")
         owner_name = "Підприємство" if intake.is_own_grain else (intake.owner_full_name or "-")
@@ -2590,49 +2424,14 @@ async def export_intakes(
             status_label,
             "" if (intake.pending_quality or intake.pending_tare) else intake.accepted_weight_kg,
             intake.note or ""
-        ])
-
-    status_col = 17  # "Очікує %"
-    for row in range(2, sheet.max_row + 1):
-        row_fill = alt_fill if row % 2 == 0 else None
-        status_value = sheet.cell(row=row, column=status_col).value
-        status_fill = pending_fill if status_value != "Підтверджено" else confirmed_fill
-
-        for col in range(1, len(headers) + 1):
-            cell = sheet.cell(row=row, column=col)
-            if col == status_col:
-                cell.fill = status_fill
-                cell.alignment = Alignment(horizontal="center")
-            elif row_fill:
-                cell.fill = row_fill
-            cell.border = thin_border
-            if col in (13, 14, 15, 18):
-                cell.number_format = "#,##0.00"
-            if col == 16:
-                cell.number_format = "0.00"
-
-    sheet.freeze_panes = "A2"
-    last_col_letter = chr(64 + len(headers)) if len(headers) <= 26 else "S"
-    sheet.auto_filter.ref = f"A1:{last_col_letter}{sheet.max_row}"
-
-    column_widths = [20, 16, 16, 10, 12, 18, 20, 24, 16, 14, 22, 16, 14, 14, 14, 12, 14, 14, 30]
-    for idx, width in enumerate(column_widths, start=1):
-        sheet.column_dimensions[chr(64 + idx)].width = width
-
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
+        ], fills={status_col: confirmed_fill if status_label == "Підтверджено" else pending_fill})
 
     filename = f"intake_report_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-    )
+    return book.to_response(filename)
 
 
 @router.get("/shipments", response_model=list[GrainShipmentResponse])
-async def list_shipments(
+def list_shipments(
     response: Response,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
@@ -2640,9 +2439,11 @@ async def list_shipments(
     end_date: Optional[str] = Query(None, description="ISO YYYY-MM-DD включно"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Курсор з X-Next-Cursor попередньої сторінки"),
+    with_total: bool = Query(False, description="Порахувати X-Total-Count"),
 ):
     """Список відправок зерна. `start_date`/`end_date` — необовʼязковий діапазон."""
-    query = select(GrainShipment).order_by(GrainShipment.created_at.desc())
+    query = select(GrainShipment)
     if start_date:
         try:
             query = query.where(GrainShipment.created_at >= datetime.combine(date.fromisoformat(start_date), time.min))
@@ -2653,13 +2454,14 @@ async def list_shipments(
             query = query.where(GrainShipment.created_at <= datetime.combine(date.fromisoformat(end_date), time.max))
         except ValueError:
             raise HTTPException(status_code=400, detail="Некоректний end_date")
-    total = session.exec(select(func.count()).select_from(query.subquery())).first() or 0
-    response.headers["X-Total-Count"] = str(total)
-    return session.exec(query.limit(limit).offset(offset)).all()
+    return paginate(
+        session, response, query, GrainShipment,
+        limit=limit, offset=offset, cursor=cursor, with_total=with_total,
+    )
 
 
 @router.post("/shipments", response_model=GrainShipmentResponse)
-async def create_shipment(
+def create_shipment(
     payload: GrainShipmentCreate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -2677,24 +2479,17 @@ async def create_shipment(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Культуру не знайдено"
         )
-    stock = _get_or_create_stock(session, payload.culture_id)
-    if stock.quantity_kg < payload.quantity_kg:
+    # При відправці списуємо спочатку фермерське зерно, потім наше
+    # farmer_quantity_kg залишається незмінним - це просто лічильник боргу перед фермерами
+    stock = deduct_shipped_grain(
+        session, payload.culture_id, payload.quantity_kg,
+        where=[GrainStock.quantity_kg >= payload.quantity_kg],
+    )
+    if stock is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Недостатньо залишку для відправки"
         )
-    quantity_before = stock.quantity_kg
-    # При відправці списуємо спочатку фермерське зерно, потім наше
-    # farmer_quantity_kg залишається незмінним - це просто лічильник боргу перед фермерами
-    remaining = payload.quantity_kg
-    if stock.farmer_quantity_kg > 0:
-        farmer_deduct = min(remaining, stock.farmer_quantity_kg)
-        # Не змінюємо farmer_quantity_kg - це лічильник боргу
-        remaining -= farmer_deduct
-    if remaining > 0:
-        stock.own_quantity_kg -= remaining
-    stock.quantity_kg -= payload.quantity_kg
-    session.add(stock)
 
     if payload.payment_format not in ("none", "cash", "cashless"):
         raise HTTPException(
@@ -2735,7 +2530,7 @@ async def create_shipment(
             item_name=culture.name,
             transaction_type=TransactionType.SUBTRACT,
             amount=payload.quantity_kg,
-            quantity_before=quantity_before,
+            quantity_before=stock.quantity_kg + payload.quantity_kg,
             quantity_after=stock.quantity_kg,
             user_id=current_user.id,
             user_full_name=current_user.full_name,
@@ -2749,7 +2544,7 @@ async def create_shipment(
 
 
 @router.patch("/shipments/{shipment_id}", response_model=GrainShipmentResponse)
-async def update_shipment(
+def update_shipment(
     shipment_id: int,
     payload: GrainShipmentUpdate,
     session: Session = Depends(get_session),
@@ -2786,27 +2581,19 @@ async def update_shipment(
     if new_culture_id == shipment.culture_id:
         delta = new_quantity - shipment.quantity_kg
         if delta != 0:
-            stock = _get_or_create_stock(session, new_culture_id)
-            quantity_before = stock.quantity_kg
             if delta > 0:
                 # Увеличиваем отправку - списываем сначала фермерское, потом наше
                 # farmer_quantity_kg остается неизменным
-                remaining = delta
-                if stock.farmer_quantity_kg > 0:
-                    farmer_deduct = min(remaining, stock.farmer_quantity_kg)
-                    remaining -= farmer_deduct
-                if remaining > 0:
-                    stock.own_quantity_kg -= remaining
-                stock.quantity_kg -= delta
+                stock = deduct_shipped_grain(session, new_culture_id, delta)
                 transaction_type = TransactionType.SUBTRACT
                 amount = delta
             else:
                 # Уменьшаем отправку - возвращаем только в наше зерно
-                stock.own_quantity_kg += abs(delta)
-                stock.quantity_kg += abs(delta)
+                stock = change_grain_stock(
+                    session, new_culture_id, quantity_kg=abs(delta), own_quantity_kg=abs(delta)
+                )
                 transaction_type = TransactionType.ADD
                 amount = abs(delta)
-            session.add(stock)
             session.add(
                 StockAdjustmentLog(
                     stock_type=StockAdjustmentType.GRAIN,
@@ -2816,7 +2603,7 @@ async def update_shipment(
                     item_name=session.get(GrainCulture, new_culture_id).name,
                     transaction_type=transaction_type,
                     amount=amount,
-                    quantity_before=quantity_before,
+                    quantity_before=stock.quantity_kg + delta,
                     quantity_after=stock.quantity_kg,
                     user_id=current_user.id,
                     user_full_name=current_user.full_name,
@@ -2826,24 +2613,13 @@ async def update_shipment(
             )
     else:
         # Изменение культуры - возвращаем в старую культуру, списываем из новой
-        old_stock = _get_or_create_stock(session, shipment.culture_id)
-        old_before = old_stock.quantity_kg
         # Возвращаем только в наше зерно (так как при отправке списывалось из нашего)
-        old_stock.own_quantity_kg += shipment.quantity_kg
-        old_stock.quantity_kg += shipment.quantity_kg
-        session.add(old_stock)
-
-        new_stock = _get_or_create_stock(session, new_culture_id)
-        new_before = new_stock.quantity_kg
+        old_stock = change_grain_stock(
+            session, shipment.culture_id,
+            quantity_kg=shipment.quantity_kg, own_quantity_kg=shipment.quantity_kg,
+        )
         # Списываем сначала фермерское, потом наше (farmer_quantity_kg остается неизменным)
-        remaining = new_quantity
-        if new_stock.farmer_quantity_kg > 0:
-            farmer_deduct = min(remaining, new_stock.farmer_quantity_kg)
-            remaining -= farmer_deduct
-        if remaining > 0:
-            new_stock.own_quantity_kg -= remaining
-        new_stock.quantity_kg -= new_quantity
-        session.add(new_stock)
+        new_stock = deduct_shipped_grain(session, new_culture_id, new_quantity)
         session.add(
             StockAdjustmentLog(
                 stock_type=StockAdjustmentType.GRAIN,
@@ -2853,7 +2629,7 @@ async def update_shipment(
                 item_name=session.get(GrainCulture, shipment.culture_id).name,
                 transaction_type=TransactionType.ADD,
                 amount=shipment.quantity_kg,
-                quantity_before=old_before,
+                quantity_before=old_stock.quantity_kg - shipment.quantity_kg,
                 quantity_after=old_stock.quantity_kg,
                 user_id=current_user.id,
                 user_full_name=current_user.full_name,
@@ -2870,7 +2646,7 @@ async def update_shipment(
                 item_name=session.get(GrainCulture, new_culture_id).name,
                 transaction_type=TransactionType.SUBTRACT,
                 amount=new_quantity,
-                quantity_before=new_before,
+                quantity_before=new_stock.quantity_kg + new_quantity,
                 quantity_after=new_stock.quantity_kg,
                 user_id=current_user.id,
                 user_full_name=current_user.full_name,
@@ -2909,14 +2685,20 @@ async def update_shipment(
 
 
 @router.get("/shipments/export")
-async def export_shipments(
+def export_shipments(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     start_date: str | None = None,
     end_date: str | None = None
 ):
     """Експорт відправок зерна у Excel"""
-    query = select(GrainShipment).order_by(GrainShipment.created_at.desc())
+    query = select(
+        GrainShipment.created_at,
+        GrainShipment.destination,
+        GrainShipment.culture_id,
+        GrainShipment.quantity_kg,
+        GrainShipment.created_by_user_id,
+    ).order_by(GrainShipment.created_at.desc())
 
     if start_date:
         try:
@@ -2938,41 +2720,18 @@ async def export_shipments(
             )
         query = query.where(GrainShipment.created_at <= end_dt)
 
-    shipments = session.exec(query).all()
-    culture_map = {
-        item.id: item.name for item in session.exec(select(GrainCulture)).all()
-    }
-    user_map = {
-        item.id: item.full_name for item in session.exec(select(User)).all()
-    }
-
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = "Відправки"
-
-    headers = ["Дата", "Куди", "Культура", "Кількість, кг", "Користувач"]
-    sheet.append(headers)
+    culture_map = reference_names(session, "cultures")
+    user_map = reference_names(session, "users")
 
-    header_fill = PatternFill("solid", fgColor="1F2937")
-    header_font = Font(color="FFFFFF", bold=True)
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style="thin", color="E5E7EB"),
-        right=Side(style="thin", color="E5E7EB"),
-        top=Side(style="thin", color="E5E7EB"),
-        bottom=Side(style="thin", color="E5E7EB")
+    book = XlsxExport()
+    sheet = book.sheet(
+        "Відправки",
+        ["Дата", "Куди", "Культура", "Кількість, кг", "Користувач"],
+        widths=[20, 28, 18, 16, 22],
+        number_formats={4: MONEY_FORMAT},
     )
 
-    for col in range(1, len(headers) + 1):
-        cell = sheet.cell(row=1, column=col)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    alt_fill = PatternFill("solid", fgColor="F8FAFC")
-
-    for shipment in shipments:
+    for shipment in stream_rows(session, query):
         sheet.append([
             shipment.created_at.strftime("%Y-%m-%d %H:%M:%S"),
             shipment.destination,
@@ -2981,37 +2740,12 @@ async def export_shipments(
             user_map.get(shipment.created_by_user_id, "-")
         ])
 
-    for row in range(2, sheet.max_row + 1):
-        row_fill = alt_fill if row % 2 == 0 else None
-        for col in range(1, len(headers) + 1):
-            cell = sheet.cell(row=row, column=col)
-            if row_fill:
-                cell.fill = row_fill
-            cell.border = thin_border
-            if col == 4:
-                cell.number_format = "#,##0.00"
-
-    sheet.freeze_panes = "A2"
-    sheet.auto_filter.ref = f"A1:E{sheet.max_row}"
-
-    column_widths = [20, 28, 18, 16, 22]
-    for idx, width in enumerate(column_widths, start=1):
-        sheet.column_dimensions[chr(64 + idx)].width = width
-
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
-
     filename = f"shipments_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-    )
+    return book.to_response(filename)
 
 
 @router.get("/driver-deliveries/export")
-async def export_driver_deliveries(
+def export_driver_deliveries(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     start_date: str | None = None,
@@ -3034,7 +2768,17 @@ async def export_driver_deliveries(
         except ValueError:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некоректний формат дати завершення")
 
-    intake_query = select(GrainIntake).where(GrainIntake.is_internal_driver == True).order_by(GrainIntake.created_at.desc())
+    intake_query = select(
+        GrainIntake.created_at,
+        GrainIntake.driver_id,
+        GrainIntake.vehicle_type_id,
+        GrainIntake.has_trailer,
+        GrainIntake.culture_id,
+        GrainIntake.net_weight_kg,
+        GrainIntake.accepted_weight_kg,
+        GrainIntake.pending_quality,
+        GrainIntake.pending_tare,
+    ).where(GrainIntake.is_internal_driver == True).order_by(GrainIntake.created_at.desc())
     if start_dt:
         intake_query = intake_query.where(GrainIntake.created_at >= start_dt)
     if end_dt:
@@ -3045,9 +2789,15 @@ async def export_driver_deliveries(
         intake_query = intake_query.where(GrainIntake.culture_id == culture_id)
     if vehicle_type_id:
         intake_query = intake_query.where(GrainIntake.vehicle_type_id == vehicle_type_id)
-    intakes = session.exec(intake_query).all()
 
-    ship_query = select(GrainShipment).where(GrainShipment.driver_id.isnot(None)).order_by(GrainShipment.created_at.desc())
+    ship_query = select(
+        GrainShipment.created_at,
+        GrainShipment.driver_id,
+        GrainShipment.vehicle_type_id,
+        GrainShipment.culture_id,
+        GrainShipment.destination,
+        GrainShipment.quantity_kg,
+    ).where(GrainShipment.driver_id.isnot(None)).order_by(GrainShipment.created_at.desc())
     if start_dt:
         ship_query = ship_query.where(GrainShipment.created_at >= start_dt)
     if end_dt:
@@ -3058,67 +2808,56 @@ async def export_driver_deliveries(
         ship_query = ship_query.where(GrainShipment.culture_id == culture_id)
     if vehicle_type_id:
         ship_query = ship_query.where(GrainShipment.vehicle_type_id == vehicle_type_id)
-    shipments = session.exec(ship_query).all()
-
-    culture_map = {c.id: c.name for c in session.exec(select(GrainCulture)).all()}
-    vehicle_map = {v.id: v.name for v in session.exec(select(VehicleType)).all()}
-    driver_items = session.exec(select(Driver)).all()
-    driver_map = {d.id: d.full_name for d in driver_items}
-    driver_phone_map = {d.id: d.phone for d in driver_items}
-
-    rows = []
-    for intake in intakes:
-        rows.append({
-            "date": intake.created_at,
-            "type": "Прийом",
-            "driver": driver_map.get(intake.driver_id, "-"),
-            "phone": driver_phone_map.get(intake.driver_id) or "-",
-            "vehicle": vehicle_map.get(intake.vehicle_type_id, "-"),
-            "trailer": "Так" if intake.has_trailer else "Ні",
-            "culture": culture_map.get(intake.culture_id, "-"),
-            "destination": "-",
-            "quantity": intake.net_weight_kg if not intake.pending_tare else "",
-            "accepted": "" if not _intake_on_stock(intake) else intake.accepted_weight_kg,
-        })
-    for ship in shipments:
-        rows.append({
-            "date": ship.created_at,
-            "type": "Відправка",
-            "driver": driver_map.get(ship.driver_id, "-"),
-            "phone": driver_phone_map.get(ship.driver_id) or "-",
-            "vehicle": vehicle_map.get(ship.vehicle_type_id, "-") if ship.vehicle_type_id else "-",
-            "trailer": "-",
-            "culture": culture_map.get(ship.culture_id, "-"),
-            "destination": ship.destination,
-            "quantity": ship.quantity_kg,
-            "accepted": ship.quantity_kg,
-        })
-    rows.sort(key=lambda r: r["date"], reverse=True)
 
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = "Рейси водіїв"
+    culture_map = reference_names(session, "cultures")
+    vehicle_map = reference_names(session, "vehicle_types")
+    driver_map = reference_names(session, "drivers")
+    driver_phone_map = reference_names(session, "driver_phones")
+
+    def intake_rows():
+        for intake in stream_rows(session, intake_query):
+            yield {
+                "date": intake.created_at,
+                "type": "Прийом",
+                "driver": driver_map.get(intake.driver_id, "-"),
+                "phone": driver_phone_map.get(intake.driver_id) or "-",
+                "vehicle": vehicle_map.get(intake.vehicle_type_id, "-"),
+                "trailer": "Так" if intake.has_trailer else "Ні",
+                "culture": culture_map.get(intake.culture_id, "-"),
+                "destination": "-",
+                "quantity": intake.net_weight_kg if not intake.pending_tare else "",
+                "accepted": "" if not _intake_on_stock(intake) else intake.accepted_weight_kg,
+            }
 
-    headers = ["Дата", "Тип", "Водій", "Телефон", "Транспорт", "Причіп", "Культура", "Куди", "Кількість, кг", "Прийнято, кг"]
-    sheet.append(headers)
+    def shipment_rows():
+        for ship in stream_rows(session, ship_query):
+            yield {
+                "date": ship.created_at,
+                "type": "Відправка",
+                "driver": driver_map.get(ship.driver_id, "-"),
+                "phone": driver_phone_map.get(ship.driver_id) or "-",
+                "vehicle": vehicle_map.get(ship.vehicle_type_id, "-") if ship.vehicle_type_id else "-",
+                "trailer": "-",
+                "culture": culture_map.get(ship.culture_id, "-"),
+                "destination": ship.destination,
+                "quantity": ship.quantity_kg,
+                "accepted": ship.quantity_kg,
+            }
 
-    header_fill = PatternFill("solid", fgColor="1F2937")
-    header_font = Font(color="FFFFFF", bold=True)
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style="thin", color="E5E7EB"),
-        right=Side(style="thin", color="E5E7EB"),
-        top=Side(style="thin", color="E5E7EB"),
-        bottom=Side(style="thin", color="E5E7EB"),
+    # Обидва курсори вже відсортовані за датою (desc) — зливаємо їх потоково,
+    # без збирання всіх рейсів у список.
+    rows = heapq.merge(intake_rows(), shipment_rows(), key=lambda r: r["date"], reverse=True)
+
+    type_col = 2
+    book = XlsxExport()
+    sheet = book.sheet(
+        "Рейси водіїв",
+        ["Дата", "Тип", "Водій", "Телефон", "Транспорт", "Причіп", "Культура", "Куди", "Кількість, кг", "Прийнято, кг"],
+        widths=[20, 14, 22, 16, 16, 10, 16, 24, 16, 16],
+        number_formats={9: MONEY_FORMAT, 10: MONEY_FORMAT},
+        centered=(type_col,),
     )
-    for col in range(1, len(headers) + 1):
-        cell = sheet.cell(row=1, column=col)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-        cell.border = thin_border
 
-    alt_fill = PatternFill("solid", fgColor="F8FAFC")
     intake_fill = PatternFill("solid", fgColor="DBEAFE")
     shipment_fill = PatternFill("solid", fgColor="FEF3C7")
 
@@ -3134,42 +2873,14 @@ async def export_driver_deliveries(
             r["destination"],
             r["quantity"],
             r["accepted"],
-        ])
-
-    for row in range(2, sheet.max_row + 1):
-        row_fill = alt_fill if row % 2 == 0 else None
-        type_val = sheet.cell(row=row, column=2).value
-        type_fill = intake_fill if type_val == "Прийом" else shipment_fill
-        for col in range(1, len(headers) + 1):
-            cell = sheet.cell(row=row, column=col)
-            if col == 2:
-                cell.fill = type_fill
-                cell.alignment = Alignment(horizontal="center")
-            elif row_fill:
-                cell.fill = row_fill
-            cell.border = thin_border
-            if col in (9, 10):
-                cell.number_format = "#,##0.00"
-
-    sheet.freeze_panes = "A2"
-    sheet.auto_filter.ref = f"A1:{chr(64 + len(headers))}{sheet.max_row}"
-    column_widths = [20, 14, 22, 16, 16, 10, 16, 24, 16, 16]
-    for idx, width in enumerate(column_widths, start=1):
-        sheet.column_dimensions[chr(64 + idx)].width = width
+        ], fills={type_col: intake_fill if r["type"] == "Прийом" else shipment_fill})
 
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
     filename = f"driver_deliveries_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    return book.to_response(filename)
 
 
 @router.get("/stock/summary-export")
-async def export_stock_summary(
+def export_stock_summary(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -3178,45 +2889,15 @@ async def export_stock_summary(
     stocks = session.exec(select(GrainStock)).all()
     stock_map = {s.culture_id: s for s in stocks}
 
-    all_owners = session.exec(select(GrainOwner)).all()
-    owner_map = {o.id: o for o in all_owners}
-
-    intake_farmer_totals = session.exec(
-        select(
-            GrainIntake.culture_id,
-            GrainIntake.owner_id,
-            func.sum(GrainIntake.accepted_weight_kg)
-        )
-        .where(
-            GrainIntake.is_own_grain == False,
-            GrainIntake.pending_quality == False,
-            GrainIntake.pending_tare == False,
-        )
-        .group_by(GrainIntake.culture_id, GrainIntake.owner_id)
-    ).all()
-
-    deductions = session.exec(
-        select(
-            FarmerGrainDeduction.culture_id,
-            FarmerGrainDeduction.owner_id,
-            func.sum(FarmerGrainDeduction.quantity_kg)
-        )
-        .group_by(FarmerGrainDeduction.culture_id, FarmerGrainDeduction.owner_id)
-    ).all()
-    deduction_map = {}
-    for cid, oid, qty in deductions:
-        deduction_map[(cid, oid)] = float(qty or 0)
+    owner_map = reference_names(session, "owners")
 
     farmer_detail_by_culture = {}
-    for cid, oid, total_qty in intake_farmer_totals:
-        total = float(total_qty or 0) - deduction_map.get((cid, oid), 0)
-        if total <= 0:
-            continue
+    for ledger_row in list_farmer_balances(session):
+        cid, oid, total = ledger_row.culture_id, ledger_row.owner_id, ledger_row.qty_kg
         if cid not in farmer_detail_by_culture:
             farmer_detail_by_culture[cid] = []
-        owner = owner_map.get(oid)
         farmer_detail_by_culture[cid].append({
-            "owner_name": owner.full_name if owner else f"ID {oid}",
+            "owner_name": owner_map.get(oid, f"ID {oid}"),
             "quantity_kg": total
         })
 
@@ -3343,7 +3024,7 @@ async def export_stock_summary(
 
 
 @router.get("/stock/export")
-async def export_grain_stock(
+def export_grain_stock(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -3415,7 +3096,7 @@ async def export_grain_stock(
 
 
 @router.patch("/intakes/{intake_id}/quality", response_model=GrainIntakeResponse)
-async def update_intake_quality(
+def update_intake_quality(
     intake_id: int,
     payload: GrainQualityUpdateRequest,
     session: Session = Depends(get_session),
@@ -3439,19 +3120,20 @@ async def update_intake_quality(
     old_accepted = intake.accepted_weight_kg
     was_pending = intake.pending_quality
 
+    # Баланс фермера: відкочуємо старий внесок картки (якщо був), накатуємо новий
+    apply_farmer_intake(session, intake, -1.0)
     intake.impurity_percent = payload.impurity_percent
     intake.pending_quality = False
     intake.accepted_weight_kg = new_accepted
     session.add(intake)
+    apply_farmer_intake(session, intake)
 
     culture = session.get(GrainCulture, intake.culture_id)
     culture_name = culture.name if culture else "-"
     owner_label = "Підприємство" if intake.is_own_grain else (intake.owner_full_name or "Фермер")
 
     if was_pending:
-        stock = _get_or_create_stock(session, intake.culture_id, commit=False)
-        quantity_before = stock.quantity_kg
-        _apply_stock_delta(session, intake.culture_id, new_accepted, intake.is_own_grain, commit=False)
+        stock = _apply_stock_delta(session, intake.culture_id, new_accepted, intake.is_own_grain, commit=False)
         session.add(StockAdjustmentLog(
             stock_type=StockAdjustmentType.GRAIN,
             culture_id=intake.culture_id,
@@ -3460,7 +3142,7 @@ async def update_intake_quality(
             item_name=culture_name,
             transaction_type=TransactionType.ADD,
             amount=new_accepted,
-            quantity_before=quantity_before,
+            quantity_before=stock.quantity_kg - new_accepted,
             quantity_after=stock.quantity_kg,
             user_id=current_admin.id,
             user_full_name=current_admin.full_name,
@@ -3482,9 +3164,7 @@ async def update_intake_quality(
     else:
         delta_accepted = new_accepted - old_accepted
         if abs(delta_accepted) > 0:
-            stock = _get_or_create_stock(session, intake.culture_id, commit=False)
-            quantity_before = stock.quantity_kg
-            _apply_stock_delta(session, intake.culture_id, delta_accepted, intake.is_own_grain, commit=False)
+            stock = _apply_stock_delta(session, intake.culture_id, delta_accepted, intake.is_own_grain, commit=False)
             is_add = delta_accepted > 0
             session.add(StockAdjustmentLog(
                 stock_type=StockAdjustmentType.GRAIN,
@@ -3494,7 +3174,7 @@ async def update_intake_quality(
                 item_name=culture_name,
                 transaction_type=TransactionType.ADD if is_add else TransactionType.SUBTRACT,
                 amount=abs(delta_accepted),
-                quantity_before=quantity_before,
+                quantity_before=stock.quantity_kg - delta_accepted,
                 quantity_after=stock.quantity_kg,
                 user_id=current_admin.id,
                 user_full_name=current_admin.full_name,
@@ -3525,7 +3205,7 @@ async def update_intake_quality(
 
 
 @router.patch("/intakes/{intake_id}", response_model=GrainIntakeResponse)
-async def update_intake(
+def update_intake(
     intake_id: int,
     payload: GrainIntakeUpdateRequest,
     session: Session = Depends(get_session),
@@ -3551,6 +3231,7 @@ async def update_intake(
     old_net = intake.net_weight_kg
     old_accepted = intake.accepted_weight_kg
     old_is_own_grain = intake.is_own_grain
+    old_farmer_share = farmer_intake_share(intake)
 
     # Власник та поле
     if update_data.get("is_own_grain") is True:
@@ -3663,6 +3344,12 @@ async def update_intake(
     session.add(intake)
     session.flush()  # без commit — щоб старе/нове коригування складу залишилось атомарним
 
+    # Баланс фермера: старий внесок картки (власник/культура/вага могли змінитись) → новий
+    if old_farmer_share:
+        old_owner_id, old_share_culture_id, old_share_kg = old_farmer_share
+        apply_farmer_balance_delta(session, old_owner_id, old_share_culture_id, -old_share_kg)
+    apply_farmer_intake(session, intake)
+
     # Коригуємо склад і статистику (відкочуємо старі дельти, накатуємо нові)
     if old_on_stock:
         _apply_stock_delta(session, old_culture_id, -old_accepted, old_is_own_grain, commit=False)
@@ -3705,7 +3392,7 @@ async def update_intake(
 
 
 @router.get("/drivers/{driver_id}/stats", response_model=list[DriverStatResponse])
-async def get_driver_stats(
+def get_driver_stats(
     driver_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -3722,12 +3409,8 @@ async def get_driver_stats(
         select(DriverStat).where(DriverStat.driver_id == driver_id)
     ).all()
 
-    vehicle_map = {
-        v.id: v for v in session.exec(select(VehicleType)).all()
-    }
-    culture_map = {
-        c.id: c for c in session.exec(select(GrainCulture)).all()
-    }
+    vehicle_map = reference_names(session, "vehicle_types")
+    culture_map = reference_names(session, "cultures")
 
     response: list[DriverStatResponse] = []
     for stat in stats:
@@ -3736,13 +3419,9 @@ async def get_driver_stats(
                 driver_id=stat.driver_id,
                 driver_name=driver.full_name,
                 vehicle_type_id=stat.vehicle_type_id,
-                vehicle_type_name=vehicle_map.get(stat.vehicle_type_id).name
-                if vehicle_map.get(stat.vehicle_type_id)
-                else "",
+                vehicle_type_name=vehicle_map.get(stat.vehicle_type_id, ""),
                 culture_id=stat.culture_id,
-                culture_name=culture_map.get(stat.culture_id).name
-                if culture_map.get(stat.culture_id)
-                else "",
+                culture_name=culture_map.get(stat.culture_id, ""),
                 has_trailer=stat.has_trailer,
                 trips=stat.trips,
                 total_net_weight_kg=stat.total_net_weight_kg,
@@ -1,12 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.responses import StreamingResponse, Response
 from sqlmodel import Session, select
-from typing import Optional
+from sqlalchemy import func
+import dataclasses
+from typing import Iterable, Mapping, Optional
 from datetime import datetime, date, time as dtime
 from io import BytesIO
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from backend.cash_ledger import record_cash_movement
 from backend.database import get_session
+from backend.pagination import TOTAL_COUNT_HEADER, paginate, parse_date
+from backend.reference_cache import reference_names
+from backend.stock import change_grain_stock, deduct_shipped_grain, farmer_cover, get_grain_stock
 from backend.models import (
     Landlord,
     LeaseParcel,
@@ -16,11 +22,8 @@ from backend.models import (
     LeasePaymentGrainItem,
     GrainCulture,
     GrainStock,
-    CashRegister,
-    Transaction,
     StockAdjustmentLog,
     StockAdjustmentType,
-    Currency,
     TransactionType,
     User,
 )
@@ -109,25 +112,99 @@ def cash_paid_uah(period_id: int, session: Session) -> float:
     return sum(float(p.amount_uah or 0.0) for p in payments)
 
 
-def build_period_response(period: LeasePeriod, parcel: LeaseParcel, session: Session) -> LeasePeriodResponse:
-    paid_map = grain_paid_kg_map(period.id, session)
+@dataclasses.dataclass
+class LeaseBalanceData:
+    """Усе, що потрібно для балансів ділянок, завантажене пакетом
+    (`load_lease_balances`): відповідь на список ділянок коштує сталу
+    кількість запитів, а не O(ділянки × роки × культури)."""
+    periods: dict = dataclasses.field(default_factory=dict)        # parcel_id -> [LeasePeriod] (year asc)
+    grain_items: dict = dataclasses.field(default_factory=dict)    # period_id -> [LeasePeriodGrainItem]
+    paid_kg: dict = dataclasses.field(default_factory=dict)        # (period_id, culture_id) -> кг
+    paid_cash: dict = dataclasses.field(default_factory=dict)      # period_id -> грн
+    prices: dict = dataclasses.field(default_factory=dict)         # (parcel_id, culture_id) -> поточна ціна
+    culture_names: Mapping[int, str] = dataclasses.field(default_factory=dict)
+
+
+def load_lease_balances(session: Session, parcel_ids: Iterable[int]) -> LeaseBalanceData:
+    """Періоди, зернові позиції, сплачене (кг / грн) і поточні ціни для
+    набору ділянок — чотири згруповані запити незалежно від кількості
+    ділянок, років і культур (назви культур — з кешу довідників)."""
+    data = LeaseBalanceData(culture_names=reference_names(session, "cultures"))
+    parcel_ids = list(set(parcel_ids))
+    if not parcel_ids:
+        return data
+
+    periods = session.exec(
+        select(LeasePeriod)
+        .where(LeasePeriod.parcel_id.in_(parcel_ids))
+        .order_by(LeasePeriod.parcel_id, LeasePeriod.year.asc())
+    ).all()
+    for period in periods:
+        data.periods.setdefault(period.parcel_id, []).append(period)
+    period_ids = [period.id for period in periods]
+    if not period_ids:
+        return data
+
     grain_items = session.exec(
-        select(LeasePeriodGrainItem).where(LeasePeriodGrainItem.period_id == period.id)
+        select(LeasePeriodGrainItem)
+        .where(LeasePeriodGrainItem.period_id.in_(period_ids))
+        .order_by(LeasePeriodGrainItem.id)
+    ).all()
+    for item in grain_items:
+        data.grain_items.setdefault(item.period_id, []).append(item)
+
+    paid_rows = session.exec(
+        select(
+            LeasePayment.period_id,
+            LeasePaymentGrainItem.culture_id,
+            func.sum(func.coalesce(LeasePaymentGrainItem.quantity_kg, 0.0)),
+        )
+        .join(LeasePayment, LeasePayment.id == LeasePaymentGrainItem.payment_id)
+        .where(LeasePayment.period_id.in_(period_ids), LeasePayment.is_cancelled == False)
+        .group_by(LeasePayment.period_id, LeasePaymentGrainItem.culture_id)
     ).all()
+    data.paid_kg = {(period_id, culture_id): float(kg or 0.0) for period_id, culture_id, kg in paid_rows}
+
+    cash_rows = session.exec(
+        select(LeasePayment.period_id, func.sum(func.coalesce(LeasePayment.amount_uah, 0.0)))
+        .where(
+            LeasePayment.period_id.in_(period_ids),
+            LeasePayment.is_cancelled == False,
+            LeasePayment.applies_to == "cash",
+        )
+        .group_by(LeasePayment.period_id)
+    ).all()
+    data.paid_cash = {period_id: float(uah or 0.0) for period_id, uah in cash_rows}
+
+    # Поточна ціна (як у `current_price`): з найновішого періоду ділянки,
+    # де є культура.
+    for period in sorted(periods, key=lambda p: (p.year, p.id), reverse=True):
+        for item in data.grain_items.get(period.id, ()):
+            data.prices.setdefault((period.parcel_id, item.culture_id), float(item.price_per_kg_uah))
+    return data
+
+
+def build_period_response(
+    period: LeasePeriod,
+    parcel: LeaseParcel,
+    session: Session,
+    data: Optional[LeaseBalanceData] = None,
+) -> LeasePeriodResponse:
+    if data is None:
+        data = load_lease_balances(session, [parcel.id])
     items_out = []
     grain_remaining_cash = 0.0
-    for gi in grain_items:
-        culture = session.get(GrainCulture, gi.culture_id)
-        paid = float(paid_map.get(gi.culture_id, 0.0))
+    for gi in data.grain_items.get(period.id, ()):
+        paid = float(data.paid_kg.get((period.id, gi.culture_id), 0.0))
         remaining_kg = max(0.0, float(gi.quantity_kg or 0.0) - paid)
-        cur_price = current_price(parcel.id, gi.culture_id, session)
+        cur_price = data.prices.get((parcel.id, gi.culture_id), 0.0)
         rem_cash = remaining_kg * cur_price
         grain_remaining_cash += rem_cash
         items_out.append(LeasePeriodGrainItemResponse(
             id=gi.id,
             period_id=gi.period_id,
             culture_id=gi.culture_id,
-            culture_name=culture.name if culture else None,
+            culture_name=data.culture_names.get(gi.culture_id),
             quantity_kg=gi.quantity_kg,
             price_per_kg_uah=gi.price_per_kg_uah,
             paid_kg=round(paid, 2),
@@ -137,7 +214,7 @@ def build_period_response(period: LeasePeriod, parcel: LeaseParcel, session: Ses
         ))
 
     cash_oblig_uah = float(period.cash_amount or 0.0) * float(getattr(period, "cash_rate", 1.0) or 1.0)
-    paid_cash = cash_paid_uah(period.id, session)
+    paid_cash = data.paid_cash.get(period.id, 0.0)
     cash_remaining = max(0.0, cash_oblig_uah - paid_cash)
     remaining_total = round(grain_remaining_cash + cash_remaining, 2)
 
@@ -160,11 +237,16 @@ def build_period_response(period: LeasePeriod, parcel: LeaseParcel, session: Ses
     )
 
 
-def build_parcel_response(parcel: LeaseParcel, session: Session) -> LeaseParcelResponse:
-    periods = session.exec(
-        select(LeasePeriod).where(LeasePeriod.parcel_id == parcel.id).order_by(LeasePeriod.year.asc())
-    ).all()
-    period_out = [build_period_response(p, parcel, session) for p in periods]
+def build_parcel_response(
+    parcel: LeaseParcel,
+    session: Session,
+    data: Optional[LeaseBalanceData] = None,
+) -> LeaseParcelResponse:
+    """Ділянка з періодами. Для списку ділянок передавайте `data` з
+    `load_lease_balances` по всіх них — інакше дані вантажаться на ділянку."""
+    if data is None:
+        data = load_lease_balances(session, [parcel.id])
+    period_out = [build_period_response(p, parcel, session, data) for p in data.periods.get(parcel.id, ())]
     cumulative = round(sum(p.remaining_cash_uah for p in period_out), 2)
     return LeaseParcelResponse(
         id=parcel.id,
@@ -183,35 +265,67 @@ def build_parcel_response(parcel: LeaseParcel, session: Session) -> LeaseParcelR
     )
 
 
+def _load_payment_refs(session: Session, payments: list) -> tuple[dict, dict, dict]:
+    """Ділянки, періоди і зернові позиції для набору виплат — три IN-запити
+    замість кількох `session.get` на кожну виплату."""
+    parcel_ids = {p.parcel_id for p in payments}
+    period_ids = {p.period_id for p in payments}
+    payment_ids = [p.id for p in payments]
+    parcels = {
+        parcel.id: parcel
+        for parcel in session.exec(select(LeaseParcel).where(LeaseParcel.id.in_(parcel_ids))).all()
+    } if parcel_ids else {}
+    periods = {
+        period.id: period
+        for period in session.exec(select(LeasePeriod).where(LeasePeriod.id.in_(period_ids))).all()
+    } if period_ids else {}
+    grain_items: dict = {}
+    if payment_ids:
+        for gi in session.exec(
+            select(LeasePaymentGrainItem)
+            .where(LeasePaymentGrainItem.payment_id.in_(payment_ids))
+            .order_by(LeasePaymentGrainItem.id)
+        ).all():
+            grain_items.setdefault(gi.payment_id, []).append(gi)
+    return parcels, periods, grain_items
+
+
+def build_payment_responses(payments: list, session: Session) -> list[LeasePaymentResponse]:
+    """Відповіді для списку виплат за сталу кількість запитів (назви культур і
+    користувачів — з кешу довідників)."""
+    parcels, periods, grain_items = _load_payment_refs(session, payments)
+    cultures = reference_names(session, "cultures")
+    users = reference_names(session, "users")
+    result = []
+    for payment in payments:
+        grain_out = []
+        for gi in grain_items.get(payment.id, ()):
+            gi_dict = gi.model_dump()
+            gi_dict["culture_name"] = cultures.get(gi.culture_id)
+            grain_out.append(LeasePaymentGrainItemResponse(**gi_dict))
+
+        parcel = parcels.get(payment.parcel_id)
+        period = periods.get(payment.period_id)
+        payment_dict = payment.model_dump()
+        payment_dict["grain_items"] = grain_out or None
+        payment_dict["landlord_full_name"] = parcel.landlord_full_name if parcel else None
+        payment_dict["area_ha"] = parcel.area_ha if parcel else None
+        payment_dict["label"] = parcel.label if parcel else None
+        payment_dict["period_year"] = period.year if period else None
+        if payment.created_by_user_id:
+            payment_dict["created_by_user_full_name"] = users.get(payment.created_by_user_id)
+        result.append(LeasePaymentResponse(**payment_dict))
+    return result
+
+
 def build_payment_response(payment: LeasePayment, session: Session) -> LeasePaymentResponse:
-    parcel = session.get(LeaseParcel, payment.parcel_id)
-    period = session.get(LeasePeriod, payment.period_id)
-    grain_items = session.exec(
-        select(LeasePaymentGrainItem).where(LeasePaymentGrainItem.payment_id == payment.id)
-    ).all()
-    grain_out = []
-    for gi in grain_items:
-        culture = session.get(GrainCulture, gi.culture_id)
-        gi_dict = gi.model_dump()
-        gi_dict["culture_name"] = culture.name if culture else None
-        grain_out.append(LeasePaymentGrainItemResponse(**gi_dict))
-
-    payment_dict = payment.model_dump()
-    payment_dict["grain_items"] = grain_out or None
-    payment_dict["landlord_full_name"] = parcel.landlord_full_name if parcel else None
-    payment_dict["area_ha"] = parcel.area_ha if parcel else None
-    payment_dict["label"] = parcel.label if parcel else None
-    payment_dict["period_year"] = period.year if period else None
-    if payment.created_by_user_id:
-        user = session.get(User, payment.created_by_user_id)
-        payment_dict["created_by_user_full_name"] = user.full_name if user else None
-    return LeasePaymentResponse(**payment_dict)
+    return build_payment_responses([payment], session)[0]
 
 
 # ===== Landlords =====
 
 @router.get("/landlords", response_model=list[LandlordResponse])
-async def list_landlords(
+def list_landlords(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     q: Optional[str] = Query(None, description="Пошук за ПІБ")
@@ -224,7 +338,7 @@ async def list_landlords(
 
 
 @router.post("/landlords", response_model=LandlordResponse)
-async def create_landlord(
+def create_landlord(
     payload: LandlordCreate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -248,7 +362,7 @@ async def create_landlord(
 
 
 @router.patch("/landlords/{landlord_id}", response_model=LandlordResponse)
-async def update_landlord(
+def update_landlord(
     landlord_id: int,
     payload: LandlordUpdate,
     session: Session = Depends(get_session),
@@ -288,7 +402,7 @@ async def update_landlord(
 
 
 @router.delete("/landlords/{landlord_id}", response_model=LandlordResponse)
-async def delete_landlord(
+def delete_landlord(
     landlord_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -318,7 +432,7 @@ async def delete_landlord(
 # ===== Parcels (ділянки) =====
 
 @router.get("/parcels", response_model=list[LeaseParcelResponse])
-async def list_parcels(
+def list_parcels(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     landlord_id: Optional[int] = Query(None, description="Фільтр за орендодавцем"),
@@ -331,11 +445,12 @@ async def list_parcels(
     if is_active is not None:
         query = query.where(LeaseParcel.is_active == is_active)
     parcels = session.exec(query.order_by(LeaseParcel.created_at.desc())).all()
-    return [build_parcel_response(p, session) for p in parcels]
+    data = load_lease_balances(session, [p.id for p in parcels])
+    return [build_parcel_response(p, session, data) for p in parcels]
 
 
 @router.get("/parcels/{parcel_id}", response_model=LeaseParcelResponse)
-async def get_parcel(
+def get_parcel(
     parcel_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
@@ -347,7 +462,7 @@ async def get_parcel(
 
 
 @router.post("/parcels", response_model=LeaseParcelResponse)
-async def create_parcel(
+def create_parcel(
     payload: LeaseParcelCreate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -386,7 +501,7 @@ async def create_parcel(
 
 
 @router.patch("/parcels/{parcel_id}", response_model=LeaseParcelResponse)
-async def update_parcel(
+def update_parcel(
     parcel_id: int,
     payload: LeaseParcelUpdate,
     session: Session = Depends(get_session),
@@ -416,7 +531,7 @@ async def update_parcel(
 
 
 @router.delete("/parcels/{parcel_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_parcel(
+def delete_parcel(
     parcel_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -478,7 +593,7 @@ async def delete_parcel(
 # ===== Periods (роки) =====
 
 @router.get("/parcels/{parcel_id}/periods", response_model=list[LeasePeriodResponse])
-async def list_periods(
+def list_periods(
     parcel_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
@@ -486,10 +601,8 @@ async def list_periods(
     parcel = session.get(LeaseParcel, parcel_id)
     if not parcel:
         raise HTTPException(status_code=404, detail="Ділянку не знайдено")
-    periods = session.exec(
-        select(LeasePeriod).where(LeasePeriod.parcel_id == parcel_id).order_by(LeasePeriod.year.asc())
-    ).all()
-    return [build_period_response(p, parcel, session) for p in periods]
+    data = load_lease_balances(session, [parcel_id])
+    return [build_period_response(p, parcel, session, data) for p in data.periods.get(parcel_id, ())]
 
 
 def _build_period(parcel: LeaseParcel, payload: LeasePeriodCreate, session: Session) -> LeasePeriod:
@@ -554,7 +667,7 @@ def _build_period(parcel: LeaseParcel, payload: LeasePeriodCreate, session: Sess
 
 
 @router.post("/parcels/{parcel_id}/periods", response_model=LeasePeriodResponse)
-async def open_period(
+def open_period(
     parcel_id: int,
     payload: LeasePeriodCreate,
     session: Session = Depends(get_session),
@@ -574,7 +687,7 @@ async def open_period(
 
 
 @router.patch("/periods/{period_id}", response_model=LeasePeriodResponse)
-async def update_period(
+def update_period(
     period_id: int,
     payload: LeasePeriodUpdate,
     session: Session = Depends(get_session),
@@ -630,7 +743,7 @@ async def update_period(
 
 
 @router.delete("/periods/{period_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_period(
+def delete_period(
     period_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -658,7 +771,7 @@ async def delete_period(
 
 
 @router.get("/periods/{period_id}/balance", response_model=LeasePeriodResponse)
-async def get_period_balance(
+def get_period_balance(
     period_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -673,13 +786,27 @@ async def get_period_balance(
 # ===== Payments =====
 
 @router.get("/payments", response_model=list[LeasePaymentResponse])
-async def list_payments(
+def list_payments(
+    response: Response,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     parcel_id: Optional[int] = Query(None),
     period_id: Optional[int] = Query(None),
     landlord_id: Optional[int] = Query(None),
+    start_date: Optional[str] = Query(None, description="ISO YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="ISO YYYY-MM-DD включно"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Розмір сторінки (без нього — усі виплати)"),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Курсор з X-Next-Cursor попередньої сторінки"),
+    with_total: bool = Query(False, description="Порахувати X-Total-Count"),
 ):
+    """Виплати. `start_date`/`end_date` — діапазон дати виплати.
+
+    Без `limit` — усі виплати: спершу активні, далі за датою виплати від
+    новіших (так їх показують картка орендодавця й вкладка виплат). З `limit` —
+    сторінка журналу через `paginate`: keyset по `(created_at, id)` від новіших.
+    Порядок «активні, потім `payment_date`» сторінками лише через offset —
+    `is_cancelled` змінюється при скасуванні, і курсор по ньому не стабільний."""
     query = select(LeasePayment)
     if parcel_id:
         query = query.where(LeasePayment.parcel_id == parcel_id)
@@ -691,10 +818,25 @@ async def list_payments(
                 select(LeaseParcel.id).where(LeaseParcel.landlord_id == landlord_id)
             )
         )
-    payments = session.exec(
-        query.order_by(LeasePayment.is_cancelled.asc(), LeasePayment.payment_date.desc())
-    ).all()
-    return [build_payment_response(p, session) for p in payments]
+    start_dt = parse_date(start_date)
+    end_dt = parse_date(end_date, end=True)
+    if start_dt:
+        query = query.where(LeasePayment.payment_date >= start_dt)
+    if end_dt:
+        query = query.where(LeasePayment.payment_date <= end_dt)
+
+    if limit is not None:
+        payments = paginate(
+            session, response, query, LeasePayment,
+            limit=limit, offset=offset, cursor=cursor, with_total=with_total,
+        )
+    else:
+        payments = session.exec(query.order_by(
+            LeasePayment.is_cancelled.asc(), LeasePayment.payment_date.desc(), LeasePayment.id.desc()
+        )).all()
+        if with_total:
+            response.headers[TOTAL_COUNT_HEADER] = str(len(payments))
+    return build_payment_responses(payments, session)
 
 
 def _deduct_grain_from_stock(culture_id, qty, contract_label, current_user, session):
@@ -702,33 +844,36 @@ def _deduct_grain_from_stock(culture_id, qty, contract_label, current_user, sess
     з-під невикупленого у фермерів (farmer_quantity_kg — лічильник боргу, не
     змінюється), решта — з own_quantity_kg. Повертає (from_own, from_farmer_virtual)."""
     culture = session.get(GrainCulture, culture_id)
-    stock = session.exec(select(GrainStock).where(GrainStock.culture_id == culture_id)).first()
-    if not stock:
-        raise HTTPException(status_code=400, detail=f"На складі немає культури '{culture.name if culture else '?'}'")
-    if float(stock.quantity_kg or 0.0) < qty - EPS:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Недостатньо '{culture.name}' на складі: є {stock.quantity_kg:.2f} кг, потрібно {qty:.2f} кг"
-        )
-    quantity_before = stock.quantity_kg
-    remaining = float(qty)
-    farmer_virtual = 0.0
-    fq = float(stock.farmer_quantity_kg or 0.0)
-    if fq > 0:
-        farmer_virtual = min(remaining, fq)
-        remaining -= farmer_virtual
-    oq = float(stock.own_quantity_kg or 0.0)
-    take_own = min(remaining, oq)
-    if remaining - take_own > EPS:
+    qty = float(qty)
+    # Перевірка і списання — один UPDATE: між ними ніхто не забере те саме зерно.
+    stock = deduct_shipped_grain(
+        session, culture_id, qty,
+        create=False,
+        where=[
+            GrainStock.quantity_kg >= qty - EPS,
+            func.coalesce(GrainStock.own_quantity_kg, 0.0) >= qty - farmer_cover(qty) - EPS,
+        ],
+        clamp=("quantity_kg", "own_quantity_kg"),
+    )
+    if stock is None:
+        current = get_grain_stock(session, culture_id)
+        if not current:
+            raise HTTPException(status_code=400, detail=f"На складі немає культури '{culture.name if culture else '?'}'")
+        if float(current.quantity_kg or 0.0) < qty - EPS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Недостатньо '{culture.name}' на складі: є {current.quantity_kg:.2f} кг, потрібно {qty:.2f} кг"
+            )
+        farmer_virtual = min(qty, max(float(current.farmer_quantity_kg or 0.0), 0.0))
         raise HTTPException(
             status_code=400,
             detail=f"Недостатньо власного зерна '{culture.name}' на складі для цієї виплати "
                    f"(після частки {farmer_virtual:.2f} кг під «невикуплене» потрібно ще "
-                   f"{remaining:.2f} кг з own, є {oq:.2f} кг)."
+                   f"{qty - farmer_virtual:.2f} кг з own, є {float(current.own_quantity_kg or 0.0):.2f} кг)."
         )
-    stock.own_quantity_kg = max(0.0, oq - take_own)
-    stock.quantity_kg = max(0.0, float(stock.quantity_kg or 0.0) - float(qty))
-    session.add(stock)
+    # farmer_quantity_kg не змінився — частка «під невикуплене» рахується від нього
+    farmer_virtual = min(qty, max(float(stock.farmer_quantity_kg or 0.0), 0.0))
+    take_own = qty - farmer_virtual
 
     dest = f"Виплата орендодавцю: {contract_label}"
     if farmer_virtual > EPS:
@@ -738,8 +883,8 @@ def _deduct_grain_from_stock(culture_id, qty, contract_label, current_user, sess
         culture_id=culture_id,
         item_name=culture.name if culture else "?",
         transaction_type=TransactionType.SUBTRACT,
-        amount=float(qty),
-        quantity_before=quantity_before,
+        amount=qty,
+        quantity_before=stock.quantity_kg + qty,
         quantity_after=stock.quantity_kg,
         user_id=current_user.id,
         user_full_name=current_user.full_name,
@@ -750,33 +895,13 @@ def _deduct_grain_from_stock(culture_id, qty, contract_label, current_user, sess
 
 
 def _deduct_cash(currency_str, amount, description, current_user, session):
-    cash_register = session.exec(select(CashRegister)).first()
-    if not cash_register:
-        raise HTTPException(status_code=400, detail="Касу не знайдено")
-    balance_field_map = {"UAH": "uah_balance", "USD": "usd_balance", "EUR": "eur_balance"}
-    balance_field = balance_field_map.get(currency_str, "uah_balance")
-    current_balance = getattr(cash_register, balance_field)
-    setattr(cash_register, balance_field, current_balance - amount)
-    cash_register.updated_at = datetime.utcnow()
-    session.add(cash_register)
-    try:
-        currency_enum = Currency(currency_str)
-    except ValueError:
-        currency_enum = Currency.UAH
-    session.add(Transaction(
-        currency=currency_enum,
-        amount=amount,
-        transaction_type=TransactionType.SUBTRACT,
-        user_id=current_user.id,
-        description=description,
-        uah_balance_after=cash_register.uah_balance,
-        usd_balance_after=cash_register.usd_balance,
-        eur_balance_after=cash_register.eur_balance,
-    ))
+    record_cash_movement(
+        session, currency_str, amount, TransactionType.SUBTRACT, current_user.id, description
+    )
 
 
 @router.post("/payments", response_model=LeasePaymentResponse)
-async def create_payment(
+def create_payment(
     payload: LeasePaymentCreate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -932,7 +1057,7 @@ async def create_payment(
 
 
 @router.post("/payments/{payment_id}/cancel", response_model=LeasePaymentResponse)
-async def cancel_payment(
+def cancel_payment(
     payment_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -956,25 +1081,23 @@ async def cancel_payment(
             if not item.quantity_kg or item.quantity_kg <= 0:
                 continue
             culture = session.get(GrainCulture, item.culture_id)
-            stock = session.exec(select(GrainStock).where(GrainStock.culture_id == item.culture_id)).first()
+            from_own = float(item.from_own_kg or 0.0)
+            from_farmer = float(item.from_farmer_kg or 0.0)
+            total = float(item.quantity_kg or 0.0)
+            if from_own <= 0 and from_farmer <= 0:
+                from_own = total
+            stock = change_grain_stock(
+                session, item.culture_id, create=False,
+                own_quantity_kg=from_own, farmer_quantity_kg=from_farmer, quantity_kg=total,
+            )
             if stock:
-                quantity_before = stock.quantity_kg
-                from_own = float(item.from_own_kg or 0.0)
-                from_farmer = float(item.from_farmer_kg or 0.0)
-                total = float(item.quantity_kg or 0.0)
-                if from_own <= 0 and from_farmer <= 0:
-                    from_own = total
-                stock.own_quantity_kg += from_own
-                stock.farmer_quantity_kg += from_farmer
-                stock.quantity_kg += total
-                session.add(stock)
                 session.add(StockAdjustmentLog(
                     stock_type=StockAdjustmentType.GRAIN,
                     culture_id=item.culture_id,
                     item_name=culture.name if culture else "?",
                     transaction_type=TransactionType.ADD,
                     amount=item.quantity_kg,
-                    quantity_before=quantity_before,
+                    quantity_before=stock.quantity_kg - total,
                     quantity_after=stock.quantity_kg,
                     user_id=current_user.id,
                     user_full_name=current_user.full_name,
@@ -982,29 +1105,10 @@ async def cancel_payment(
                     destination=f"Скасування виплати #{payment.id} ({label})",
                 ))
     elif payment.payment_type == "cash" and payment.amount:
-        cash_register = session.exec(select(CashRegister)).first()
-        if cash_register:
-            currency_str = payment.currency or "UAH"
-            balance_field_map = {"UAH": "uah_balance", "USD": "usd_balance", "EUR": "eur_balance"}
-            balance_field = balance_field_map.get(currency_str, "uah_balance")
-            current_balance = getattr(cash_register, balance_field)
-            setattr(cash_register, balance_field, current_balance + payment.amount)
-            cash_register.updated_at = datetime.utcnow()
-            session.add(cash_register)
-            try:
-                currency_enum = Currency(currency_str)
-            except ValueError:
-                currency_enum = Currency.UAH
-            session.add(Transaction(
-                currency=currency_enum,
-                amount=payment.amount,
-                transaction_type=TransactionType.ADD,
-                user_id=current_user.id,
-                description=f"Скасування виплати #{payment.id} ({label})",
-                uah_balance_after=cash_register.uah_balance,
-                usd_balance_after=cash_register.usd_balance,
-                eur_balance_after=cash_register.eur_balance,
-            ))
+        record_cash_movement(
+            session, payment.currency, payment.amount, TransactionType.ADD, current_user.id,
+            f"Скасування виплати #{payment.id} ({label})",
+        )
 
     payment.is_cancelled = True
     payment.updated_at = datetime.utcnow()
@@ -1073,7 +1177,7 @@ TERMS_LABEL = {"grain": "Зерно", "cash": "Гроші", "grain_cash": "Гр
 
 
 @router.get("/landlords/export")
-async def export_landlords(
+def export_landlords(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     search: str | None = None
@@ -1105,7 +1209,7 @@ async def export_landlords(
 
 
 @router.get("/parcels/export")
-async def export_parcels(
+def export_parcels(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     landlord_id: int | None = None,
@@ -1115,6 +1219,7 @@ async def export_parcels(
     if landlord_id:
         query = query.where(LeaseParcel.landlord_id == landlord_id)
     parcels = session.exec(query).all()
+    data = load_lease_balances(session, [p.id for p in parcels])
 
     wb = Workbook()
     ws = wb.active
@@ -1122,7 +1227,7 @@ async def export_parcels(
     headers = ["Орендодавець", "Кількість, га", "Примітка", "Умови", "Роки", "Накопич. борг, грн", "Статус"]
     _apply_header(ws, headers)
     for p in parcels:
-        resp = build_parcel_response(p, session)
+        resp = build_parcel_response(p, session, data)
         years = ", ".join(str(per.year) for per in resp.periods) or "-"
         ws.append([
             p.landlord_full_name,
@@ -1142,7 +1247,7 @@ async def export_parcels(
 
 
 @router.get("/parcels/debt-export")
-async def export_parcels_debt(
+def export_parcels_debt(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
 ):
@@ -1150,6 +1255,7 @@ async def export_parcels_debt(
     parcels = session.exec(
         select(LeaseParcel).order_by(LeaseParcel.landlord_full_name, LeaseParcel.id)
     ).all()
+    data = load_lease_balances(session, [p.id for p in parcels])
 
     wb = Workbook()
     ws = wb.active
@@ -1159,7 +1265,7 @@ async def export_parcels_debt(
     debt_fill = PatternFill("solid", fgColor="FEF3C7")
 
     for p in parcels:
-        resp = build_parcel_response(p, session)
+        resp = build_parcel_response(p, session, data)
         if resp.cumulative_balance_uah <= EPS:
             continue
         details = []
@@ -1189,7 +1295,7 @@ async def export_parcels_debt(
 
 
 @router.get("/payments/export")
-async def export_payments(
+def export_payments(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     landlord_id: int | None = None,
@@ -1224,6 +1330,8 @@ async def export_payments(
             pass
 
     payments = session.exec(query).all()
+    parcels, periods, payment_grain_items = _load_payment_refs(session, payments)
+    cultures = reference_names(session, "cultures")
 
     wb = Workbook()
     ws = wb.active
@@ -1235,18 +1343,15 @@ async def export_payments(
     cancelled_fill = PatternFill("solid", fgColor="FECACA")
 
     for p in payments:
-        parcel = session.get(LeaseParcel, p.parcel_id)
-        period = session.get(LeasePeriod, p.period_id)
-        grain_items = session.exec(
-            select(LeasePaymentGrainItem).where(LeasePaymentGrainItem.payment_id == p.id)
-        ).all()
+        parcel = parcels.get(p.parcel_id)
+        period = periods.get(p.period_id)
+        grain_items = payment_grain_items.get(p.id, ())
         if p.payment_type == "cash":
             sum_text = f"{p.amount:.2f} {p.currency or 'UAH'}"
         elif grain_items:
             parts = []
             for gi in grain_items:
-                culture = session.get(GrainCulture, gi.culture_id)
-                parts.append(f"{culture.name if culture else '?'}: {gi.quantity_kg:.2f} кг")
+                parts.append(f"{cultures.get(gi.culture_id, '?')}: {gi.quantity_kg:.2f} кг")
             sum_text = "; ".join(parts)
         else:
             sum_text = "-"
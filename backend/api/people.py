@@ -1,22 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
-from sqlalchemy import or_
+from sqlalchemy import func, or_
 from typing import Optional
 from datetime import datetime, date, time as dtime
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+import heapq
 
-from backend.database import get_session
+from backend.database import get_session, stream_rows
+from backend.exports import XlsxExport, MONEY_FORMAT
+from backend.reference_cache import reference_names
 from backend.models import (
     Person,
     User,
     FarmerContract,
     FarmerContractPayment,
     FarmerGrainMovement,
-    GrainCulture,
-    GrainOwner,
 )
 from backend.schemas import (
     PersonCreate,
@@ -25,50 +22,17 @@ from backend.schemas import (
     PersonActionResponse,
 )
 from backend.auth import get_current_user
+from backend.balances import list_person_balances
 
 router = APIRouter()
 
 
-# ── Стиль для Excel-звітів (узгоджений з іншими експортами) ──
-_HEADER_FILL = PatternFill("solid", fgColor="1F2937")
-_HEADER_FONT = Font(color="FFFFFF", bold=True)
-_HEADER_ALIGN = Alignment(horizontal="center", vertical="center")
-_THIN_BORDER = Border(
-    left=Side(style="thin", color="E5E7EB"),
-    right=Side(style="thin", color="E5E7EB"),
-    top=Side(style="thin", color="E5E7EB"),
-    bottom=Side(style="thin", color="E5E7EB"),
-)
-_ALT_FILL = PatternFill("solid", fgColor="F8FAFC")
-
-
-def _style_header(sheet, headers):
-    for col in range(1, len(headers) + 1):
-        cell = sheet.cell(row=1, column=col)
-        cell.fill = _HEADER_FILL
-        cell.font = _HEADER_FONT
-        cell.alignment = _HEADER_ALIGN
-        cell.border = _THIN_BORDER
-
-
-def _style_body(sheet, headers, number_columns=()):
-    for row in range(2, sheet.max_row + 1):
-        row_fill = _ALT_FILL if row % 2 == 0 else None
-        for col in range(1, len(headers) + 1):
-            cell = sheet.cell(row=row, column=col)
-            cell.border = _THIN_BORDER
-            if row_fill:
-                cell.fill = row_fill
-            if col in number_columns:
-                cell.number_format = "#,##0.00"
-
-
 def _clean_name(value: str) -> str:
     return " ".join(value.split()).strip()
 
 
 @router.get("", response_model=list[PersonResponse])
-async def list_people(
+def list_people(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     q: Optional[str] = Query(default=None, description="Пошук за ПІБ або телефоном"),
@@ -82,7 +46,7 @@ async def list_people(
 
 
 @router.post("", response_model=PersonResponse)
-async def create_person(
+def create_person(
     payload: PersonCreate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
@@ -101,7 +65,7 @@ async def create_person(
 
 
 @router.patch("/{person_id}", response_model=PersonResponse)
-async def update_person(
+def update_person(
     person_id: int,
     payload: PersonUpdate,
     session: Session = Depends(get_session),
@@ -130,7 +94,7 @@ async def update_person(
 
 
 @router.get("/{person_id}/actions", response_model=list[PersonActionResponse])
-async def list_person_actions(
+def list_person_actions(
     person_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
@@ -140,9 +104,9 @@ async def list_person_actions(
     if not person:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Людину не знайдено")
 
-    cultures_map = {c.id: c.name for c in session.exec(select(GrainCulture)).all()}
-    owners_map = {o.id: o.full_name for o in session.exec(select(GrainOwner)).all()}
-    people_map = {p.id: p.full_name for p in session.exec(select(Person)).all()}
+    cultures_map = reference_names(session, "cultures")
+    owners_map = reference_names(session, "owners")
+    people_map = reference_names(session, "people")
 
     actions: list[PersonActionResponse] = []
 
@@ -244,109 +208,42 @@ async def list_person_actions(
 
 
 @router.get("/{person_id}/balance")
-async def get_person_balance(
+def get_person_balance(
     person_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
 ):
     """Залишок зерна на балансі людини по культурах.
 
-    Розраховується як сума переказів `to_person_id` мінус витрати у контрактах
-    (видача/прийом за контрактом). Зараз контрактна логіка для людини оперує
-    лише грошима, тому витрати = 0 — лишається повна сума переказів.
+    Читається з журналу `person_grain_balances`: перекази `to_person_id` мінус
+    перекази від людини, GRAIN-оплати і викуп (FROM_FARMER) по її контрактах.
     """
     person = session.get(Person, person_id)
     if not person:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Людину не знайдено")
 
-    cultures_map = {c.id: c.name for c in session.exec(select(GrainCulture)).all()}
-
-    incoming = session.exec(
-        select(FarmerGrainMovement).where(
-            FarmerGrainMovement.to_person_id == person_id,
-            FarmerGrainMovement.movement_type == "transfer",
-        )
-    ).all()
-
-    # OUT-перекази від цієї людини (зокрема людина → підприємство)
-    outgoing = session.exec(
-        select(FarmerGrainMovement).where(
-            FarmerGrainMovement.from_person_id == person_id,
-            FarmerGrainMovement.movement_type == "transfer",
-        )
-    ).all()
-
-    totals: dict[int, float] = {}
-    for m in incoming:
-        totals[m.culture_id] = totals.get(m.culture_id, 0.0) + (m.quantity_kg or 0.0)
-    for m in outgoing:
-        totals[m.culture_id] = totals.get(m.culture_id, 0.0) - (m.quantity_kg or 0.0)
-
-    # Витрати:
-    #  1) GRAIN-оплати по DEBT-контрактах (людина платить за свій борг зерном)
-    #  2) FROM_FARMER GRAIN-позиції у PAYMENT-контрактах (викуп: зерно одразу йде у нас)
-    from backend.models import (
-        FarmerContractPayment, FarmerContractPaymentType,
-        FarmerContractItem, FarmerContractItemDirection, FarmerContractItemType,
-        FarmerContractStatus,
-    )
-    active_contracts = session.exec(
-        select(FarmerContract).where(
-            FarmerContract.person_id == person_id,
-            FarmerContract.status != FarmerContractStatus.CANCELLED.value,
-        )
-    ).all()
-    contract_ids = [c.id for c in active_contracts]
-    if contract_ids:
-        spent_payments = session.exec(
-            select(FarmerContractPayment).where(
-                FarmerContractPayment.contract_id.in_(contract_ids),
-                FarmerContractPayment.payment_type == FarmerContractPaymentType.GRAIN.value,
-                FarmerContractPayment.is_cancelled == False,
-            )
-        ).all()
-        for p in spent_payments:
-            if p.culture_id is None:
-                continue
-            totals[p.culture_id] = totals.get(p.culture_id, 0.0) - (p.quantity_kg or 0.0)
-
-        spent_payment_items = session.exec(
-            select(FarmerContractItem).where(
-                FarmerContractItem.contract_id.in_(contract_ids),
-                FarmerContractItem.direction == FarmerContractItemDirection.FROM_FARMER.value,
-                FarmerContractItem.item_type == FarmerContractItemType.GRAIN.value,
-            )
-        ).all()
-        for it in spent_payment_items:
-            if it.culture_id is None:
-                continue
-            totals[it.culture_id] = totals.get(it.culture_id, 0.0) - (it.delivered_kg or 0.0)
+    cultures_map = reference_names(session, "cultures")
 
     return [
         {
-            "culture_id": cid,
-            "culture_name": cultures_map.get(cid, "—"),
-            "quantity_kg": round(qty, 4),
+            "culture_id": b.culture_id,
+            "culture_name": cultures_map.get(b.culture_id, "—"),
+            "quantity_kg": round(b.qty_kg, 4),
         }
-        for cid, qty in sorted(totals.items())
-        if qty > 0.0001
+        for b in sorted(list_person_balances(session, person_id), key=lambda b: b.culture_id)
     ]
 
 
 @router.get("/export")
-async def export_people(
+def export_people(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
 ):
     """Експорт списку людей у Excel."""
     people = session.exec(select(Person).order_by(Person.full_name)).all()
 
-    wb = Workbook()
-    sheet = wb.active
-    sheet.title = "Люди"
-    headers = ["ПІБ", "Телефон", "Дата створення"]
-    sheet.append(headers)
-    _style_header(sheet, headers)
+    book = XlsxExport()
+    sheet = book.sheet("Люди", ["ПІБ", "Телефон", "Дата створення"], widths=[28, 22, 18])
 
     for p in people:
         sheet.append([
@@ -355,26 +252,11 @@ async def export_people(
             p.created_at.strftime("%Y-%m-%d %H:%M") if p.created_at else "-",
         ])
 
-    _style_body(sheet, headers)
-    sheet.freeze_panes = "A2"
-    if sheet.max_row > 1:
-        sheet.auto_filter.ref = f"A1:C{sheet.max_row}"
-    for idx, width in enumerate([28, 22, 18], start=1):
-        sheet.column_dimensions[chr(64 + idx)].width = width
-
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    filename = f"people_{date.today().isoformat()}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    return book.to_response(f"people_{date.today().isoformat()}.xlsx")
 
 
 @router.get("/actions/export")
-async def export_people_actions(
+def export_people_actions(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     person_id: Optional[int] = Query(default=None, description="Фільтр по конкретній людині"),
@@ -408,102 +290,127 @@ async def export_people_actions(
         # Все ж поверне порожній звіт зі заголовками
         people = []
 
-    cultures_map = {c.id: c.name for c in session.exec(select(GrainCulture)).all()}
-    owners_map = {o.id: o.full_name for o in session.exec(select(GrainOwner)).all()}
+    cultures_map = reference_names(session, "cultures")
+    owners_map = reference_names(session, "owners")
     people_map = {p.id: p.full_name for p in people}
 
-    rows: list[dict] = []
+    def in_range(query, column):
+        if start_dt:
+            query = query.where(column >= start_dt)
+        if end_dt:
+            query = query.where(column <= end_dt)
+        return query.order_by(column.desc())
+
+    # Кожне джерело — окремий серверний курсор, відсортований за датою (desc);
+    # у звіт вони зливаються потоково через heapq.merge.
+    sources = []
 
     if not action_type or action_type == "contract":
-        contracts_q = select(FarmerContract)
+        contracts_q = select(
+            FarmerContract.id,
+            FarmerContract.person_id,
+            FarmerContract.contract_type,
+            FarmerContract.total_value_uah,
+            FarmerContract.created_at,
+        )
         if person_id:
             contracts_q = contracts_q.where(FarmerContract.person_id == person_id)
         else:
             contracts_q = contracts_q.where(FarmerContract.person_id.is_not(None))
-        contracts = session.exec(contracts_q).all()
-        for c in contracts:
-            ts = c.created_at
-            if start_dt and ts and ts < start_dt:
-                continue
-            if end_dt and ts and ts > end_dt:
-                continue
-            rows.append({
-                "ts": ts,
-                "person": people_map.get(c.person_id, f"#{c.person_id}"),
-                "type": "Контракт",
-                "description": f"Контракт #{c.id} ({c.contract_type})",
-                "qty": None,
-                "amount": c.total_value_uah or 0.0,
-                "culture": "",
-            })
+
+        def contract_rows(query):
+            for c in stream_rows(session, query):
+                yield {
+                    "ts": c.created_at,
+                    "person": people_map.get(c.person_id, f"#{c.person_id}"),
+                    "type": "Контракт",
+                    "description": f"Контракт #{c.id} ({c.contract_type})",
+                    "qty": None,
+                    "amount": c.total_value_uah or 0.0,
+                    "culture": "",
+                }
+
+        sources.append(contract_rows(in_range(contracts_q, FarmerContract.created_at)))
 
     if not action_type or action_type == "contract_payment":
         # Усі платежі по контрактах, де контракт прив'язаний до людини
-        person_contracts = session.exec(
-            select(FarmerContract).where(FarmerContract.person_id.is_not(None))
-            if not person_id
-            else select(FarmerContract).where(FarmerContract.person_id == person_id)
-        ).all()
-        person_contract_ids = [c.id for c in person_contracts]
-        person_contract_to_person = {c.id: c.person_id for c in person_contracts}
-        if person_contract_ids:
-            payments = session.exec(
-                select(FarmerContractPayment).where(FarmerContractPayment.contract_id.in_(person_contract_ids))
-            ).all()
-            for p in payments:
-                ts = p.payment_date or p.created_at
-                if start_dt and ts and ts < start_dt:
-                    continue
-                if end_dt and ts and ts > end_dt:
-                    continue
-                pid = person_contract_to_person.get(p.contract_id)
+        payment_ts = func.coalesce(FarmerContractPayment.payment_date, FarmerContractPayment.created_at)
+        payments_q = (
+            select(
+                FarmerContractPayment.contract_id,
+                FarmerContractPayment.item_name,
+                FarmerContractPayment.payment_type,
+                FarmerContractPayment.is_cancelled,
+                FarmerContractPayment.quantity_kg,
+                FarmerContractPayment.amount_uah,
+                FarmerContractPayment.culture_id,
+                FarmerContract.person_id,
+                payment_ts.label("ts"),
+            )
+            .join(FarmerContract, FarmerContract.id == FarmerContractPayment.contract_id)
+        )
+        if person_id:
+            payments_q = payments_q.where(FarmerContract.person_id == person_id)
+        else:
+            payments_q = payments_q.where(FarmerContract.person_id.is_not(None))
+
+        def payment_rows(query):
+            for p in stream_rows(session, query):
                 label = p.item_name or p.payment_type
                 desc = f"Оплата по контракту #{p.contract_id}: {label}"
                 if p.is_cancelled:
                     desc += " (скасовано)"
-                rows.append({
-                    "ts": ts,
-                    "person": people_map.get(pid, f"#{pid}"),
+                yield {
+                    "ts": p.ts,
+                    "person": people_map.get(p.person_id, f"#{p.person_id}"),
                     "type": "Оплата",
                     "description": desc,
                     "qty": p.quantity_kg,
                     "amount": p.amount_uah or 0.0,
                     "culture": cultures_map.get(p.culture_id, "") if p.culture_id else "",
-                })
+                }
+
+        sources.append(payment_rows(in_range(payments_q, payment_ts)))
 
     if not action_type or action_type == "transfer":
-        transfers_q = select(FarmerGrainMovement).where(FarmerGrainMovement.to_person_id.is_not(None))
+        transfers_q = select(
+            FarmerGrainMovement.created_at,
+            FarmerGrainMovement.from_owner_id,
+            FarmerGrainMovement.to_person_id,
+            FarmerGrainMovement.culture_id,
+            FarmerGrainMovement.quantity_kg,
+            FarmerGrainMovement.note,
+        ).where(FarmerGrainMovement.to_person_id.is_not(None))
         if person_id:
             transfers_q = transfers_q.where(FarmerGrainMovement.to_person_id == person_id)
-        transfers = session.exec(transfers_q).all()
-        for m in transfers:
-            ts = m.created_at
-            if start_dt and ts and ts < start_dt:
-                continue
-            if end_dt and ts and ts > end_dt:
-                continue
-            from_label = owners_map.get(m.from_owner_id, "?")
-            desc = f"Переказ зерна від фермера: {from_label}"
-            if m.note:
-                desc += f" — {m.note}"
-            rows.append({
-                "ts": ts,
-                "person": people_map.get(m.to_person_id, f"#{m.to_person_id}"),
-                "type": "Переказ зерна",
-                "description": desc,
-                "qty": m.quantity_kg,
-                "amount": None,
-                "culture": cultures_map.get(m.culture_id, ""),
-            })
-
-    rows.sort(key=lambda r: r["ts"] or datetime.min, reverse=True)
-
-    wb = Workbook()
-    sheet = wb.active
-    sheet.title = "Дії по людях"
-    headers = ["Дата", "Людина", "Тип", "Опис", "Культура", "Кількість, кг", "Сума, грн"]
-    sheet.append(headers)
-    _style_header(sheet, headers)
+
+        def transfer_rows(query):
+            for m in stream_rows(session, query):
+                from_label = owners_map.get(m.from_owner_id, "?")
+                desc = f"Переказ зерна від фермера: {from_label}"
+                if m.note:
+                    desc += f" — {m.note}"
+                yield {
+                    "ts": m.created_at,
+                    "person": people_map.get(m.to_person_id, f"#{m.to_person_id}"),
+                    "type": "Переказ зерна",
+                    "description": desc,
+                    "qty": m.quantity_kg,
+                    "amount": None,
+                    "culture": cultures_map.get(m.culture_id, ""),
+                }
+
+        sources.append(transfer_rows(in_range(transfers_q, FarmerGrainMovement.created_at)))
+
+    rows = heapq.merge(*sources, key=lambda r: r["ts"] or datetime.min, reverse=True)
+
+    book = XlsxExport()
+    sheet = book.sheet(
+        "Дії по людях",
+        ["Дата", "Людина", "Тип", "Опис", "Культура", "Кількість, кг", "Сума, грн"],
+        widths=[18, 24, 14, 44, 18, 14, 14],
+        number_formats={6: MONEY_FORMAT, 7: MONEY_FORMAT},
+    )
 
     for r in rows:
         sheet.append([
@@ -516,19 +423,4 @@ async def export_people_actions(
             r["amount"] if r["amount"] is not None else "",
         ])
 
-    _style_body(sheet, headers, number_columns=(6, 7))
-    sheet.freeze_panes = "A2"
-    if sheet.max_row > 1:
-        sheet.auto_filter.ref = f"A1:G{sheet.max_row}"
-    for idx, width in enumerate([18, 24, 14, 44, 18, 14, 14], start=1):
-        sheet.column_dimensions[chr(64 + idx)].width = width
-
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    filename = f"people_actions_{date.today().isoformat()}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    return book.to_response(f"people_actions_{date.today().isoformat()}.xlsx")
@@ -8,12 +8,12 @@ from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 
 from backend.database import get_session
+from backend.exports import XlsxExport, MONEY_FORMAT
+from backend.pagination import paginate
+from backend.cash_ledger import record_cash_movement
 from backend.models import (
     PurchaseStock,
     PurchaseRecord,
-    CashRegister,
-    Transaction,
-    Currency,
     TransactionType,
     PurchaseCategory,
     StockAdjustmentLog,
@@ -29,7 +29,6 @@ from backend.schemas import (
     StockAdjustmentResponse
 )
 from backend.auth import get_current_user, get_current_super_admin, get_current_admin_or_manager
-from backend.api.cash import get_or_create_cash_register
 
 router = APIRouter()
 
@@ -39,7 +38,7 @@ def normalize_name(value: str) -> str:
 
 
 @router.get("/stock", response_model=list[PurchaseStockResponse])
-async def list_purchase_stock(
+def list_purchase_stock(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -53,7 +52,7 @@ async def list_purchase_stock(
 
 
 @router.patch("/stock/{stock_id}/price", response_model=PurchaseStockResponse)
-async def update_purchase_stock_price(
+def update_purchase_stock_price(
     stock_id: int,
     payload: PurchaseStockPriceUpdate,
     session: Session = Depends(get_session),
@@ -74,7 +73,7 @@ async def update_purchase_stock_price(
 
 
 @router.patch("/stock/{stock_id}/adjust", response_model=PurchaseStockResponse)
-async def adjust_purchase_stock(
+def adjust_purchase_stock(
     stock_id: int,
     payload: StockAdjustRequest,
     session: Session = Depends(get_session),
@@ -121,7 +120,7 @@ async def adjust_purchase_stock(
 
 
 @router.get("/stock/adjustments", response_model=list[StockAdjustmentResponse])
-async def list_purchase_stock_adjustments(
+def list_purchase_stock_adjustments(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -134,7 +133,7 @@ async def list_purchase_stock_adjustments(
 
 
 @router.get("", response_model=list[PurchaseResponse])
-async def list_purchases(
+def list_purchases(
     response: Response,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
@@ -142,10 +141,11 @@ async def list_purchases(
     end_date: Optional[str] = Query(None, description="ISO YYYY-MM-DD включно"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Курсор з X-Next-Cursor попередньої сторінки"),
+    with_total: bool = Query(False, description="Порахувати X-Total-Count"),
 ):
     """Історія закупівель. `start_date`/`end_date` — необовʼязковий діапазон."""
-    from sqlalchemy import func as _f
-    query = select(PurchaseRecord).order_by(PurchaseRecord.created_at.desc())
+    query = select(PurchaseRecord)
     if start_date:
         try:
             query = query.where(PurchaseRecord.created_at >= datetime.combine(date.fromisoformat(start_date), time.min))
@@ -156,13 +156,14 @@ async def list_purchases(
             query = query.where(PurchaseRecord.created_at <= datetime.combine(date.fromisoformat(end_date), time.max))
         except ValueError:
             raise HTTPException(status_code=400, detail="Некоректний end_date")
-    total = session.exec(select(_f.count()).select_from(query.subquery())).first() or 0
-    response.headers["X-Total-Count"] = str(total)
-    return session.exec(query.limit(limit).offset(offset)).all()
+    return paginate(
+        session, response, query, PurchaseRecord,
+        limit=limit, offset=offset, cursor=cursor, with_total=with_total,
+    )
 
 
 @router.get("/export")
-async def export_purchases(
+def export_purchases(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     start_date: str | None = None,
@@ -193,41 +194,23 @@ async def export_purchases(
 
     records = session.exec(query).all()
 
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = "Закупівлі"
-
-    headers = [
-        "Дата",
-        "Тип",
-        "Назва",
-        "Категорія",
-        "Ціна/кг",
-        "Валюта",
-        "Кількість, кг",
-        "Сума"
-    ]
-    sheet.append(headers)
-
-    header_fill = PatternFill("solid", fgColor="1F2937")
-    header_font = Font(color="FFFFFF", bold=True)
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style="thin", color="E5E7EB"),
-        right=Side(style="thin", color="E5E7EB"),
-        top=Side(style="thin", color="E5E7EB"),
-        bottom=Side(style="thin", color="E5E7EB")
+    book = XlsxExport()
+    sheet = book.sheet(
+        "Закупівлі",
+        [
+            "Дата",
+            "Тип",
+            "Назва",
+            "Категорія",
+            "Ціна/кг",
+            "Валюта",
+            "Кількість, кг",
+            "Сума"
+        ],
+        widths=[20, 16, 28, 18, 12, 10, 14, 14],
+        number_formats={5: MONEY_FORMAT, 7: MONEY_FORMAT, 8: MONEY_FORMAT},
     )
 
-    for col in range(1, len(headers) + 1):
-        cell = sheet.cell(row=1, column=col)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    alt_fill = PatternFill("solid", fgColor="F8FAFC")
-
     for record in records:
         category_label = "Добрива" if record.category.value == "fertilizer" else "Посівне зерно"
         type_label = "Безкоштовно" if record.is_free else "Закупка"
@@ -242,37 +225,12 @@ async def export_purchases(
             record.total_amount
         ])
 
-    for row in range(2, sheet.max_row + 1):
-        row_fill = alt_fill if row % 2 == 0 else None
-        for col in range(1, len(headers) + 1):
-            cell = sheet.cell(row=row, column=col)
-            if row_fill:
-                cell.fill = row_fill
-            cell.border = thin_border
-            if col in (5, 7, 8):
-                cell.number_format = "#,##0.00"
-
-    sheet.freeze_panes = "A2"
-    sheet.auto_filter.ref = f"A1:H{sheet.max_row}"
-
-    column_widths = [20, 16, 28, 18, 12, 10, 14, 14]
-    for idx, width in enumerate(column_widths, start=1):
-        sheet.column_dimensions[chr(64 + idx)].width = width
-
-    buffer = BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
-
     filename = f"purchases_report_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-    )
+    return book.to_response(filename)
 
 
 @router.get("/stock/export")
-async def export_purchase_stock(
+def export_purchase_stock(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     category: str | None = Query(default=None)
@@ -366,7 +324,7 @@ async def export_purchase_stock(
 
 
 @router.post("", response_model=PurchaseResponse)
-async def create_purchase(
+def create_purchase(
     payload: PurchaseCreate,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_super_admin)
@@ -408,35 +366,11 @@ async def create_purchase(
         price_per_kg = payload.price_per_kg
         total_amount = price_per_kg * payload.quantity_kg
 
-        cash_register: CashRegister = get_or_create_cash_register(session)
-        balance_field_map = {
-            Currency.UAH: "uah_balance",
-            Currency.USD: "usd_balance",
-            Currency.EUR: "eur_balance"
-        }
-        currency_label_map = {
-            Currency.UAH: "UAH (гривня)",
-            Currency.USD: "USD (долар США)",
-            Currency.EUR: "EUR (євро)"
-        }
-        balance_field = balance_field_map[payload.currency]
-        current_balance = getattr(cash_register, balance_field)
-        new_balance = current_balance - total_amount
         # Дозволяємо касі йти в мінус при закупівлі (як у виплатах по контрактах / хлібзаводі)
-        setattr(cash_register, balance_field, new_balance)
-        session.add(cash_register)
-
-        transaction = Transaction(
-            currency=payload.currency,
-            amount=total_amount,
-            transaction_type=TransactionType.SUBTRACT,
-            user_id=current_user.id,
-            description=f"Закупівля: {stock.name}",
-            uah_balance_after=cash_register.uah_balance,
-            usd_balance_after=cash_register.usd_balance,
-            eur_balance_after=cash_register.eur_balance
+        record_cash_movement(
+            session, payload.currency, total_amount, TransactionType.SUBTRACT,
+            current_user.id, f"Закупівля: {stock.name}",
         )
-        session.add(transaction)
 
     stock.quantity_kg += payload.quantity_kg
     if stock.quantity_kg <= 0:
@@ -9,7 +9,7 @@ router = APIRouter()
 
 
 @router.post("/", response_model=UserResponse)
-async def create_user(
+def create_user(
     user: UserCreate,
     session: Session = Depends(get_session),
     current_admin: User = Depends(get_current_super_admin)
@@ -49,7 +49,7 @@ async def create_user(
 
 
 @router.get("/", response_model=list[UserResponse])
-async def get_users(
+def get_users(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -67,7 +67,7 @@ async def get_current_user_info(
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(
+def get_user(
     user_id: int,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -83,7 +83,7 @@ async def get_user(
 
 
 @router.patch("/{user_id}", response_model=UserResponse)
-async def update_user(
+def update_user(
     user_id: int,
     user_update: UserUpdate,
     session: Session = Depends(get_session),
@@ -139,7 +139,7 @@ async def update_user(
 
 
 @router.delete("/{user_id}")
-async def delete_user(
+def delete_user(
     user_id: int,
     session: Session = Depends(get_session),
     current_admin: User = Depends(get_current_super_admin)
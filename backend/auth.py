@@ -1,3 +1,7 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Depends, HTTPException, status
 from fastapi_jwt import JwtAccessBearer, JwtAuthorizationCredentials
 from sqlmodel import Session, select
@@ -5,7 +9,8 @@ from passlib.context import CryptContext
 from backend.database import get_session
 from backend.models import User, UserRole
 from backend.config import settings
-from typing import Union
+from backend.reference_cache import reference_cache
+from typing import Optional, Union
 
 # Настройка JWT
 access_security = JwtAccessBearer(
@@ -26,27 +31,118 @@ def _get_pwd_context():
     return _pwd_context
 
 
+# bcrypt — ~200 мс CPU на виклик. Усі хешування/перевірки йдуть через окремий
+# обмежений пул (`password_hash_workers`): зміна зміни, коли 20 операторів
+# логіняться одночасно, займає лише ці потоки, а не threadpool FastAPI
+# (у ньому й так лише стільки слотів, скільки з'єднань з БД) і не event loop.
+_hash_executor = None
+_hash_executor_lock = threading.Lock()
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            _hash_executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.password_hash_workers),
+                thread_name_prefix="password-hash",
+            )
+        return _hash_executor
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Проверка пароля"""
-    return _get_pwd_context().verify(plain_password, hashed_password)
+    """Проверка пароля (у пулі хешування; блокує потік виклику до результату)"""
+    return _get_hash_executor().submit(
+        _get_pwd_context().verify, plain_password, hashed_password
+    ).result()
 
 
 def get_password_hash(password: str) -> str:
-    """Хеширование пароля"""
-    return _get_pwd_context().hash(password)
+    """Хеширование пароля (у пулі хешування; блокує потік виклику до результату)"""
+    return _get_hash_executor().submit(_get_pwd_context().hash, password).result()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Перевірка пароля з async-хендлера: чекає на пул хешування, не тримаючи
+    ні event loop, ні потік threadpool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_hash_executor(), _get_pwd_context().verify, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Хешування пароля з async-хендлера (див. `verify_password_async`)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), _get_pwd_context().hash, password)
+
+
+# Кеш автентифікованих користувачів: user_id → (час завантаження, поля User).
+# Кожен запит раніше читав users за username; тепер — лише раз на
+# `auth_user_cache_ttl_sec` або після зміни користувача. Зміни (update_user,
+# delete_user, будь-який flush User) інвалідуються через той самий NOTIFY, що й
+# кеш довідників (`backend.reference_cache`, kind "users"), — в усіх воркерах.
+_user_cache: dict[int, tuple[float, dict]] = {}
+_user_cache_lock = threading.Lock()
+_user_cache_generation = 0
+_user_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
 
+def _cached_user(user_id: int, username: str) -> Optional[User]:
+    now = time.monotonic()
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+        if entry and now - entry[0] < settings.auth_user_cache_ttl_sec and entry[1]["username"] == username:
+            _user_cache_stats["hits"] += 1
+            data = entry[1]
+        else:
+            _user_cache_stats["misses"] += 1
+            return None
+    # Окремий екземпляр на запит, не прив'язаний до жодної сесії.
+    return User(**data)
 
-async def get_current_user(
+
+def _remember_user(user: User, generation: int) -> None:
+    data = user.model_dump()
+    with _user_cache_lock:
+        # Поки читали з БД, користувача могли змінити — не кешуємо старий знімок.
+        if generation == _user_cache_generation:
+            _user_cache[user.id] = (time.monotonic(), data)
+
+
+def invalidate_user_cache(kinds: set) -> None:
+    global _user_cache_generation
+    if "users" not in kinds:
+        return
+    with _user_cache_lock:
+        _user_cache.clear()
+        _user_cache_generation += 1
+        _user_cache_stats["invalidations"] += 1
+
+
+def user_cache_stats() -> dict:
+    with _user_cache_lock:
+        return {**_user_cache_stats, "size": len(_user_cache)}
+
+
+reference_cache.subscribe(invalidate_user_cache)
+
+
+def get_current_user(
     credentials: JwtAuthorizationCredentials = Depends(access_security),
     session: Session = Depends(get_session)
 ) -> User:
-    """Получение текущего пользователя из JWT токена"""
+    """Получение текущего пользователя из JWT токена.
+    Звичайний випадок — без запиту до БД: користувач береться з кешу за
+    `user_id` із токена (сесія не відкриває з'єднання, поки її не використали)."""
     # В fastapi-jwt subject может быть dict или строкой
     subject = credentials.subject
     
     # Если subject - это dict, извлекаем username
+    user_id = None
     if isinstance(subject, dict):
         username = subject.get("username")
+        user_id = subject.get("user_id")
     else:
         # Если subject - это строка (username)
         username = subject
@@ -56,10 +152,15 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Невірні облікові дані"
         )
-    
-    user = session.exec(
-        select(User).where(User.username == username)
-    ).first()
+
+    user = _cached_user(user_id, username) if user_id else None
+    if user is None:
+        generation = _user_cache_generation
+        user = session.exec(
+            select(User).where(User.username == username)
+        ).first()
+        if user and user.is_active:
+            _remember_user(user, generation)
     
     if not user or not user.is_active:
         raise HTTPException(
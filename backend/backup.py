@@ -1,13 +1,31 @@
 """Резервне копіювання БД.
 
-Щодоби (і одразу при старті застосунку) знімається читабельний SQL-dump
-у файл `BACKUP_FILE`, який **перезаписується** — на сервері завжди лежить
-одна свіжа копія. Ендпоінт у `api/admin.py` віддає цей файл на скачування.
+Щодоби (задача `backup` планувальника `backend/scheduler.py`, лише на
+воркері-лідері) знімається `pg_dump` у новий файл
+`BACKUP_DIR/zerno_<YYYYmmdd_HHMMSS>.<розширення>`:
+
+* формат — `backup_format`: `plain` (читабельний SQL), `custom` (один файл
+  для `pg_restore`) або `directory` (тека, дамп таблиць паралельно в
+  `backup_jobs` процесів `pg_dump -j`);
+* стиснення — `backup_compression` (`gzip` / `zstd` / `lz4` / `none`) з рівнем
+  `backup_compression_level`; zstd і lz4 потребують pg_dump 16+;
+* зберігаються останні `backup_keep_daily` щоденних і `backup_keep_weekly`
+  щотижневих копій (найновіша за день / ISO-тиждень), решта видаляється.
+
+Розмір і тривалість кожного запуску пишуться в лог і в `job_runs.details`.
+Скачування з адмінки (`stream_backup`) не пише файл на диск: вихід
+`pg_dump` віддається клієнту по мірі створення.
 """
 import asyncio
 import logging
 import os
+import re
+import shutil
+import time
+import weakref
+from datetime import datetime
 from pathlib import Path
+from typing import AsyncIterator, Optional
 
 from backend.config import settings
 
@@ -18,57 +36,269 @@ logger = logging.getLogger(__name__)
 #   systemd (WorkingDirectory /opt/zerno) → /opt/zerno/backups.
 # Можна перевизначити змінною оточення BACKUP_DIR.
 BACKUP_DIR = Path(os.environ.get("BACKUP_DIR") or "backups").resolve()
-BACKUP_FILE = BACKUP_DIR / "zerno_backup.sql"
 BACKUP_INTERVAL_SEC = 24 * 60 * 60  # щодоби
+BACKUP_PREFIX = "zerno_"
+BACKUP_STAMP_FORMAT = "%Y%m%d_%H%M%S"
+_BACKUP_NAME_RE = re.compile(rf"^{BACKUP_PREFIX}(\d{{8}}_\d{{6}})\.")
+STREAM_CHUNK_SIZE = 64 * 1024
+# Скільки останніх байт stderr pg_dump тримати для повідомлення про помилку.
+STDERR_TAIL_BYTES = 16 * 1024
+# Недописані .tmp від процесів, що впали, прибираються через добу.
+STALE_TMP_SEC = 24 * 60 * 60
+
+BACKUP_FORMATS = ("plain", "custom", "directory")
+_COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "lz4": ".lz4", "none": ""}
 
 
 def _database_url() -> str:
     return os.environ.get("DATABASE_URL") or settings.database_url
 
 
-async def make_backup() -> Path:
-    """Знімає читабельний SQL-dump БД і атомарно перезаписує BACKUP_FILE.
+def _compression_args(method: str, level: int) -> list[str]:
+    if method not in _COMPRESSION_SUFFIXES:
+        raise ValueError(f"Невідоме стиснення бекапу: {method}")
+    if method == "none":
+        return ["--compress=0"]
+    if method == "gzip":
+        # Числовий рівень — gzip у будь-якій версії pg_dump.
+        return [f"--compress={level}"]
+    return [f"--compress={method}:{level}"]
 
-    Пишемо у тимчасовий файл і робимо os.replace — щоб скачування ніколи не
-    натрапило на напівзаписаний файл."""
-    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
-    # tmp унікальний на процес (на проді uvicorn --workers 2 → планувальник
-    # працює в кількох процесах; спільний .tmp могли б писати одночасно).
-    tmp = BACKUP_FILE.with_name(f"{BACKUP_FILE.name}.{os.getpid()}.tmp")
-    with open(tmp, "wb") as fh:
-        proc = await asyncio.create_subprocess_exec(
-            "pg_dump", _database_url(),
-            "--no-owner", "--no-privileges", "--clean", "--if-exists",
-            stdout=fh,
-            stderr=asyncio.subprocess.PIPE,
-        )
+
+def _backup_suffix(backup_format: str, method: str) -> str:
+    if backup_format == "plain":
+        return ".sql" + _COMPRESSION_SUFFIXES[method]
+    if backup_format == "custom":
+        return ".dump"
+    return ".dir"
+
+
+def _pg_dump_args(backup_format: str, method: str, level: int) -> list[str]:
+    if backup_format not in BACKUP_FORMATS:
+        raise ValueError(f"Невідомий формат бекапу: {backup_format}")
+    args = ["pg_dump", _database_url(), "--no-owner", "--no-privileges", f"--format={backup_format}"]
+    args += _compression_args(method, level)
+    if backup_format == "plain":
+        args += ["--clean", "--if-exists"]
+    if backup_format == "directory":
+        args.append(f"--jobs={max(1, settings.backup_jobs)}")
+    return args
+
+
+def _path_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(entry.stat().st_size for entry in path.rglob("*") if entry.is_file())
+    return path.stat().st_size
+
+
+def _remove_path(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+async def _run_pg_dump(args: list[str]) -> None:
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
         _, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        # Зупинка воркера / втрата лідерства — не лишаємо pg_dump сиротою.
+        proc.kill()
+        await proc.wait()
+        raise
     if proc.returncode != 0:
-        try:
-            tmp.unlink()
-        except FileNotFoundError:
-            pass
         raise RuntimeError(f"pg_dump завершився з кодом {proc.returncode}: "
                            f"{stderr.decode(errors='replace')[:500]}")
-    os.replace(tmp, BACKUP_FILE)  # атомарна заміна
-    logger.info("Резервну копію БД оновлено: %s (%d байт)",
-                BACKUP_FILE, BACKUP_FILE.stat().st_size)
-    return BACKUP_FILE
 
 
-async def ensure_backup() -> Path:
-    """Повертає шлях до бекапу; якщо файлу ще немає — створює його зараз."""
-    if not BACKUP_FILE.exists():
-        await make_backup()
-    return BACKUP_FILE
+async def make_backup() -> dict:
+    """Знімає бекап у новий файл (теку) і застосовує політику зберігання.
+    Повертає підсумок запуску: файл, формат, розмір, тривалість, видалені копії.
+
+    Пишемо у тимчасовий шлях і робимо os.replace — щоб скачування ніколи не
+    натрапило на напівзаписаний файл."""
+    backup_format = settings.backup_format.lower()
+    method = settings.backup_compression.lower()
+    args = _pg_dump_args(backup_format, method, settings.backup_compression_level)
+
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"{BACKUP_PREFIX}{datetime.utcnow().strftime(BACKUP_STAMP_FORMAT)}{_backup_suffix(backup_format, method)}"
+    target = BACKUP_DIR / name
+    # tmp унікальний на процес і прихований від політики зберігання.
+    tmp = BACKUP_DIR / f".{name}.{os.getpid()}.tmp"
+
+    started = time.monotonic()
+    try:
+        await _run_pg_dump(args + [f"--file={tmp}"])
+    except BaseException:
+        _remove_path(tmp)
+        raise
+    os.replace(tmp, target)  # атомарна заміна
+    duration = time.monotonic() - started
+    size = _path_size(target)
+    removed = await asyncio.to_thread(apply_retention)
+    logger.info("Резервну копію БД знято: %s (%d байт, %.1f с), видалено старих: %d",
+                target, size, duration, len(removed))
+    return {
+        "file": target.name,
+        "format": backup_format,
+        "compression": method,
+        "size_bytes": size,
+        "duration_sec": round(duration, 1),
+        "removed": removed,
+    }
+
+
+# ─── Зберігання ─────────────────────────────────────────────────────────────
 
+def _backup_stamp(path: Path) -> Optional[datetime]:
+    match = _BACKUP_NAME_RE.match(path.name)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), BACKUP_STAMP_FORMAT)
+    except ValueError:
+        return None
 
-async def backup_scheduler() -> None:
-    """Фонова задача: знімає бекап одразу і далі щодоби (перезаписує файл).
-    Помилка бекапу логуються, але не валять застосунок."""
+
+def list_backups() -> list[dict]:
+    """Бекапи в BACKUP_DIR, від новіших до старіших."""
+    if not BACKUP_DIR.exists():
+        return []
+    backups = []
+    for path in BACKUP_DIR.iterdir():
+        stamp = _backup_stamp(path)
+        if stamp is not None:
+            backups.append({"path": path, "name": path.name, "created_at": stamp, "size_bytes": _path_size(path)})
+    backups.sort(key=lambda b: b["created_at"], reverse=True)
+    return backups
+
+
+def select_backups_to_keep(stamps: list[datetime], keep_daily: int, keep_weekly: int) -> set[datetime]:
+    """Найновіша копія кожного з останніх `keep_daily` днів і кожного з
+    останніх `keep_weekly` ISO-тижнів (дні/тижні без копій не рахуються)."""
+    keep = set()
+    days, weeks = set(), set()
+    for stamp in sorted(stamps, reverse=True):
+        day = stamp.date()
+        week = stamp.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            days.add(day)
+            keep.add(stamp)
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.add(week)
+            keep.add(stamp)
+    return keep
+
+
+def apply_retention() -> list[str]:
+    """Видаляє копії поза політикою зберігання і старі недописані .tmp."""
+    backups = list_backups()
+    keep = select_backups_to_keep(
+        [b["created_at"] for b in backups],
+        max(1, settings.backup_keep_daily),
+        max(0, settings.backup_keep_weekly),
+    )
+    removed = []
+    for backup in backups:
+        if backup["created_at"] not in keep:
+            _remove_path(backup["path"])
+            removed.append(backup["name"])
+
+    cutoff = time.time() - STALE_TMP_SEC
+    for entry in BACKUP_DIR.iterdir():
+        try:
+            if entry.name.startswith(".") and entry.name.endswith(".tmp") and entry.stat().st_mtime < cutoff:
+                _remove_path(entry)
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+# ─── Скачування без проміжного файлу ────────────────────────────────────────
+
+async def _read_tail(stream: asyncio.StreamReader, limit: int = STDERR_TAIL_BYTES) -> bytes:
+    """Читає потік до кінця, лишаючи останні `limit` байт (для повідомлення
+    про помилку)."""
+    tail = b""
     while True:
+        chunk = await stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            return tail
+        tail = (tail + chunk)[-limit:]
+
+
+def _kill_if_running(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is None:
         try:
-            await make_backup()
-        except Exception as e:
-            logger.error("Не вдалося зняти резервну копію БД: %s", e)
-        await asyncio.sleep(BACKUP_INTERVAL_SEC)
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+async def stream_backup(backup_format: str = "plain") -> AsyncIterator[bytes]:
+    """Запускає `pg_dump` і віддає його stdout шматками.
+
+    Перший шматок читається до початку відповіді: якщо `pg_dump` не зміг
+    стартувати (недоступна БД, права), викликач отримає RuntimeError і
+    поверне помилку замість порожнього файлу. stderr вичитується окремою
+    задачею паралельно зі stdout — інакше `pg_dump` з багатьма попередженнями
+    заблокувався б на повному каналі stderr. Процес зупиняється, якщо клієнт
+    відключився посеред скачування, а також якщо генератор так і не почали
+    читати (відповідь не відправилась) — тоді при його збиранні."""
+    if backup_format == "directory":
+        raise ValueError("Формат directory не передається одним потоком")
+    # plain віддаємо нестиснутим .sql, як і раніше; custom — зі стисненням з налаштувань.
+    method = "none" if backup_format == "plain" else settings.backup_compression.lower()
+    args = _pg_dump_args(backup_format, method, settings.backup_compression_level)
+    started = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stderr_task = asyncio.create_task(_read_tail(proc.stderr))
+    try:
+        first = await proc.stdout.read(STREAM_CHUNK_SIZE)
+    except BaseException:
+        _kill_if_running(proc)
+        raise
+    if not first:
+        await proc.wait()
+        stderr = await stderr_task
+        raise RuntimeError(f"pg_dump завершився з кодом {proc.returncode}: "
+                           f"{stderr.decode(errors='replace')[:500]}")
+
+    async def chunks() -> AsyncIterator[bytes]:
+        size = 0
+        try:
+            chunk = first
+            while chunk:
+                size += len(chunk)
+                yield chunk
+                chunk = await proc.stdout.read(STREAM_CHUNK_SIZE)
+            await proc.wait()
+        finally:
+            interrupted = proc.returncode is None
+            if interrupted:
+                # Клієнт відключився посеред скачування.
+                proc.kill()
+                await proc.wait()
+            stderr = await stderr_task
+            if interrupted:
+                logger.warning("Скачування бекапу перервано після %d байт", size)
+            elif proc.returncode != 0:
+                logger.error("pg_dump при скачуванні завершився з кодом %s: %s",
+                             proc.returncode, stderr.decode(errors="replace")[:500])
+            else:
+                logger.info("Бекап віддано клієнту: %d байт, %.1f с", size, time.monotonic() - started)
+
+    stream = chunks()
+    # Незапущений генератор не виконає свій finally — процес зупиняє фіналізатор.
+    weakref.finalize(stream, _kill_if_running, proc)
+    return stream
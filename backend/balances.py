@@ -0,0 +1,404 @@
+"""Матеріалізовані баланси зерна контрагентів.
+
+`farmer_balances` — залишок не викупленого зерна фермера по культурі. Раніше
+рахувався як SUM по всій історії `grain_intakes` мінус SUM `farmer_grain_deductions`
+на кожен запит (і всередині write-шляхів).
+
+`person_grain_balances` — залишок зерна людини по культурі. Раніше — чотири SUM
+(перекази до/від людини, GRAIN-оплати, FROM_FARMER-позиції) на кожну перевірку.
+
+Кожна мутація, що змінює баланс, у тій самій транзакції застосовує дельту до
+рядка журналу, а читання — один індексований рядок.
+
+Звірка / перебудова з сирої історії:
+    docker compose exec backend python -m backend.balances verify
+    docker compose exec backend python -m backend.balances rebuild
+"""
+import argparse
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, select, delete
+
+from backend.models import (
+    FarmerBalance,
+    FarmerContract,
+    FarmerContractItem,
+    FarmerContractItemDirection,
+    FarmerContractItemType,
+    FarmerContractPayment,
+    FarmerContractPaymentType,
+    FarmerContractStatus,
+    FarmerGrainDeduction,
+    FarmerGrainMovement,
+    GrainIntake,
+    PersonGrainBalance,
+)
+
+# Допуск на похибку float при накопиченні дельт і при звірці з історією
+BALANCE_EPS = 0.0001
+VERIFY_TOLERANCE_KG = 0.01
+
+
+def _upsert_delta(session: Session, model, constraint: str, key: dict, delta_kg: float) -> None:
+    """INSERT ... ON CONFLICT DO UPDATE SET qty_kg = qty_kg + delta — один атомарний
+    statement без read-modify-write. Без commit — виконується в транзакції виклику."""
+    now = datetime.utcnow()
+    stmt = pg_insert(model).values(**key, qty_kg=delta_kg, created_at=now)
+    stmt = stmt.on_conflict_do_update(
+        constraint=constraint,
+        set_={
+            "qty_kg": model.qty_kg + stmt.excluded.qty_kg,
+            "updated_at": now,
+        },
+    )
+    session.exec(stmt)
+
+
+def _diff_ledger(expected: dict, actual: dict, key_names: tuple[str, str]) -> list[dict]:
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        exp = expected.get(key, 0.0)
+        act = actual.get(key, 0.0)
+        if abs(exp - act) > VERIFY_TOLERANCE_KG:
+            mismatches.append({
+                key_names[0]: key[0],
+                key_names[1]: key[1],
+                "ledger_kg": round(act, 2),
+                "history_kg": round(exp, 2),
+            })
+    return mismatches
+
+
+# ─────────────────────────────────────────────
+#  Фермери
+# ─────────────────────────────────────────────
+
+def farmer_intake_share(intake: GrainIntake) -> Optional[tuple[int, int, float]]:
+    """Внесок картки приходу у баланс фермера: (owner_id, culture_id, кг) або None.
+    Ті самі умови, що й в історичному SUM: фермерське зерно, картка вже на складі."""
+    if intake.is_own_grain or not intake.owner_id:
+        return None
+    if intake.pending_quality or intake.pending_tare:
+        return None
+    return intake.owner_id, intake.culture_id, float(intake.accepted_weight_kg or 0.0)
+
+
+def apply_farmer_balance_delta(session: Session, owner_id: Optional[int], culture_id: Optional[int], delta_kg: float) -> None:
+    """Атомарно додає `delta_kg` до балансу фермера."""
+    if not owner_id or not culture_id or not delta_kg:
+        return
+    _upsert_delta(
+        session, FarmerBalance, "uq_farmer_balance_key",
+        {"owner_id": owner_id, "culture_id": culture_id}, delta_kg,
+    )
+
+
+def apply_farmer_intake(session: Session, intake: GrainIntake, sign: float = 1.0) -> None:
+    """Накатує (`sign=1`) або відкочує (`sign=-1`) внесок картки у баланс фермера."""
+    share = farmer_intake_share(intake)
+    if share:
+        owner_id, culture_id, qty = share
+        apply_farmer_balance_delta(session, owner_id, culture_id, sign * qty)
+
+
+def add_farmer_deduction(
+    session: Session,
+    owner_id: int,
+    culture_id: int,
+    quantity_kg: float,
+    payment_id: Optional[int] = None,
+) -> FarmerGrainDeduction:
+    """Створює FarmerGrainDeduction і одночасно зменшує баланс фермера."""
+    deduction = FarmerGrainDeduction(
+        owner_id=owner_id,
+        culture_id=culture_id,
+        quantity_kg=quantity_kg,
+        payment_id=payment_id,
+    )
+    session.add(deduction)
+    apply_farmer_balance_delta(session, owner_id, culture_id, -quantity_kg)
+    return deduction
+
+
+def delete_farmer_deduction(session: Session, deduction: FarmerGrainDeduction) -> None:
+    """Видаляє FarmerGrainDeduction і повертає кількість на баланс фермера."""
+    apply_farmer_balance_delta(session, deduction.owner_id, deduction.culture_id, deduction.quantity_kg)
+    session.delete(deduction)
+
+
+def get_farmer_balance(session: Session, owner_id: int, culture_id: int, *, for_update: bool = False) -> float:
+    """Баланс фермера по культурі. `for_update=True` — блокує рядок до кінця транзакції,
+    щоб паралельні списання з того самого балансу не пройшли перевірку обидва."""
+    query = select(FarmerBalance.qty_kg).where(
+        FarmerBalance.owner_id == owner_id,
+        FarmerBalance.culture_id == culture_id,
+    )
+    if for_update:
+        query = query.with_for_update()
+    qty = session.exec(query).first()
+    return float(qty or 0.0)
+
+
+def list_farmer_balances(session: Session, owner_id: Optional[int] = None) -> list[FarmerBalance]:
+    """Рядки журналу з позитивним залишком (усі фермери або один)."""
+    query = select(FarmerBalance).where(FarmerBalance.qty_kg > BALANCE_EPS)
+    if owner_id is not None:
+        query = query.where(FarmerBalance.owner_id == owner_id)
+    return session.exec(query).all()
+
+
+def _farmer_balances_from_history(session: Session) -> dict[tuple[int, int], float]:
+    """Баланси фермерів, пораховані з сирої історії (еталон для звірки)."""
+    balances: dict[tuple[int, int], float] = {}
+    received = session.exec(
+        select(
+            GrainIntake.owner_id,
+            GrainIntake.culture_id,
+            func.sum(GrainIntake.accepted_weight_kg),
+        )
+        .where(
+            GrainIntake.owner_id.is_not(None),
+            GrainIntake.is_own_grain == False,
+            GrainIntake.pending_quality == False,
+            GrainIntake.pending_tare == False,
+        )
+        .group_by(GrainIntake.owner_id, GrainIntake.culture_id)
+    ).all()
+    for owner_id, culture_id, qty in received:
+        balances[(owner_id, culture_id)] = float(qty or 0.0)
+
+    deducted = session.exec(
+        select(
+            FarmerGrainDeduction.owner_id,
+            FarmerGrainDeduction.culture_id,
+            func.sum(FarmerGrainDeduction.quantity_kg),
+        )
+        .group_by(FarmerGrainDeduction.owner_id, FarmerGrainDeduction.culture_id)
+    ).all()
+    for owner_id, culture_id, qty in deducted:
+        balances[(owner_id, culture_id)] = balances.get((owner_id, culture_id), 0.0) - float(qty or 0.0)
+    return balances
+
+
+def verify_farmer_balances(session: Session) -> list[dict]:
+    """Звіряє журнал з історією. Повертає розбіжності (порожній список — все збігається)."""
+    actual = {
+        (b.owner_id, b.culture_id): b.qty_kg
+        for b in session.exec(select(FarmerBalance)).all()
+    }
+    return _diff_ledger(_farmer_balances_from_history(session), actual, ("owner_id", "culture_id"))
+
+
+def rebuild_farmer_balances(session: Session) -> int:
+    """Перебудовує журнал з історії (в одній транзакції). Повертає кількість рядків."""
+    expected = _farmer_balances_from_history(session)
+    session.exec(delete(FarmerBalance))
+    now = datetime.utcnow()
+    for (owner_id, culture_id), qty in expected.items():
+        session.add(FarmerBalance(owner_id=owner_id, culture_id=culture_id, qty_kg=qty, created_at=now))
+    session.commit()
+    return len(expected)
+
+
+# ─────────────────────────────────────────────
+#  Люди
+# ─────────────────────────────────────────────
+# Баланс людини змінюють: перекази до/від людини (transfer), GRAIN-оплати по її
+# контрактах і `delivered_kg` FROM_FARMER GRAIN-позицій її контрактів (викуп).
+# Скасовані контракти в історичній формулі не враховуються; статус CANCELLED
+# контрактам зараз ніде не виставляється — якщо з'явиться, його перехід теж
+# має відкотити внески контракту через ці хелпери.
+
+def apply_person_balance_delta(session: Session, person_id: Optional[int], culture_id: Optional[int], delta_kg: float) -> None:
+    """Атомарно додає `delta_kg` до балансу людини."""
+    if not person_id or not culture_id or not delta_kg:
+        return
+    _upsert_delta(
+        session, PersonGrainBalance, "uq_person_grain_balance_key",
+        {"person_id": person_id, "culture_id": culture_id}, delta_kg,
+    )
+
+
+def apply_person_item_delivery(session: Session, contract: FarmerContract, item: FarmerContractItem, delivered_delta_kg: float) -> None:
+    """Зміна `delivered_kg` позиції контракту. Для FROM_FARMER GRAIN-позицій контракту
+    людини зерно переходить від людини до нас — баланс людини зменшується на дельту."""
+    if not contract.person_id or not item.culture_id:
+        return
+    if item.direction != FarmerContractItemDirection.FROM_FARMER.value:
+        return
+    if item.item_type != FarmerContractItemType.GRAIN.value:
+        return
+    apply_person_balance_delta(session, contract.person_id, item.culture_id, -delivered_delta_kg)
+
+
+def apply_person_grain_payment(session: Session, contract: FarmerContract, payment: FarmerContractPayment, sign: float = 1.0) -> None:
+    """GRAIN-оплата по контракту людини: `sign=1` — створення (баланс зменшується),
+    `sign=-1` — скасування (зерно повертається на баланс)."""
+    if not contract.person_id:
+        return
+    if payment.payment_type != FarmerContractPaymentType.GRAIN.value:
+        return
+    apply_person_balance_delta(session, contract.person_id, payment.culture_id, -sign * (payment.quantity_kg or 0.0))
+
+
+def apply_person_movement(session: Session, movement: FarmerGrainMovement) -> None:
+    """Переказ зерна: +кг отримувачу-людині, −кг відправнику-людині."""
+    if movement.movement_type != "transfer":
+        return
+    apply_person_balance_delta(session, movement.to_person_id, movement.culture_id, movement.quantity_kg)
+    apply_person_balance_delta(session, movement.from_person_id, movement.culture_id, -movement.quantity_kg)
+
+
+def get_person_balance(session: Session, person_id: int, culture_id: int, *, for_update: bool = False) -> float:
+    """Баланс людини по культурі. `for_update` — див. `get_farmer_balance`."""
+    query = select(PersonGrainBalance.qty_kg).where(
+        PersonGrainBalance.person_id == person_id,
+        PersonGrainBalance.culture_id == culture_id,
+    )
+    if for_update:
+        query = query.with_for_update()
+    qty = session.exec(query).first()
+    return float(qty or 0.0)
+
+
+def list_person_balances(session: Session, person_id: Optional[int] = None) -> list[PersonGrainBalance]:
+    """Рядки журналу з позитивним залишком (усі люди або одна)."""
+    query = select(PersonGrainBalance).where(PersonGrainBalance.qty_kg > BALANCE_EPS)
+    if person_id is not None:
+        query = query.where(PersonGrainBalance.person_id == person_id)
+    return session.exec(query).all()
+
+
+def _person_balances_from_history(session: Session) -> dict[tuple[int, int], float]:
+    """Баланси людей за формулою `_get_person_balance` (еталон для звірки)."""
+    balances: dict[tuple[int, int], float] = {}
+
+    def add(person_id, culture_id, qty):
+        if person_id is None or culture_id is None:
+            return
+        balances[(person_id, culture_id)] = balances.get((person_id, culture_id), 0.0) + float(qty or 0.0)
+
+    incoming = session.exec(
+        select(
+            FarmerGrainMovement.to_person_id,
+            FarmerGrainMovement.culture_id,
+            func.sum(FarmerGrainMovement.quantity_kg),
+        )
+        .where(
+            FarmerGrainMovement.to_person_id.is_not(None),
+            FarmerGrainMovement.movement_type == "transfer",
+        )
+        .group_by(FarmerGrainMovement.to_person_id, FarmerGrainMovement.culture_id)
+    ).all()
+    for person_id, culture_id, qty in incoming:
+        add(person_id, culture_id, qty)
+
+    outgoing = session.exec(
+        select(
+            FarmerGrainMovement.from_person_id,
+            FarmerGrainMovement.culture_id,
+            func.sum(FarmerGrainMovement.quantity_kg),
+        )
+        .where(
+            FarmerGrainMovement.from_person_id.is_not(None),
+            FarmerGrainMovement.movement_type == "transfer",
+        )
+        .group_by(FarmerGrainMovement.from_person_id, FarmerGrainMovement.culture_id)
+    ).all()
+    for person_id, culture_id, qty in outgoing:
+        add(person_id, culture_id, -float(qty or 0.0))
+
+    grain_spent = session.exec(
+        select(
+            FarmerContract.person_id,
+            FarmerContractPayment.culture_id,
+            func.sum(FarmerContractPayment.quantity_kg),
+        )
+        .join(FarmerContract, FarmerContract.id == FarmerContractPayment.contract_id)
+        .where(
+            FarmerContract.person_id.is_not(None),
+            FarmerContract.status != FarmerContractStatus.CANCELLED.value,
+            FarmerContractPayment.payment_type == FarmerContractPaymentType.GRAIN.value,
+            FarmerContractPayment.is_cancelled == False,
+        )
+        .group_by(FarmerContract.person_id, FarmerContractPayment.culture_id)
+    ).all()
+    for person_id, culture_id, qty in grain_spent:
+        add(person_id, culture_id, -float(qty or 0.0))
+
+    payment_spent = session.exec(
+        select(
+            FarmerContract.person_id,
+            FarmerContractItem.culture_id,
+            func.sum(FarmerContractItem.delivered_kg),
+        )
+        .join(FarmerContract, FarmerContract.id == FarmerContractItem.contract_id)
+        .where(
+            FarmerContract.person_id.is_not(None),
+            FarmerContract.status != FarmerContractStatus.CANCELLED.value,
+            FarmerContractItem.direction == FarmerContractItemDirection.FROM_FARMER.value,
+            FarmerContractItem.item_type == FarmerContractItemType.GRAIN.value,
+        )
+        .group_by(FarmerContract.person_id, FarmerContractItem.culture_id)
+    ).all()
+    for person_id, culture_id, qty in payment_spent:
+        add(person_id, culture_id, -float(qty or 0.0))
+
+    return balances
+
+
+def verify_person_balances(session: Session) -> list[dict]:
+    """Звіряє журнал людей з історією. Повертає розбіжності."""
+    actual = {
+        (b.person_id, b.culture_id): b.qty_kg
+        for b in session.exec(select(PersonGrainBalance)).all()
+    }
+    return _diff_ledger(_person_balances_from_history(session), actual, ("person_id", "culture_id"))
+
+
+def rebuild_person_balances(session: Session) -> int:
+    """Перебудовує журнал людей з історії (в одній транзакції). Повертає кількість рядків."""
+    expected = _person_balances_from_history(session)
+    session.exec(delete(PersonGrainBalance))
+    now = datetime.utcnow()
+    for (person_id, culture_id), qty in expected.items():
+        session.add(PersonGrainBalance(person_id=person_id, culture_id=culture_id, qty_kg=qty, created_at=now))
+    session.commit()
+    return len(expected)
+
+
+def main():
+    from backend.database import engine
+
+    parser = argparse.ArgumentParser(description="Звірка / перебудова матеріалізованих балансів зерна")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args()
+
+    ledgers = [
+        ("farmer_balances", verify_farmer_balances, rebuild_farmer_balances),
+        ("person_grain_balances", verify_person_balances, rebuild_person_balances),
+    ]
+    failed = False
+    with Session(engine) as session:
+        for name, verify, rebuild in ledgers:
+            if args.command == "rebuild":
+                count = rebuild(session)
+                print(f"✅ {name} перебудовано: {count} рядків")
+                continue
+            mismatches = verify(session)
+            if not mismatches:
+                print(f"✅ {name} збігається з історією")
+                continue
+            failed = True
+            print(f"⚠️  {name}: {len(mismatches)} розбіжностей")
+            for m in mismatches:
+                print(f"   {m}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Атомарний облік каси (`cash_register`).
+
+Каса — один рядок на всю систему, і кожна операція (ручна зміна балансу,
+виплата по талонах, оренда, контракти, закупівлі) раніше читала його в
+Python, рахувала новий баланс і записувала назад. Дві одночасні виплати
+перезаписували одна одну, а перевірка «чи вистачає коштів» бачила застарілий
+баланс.
+
+Тут рух коштів — один statement:
+
+    UPDATE cash_register SET uah_balance = uah_balance - :amt
+    WHERE id = <каса> [AND uah_balance - :amt >= 0]
+    RETURNING *
+
+Рядок блокується лише на час транзакції виклику, а `*_balance_after` у
+`Transaction` беруться з RETURNING-рядка — тобто з балансу саме після цієї
+операції, а не з прочитаного раніше. Без commit — виконується в транзакції
+виклику.
+"""
+from datetime import datetime
+from typing import Optional, Union
+
+from sqlalchemy import func, update
+from sqlmodel import Session, select
+
+from backend.models import CashRegister, Currency, Transaction, TransactionType
+
+BALANCE_FIELDS = {
+    Currency.UAH: "uah_balance",
+    Currency.USD: "usd_balance",
+    Currency.EUR: "eur_balance",
+}
+
+
+def to_currency(value: Union[Currency, str, None]) -> Currency:
+    """Currency з enum або рядка ('UAH'); невідома чи порожня валюта — гривня."""
+    try:
+        return Currency(value)
+    except ValueError:
+        return Currency.UAH
+
+
+def get_cash_register(session: Session) -> CashRegister:
+    """Рядок каси (створюється, якщо його ще немає; без commit)."""
+    register = session.exec(select(CashRegister).order_by(CashRegister.id)).first()
+    if not register:
+        register = CashRegister(uah_balance=0.0, usd_balance=0.0, eur_balance=0.0)
+        session.add(register)
+        session.flush()
+    return register
+
+
+def change_cash_balance(
+    session: Session,
+    currency: Union[Currency, str],
+    delta: float,
+    *,
+    non_negative: bool = False,
+    clamp: bool = False,
+) -> Optional[CashRegister]:
+    """Атомарно додає `delta` до балансу валюти і повертає рядок каси після зміни.
+    `non_negative=True` — не пускати баланс у мінус: якщо коштів не вистачає,
+    рядок не змінюється і повертається None. `clamp=True` — списати, але
+    не нижче нуля (як старі `max(0.0, ...)` у скасуваннях)."""
+    field = BALANCE_FIELDS[to_currency(currency)]
+    column = getattr(CashRegister, field)
+    register_id = get_cash_register(session).id
+
+    stmt = update(CashRegister).where(CashRegister.id == register_id)
+    if non_negative:
+        stmt = stmt.where(func.coalesce(column, 0.0) + delta >= 0)
+    value = func.coalesce(column, 0.0) + delta
+    if clamp:
+        value = func.greatest(value, 0.0)
+    stmt = (
+        stmt.values({field: value, "updated_at": datetime.utcnow()})
+        .returning(CashRegister)
+        .execution_options(synchronize_session="fetch", populate_existing=True)
+    )
+    return session.exec(stmt).scalar_one_or_none()
+
+
+def record_cash_movement(
+    session: Session,
+    currency: Union[Currency, str],
+    amount: float,
+    transaction_type: TransactionType,
+    user_id: int,
+    description: Optional[str] = None,
+    *,
+    non_negative: bool = False,
+    clamp: bool = False,
+) -> Optional[Transaction]:
+    """Зміна балансу + запис у журналі `transactions` з балансами після операції.
+    `amount` — додатна сума, знак визначає `transaction_type`. None — коштів
+    не вистачило (лише з `non_negative=True`), нічого не змінено."""
+    currency = to_currency(currency)
+    delta = amount if transaction_type == TransactionType.ADD else -amount
+    register = change_cash_balance(session, currency, delta, non_negative=non_negative, clamp=clamp)
+    if register is None:
+        return None
+    transaction = Transaction(
+        currency=currency,
+        amount=amount,
+        transaction_type=transaction_type,
+        user_id=user_id,
+        description=description,
+        uah_balance_after=register.uah_balance,
+        usd_balance_after=register.usd_balance,
+        eur_balance_after=register.eur_balance,
+    )
+    session.add(transaction)
+    return transaction
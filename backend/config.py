@@ -32,10 +32,51 @@ class Settings(BaseSettings):
     jwt_secret_key: str = "your-jwt-secret-key-here"
     jwt_algorithm: str = "HS256"
     jwt_expiration_hours: int = 24
+    # Кеш користувачів для get_current_user (backend/auth.py), секунд
+    auth_user_cache_ttl_sec: int = 60
+    # Потоків для bcrypt (логін, створення/зміна пароля) на воркер
+    password_hash_workers: int = 2
     
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
+
+    # Виконання sync-хендлерів: FastAPI запускає `def`-ендпоінти у threadpool
+    # (anyio). Ліміт потоків на воркер має бути узгоджений з пулом з'єднань БД,
+    # інакше потоки чекатимуть на вільне з'єднання, а не на Postgres.
+    worker_threads: int = 20
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30
+
+    # Фонові експорти (backend/export_jobs.py): процесів генерації на воркер,
+    # скільки годин зберігати готові файли, через скільки хвилин без heartbeat
+    # (щохвилини, поки йде генерація) задача вважається втраченою — воркер
+    # перезапустився посеред генерації, і через скільки хвилин від створення
+    # втраченою вважається задача, що так і не вийшла з черги.
+    export_workers: int = 2
+    export_retention_hours: int = 24
+    export_stale_minutes: int = 5
+    export_queue_timeout_minutes: int = 180
+
+    # Idempotency-Key (backend/idempotency.py): скільки годин повтор запиту
+    # з тим самим ключем повертає збережену відповідь.
+    idempotency_ttl_hours: int = 24
+    # Ключ без відповіді, старший за цей час, вважається покинутим (воркер
+    # упав посеред запиту) і застовплюється заново. Має бути більшим за
+    # найдовший мутуючий запит.
+    idempotency_stale_claim_minutes: int = 15
+
+    # Бекапи БД (backend/backup.py): формат pg_dump (plain / custom / directory),
+    # процесів pg_dump -j для directory, стиснення (gzip / zstd / lz4 / none —
+    # zstd і lz4 потребують pg_dump 16+), скільки щоденних і щотижневих копій
+    # зберігати.
+    backup_format: str = "custom"
+    backup_jobs: int = 2
+    backup_compression: str = "gzip"
+    backup_compression_level: int = 6
+    backup_keep_daily: int = 7
+    backup_keep_weekly: int = 4
     
     # Super Admin (из .env)
     admin_username: str = "admin"
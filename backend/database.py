@@ -1,349 +1,204 @@
-from sqlmodel import SQLModel, create_engine, Session, select, text
+import threading
+from contextlib import contextmanager
+from typing import Iterable
+from sqlalchemy import event
+from sqlmodel import create_engine, Session, text
 from backend.config import settings
-from backend.models import (
-    User,
-    UserRole,
-    CashRegister,
-    GrainCulture,
-    VehicleType,
-    GrainStock,
-    AgriField
-)
 
-# Создание движка базы данных (echo=False — щоб не спамити логи SQL-запитами)
+# Создание движка базы данных (echo=False — щоб не спамити логи SQL-запитами).
+# Пул розрахований на `worker_threads` одночасних sync-хендлерів на воркер:
+# кожен потік тримає одну сесію на час запиту.
 engine = create_engine(
     settings.database_url,
     echo=False,
     pool_pre_ping=True,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
 )
 
 
 def get_session():
-    """Получение сессии базы данных"""
+    """Получение сессии базы данных.
+
+    Сесія синхронна (psycopg2), тому всі ендпоінти, що її використовують,
+    оголошені як звичайні `def` — FastAPI виконує їх у обмеженому threadpool
+    (див. `main.configure_threadpool`), а не на event loop."""
     with Session(engine) as session:
         yield session
 
 
-def init_db():
-    """Инициализация базы данных (создание таблиц, супер админа и кассы)"""
-    # ── Редизайн оренди: знос старих lease-таблиць ПЕРЕД create_all ──────────
-    # Старі дані оренди стираємо (start-from-scratch), орендодавців лишаємо.
-    # Порядок важливий: спершу прибрати FK з agri_fields на lease_contracts,
-    # потім дропнути таблиці (CASCADE — через self-FK на lease_contracts).
-    with engine.connect() as conn:
-        # Одноразовий знос: ВИКОНУЄМО лише якщо в БД ще є СТАРА структура оренди
-        # (таблиця lease_contracts). Нові таблиці lease_payments /
-        # lease_payment_grain_items мають ТІ САМІ імена, тому без цієї перевірки
-        # вони дропалися б при КОЖНОМУ старті → втрата даних виплат.
-        old_lease_exists = conn.execute(
-            text("SELECT to_regclass('public.lease_contracts') IS NOT NULL")
-        ).scalar()
-        if old_lease_exists:
-            for ddl in [
-                "ALTER TABLE IF EXISTS agri_fields DROP COLUMN IF EXISTS lease_contract_id",
-                "ALTER TABLE IF EXISTS agri_fields DROP COLUMN IF EXISTS landlord_id",
-                "DROP TABLE IF EXISTS lease_payment_grain_items CASCADE",
-                "DROP TABLE IF EXISTS lease_payments CASCADE",
-                "DROP TABLE IF EXISTS lease_contract_items CASCADE",
-                "DROP TABLE IF EXISTS lease_contracts CASCADE",
-            ]:
-                try:
-                    conn.execute(text(ddl))
-                    conn.commit()
-                except Exception:
-                    conn.rollback()
-
-    SQLModel.metadata.create_all(engine)
-
-    # Міграції колонок: IF NOT EXISTS — без ERROR у логах Postgres при повторному init_db
-    with engine.connect() as conn:
-        conn.execute(text(
-            "ALTER TABLE grain_stock ADD COLUMN IF NOT EXISTS reserved_kg DOUBLE PRECISION DEFAULT 0"
-        ))
-        conn.commit()
-
-        conn.execute(text(
-            "ALTER TABLE farmer_contract_items ADD COLUMN IF NOT EXISTS direction VARCHAR(32) DEFAULT 'from_company'"
-        ))
-        conn.execute(text(
-            "ALTER TABLE farmer_contract_items ADD COLUMN IF NOT EXISTS delivered_kg DOUBLE PRECISION DEFAULT 0"
-        ))
-        conn.commit()
-
-        conn.execute(text(
-            "ALTER TABLE farmer_contract_payments ADD COLUMN IF NOT EXISTS contract_item_id INTEGER"
-        ))
-        conn.execute(text(
-            "ALTER TABLE farmer_contract_payments ADD COLUMN IF NOT EXISTS item_name VARCHAR(255)"
-        ))
-        conn.commit()
-
-        # Розширення farmer_grain_movements: from_person_id, to_enterprise +
-        # дозволяємо from_owner_id бути NULL (для рухів «людина → підприємство»).
-        conn.execute(text(
-            "ALTER TABLE farmer_grain_movements ADD COLUMN IF NOT EXISTS from_person_id INTEGER REFERENCES people(id)"
-        ))
-        conn.execute(text(
-            "ALTER TABLE farmer_grain_movements ADD COLUMN IF NOT EXISTS to_enterprise BOOLEAN DEFAULT FALSE"
-        ))
-        conn.execute(text(
-            "ALTER TABLE farmer_grain_movements ALTER COLUMN from_owner_id DROP NOT NULL"
-        ))
-        conn.commit()
-
-        # Міграція: конвертуємо enum-колонки в VARCHAR(32) для уникнення проблем з PostgreSQL enum
-        for tbl, col in [
-            ("farmer_contracts", "contract_type"),
-            ("farmer_contracts", "status"),
-            ("farmer_contract_items", "item_type"),
-            ("farmer_contract_payments", "payment_type"),
-        ]:
-            try:
-                conn.execute(text(
-                    f"ALTER TABLE {tbl} ALTER COLUMN {col} TYPE VARCHAR(32) USING {col}::text"
-                ))
-                conn.commit()
-                print(f"✅ Конвертовано {tbl}.{col} в VARCHAR(32)")
-            except Exception:
-                conn.rollback()
-
-        # Нормалізуємо значення enum-колонок до нижнього регістру
-        try:
-            conn.execute(text("UPDATE farmer_contracts SET contract_type = LOWER(contract_type), status = LOWER(status)"))
-            conn.execute(text("UPDATE farmer_contract_items SET item_type = LOWER(item_type), direction = LOWER(direction)"))
-            conn.execute(text("UPDATE farmer_contract_payments SET payment_type = LOWER(payment_type)"))
-            conn.commit()
-        except Exception:
-            conn.rollback()
-
-        # Міграції для нових полів farmer_contracts (4 типи контрактів)
-        conn.execute(text(
-            "ALTER TABLE farmer_contracts ADD COLUMN IF NOT EXISTS currency VARCHAR(8)"
-        ))
-        conn.execute(text(
-            "ALTER TABLE farmer_contracts ADD COLUMN IF NOT EXISTS exchange_rate DOUBLE PRECISION"
-        ))
-        conn.execute(text(
-            "ALTER TABLE farmer_contracts ADD COLUMN IF NOT EXISTS was_reserve BOOLEAN DEFAULT FALSE"
-        ))
-        conn.commit()
+EXPORT_BATCH_SIZE = 1000
+
+
+def stream_rows(session: Session, statement, batch_size: int = EXPORT_BATCH_SIZE):
+    """Ітерує результат запиту серверним курсором (psycopg2 named cursor).
+
+    `yield_per` вмикає `stream_results`: Postgres віддає рядки партіями по
+    `batch_size`, тож у пам'яті ніколи не лежить уся вибірка. Для експортів
+    краще передавати select по конкретних колонках, а не по моделі, — тоді
+    рядки повертаються як легкі `Row` без ORM-об'єктів та identity map.
+    Курсор живе в транзакції сесії, тому результат треба вичитати до
+    закриття сесії (тобто в межах хендлера)."""
+    yield from session.exec(statement, execution_options={"yield_per": batch_size})
+
+
+class QueryCounter:
+    """Лічильник SQL-запитів, виконаних поточним потоком у межах `count_queries`."""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(bind=None):
+    """Рахує запити до БД, виконані в поточному потоці.
+
+    Рахуються лише запити потоку, що відкрив контекст, — паралельні запити
+    інших хендлерів threadpool на той самий engine не впливають на результат.
+
+        with count_queries() as counter:
+            period_report(session, user)
+        assert counter.count <= 12
+    """
+    bind = bind or engine
+    counter = QueryCounter()
+    thread_id = threading.get_ident()
+
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread_id:
+            counter.statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", _on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", _on_execute)
+
+
+@contextmanager
+def assert_max_queries(limit: int, bind=None):
+    """Падає з AssertionError, якщо в блоці виконано більше `limit` запитів.
+
+    Для звітів: ліміт фіксується на малому наборі даних і не має рости
+    з кількістю рядків (захист від N+1)."""
+    with count_queries(bind) as counter:
+        yield counter
+    if counter.count > limit:
+        joined = "\n".join(counter.statements)
+        raise AssertionError(
+            f"Виконано {counter.count} SQL-запитів, очікувалось не більше {limit}:\n{joined}"
+        )
+
+
+# Індекси під гарячі запити. create_all не створює індексів для foreign_key=
+# і не вміє partial/DESC, тому набори ведемо тут і застосовуємо міграціями
+# (`backend.migrations`). Кожен набір заморожений за своєю міграцією: новий
+# індекс — новий кортеж і нова міграція з `ensure_indexes(conn, <кортеж>)`,
+# застосовані набори не редагуються.
+# Принципи:
+#   • (created_at DESC, id DESC) — на всіх журналах, які списки/експорти
+#     сортують від новіших (і під keyset-пагінацію по (created_at, id));
+#   • FK-колонки, по яких фільтруємо або джойнимо (contract_id, payment_id, …);
+#   • partial — коли запит завжди містить той самий предикат (баланси фермерів
+#     рахуються лише по підтверджених картках) або колонка здебільшого NULL.
+# Міграція 11 (`_indexes`).
+INDEXES_V11: tuple[tuple[str, str], ...] = (
+    # grain_intakes
+    ("ix_grain_intakes_created_at", "grain_intakes (created_at DESC, id DESC)"),
+    ("ix_grain_intakes_owner_culture_on_stock",
+     "grain_intakes (owner_id, culture_id) "
+     "WHERE NOT is_own_grain AND NOT pending_quality AND NOT pending_tare"),
+    ("ix_grain_intakes_culture_created", "grain_intakes (culture_id, created_at DESC)"),
+    ("ix_grain_intakes_pending", "grain_intakes (created_at DESC) WHERE pending_quality OR pending_tare"),
+    ("ix_grain_intakes_driver_created", "grain_intakes (driver_id, created_at DESC) WHERE driver_id IS NOT NULL"),
+    ("ix_grain_intakes_field_id", "grain_intakes (field_id) WHERE field_id IS NOT NULL"),
+    # grain_shipments
+    ("ix_grain_shipments_created_at", "grain_shipments (created_at DESC, id DESC)"),
+    ("ix_grain_shipments_culture_id", "grain_shipments (culture_id)"),
+    ("ix_grain_shipments_driver_created", "grain_shipments (driver_id, created_at DESC) WHERE driver_id IS NOT NULL"),
+    # Каса, закупівлі, журнал складу
+    ("ix_transactions_created_at", "transactions (created_at DESC, id DESC)"),
+    ("ix_transactions_user_id", "transactions (user_id)"),
+    ("ix_purchase_records_created_at", "purchase_records (created_at DESC, id DESC)"),
+    ("ix_purchase_records_stock_id", "purchase_records (stock_id)"),
+    ("ix_stock_adjustments_created_at", "stock_adjustments (created_at DESC, id DESC)"),
+    ("ix_stock_adjustments_culture_id", "stock_adjustments (culture_id) WHERE culture_id IS NOT NULL"),
+    # Рухи зерна фермерів/людей
+    ("ix_farmer_grain_movements_created_at", "farmer_grain_movements (created_at DESC, id DESC)"),
+    ("ix_farmer_grain_movements_from_owner",
+     "farmer_grain_movements (from_owner_id, culture_id) WHERE from_owner_id IS NOT NULL"),
+    ("ix_farmer_grain_movements_to_owner",
+     "farmer_grain_movements (to_owner_id, culture_id) WHERE to_owner_id IS NOT NULL"),
+    ("ix_farmer_grain_movements_from_person",
+     "farmer_grain_movements (from_person_id, culture_id) WHERE from_person_id IS NOT NULL"),
+    ("ix_farmer_grain_movements_to_person",
+     "farmer_grain_movements (to_person_id, culture_id) WHERE to_person_id IS NOT NULL"),
+    ("ix_farmer_grain_deductions_owner_culture", "farmer_grain_deductions (owner_id, culture_id)"),
+    ("ix_farmer_grain_deductions_payment_id",
+     "farmer_grain_deductions (payment_id) WHERE payment_id IS NOT NULL"),
+    # Контракти фермерів
+    ("ix_farmer_contracts_owner_id", "farmer_contracts (owner_id) WHERE owner_id IS NOT NULL"),
+    ("ix_farmer_contracts_person_id", "farmer_contracts (person_id) WHERE person_id IS NOT NULL"),
+    ("ix_farmer_contracts_status_created", "farmer_contracts (status, created_at DESC)"),
+    ("ix_farmer_contract_items_contract_id", "farmer_contract_items (contract_id)"),
+    ("ix_farmer_contract_payments_contract_id", "farmer_contract_payments (contract_id)"),
+    ("ix_farmer_contract_payments_payment_date", "farmer_contract_payments (payment_date DESC)"),
+    ("ix_farmer_contract_payments_item_id",
+     "farmer_contract_payments (contract_item_id) WHERE contract_item_id IS NOT NULL"),
+    # Талони
+    ("ix_grain_vouchers_owner_id", "grain_vouchers (owner_id)"),
+    ("ix_grain_vouchers_contract_payment_id",
+     "grain_vouchers (farmer_contract_payment_id) WHERE farmer_contract_payment_id IS NOT NULL"),
+    ("ix_grain_voucher_payments_voucher_id", "grain_voucher_payments (voucher_id)"),
+    # Оренда
+    ("ix_lease_parcels_landlord_id", "lease_parcels (landlord_id)"),
+    ("ix_lease_period_grain_items_period_id", "lease_period_grain_items (period_id)"),
+    ("ix_lease_payments_parcel_period", "lease_payments (parcel_id, period_id)"),
+    ("ix_lease_payments_payment_date", "lease_payments (payment_date DESC)"),
+    ("ix_lease_payment_grain_items_payment_id", "lease_payment_grain_items (payment_id)"),
+    # Інше
+    ("ix_driver_stats_driver_id", "driver_stats (driver_id)"),
+    ("ix_export_jobs_user_created", "export_jobs (created_by_user_id, created_at DESC)"),
+)
 
-        for col_def in [
-            ("payment_format", "VARCHAR(32) DEFAULT 'none'"),
-            ("driver_id", "INTEGER"),
-            ("vehicle_type_id", "INTEGER"),
-        ]:
-            conn.execute(text(
-                f"ALTER TABLE grain_shipments ADD COLUMN IF NOT EXISTS {col_def[0]} {col_def[1]}"
-            ))
-        conn.commit()
+# Міграція 16 (`_voucher_fifo`): черга FIFO розподілу виплат по талонах
+# (`backend/voucher_allocation.py`) і журнал виплат від новіших.
+VOUCHER_FIFO_INDEXES: tuple[tuple[str, str], ...] = (
+    ("ix_grain_vouchers_open_fifo", "grain_vouchers (created_at, id) WHERE is_closed = false"),
+    ("ix_grain_vouchers_paid_fifo", "grain_vouchers (created_at DESC, id DESC) WHERE paid_value_uah > 0"),
+    ("ix_grain_voucher_payments_created_at", "grain_voucher_payments (created_at DESC, id DESC)"),
+)
 
-        conn.execute(text(
-            "ALTER TABLE purchase_records ADD COLUMN IF NOT EXISTS is_free BOOLEAN DEFAULT FALSE"
-        ))
-        conn.commit()
 
-        conn.execute(text(
-            "ALTER TABLE grain_intakes ADD COLUMN IF NOT EXISTS is_own_combine BOOLEAN DEFAULT FALSE"
-        ))
-        conn.execute(text(
-            "ALTER TABLE grain_intakes ADD COLUMN IF NOT EXISTS field_id INTEGER REFERENCES agri_fields(id)"
-        ))
-        conn.execute(text(
-            "ALTER TABLE grain_intakes ADD COLUMN IF NOT EXISTS is_farmer_transfer BOOLEAN DEFAULT FALSE"
-        ))
-        conn.commit()
+def ensure_indexes(conn, indexes: Iterable[tuple[str, str]]) -> None:
+    """CREATE INDEX IF NOT EXISTS для кожного індексу з `indexes` (пари
+    «назва, `таблиця (колонки) [WHERE ...]`»). Кожен — у своїй транзакції.
 
-        try:
-            conn.execute(text(
-                "UPDATE grain_intakes SET is_farmer_transfer = TRUE "
-                "WHERE note IS NOT NULL AND note ILIKE 'Трансфер від%'"
-            ))
-            conn.commit()
-            print("✅ Позначено існуючі трансфери між фермерами в grain_intakes")
-        except Exception:
-            conn.rollback()
-
-        conn.execute(text(
-            "ALTER TABLE grain_intakes ADD COLUMN IF NOT EXISTS pending_tare BOOLEAN DEFAULT FALSE"
-        ))
+    Міграції йдуть під pg_advisory_lock, тож гонки воркерів тут немає; помилка
+    пробрасується — міграція не записується в журнал і повториться на
+    наступному старті, а не лишить БД без індексу назавжди."""
+    for name, definition in indexes:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
         conn.commit()
 
-        conn.execute(text(
-            "ALTER TABLE farmer_contract_items ADD COLUMN IF NOT EXISTS currency VARCHAR(8) DEFAULT 'UAH'"
-        ))
-        conn.commit()
 
-        # Міграція: users.role — конвертуємо нативний enum у VARCHAR(32),
-        # щоб додати нову роль "manager" без перетворення типу.
-        try:
-            conn.execute(text(
-                "ALTER TABLE users ALTER COLUMN role TYPE VARCHAR(32) USING role::text"
-            ))
-            conn.commit()
-            print("✅ Конвертовано users.role в VARCHAR(32)")
-        except Exception:
-            conn.rollback()
-
-        # SQLAlchemy старі версії зберігали enum NAME (SUPER_ADMIN) замість value (super_admin).
-        # Нормалізуємо до нижнього регістру, бо Pydantic очікує саме значення enum.
-        try:
-            conn.execute(text("UPDATE users SET role = LOWER(role) WHERE role <> LOWER(role)"))
-            conn.commit()
-        except Exception:
-            conn.rollback()
-
-        # Міграція: «Люди» — окрема сутність, що може купувати у нас і приймати трансфери зерна.
-        conn.execute(text(
-            "ALTER TABLE farmer_contracts ADD COLUMN IF NOT EXISTS person_id INTEGER REFERENCES people(id)"
-        ))
-        # owner_id був NOT NULL — тепер контракт може бути або з фермером, або з людиною.
-        try:
-            conn.execute(text(
-                "ALTER TABLE farmer_contracts ALTER COLUMN owner_id DROP NOT NULL"
-            ))
-        except Exception:
-            conn.rollback()
-        conn.execute(text(
-            "ALTER TABLE farmer_grain_movements ADD COLUMN IF NOT EXISTS to_person_id INTEGER REFERENCES people(id)"
-        ))
-        conn.commit()
-
-        # Баланс зерна у людей (новий бакет в grain_stock). Бекап з історичних
-        # переказів to_person_id: повертаємо зерно на склад і кладемо у новий бакет.
-        # Стара логіка фізично зменшувала quantity_kg при переказі до людини; тепер
-        # переказ — це внутрішня переуступка з farmer_quantity_kg в person_quantity_kg.
-        conn.execute(text(
-            "ALTER TABLE grain_stock ADD COLUMN IF NOT EXISTS person_quantity_kg DOUBLE PRECISION DEFAULT 0"
-        ))
-        conn.commit()
+def explain_plan(session: Session, statement) -> str:
+    """Текст EXPLAIN для запиту (SQLAlchemy statement) — щоб перевірити,
+    що запит іде по індексу: `assert "ix_grain_intakes_created_at" in plan`."""
+    compiled = statement.compile(bind=session.get_bind(), compile_kwargs={"literal_binds": True})
+    rows = session.exec(text(f"EXPLAIN {compiled}")).all()
+    return "\n".join(row[0] for row in rows)
 
-        try:
-            already_migrated = conn.execute(text(
-                "SELECT COALESCE(SUM(person_quantity_kg), 0) FROM grain_stock"
-            )).scalar() or 0
-            # Запускаємо бекап лише один раз — якщо ще нікому з людей баланс не нараховувався.
-            if float(already_migrated) <= 0:
-                conn.execute(text(
-                    """
-                    WITH person_transfers AS (
-                        SELECT culture_id, COALESCE(SUM(quantity_kg), 0) AS total_kg
-                        FROM farmer_grain_movements
-                        WHERE to_person_id IS NOT NULL
-                          AND movement_type = 'transfer'
-                        GROUP BY culture_id
-                    )
-                    UPDATE grain_stock gs
-                    SET person_quantity_kg = pt.total_kg,
-                        quantity_kg = gs.quantity_kg + pt.total_kg
-                    FROM person_transfers pt
-                    WHERE gs.culture_id = pt.culture_id
-                      AND pt.total_kg > 0
-                    """
-                ))
-                conn.commit()
-                print("✅ Бекап: зерно з історичних переказів to_person повернуто на склад у person_quantity_kg")
-        except Exception as exc:
-            print(f"⚠️  Бекап person_quantity_kg пропущено: {exc}")
-            conn.rollback()
 
-    with Session(engine) as session:
-        # Создание супер админа, если его еще нет
-        admin = session.exec(
-            select(User).where(User.username == settings.admin_username)
-        ).first()
-        
-        if not admin:
-            # Импортируем локально, чтобы избежать циклического импорта
-            from backend.auth import get_password_hash
-            
-            admin = User(
-                username=settings.admin_username,
-                password_hash=get_password_hash(settings.admin_password),
-                password_plain=settings.admin_password,  # Сохраняем пароль в открытом виде
-                full_name=settings.admin_full_name,
-                role=UserRole.SUPER_ADMIN,
-                is_active=True
-            )
-            session.add(admin)
-            session.commit()
-            print(f"✅ Супер админ создан: {settings.admin_username}")
-        
-        # Создание кассы, если ее еще нет
-        cash_register = session.exec(select(CashRegister)).first()
-        
-        if not cash_register:
-            cash_register = CashRegister(
-                uah_balance=0.0,
-                usd_balance=0.0,
-                eur_balance=0.0
-            )
-            session.add(cash_register)
-            session.commit()
-            print("✅ Касса инициализирована с нулевыми балансами")
-
-        # Инициализация культур зерна
-        default_cultures = [
-            "Ячмінь",
-            "Пшениця",
-            "Горох",
-            "Ріпак",
-            "Соняшник",
-            "Кукурудза",
-            "Льон"
-        ]
-        for culture_name in default_cultures:
-            exists = session.exec(
-                select(GrainCulture).where(GrainCulture.name == culture_name)
-            ).first()
-            if not exists:
-                session.add(GrainCulture(name=culture_name, price_per_kg=1.0))
-        session.commit()
-
-        # Мінімальна ціна 1 для всіх позицій на складі
-        from backend.models import PurchaseStock
-        zero_cultures = session.exec(
-            select(GrainCulture).where(GrainCulture.price_per_kg < 1.0)
-        ).all()
-        for c in zero_cultures:
-            c.price_per_kg = 1.0
-            session.add(c)
-
-        zero_stocks = session.exec(
-            select(PurchaseStock).where(PurchaseStock.sale_price_per_kg < 1.0)
-        ).all()
-        for s in zero_stocks:
-            s.sale_price_per_kg = 1.0
-            session.add(s)
-        if zero_cultures or zero_stocks:
-            session.commit()
-            print(f"✅ Оновлено ціни: {len(zero_cultures)} культур, {len(zero_stocks)} товарів (мін. 1 грн/кг)")
-
-        # Инициализация типов транспорта
-        default_vehicle_types = [
-            "КамАЗ",
-            "ГАЗ",
-            "ЗИЛ",
-            "Фура",
-            "Трактор",
-            "КрАЗ",
-            "Легковой автомобіль"
-        ]
-        for vehicle_name in default_vehicle_types:
-            exists = session.exec(
-                select(VehicleType).where(VehicleType.name == vehicle_name)
-            ).first()
-            if not exists:
-                session.add(VehicleType(name=vehicle_name))
-        session.commit()
-
-        # Инициализация склада для каждой культуры
-        cultures = session.exec(select(GrainCulture)).all()
-        for culture in cultures:
-            stock = session.exec(
-                select(GrainStock).where(GrainStock.culture_id == culture.id)
-            ).first()
-            if not stock:
-                session.add(GrainStock(culture_id=culture.id, quantity_kg=0.0))
-        session.commit()
+def init_db():
+    """Міграції схеми й початкові дані (`backend.migrations`). На вже
+    мігрованій БД — один запит перевірки версії."""
+    # Імпорт тут — migrations сам імпортує engine з цього модуля
+    from backend.migrations import run_migrations
 
+    run_migrations()
@@ -0,0 +1,282 @@
+"""Фонові експорти великих Excel-звітів.
+
+Важкі звіти (спец-звіт приходів, звіт за період) не вміщаються в таймаут
+nginx і тримають потік воркера, тому їх можна замовити фоном:
+
+    POST /api/exports/jobs            → задача в таблиці `export_jobs` (queued)
+    GET  /api/exports/jobs/{id}       → статус і прогрес
+    GET  /api/exports/jobs/{id}/download → готовий .xlsx
+
+Генерація йде в локальному пулі процесів (ProcessPoolExecutor) воркера, що
+прийняв запит. Стан задачі — у Postgres, файл — у спільній теці EXPORT_DIR,
+тож при `uvicorn --workers 2` статус і файл віддає будь-який воркер.
+Поки задача генерується, дочірній процес раз на `HEARTBEAT_INTERVAL_SEC`
+оновлює `updated_at`. Якщо воркер перезапустився посеред генерації, heartbeat
+зникає, і задача (running) без нього довше `export_stale_minutes` позначається
+як failed. Задача в черзі (queued) чекає на вільний процес скільки завгодно
+довго, тож її рахуємо втраченою лише через `export_queue_timeout_minutes` від
+створення. Завершення (done / failed) записується тільки поверх running —
+задача, яку вже визнано втраченою, не «оживає». Готові файли та записи
+видаляються через `export_retention_hours`.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_, update
+from sqlmodel import Session, select
+
+from backend.config import settings
+from backend.database import engine
+from backend.models import ExportJob, ExportJobStatus, User
+from backend.reference_cache import reference_cache
+
+logger = logging.getLogger(__name__)
+
+# Тека для готових файлів. Як і BACKUP_DIR — відносно робочої теки процесу,
+# можна перевизначити змінною оточення EXPORT_DIR. Має бути спільною для всіх
+# воркерів uvicorn (одна машина).
+EXPORT_DIR = Path(os.environ.get("EXPORT_DIR") or "exports").resolve()
+CLEANUP_INTERVAL_SEC = 15 * 60
+HEARTBEAT_INTERVAL_SEC = 60
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+# ─── Типи звітів ──────────────────────────────────────────────────────────────
+# Будівники імпортуються ліниво: модуль вантажиться і в дочірньому процесі.
+
+def _build_intakes_summary(session: Session, params: dict, progress: Callable[[int], None]):
+    from backend.api.grain import build_intakes_summary_workbook
+
+    workbook = build_intakes_summary_workbook(
+        session, params.get("start_date"), params.get("end_date"), progress=progress
+    )
+    return workbook, f"intakes_summary_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
+
+
+def _build_period_report(session: Session, params: dict, progress: Callable[[int], None]):
+    from backend.api.dashboard import build_period_report_workbook, period_report_filename
+
+    start_date, end_date = params.get("start_date"), params.get("end_date")
+    workbook = build_period_report_workbook(session, None, start_date, end_date, progress=progress)
+    return workbook, period_report_filename(start_date, end_date)
+
+
+EXPORT_KINDS: dict[str, Callable] = {
+    "intakes_summary": _build_intakes_summary,
+    "period_report": _build_period_report,
+}
+
+
+# ─── Пул процесів ─────────────────────────────────────────────────────────────
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Пул створюється ліниво, по одному на воркер uvicorn.
+    spawn, а не fork: батьківський процес багатопотоковий (threadpool FastAPI),
+    і fork скопіював би захоплені локи та відкриті з'єднання пулу БД."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=max(1, settings.export_workers),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def create_export_job(session: Session, kind: str, params: dict, user: User) -> ExportJob:
+    """Створює задачу і ставить її в пул процесів цього воркера."""
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Невідомий тип звіту: {kind}")
+    job = ExportJob(kind=kind, params=json.dumps(params), created_by_user_id=user.id)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+
+    try:
+        _get_executor().submit(run_export_job, job.id)
+    except BrokenProcessPool:
+        # Дочірній процес впав (OOM тощо) — пул непридатний, створюємо новий.
+        shutdown_executor()
+        _get_executor().submit(run_export_job, job.id)
+    return job
+
+
+# ─── Виконання (у дочірньому процесі) ─────────────────────────────────────────
+
+def _update_job(job_id: int, **values) -> int:
+    """Окрема коротка транзакція: прогрес видно іншим воркерам одразу,
+    навіть поки сесія будівника тримає свою транзакцію читання.
+    Змінює лише задачу в статусі running — повертає 0, якщо її вже
+    позначено втраченою (`cleanup_export_jobs`)."""
+    values.setdefault("updated_at", datetime.utcnow())
+    with engine.begin() as conn:
+        return conn.execute(
+            update(ExportJob)
+            .where(ExportJob.id == job_id, ExportJob.status == ExportJobStatus.RUNNING.value)
+            .values(**values)
+        ).rowcount
+
+
+def _heartbeat(job_id: int, stop: threading.Event) -> None:
+    """Оновлює `updated_at`, поки йде генерація: між відсотками прогресу
+    будівник може довго не звітувати (один великий запит, збереження книги)."""
+    while not stop.wait(HEARTBEAT_INTERVAL_SEC):
+        try:
+            if not _update_job(job_id):
+                return
+        except Exception:
+            logger.exception("Heartbeat фонового експорту #%s не записано", job_id)
+
+
+def run_export_job(job_id: int) -> None:
+    # Захоплюємо задачу атомарно: лише queued → running. Задачу, яку вже
+    # позначено втраченою (failed), повторно не запускаємо.
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        claimed = conn.execute(
+            update(ExportJob)
+            .where(ExportJob.id == job_id, ExportJob.status == ExportJobStatus.QUEUED.value)
+            .values(status=ExportJobStatus.RUNNING.value, progress=5, started_at=now, updated_at=now)
+        ).rowcount
+    if not claimed:
+        return
+
+    # Дочірній процес не слухає NOTIFY (див. `backend.reference_cache`) —
+    # кожен звіт бере довідники свіжими.
+    reference_cache.invalidate()
+    started = time.monotonic()
+    path: Optional[Path] = None
+    stop_heartbeat = threading.Event()
+    threading.Thread(
+        target=_heartbeat, args=(job_id, stop_heartbeat), name=f"export-heartbeat-{job_id}", daemon=True
+    ).start()
+    with Session(engine) as session:
+        job = session.get(ExportJob, job_id)
+        try:
+            params = json.loads(job.params or "{}")
+            workbook, filename = EXPORT_KINDS[job.kind](
+                session, params, lambda pct: _update_job(job_id, progress=pct)
+            )
+            EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+            path = EXPORT_DIR / f"{job_id}_{uuid.uuid4().hex}.xlsx"
+            tmp = path.with_name(f"{path.name}.part")
+            workbook.save(tmp)
+            os.replace(tmp, path)  # атомарно: download ніколи не бачить напівзаписаний файл
+        except Exception as e:
+            session.rollback()
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.exception("Фоновий експорт #%s (%s) завершився помилкою", job_id, job.kind)
+            _update_job(
+                job_id,
+                status=ExportJobStatus.FAILED.value,
+                error=str(detail)[:500],
+                finished_at=datetime.utcnow(),
+            )
+            return
+        finally:
+            stop_heartbeat.set()
+
+    finished = _update_job(
+        job_id,
+        status=ExportJobStatus.DONE.value,
+        progress=100,
+        filename=filename,
+        file_path=str(path),
+        file_size=path.stat().st_size,
+        finished_at=datetime.utcnow(),
+    )
+    if not finished:
+        # Поки генерували, задачу визнали втраченою — користувач уже бачить
+        # помилку, файл нікому не віддасться.
+        _remove_file(str(path))
+        logger.warning("Фоновий експорт #%s завершився після того, як його позначено втраченим", job_id)
+        return
+    logger.info("Фоновий експорт #%s готовий: %s (%.1f с)", job_id, path.name, time.monotonic() - started)
+
+
+# ─── Прибирання ───────────────────────────────────────────────────────────────
+
+def _remove_file(file_path: Optional[str]) -> None:
+    if not file_path:
+        return
+    try:
+        os.unlink(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def cleanup_export_jobs(session: Session) -> int:
+    """Позначає втрачені задачі як failed, видаляє прострочені задачі та їх файли.
+    Втрачена — running без heartbeat довше `export_stale_minutes` або queued
+    довше `export_queue_timeout_minutes` від створення.
+    Ідемпотентно — безпечно запускати одночасно в кількох воркерах."""
+    now = datetime.utcnow()
+    stale_before = now - timedelta(minutes=settings.export_stale_minutes)
+    queued_before = now - timedelta(minutes=settings.export_queue_timeout_minutes)
+    expire_before = now - timedelta(hours=settings.export_retention_hours)
+
+    session.exec(
+        update(ExportJob)
+        .where(or_(
+            and_(
+                ExportJob.status == ExportJobStatus.RUNNING.value,
+                func.coalesce(ExportJob.updated_at, ExportJob.started_at, ExportJob.created_at) < stale_before,
+            ),
+            and_(
+                ExportJob.status == ExportJobStatus.QUEUED.value,
+                ExportJob.created_at < queued_before,
+            ),
+        ))
+        .values(
+            status=ExportJobStatus.FAILED.value,
+            error="Задачу перервано (перезапуск сервера) — сформуйте звіт повторно",
+            finished_at=now,
+            updated_at=now,
+        )
+    )
+
+    expired = session.exec(select(ExportJob).where(ExportJob.created_at < expire_before)).all()
+    for job in expired:
+        _remove_file(job.file_path)
+        session.delete(job)
+    session.commit()
+
+    # Сироти на диску: .part від процесів, що впали, або файли без запису в БД.
+    if EXPORT_DIR.exists():
+        cutoff = time.time() - settings.export_retention_hours * 3600
+        for entry in EXPORT_DIR.iterdir():
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    entry.unlink()
+            except FileNotFoundError:
+                pass
+    return len(expired)
+
+
+def export_cleanup_job() -> None:
+    """Періодична задача планувальника (кожні `CLEANUP_INTERVAL_SEC`)."""
+    with Session(engine) as session:
+        removed = cleanup_export_jobs(session)
+    if removed:
+        logger.info("Видалено прострочених фонових експортів: %d", removed)
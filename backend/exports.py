@@ -0,0 +1,161 @@
+"""Потоковий експорт у Excel (openpyxl write-only).
+
+Звичайний `Workbook()` тримає всі клітинки в пам'яті, а стилі ще раз
+проходять по `sheet.max_row × колонки` після заповнення. Тут аркуш пишеться
+в режимі write-only: кожен рядок стилізується в момент додавання і одразу
+скидається у тимчасовий файл openpyxl, тож пам'ять не залежить від кількості
+рядків. Готовий .xlsx віддається з диска частинами через `StreamingResponse`.
+
+    book = XlsxExport()
+    sheet = book.sheet("Прихід зерна", headers, widths=[20, 16], number_formats={4: MONEY_FORMAT})
+    for item in rows:
+        sheet.append([...], fills={5: status_fill})
+    return book.to_response("intake_report.xlsx")
+"""
+import os
+import tempfile
+from typing import Iterable, Iterator, Optional
+
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CHUNK_SIZE = 64 * 1024
+
+MONEY_FORMAT = "#,##0.00"
+PERCENT_FORMAT = "0.00"
+
+HEADER_FILL = PatternFill("solid", fgColor="1F2937")
+HEADER_FONT = Font(color="FFFFFF", bold=True)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="center")
+ALT_FILL = PatternFill("solid", fgColor="F8FAFC")
+CENTER = Alignment(horizontal="center")
+THIN_BORDER = Border(
+    left=Side(style="thin", color="E5E7EB"),
+    right=Side(style="thin", color="E5E7EB"),
+    top=Side(style="thin", color="E5E7EB"),
+    bottom=Side(style="thin", color="E5E7EB"),
+)
+
+
+class XlsxSheet:
+    """Аркуш write-only: шапка, ширини і формати задаються до першого рядка."""
+
+    def __init__(
+        self,
+        worksheet,
+        headers: list[str],
+        widths: Iterable[float] = (),
+        number_formats: Optional[dict[int, str]] = None,
+        centered: Iterable[int] = (),
+        striped: bool = True,
+    ):
+        self._ws = worksheet
+        self.ncols = len(headers)
+        self.number_formats = number_formats or {}
+        self.centered = set(centered)
+        self.striped = striped
+        self.row_count = 0
+
+        for idx, width in enumerate(widths, start=1):
+            worksheet.column_dimensions[get_column_letter(idx)].width = width
+        worksheet.freeze_panes = "A2"
+
+        header_cells = []
+        for value in headers:
+            cell = WriteOnlyCell(worksheet, value=value)
+            cell.fill = HEADER_FILL
+            cell.font = HEADER_FONT
+            cell.alignment = HEADER_ALIGNMENT
+            cell.border = THIN_BORDER
+            header_cells.append(cell)
+        worksheet.append(header_cells)
+
+    def append(self, values: list, fills: Optional[dict[int, PatternFill]] = None) -> None:
+        """Додати рядок даних. `fills` — заливка окремих колонок (1-based),
+        має пріоритет над «зеброю» (як колонка статусу в старих експортах)."""
+        self.row_count += 1
+        row_index = self.row_count + 1
+        row_fill = ALT_FILL if self.striped and row_index % 2 == 0 else None
+        cells = []
+        for col, value in enumerate(values, start=1):
+            cell = WriteOnlyCell(self._ws, value=value)
+            fill = fills.get(col) if fills else None
+            if fill is not None:
+                cell.fill = fill
+            elif row_fill is not None:
+                cell.fill = row_fill
+            if col in self.centered:
+                cell.alignment = CENTER
+            number_format = self.number_formats.get(col)
+            if number_format:
+                cell.number_format = number_format
+            cell.border = THIN_BORDER
+            cells.append(cell)
+        self._ws.append(cells)
+
+    def close(self) -> None:
+        """Автофільтр по фактичному діапазону (відомий лише після останнього рядка)."""
+        self._ws.auto_filter.ref = f"A1:{get_column_letter(self.ncols)}{self.row_count + 1}"
+
+
+class XlsxExport:
+    """Книга write-only з кількома аркушами `XlsxSheet`."""
+
+    def __init__(self):
+        self.workbook = Workbook(write_only=True)
+        self._sheets: list[XlsxSheet] = []
+
+    def sheet(self, title: str, headers: list[str], **options) -> XlsxSheet:
+        sheet = XlsxSheet(self.workbook.create_sheet(title), headers, **options)
+        self._sheets.append(sheet)
+        return sheet
+
+    def save(self, target) -> None:
+        """Записати книгу у файл (шлях або файловий об'єкт)."""
+        for sheet in self._sheets:
+            sheet.close()
+        self.workbook.save(target)
+
+    def to_response(self, filename: str) -> StreamingResponse:
+        """Зберегти у тимчасовий файл і віддати його частинами; файл видаляється
+        після відправки (або обриву з'єднання)."""
+        fd, path = tempfile.mkstemp(suffix=".xlsx", prefix="zerno_export_")
+        os.close(fd)
+        try:
+            self.save(path)
+        except Exception:
+            os.unlink(path)
+            raise
+        return file_response(path, filename, remove=True)
+
+
+def _iter_file(path: str, remove: bool) -> Iterator[bytes]:
+    try:
+        with open(path, "rb") as handle:
+            while True:
+                chunk = handle.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def file_response(path: str, filename: str, remove: bool = False) -> StreamingResponse:
+    """StreamingResponse для готового .xlsx на диску."""
+    return StreamingResponse(
+        _iter_file(path, remove),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(os.path.getsize(path)),
+        },
+    )
@@ -0,0 +1,274 @@
+"""Ідемпотентні мутуючі запити: заголовок `Idempotency-Key`.
+
+Оператори на вагах і в полі працюють через слабкий мобільний зв'язок: запит
+`POST /grain/intakes` чи `/cash/update-balance` доходить до сервера, а
+відповідь губиться — клієнт повторює, і картка / рух коштів задвоюються.
+
+Клієнт генерує ключ на кожну дію і повторює запит з тим самим ключем.
+Перший запит «застовпує» ключ у таблиці `idempotency_keys`
+(INSERT ... ON CONFLICT DO NOTHING — спільно для всіх воркерів), виконується
+і зберігає відповідь. Повтор:
+
+* відповідь уже збережена → повертається вона (`Idempotent-Replayed: true`),
+  handler не виконується;
+* перший запит ще виконується → 409 з `Retry-After`, клієнт повторить
+  пізніше з тим самим ключем. Якщо ключ
+  без відповіді висить довше за `idempotency_stale_claim_minutes` (воркер
+  упав або перезапустився посеред запиту), він вважається покинутим —
+  повтор застовплює його заново і виконує операцію;
+* той самий ключ з іншим запитом (шлях / тіло) → 422.
+
+Ключ прив'язаний до токена (`scope` — хеш заголовка Authorization), тож
+чужий ключ не поверне чужу відповідь. Запити без токена і без ключа йдуть як
+раніше. Відповіді 5xx (handler відкотив транзакцію) і обірвані запити без
+відповіді не зберігаються — ключ звільняється, і повтор виконує операцію
+заново. Відповідь, більша за `MAX_STORED_BODY`, означає, що операцію вже
+виконано: зберігається її статус з коротким тілом-маркером
+(`TOO_LARGE_BODY`), і повтор отримує його, а не виконує запит вдруге. Прострочені ключі
+(`idempotency_ttl_hours`) прибирає `idempotency_cleanup_job` у планувальнику.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from anyio import to_thread
+from sqlalchemy import delete, or_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, select
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.config import settings
+from backend.database import engine
+from backend.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+MAX_KEY_LENGTH = 128
+# Більші відповіді зберігаються без тіла — лише статус і маркер (мутуючі
+# запити повертають компактний JSON, файли віддаються GET-ами).
+MAX_STORED_BODY = 1024 * 1024
+TOO_LARGE_BODY = json.dumps(
+    {"detail": "Запит уже виконано; відповідь завелика для повтору — оновіть дані"},
+    ensure_ascii=False,
+).encode()
+# Через скільки секунд клієнту повторити запит, поки перший ще виконується (409).
+CLAIM_RETRY_AFTER_SEC = 1
+# Заголовки, які сервер виставить заново при повторі.
+_SKIP_HEADERS = {"content-length", "date", "server"}
+CLEANUP_INTERVAL_SEC = 60 * 60
+
+
+def _sha256(*parts: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# ─── Робота з таблицею (sync, виконується у threadpool) ─────────────────────
+
+def claim_key(scope: str, key: str, method: str, path: str, request_hash: str) -> Optional[IdempotencyKey]:
+    """Застовпити ключ. None — ключ наш, запит треба виконати; інакше — існуючий
+    запис (збережена відповідь або запит, що ще виконується)."""
+    now = datetime.utcnow()
+    stale_before = now - timedelta(minutes=settings.idempotency_stale_claim_minutes)
+    with Session(engine) as session:
+        for _ in range(2):
+            # Прострочений або покинутий (без відповіді надто довго) ключ
+            # звільняємо одразу, не чекаючи на прибирання.
+            session.exec(
+                delete(IdempotencyKey).where(
+                    IdempotencyKey.scope == scope,
+                    IdempotencyKey.key == key,
+                    or_(
+                        IdempotencyKey.expires_at < now,
+                        (IdempotencyKey.status_code.is_(None)) & (IdempotencyKey.created_at < stale_before),
+                    ),
+                )
+            )
+            inserted = session.exec(
+                pg_insert(IdempotencyKey)
+                .values(
+                    scope=scope,
+                    key=key,
+                    method=method,
+                    path=path,
+                    request_hash=request_hash,
+                    created_at=now,
+                    expires_at=now + timedelta(hours=settings.idempotency_ttl_hours),
+                )
+                .on_conflict_do_nothing(index_elements=["scope", "key"])
+                .returning(IdempotencyKey.id)
+            ).first()
+            session.commit()
+            if inserted:
+                return None
+            existing = session.exec(
+                select(IdempotencyKey).where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+            ).first()
+            if existing:
+                return existing
+            # Власник ключа щойно його звільнив (5xx) — пробуємо застовпити ще раз.
+    # Ключ двічі поспіль перехопили — відповідаємо як на запит, що ще виконується.
+    return IdempotencyKey(
+        scope=scope, key=key, method=method, path=path, request_hash=request_hash, expires_at=now,
+    )
+
+
+def store_response(scope: str, key: str, status_code: int, headers: list, body: bytes) -> None:
+    with Session(engine) as session:
+        session.exec(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+            .values(
+                status_code=status_code,
+                response_headers=json.dumps(headers),
+                response_body=body,
+                updated_at=datetime.utcnow(),
+            )
+        )
+        session.commit()
+
+
+def release_key(scope: str, key: str) -> None:
+    with Session(engine) as session:
+        session.exec(
+            delete(IdempotencyKey).where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+        )
+        session.commit()
+
+
+def cleanup_idempotency_keys(session: Session) -> int:
+    """Видаляє прострочені ключі. Ідемпотентно — безпечно в кількох воркерах."""
+    result = session.exec(delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.utcnow()))
+    session.commit()
+    return result.rowcount or 0
+
+
+def idempotency_cleanup_job() -> None:
+    """Періодична задача планувальника (щогодини)."""
+    with Session(engine) as session:
+        removed = cleanup_idempotency_keys(session)
+    if removed:
+        logger.info("Видалено прострочених ключів ідемпотентності: %d", removed)
+
+
+# ─── ASGI middleware ────────────────────────────────────────────────────────
+
+def _replay(record: IdempotencyKey) -> Response:
+    headers = {name: value for name, value in json.loads(record.response_headers or "[]")}
+    headers[REPLAYED_HEADER] = "true"
+    return Response(content=record.response_body or b"", status_code=record.status_code, headers=headers)
+
+
+class IdempotencyMiddleware:
+    """Чистий ASGI middleware (без BaseHTTPMiddleware): тіло запиту читається
+    один раз для хешу і віддається handler-у без змін, відповідь дублюється
+    в буфер для збереження, не затримуючи відправку клієнту."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER)
+        authorization = headers.get("authorization")
+        if not key or not authorization:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse(
+                {"detail": f"{IDEMPOTENCY_HEADER} задовгий (максимум {MAX_KEY_LENGTH} символів)"},
+                status_code=400,
+            )
+            await response(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        method = scope["method"]
+        path = scope["path"]
+        owner = _sha256(authorization.encode())
+        request_hash = _sha256(method.encode(), path.encode(), scope.get("query_string", b""), body)
+
+        existing = await to_thread.run_sync(claim_key, owner, key, method, path, request_hash)
+        if existing is not None:
+            if existing.request_hash != request_hash:
+                response = JSONResponse(
+                    {"detail": f"{IDEMPOTENCY_HEADER} вже використано для іншого запиту"},
+                    status_code=422,
+                )
+            elif existing.status_code is None:
+                # Retry-After відрізняє цей 409 від бізнесових конфліктів:
+                # клієнт (`apiFetch`) чекає й повторює з тим самим ключем.
+                response = JSONResponse(
+                    {"detail": "Запит з цим ключем ще виконується — повторіть пізніше"},
+                    status_code=409,
+                    headers={"Retry-After": str(CLAIM_RETRY_AFTER_SEC)},
+                )
+            else:
+                response = _replay(existing)
+            await response(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def replay_receive() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        captured = {"status": None, "headers": [], "body": bytearray(), "too_large": False}
+
+        async def capture_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message.get("headers", [])
+                    if name.decode("latin-1").lower() not in _SKIP_HEADERS
+                ]
+            elif message["type"] == "http.response.body" and not captured["too_large"]:
+                captured["body"] += message.get("body", b"")
+                if len(captured["body"]) > MAX_STORED_BODY:
+                    captured["too_large"] = True
+                    captured["body"] = bytearray()
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except Exception:
+            await to_thread.run_sync(release_key, owner, key)
+            raise
+
+        status_code = captured["status"]
+        if status_code is None or status_code >= 500:
+            await to_thread.run_sync(release_key, owner, key)
+        elif captured["too_large"]:
+            headers = [["content-type", "application/json"]]
+            await to_thread.run_sync(store_response, owner, key, status_code, headers, TOO_LARGE_BODY)
+        else:
+            await to_thread.run_sync(
+                store_response, owner, key, status_code, captured["headers"], bytes(captured["body"])
+            )
@@ -1,54 +1,47 @@
 import asyncio
 import logging
-import re
+from datetime import datetime
 
+from anyio import to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.encoders import ENCODERS_BY_TYPE
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.exc import OperationalError
 
+from backend.config import settings
 from backend.database import init_db
 from backend.api import router
-from backend.backup import backup_scheduler
+from backend.backup import BACKUP_INTERVAL_SEC, make_backup
+from backend.export_jobs import CLEANUP_INTERVAL_SEC as EXPORT_CLEANUP_INTERVAL_SEC
+from backend.export_jobs import export_cleanup_job, shutdown_executor
+from backend.idempotency import CLEANUP_INTERVAL_SEC as IDEMPOTENCY_CLEANUP_INTERVAL_SEC
+from backend.idempotency import IdempotencyMiddleware, idempotency_cleanup_job
+from backend.reference_cache import start_reference_listener
+from backend.scheduler import cleanup_job_runs, scheduler
+from backend.schemas import utc_isoformat
 
 logger = logging.getLogger(__name__)
 
-# Регулярка ловить naive-ISO-рядки (без TZ-маркера) які Pydantic генерує
-# з `datetime.utcnow()`. Приклад: "2026-06-25T15:36:42" або "2026-06-25T15:36:42.123456".
-_NAIVE_ISO_RE = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?$")
-
-
-def _add_z_to_naive_datetimes(obj):
-    """Рекурсивно проходить response payload і додає `Z` до рядків що
-    виглядають як naive ISO-datetime. Це робить дату однозначно UTC для
-    браузера (який інакше інтерпретує наївний ISO як локальний час)."""
-    if isinstance(obj, str):
-        if _NAIVE_ISO_RE.match(obj):
-            return obj + "Z"
-        return obj
-    if isinstance(obj, dict):
-        return {k: _add_z_to_naive_datetimes(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_add_z_to_naive_datetimes(v) for v in obj]
-    return obj
-
-
-class UTCJSONResponse(JSONResponse):
-    """JSONResponse що позначає всі naive-UTC datetime-и маркером Z.
-    Без цього таблиці у фронті відстають від справжнього часу на TZ-офсет
-    (3 години у Києві влітку), бо браузер бачить ISO-рядок без зони і
-    припускає що це місцевий час."""
-    def render(self, content) -> bytes:
-        return super().render(_add_z_to_naive_datetimes(content))
+# datetime у JSON — ISO з маркером `Z` (naive-UTC з БД), щоб браузер не читав
+# час як місцевий. Схеми відповідей роблять це через `UTCDateTime`, а dict-и
+# з ендпоінтів без response_model проходять через `jsonable_encoder`. Моделі
+# він серіалізує самим pydantic, тож dict-поле моделі цього енкодера не бачить:
+# вкладені рядки з часом типізуються схемою з `UTCDateTime`.
+ENCODERS_BY_TYPE[datetime] = utc_isoformat
 
 
 app = FastAPI(
     title="Zerno Web3 App",
     description="Web3 приложение на FastAPI",
     version="1.0.0",
-    default_response_class=UTCJSONResponse,
+    default_response_class=ORJSONResponse,
 )
 
+# Повтори мутуючих запитів з тим самим Idempotency-Key не виконуються вдруге.
+# Додається до CORS, щоб CORS-заголовки отримували і збережені відповіді.
+app.add_middleware(IdempotencyMiddleware)
+
 # CORS для работы с фронтендом
 app.add_middleware(
     CORSMiddleware,
@@ -61,23 +54,46 @@ app.add_middleware(
 # Подключение роутеров
 app.include_router(router, prefix="/api")
 
+# Періодичні задачі — виконує лише воркер-лідер (backend/scheduler.py)
+scheduler.register("backup", BACKUP_INTERVAL_SEC, make_backup)
+scheduler.register("export_cleanup", EXPORT_CLEANUP_INTERVAL_SEC, export_cleanup_job)
+scheduler.register("idempotency_cleanup", IDEMPOTENCY_CLEANUP_INTERVAL_SEC, idempotency_cleanup_job)
+scheduler.register("job_runs_cleanup", 24 * 60 * 60, cleanup_job_runs)
+
 # Статические файлы (если нужно)
 # app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
 
 
+def configure_threadpool():
+    """Обмежує threadpool, у якому FastAPI виконує sync-ендпоінти та залежності.
+
+    Усі хендлери з `Session` — звичайні `def`, тож блокуючі запити до БД і
+    генерація Excel ідуть у потоках, а event loop лишається вільним для інших
+    запитів воркера. Ліміт не перевищує пул з'єднань, щоб потоки не чекали
+    на з'єднання всередині вже зайнятого слоту."""
+    limiter = to_thread.current_default_thread_limiter()
+    limiter.total_tokens = max(
+        1,
+        min(settings.worker_threads, settings.db_pool_size + settings.db_max_overflow),
+    )
+
+
 @app.on_event("startup")
 async def startup_event():
     """Инициализация базы данных при запуске (с повторами — DNS Docker «db» не всегда готов сразу)."""
+    configure_threadpool()
     max_retries = 15
     delay_sec = 2.0
     last_error: Exception | None = None
     for attempt in range(1, max_retries + 1):
         try:
             await asyncio.to_thread(init_db)
+            # LISTEN на інвалідацію кешу довідників від інших воркерів
+            start_reference_listener()
             if attempt > 1:
                 logger.info("База данных доступна з %s-ї спроби", attempt)
-            # Щодобовий бекап БД (знімається одразу і далі раз на добу)
-            asyncio.create_task(backup_scheduler())
+            # Бекап і прибирання — у воркера, що стане лідером планувальника
+            scheduler.start()
             return
         except OperationalError as e:
             last_error = e
@@ -93,6 +109,15 @@ async def startup_event():
     raise last_error
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Зупиняє планувальник (лідерство переходить іншому воркеру) і пул
+    процесів фонових експортів (незавершені задачі стануть failed, див.
+    `export_jobs.cleanup_export_jobs`)."""
+    await scheduler.stop()
+    shutdown_executor()
+
+
 @app.get("/")
 async def root():
     return {"message": "Zerno Web3 API", "status": "running"}
@@ -0,0 +1,457 @@
+"""Версійовані міграції схеми з журналом `schema_migrations`.
+
+Раніше `init_db` на кожному старті кожного воркера uvicorn проганяв усі
+`ALTER TABLE ... IF NOT EXISTS`, конвертації enum, нормалізації `LOWER(...)`
+і `create_all` — кожен statement бере блокування, і холодний старт та
+перезапуски під час жнив гальмували.
+
+Тепер кожна міграція — пронумерований крок у `MIGRATIONS`, що виконується
+рівно один раз і записується в `schema_migrations`:
+
+* теплий старт — один запит `MAX(version)`, і якщо БД актуальна, більше
+  нічого не виконується;
+* інакше воркер бере `pg_advisory_lock` і застосовує відсутні міграції;
+  решта воркерів чекають на блокуванні, перечитують версію і пропускають
+  вже застосоване.
+
+Нова таблиця, колонка чи індекс (новий набір у `database`) — це нова міграція в
+кінці списку з наступним номером; застосовані міграції не редагуються.
+Міграції мають бути ідемпотентними (IF NOT EXISTS, перевірки стану): при
+падінні посередині кроку запис у журнал не з'явиться, і наступний старт
+виконає крок заново.
+"""
+import logging
+import time
+from typing import Callable
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import ProgrammingError
+from sqlmodel import Session, SQLModel, select
+
+from backend.config import settings
+from backend.database import INDEXES_V11, VOUCHER_FIFO_INDEXES, engine, ensure_indexes
+from backend.models import (
+    CashRegister,
+    GrainCulture,
+    GrainStock,
+    PurchaseStock,
+    User,
+    UserRole,
+    VehicleType,
+)
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE = "schema_migrations"
+# Ключ pg_advisory_lock ("zerno" у hex) — один на всю БД.
+MIGRATIONS_LOCK_ID = 0x7A65726E6F
+
+
+def _execute_each(conn: Connection, statements: list[str]) -> None:
+    """Кожен statement — у своїй транзакції: помилка одного (напр. колонка
+    вже має потрібний тип) не скасовує решту."""
+    for ddl in statements:
+        try:
+            conn.execute(text(ddl))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+
+
+# ─── Міграції ───────────────────────────────────────────────────────────────
+
+def _drop_legacy_lease_tables(conn: Connection) -> None:
+    """Редизайн оренди: знос старих lease-таблиць ПЕРЕД create_all.
+    Старі дані оренди стираємо (start-from-scratch), орендодавців лишаємо.
+    Порядок важливий: спершу прибрати FK з agri_fields на lease_contracts,
+    потім дропнути таблиці (CASCADE — через self-FK на lease_contracts)."""
+    # Лише якщо в БД ще є СТАРА структура оренди: нові таблиці lease_payments /
+    # lease_payment_grain_items мають ТІ САМІ імена.
+    old_lease_exists = conn.execute(
+        text("SELECT to_regclass('public.lease_contracts') IS NOT NULL")
+    ).scalar()
+    conn.commit()
+    if old_lease_exists:
+        _execute_each(conn, [
+            "ALTER TABLE IF EXISTS agri_fields DROP COLUMN IF EXISTS lease_contract_id",
+            "ALTER TABLE IF EXISTS agri_fields DROP COLUMN IF EXISTS landlord_id",
+            "DROP TABLE IF EXISTS lease_payment_grain_items CASCADE",
+            "DROP TABLE IF EXISTS lease_payments CASCADE",
+            "DROP TABLE IF EXISTS lease_contract_items CASCADE",
+            "DROP TABLE IF EXISTS lease_contracts CASCADE",
+        ])
+
+
+def _create_tables(conn: Connection) -> None:
+    """Таблиці з `backend.models`, яких ще немає (create_all не чіпає існуючі)."""
+    SQLModel.metadata.create_all(conn)
+    conn.commit()
+
+
+def _contract_items_and_payments(conn: Connection) -> None:
+    for ddl in [
+        "ALTER TABLE grain_stock ADD COLUMN IF NOT EXISTS reserved_kg DOUBLE PRECISION DEFAULT 0",
+        "ALTER TABLE farmer_contract_items ADD COLUMN IF NOT EXISTS direction VARCHAR(32) DEFAULT 'from_company'",
+        "ALTER TABLE farmer_contract_items ADD COLUMN IF NOT EXISTS delivered_kg DOUBLE PRECISION DEFAULT 0",
+        "ALTER TABLE farmer_contract_payments ADD COLUMN IF NOT EXISTS contract_item_id INTEGER",
+        "ALTER TABLE farmer_contract_payments ADD COLUMN IF NOT EXISTS item_name VARCHAR(255)",
+    ]:
+        conn.execute(text(ddl))
+    conn.commit()
+
+
+def _farmer_movements_people(conn: Connection) -> None:
+    """farmer_grain_movements: from_person_id, to_enterprise + дозволяємо
+    from_owner_id бути NULL (для рухів «людина → підприємство»)."""
+    for ddl in [
+        "ALTER TABLE farmer_grain_movements ADD COLUMN IF NOT EXISTS from_person_id INTEGER REFERENCES people(id)",
+        "ALTER TABLE farmer_grain_movements ADD COLUMN IF NOT EXISTS to_enterprise BOOLEAN DEFAULT FALSE",
+        "ALTER TABLE farmer_grain_movements ALTER COLUMN from_owner_id DROP NOT NULL",
+    ]:
+        conn.execute(text(ddl))
+    conn.commit()
+
+
+def _contract_enums_to_varchar(conn: Connection) -> None:
+    """Enum-колонки контрактів → VARCHAR(32) (без проблем з PostgreSQL enum),
+    значення — у нижньому регістрі."""
+    _execute_each(conn, [
+        f"ALTER TABLE {tbl} ALTER COLUMN {col} TYPE VARCHAR(32) USING {col}::text"
+        for tbl, col in [
+            ("farmer_contracts", "contract_type"),
+            ("farmer_contracts", "status"),
+            ("farmer_contract_items", "item_type"),
+            ("farmer_contract_payments", "payment_type"),
+        ]
+    ])
+    try:
+        conn.execute(text("UPDATE farmer_contracts SET contract_type = LOWER(contract_type), status = LOWER(status)"))
+        conn.execute(text("UPDATE farmer_contract_items SET item_type = LOWER(item_type), direction = LOWER(direction)"))
+        conn.execute(text("UPDATE farmer_contract_payments SET payment_type = LOWER(payment_type)"))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+
+
+def _contract_types_and_shipments(conn: Connection) -> None:
+    """Поля 4 типів контрактів, формат оплати/транспорт відправок, безкоштовні закупівлі."""
+    for ddl in [
+        "ALTER TABLE farmer_contracts ADD COLUMN IF NOT EXISTS currency VARCHAR(8)",
+        "ALTER TABLE farmer_contracts ADD COLUMN IF NOT EXISTS exchange_rate DOUBLE PRECISION",
+        "ALTER TABLE farmer_contracts ADD COLUMN IF NOT EXISTS was_reserve BOOLEAN DEFAULT FALSE",
+        "ALTER TABLE grain_shipments ADD COLUMN IF NOT EXISTS payment_format VARCHAR(32) DEFAULT 'none'",
+        "ALTER TABLE grain_shipments ADD COLUMN IF NOT EXISTS driver_id INTEGER",
+        "ALTER TABLE grain_shipments ADD COLUMN IF NOT EXISTS vehicle_type_id INTEGER",
+        "ALTER TABLE purchase_records ADD COLUMN IF NOT EXISTS is_free BOOLEAN DEFAULT FALSE",
+    ]:
+        conn.execute(text(ddl))
+    conn.commit()
+
+
+def _intake_flags(conn: Connection) -> None:
+    for ddl in [
+        "ALTER TABLE grain_intakes ADD COLUMN IF NOT EXISTS is_own_combine BOOLEAN DEFAULT FALSE",
+        "ALTER TABLE grain_intakes ADD COLUMN IF NOT EXISTS field_id INTEGER REFERENCES agri_fields(id)",
+        "ALTER TABLE grain_intakes ADD COLUMN IF NOT EXISTS is_farmer_transfer BOOLEAN DEFAULT FALSE",
+        "ALTER TABLE grain_intakes ADD COLUMN IF NOT EXISTS pending_tare BOOLEAN DEFAULT FALSE",
+        "ALTER TABLE farmer_contract_items ADD COLUMN IF NOT EXISTS currency VARCHAR(8) DEFAULT 'UAH'",
+    ]:
+        conn.execute(text(ddl))
+    conn.commit()
+    try:
+        conn.execute(text(
+            "UPDATE grain_intakes SET is_farmer_transfer = TRUE "
+            "WHERE note IS NOT NULL AND note ILIKE 'Трансфер від%'"
+        ))
+        conn.commit()
+        print("✅ Позначено існуючі трансфери між фермерами в grain_intakes")
+    except Exception:
+        conn.rollback()
+
+
+def _user_role_varchar(conn: Connection) -> None:
+    """users.role: нативний enum → VARCHAR(32) (нова роль "manager" без
+    перетворення типу). Старі версії SQLAlchemy зберігали enum NAME
+    (SUPER_ADMIN) замість value — Pydantic очікує значення в нижньому регістрі."""
+    _execute_each(conn, [
+        "ALTER TABLE users ALTER COLUMN role TYPE VARCHAR(32) USING role::text",
+        "UPDATE users SET role = LOWER(role) WHERE role <> LOWER(role)",
+    ])
+
+
+def _people_contracts(conn: Connection) -> None:
+    """«Люди» — окрема сутність: контракт або з фермером, або з людиною."""
+    for ddl in [
+        "ALTER TABLE farmer_contracts ADD COLUMN IF NOT EXISTS person_id INTEGER REFERENCES people(id)",
+        "ALTER TABLE farmer_contracts ALTER COLUMN owner_id DROP NOT NULL",
+        "ALTER TABLE farmer_grain_movements ADD COLUMN IF NOT EXISTS to_person_id INTEGER REFERENCES people(id)",
+    ]:
+        conn.execute(text(ddl))
+    conn.commit()
+
+
+def _person_grain_stock(conn: Connection) -> None:
+    """Баланс зерна у людей (новий бакет в grain_stock). Бекап з історичних
+    переказів to_person_id: стара логіка фізично зменшувала quantity_kg при
+    переказі до людини; тепер переказ — внутрішня переуступка з
+    farmer_quantity_kg в person_quantity_kg."""
+    conn.execute(text(
+        "ALTER TABLE grain_stock ADD COLUMN IF NOT EXISTS person_quantity_kg DOUBLE PRECISION DEFAULT 0"
+    ))
+    conn.commit()
+
+    try:
+        already_migrated = conn.execute(text(
+            "SELECT COALESCE(SUM(person_quantity_kg), 0) FROM grain_stock"
+        )).scalar() or 0
+        # Лише якщо ще нікому з людей баланс не нараховувався.
+        if float(already_migrated) <= 0:
+            conn.execute(text(
+                """
+                WITH person_transfers AS (
+                    SELECT culture_id, COALESCE(SUM(quantity_kg), 0) AS total_kg
+                    FROM farmer_grain_movements
+                    WHERE to_person_id IS NOT NULL
+                      AND movement_type = 'transfer'
+                    GROUP BY culture_id
+                )
+                UPDATE grain_stock gs
+                SET person_quantity_kg = pt.total_kg,
+                    quantity_kg = gs.quantity_kg + pt.total_kg
+                FROM person_transfers pt
+                WHERE gs.culture_id = pt.culture_id
+                  AND pt.total_kg > 0
+                """
+            ))
+            conn.commit()
+            print("✅ Бекап: зерно з історичних переказів to_person повернуто на склад у person_quantity_kg")
+    except Exception as exc:
+        print(f"⚠️  Бекап person_quantity_kg пропущено: {exc}")
+        conn.rollback()
+
+
+def _indexes(conn: Connection) -> None:
+    ensure_indexes(conn, INDEXES_V11)
+
+
+def _balance_ledgers(conn: Connection) -> None:
+    """Матеріалізовані баланси фермерів/людей: заповнюємо з історії, якщо
+    таблиця порожня, а картки/списання вже є. Далі журнал ведуть write-шляхи."""
+    from backend.balances import rebuild_farmer_balances, rebuild_person_balances
+
+    with Session(engine) as session:
+        try:
+            ledger_empty = session.exec(text("SELECT NOT EXISTS (SELECT 1 FROM farmer_balances)")).scalar()
+            has_history = session.exec(text(
+                "SELECT EXISTS (SELECT 1 FROM grain_intakes WHERE owner_id IS NOT NULL) "
+                "OR EXISTS (SELECT 1 FROM farmer_grain_deductions)"
+            )).scalar()
+            if ledger_empty and has_history:
+                count = rebuild_farmer_balances(session)
+                print(f"✅ farmer_balances заповнено з історії: {count} рядків")
+        except Exception as exc:
+            print(f"⚠️  Заповнення farmer_balances пропущено: {exc}")
+            session.rollback()
+
+        try:
+            ledger_empty = session.exec(text("SELECT NOT EXISTS (SELECT 1 FROM person_grain_balances)")).scalar()
+            has_history = session.exec(text(
+                "SELECT EXISTS (SELECT 1 FROM farmer_grain_movements "
+                "WHERE to_person_id IS NOT NULL OR from_person_id IS NOT NULL) "
+                "OR EXISTS (SELECT 1 FROM farmer_contracts WHERE person_id IS NOT NULL)"
+            )).scalar()
+            if ledger_empty and has_history:
+                count = rebuild_person_balances(session)
+                print(f"✅ person_grain_balances заповнено з історії: {count} рядків")
+        except Exception as exc:
+            print(f"⚠️  Заповнення person_grain_balances пропущено: {exc}")
+            session.rollback()
+
+
+def _seed_defaults(conn: Connection) -> None:
+    """Супер адмін, каса, культури, типи транспорту, склад по культурах;
+    мінімальна ціна 1 грн/кг для культур і закупівель."""
+    # Імпорт тут — щоб уникнути циклічного імпорту
+    from backend.auth import get_password_hash
+
+    with Session(engine) as session:
+        admin = session.exec(
+            select(User).where(User.username == settings.admin_username)
+        ).first()
+        if not admin:
+            session.add(User(
+                username=settings.admin_username,
+                password_hash=get_password_hash(settings.admin_password),
+                password_plain=settings.admin_password,  # Зберігаємо пароль у відкритому вигляді
+                full_name=settings.admin_full_name,
+                role=UserRole.SUPER_ADMIN,
+                is_active=True
+            ))
+            session.commit()
+            print(f"✅ Супер админ создан: {settings.admin_username}")
+
+        if not session.exec(select(CashRegister)).first():
+            session.add(CashRegister(uah_balance=0.0, usd_balance=0.0, eur_balance=0.0))
+            session.commit()
+            print("✅ Касса инициализирована с нулевыми балансами")
+
+        default_cultures = [
+            "Ячмінь",
+            "Пшениця",
+            "Горох",
+            "Ріпак",
+            "Соняшник",
+            "Кукурудза",
+            "Льон"
+        ]
+        existing = set(session.exec(
+            select(GrainCulture.name).where(GrainCulture.name.in_(default_cultures))
+        ).all())
+        for culture_name in default_cultures:
+            if culture_name not in existing:
+                session.add(GrainCulture(name=culture_name, price_per_kg=1.0))
+        session.commit()
+
+        zero_cultures = session.exec(
+            select(GrainCulture).where(GrainCulture.price_per_kg < 1.0)
+        ).all()
+        for c in zero_cultures:
+            c.price_per_kg = 1.0
+            session.add(c)
+        zero_stocks = session.exec(
+            select(PurchaseStock).where(PurchaseStock.sale_price_per_kg < 1.0)
+        ).all()
+        for s in zero_stocks:
+            s.sale_price_per_kg = 1.0
+            session.add(s)
+        if zero_cultures or zero_stocks:
+            session.commit()
+            print(f"✅ Оновлено ціни: {len(zero_cultures)} культур, {len(zero_stocks)} товарів (мін. 1 грн/кг)")
+
+        default_vehicle_types = [
+            "КамАЗ",
+            "ГАЗ",
+            "ЗИЛ",
+            "Фура",
+            "Трактор",
+            "КрАЗ",
+            "Легковой автомобіль"
+        ]
+        existing = set(session.exec(
+            select(VehicleType.name).where(VehicleType.name.in_(default_vehicle_types))
+        ).all())
+        for vehicle_name in default_vehicle_types:
+            if vehicle_name not in existing:
+                session.add(VehicleType(name=vehicle_name))
+        session.commit()
+
+        # Склад для кожної культури
+        missing_stock = session.exec(
+            select(GrainCulture.id)
+            .outerjoin(GrainStock, GrainStock.culture_id == GrainCulture.id)
+            .where(GrainStock.id.is_(None))
+        ).all()
+        for culture_id in missing_stock:
+            session.add(GrainStock(culture_id=culture_id, quantity_kg=0.0))
+        session.commit()
+
+
+def _job_runs_details(conn: Connection) -> None:
+    conn.execute(text("ALTER TABLE job_runs ADD COLUMN IF NOT EXISTS details VARCHAR"))
+    conn.commit()
+
+
+def _voucher_fifo(conn: Connection) -> None:
+    """Індекси черги талонів і одноразовий повний FIFO-перерахунок: далі
+    розподіл ведуть інкрементально виплата / скасування. Помилка
+    перерахунку зупиняє міграцію — вона повториться на наступному старті."""
+    from backend.voucher_allocation import rebuild_voucher_allocation
+
+    ensure_indexes(conn, VOUCHER_FIFO_INDEXES)
+    with Session(engine) as session:
+        count = rebuild_voucher_allocation(session)
+        session.commit()
+    if count:
+        print(f"✅ Розподіл виплат по талонах перераховано: {count} талонів")
+
+
+# (номер, назва, функція). Номери — лише зростають; нове — в кінець.
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "drop_legacy_lease_tables", _drop_legacy_lease_tables),
+    (2, "create_tables", _create_tables),
+    (3, "contract_items_and_payments", _contract_items_and_payments),
+    (4, "farmer_movements_people", _farmer_movements_people),
+    (5, "contract_enums_to_varchar", _contract_enums_to_varchar),
+    (6, "contract_types_and_shipments", _contract_types_and_shipments),
+    (7, "intake_flags", _intake_flags),
+    (8, "user_role_varchar", _user_role_varchar),
+    (9, "people_contracts", _people_contracts),
+    (10, "person_grain_stock", _person_grain_stock),
+    (11, "indexes", _indexes),
+    (12, "balance_ledgers", _balance_ledgers),
+    (13, "seed_defaults", _seed_defaults),
+    (14, "job_runs", _create_tables),
+    (15, "job_runs_details", _job_runs_details),
+    (16, "voucher_fifo", _voucher_fifo),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ─── Виконання ──────────────────────────────────────────────────────────────
+
+def current_version(conn: Connection) -> int:
+    """Остання застосована міграція (0 — журналу ще немає)."""
+    try:
+        version = conn.execute(text(f"SELECT COALESCE(MAX(version), 0) FROM {MIGRATIONS_TABLE}")).scalar()
+        conn.commit()
+        return version
+    except ProgrammingError:
+        conn.rollback()
+        return 0
+
+
+def run_migrations() -> int:
+    """Застосовує відсутні міграції; повертає кількість застосованих."""
+    with engine.connect() as conn:
+        if current_version(conn) >= LATEST_VERSION:
+            return 0
+
+        # Блокування на рівні з'єднання (переживає commit-и окремих кроків).
+        # Інші воркери чекають тут, доки перший не закінчить.
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATIONS_LOCK_ID})
+        conn.commit()
+        try:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+                "version INTEGER PRIMARY KEY, "
+                "name VARCHAR(128) NOT NULL, "
+                "applied_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'), "
+                "duration_ms INTEGER)"
+            ))
+            conn.commit()
+            # Поки чекали на блокування, інший воркер міг усе застосувати.
+            applied_version = current_version(conn)
+            applied = 0
+            for version, name, migrate in MIGRATIONS:
+                if version <= applied_version:
+                    continue
+                started = time.monotonic()
+                migrate(conn)
+                duration_ms = int((time.monotonic() - started) * 1000)
+                conn.execute(
+                    text(
+                        f"INSERT INTO {MIGRATIONS_TABLE} (version, name, duration_ms) "
+                        "VALUES (:version, :name, :duration_ms)"
+                    ),
+                    {"version": version, "name": name, "duration_ms": duration_ms},
+                )
+                conn.commit()
+                applied += 1
+                logger.info("Міграцію %03d %s застосовано за %d мс", version, name, duration_ms)
+            return applied
+        finally:
+            # З'єднання повертається в пул — блокування треба зняти явно.
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATIONS_LOCK_ID})
+            conn.commit()
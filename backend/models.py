@@ -2,7 +2,7 @@ from sqlmodel import SQLModel, Field
 from typing import Optional
 from datetime import datetime
 from enum import Enum
-from sqlalchemy import UniqueConstraint, Column, String
+from sqlalchemy import UniqueConstraint, Column, LargeBinary, String
 
 
 class UserRole(str, Enum):
@@ -339,6 +339,34 @@ class FarmerGrainDeduction(BaseModel, table=True):
     payment_id: Optional[int] = Field(default=None, foreign_key="farmer_contract_payments.id")
 
 
+class FarmerBalance(BaseModel, table=True):
+    """Матеріалізований баланс зерна фермера по культурі (не викуплене зерно).
+    Інваріант: qty_kg == SUM(прийнятих карток фермера на складі) − SUM(FarmerGrainDeduction).
+    Оновлюється в тій самій транзакції, що й картки/списання (див. `backend.balances`)."""
+    __tablename__ = "farmer_balances"
+    __table_args__ = (
+        UniqueConstraint("owner_id", "culture_id", name="uq_farmer_balance_key"),
+    )
+
+    owner_id: int = Field(foreign_key="grain_owners.id")
+    culture_id: int = Field(foreign_key="grain_cultures.id")
+    qty_kg: float = Field(default=0.0, description="Залишок на балансі фермера, кг")
+
+
+class PersonGrainBalance(BaseModel, table=True):
+    """Матеріалізований баланс зерна людини по культурі.
+    Інваріант: qty_kg == перекази to_person − перекази from_person − GRAIN-оплати
+    − FROM_FARMER GRAIN-позиції (delivered_kg) у не скасованих контрактах людини."""
+    __tablename__ = "person_grain_balances"
+    __table_args__ = (
+        UniqueConstraint("person_id", "culture_id", name="uq_person_grain_balance_key"),
+    )
+
+    person_id: int = Field(foreign_key="people.id")
+    culture_id: int = Field(foreign_key="grain_cultures.id")
+    qty_kg: float = Field(default=0.0, description="Залишок на балансі людини, кг")
+
+
 class FarmerGrainMovementType(str, Enum):
     """Тип переміщення зерна фермера"""
     DEDUCT = "deduct"
@@ -547,3 +575,79 @@ class GrainVoucherPayment(BaseModel, table=True):
     is_cancelled: bool = Field(default=False, description="Скасовано")
     created_by_user_id: Optional[int] = Field(default=None, foreign_key="users.id")
 
+
+
+class ExportJobStatus(str, Enum):
+    """Статус фонового експорту"""
+    QUEUED = "queued"      # Створено, чекає на вільний процес
+    RUNNING = "running"    # Генерується
+    DONE = "done"          # Файл готовий до скачування
+    FAILED = "failed"      # Помилка (див. error)
+
+
+class ExportJob(BaseModel, table=True):
+    """Фонове формування великого Excel-звіту.
+
+    Стан зберігається в БД, файл — у спільній теці EXPORT_DIR, тому будь-який
+    воркер uvicorn може віддати статус і готовий файл, незалежно від того,
+    у чиєму пулі процесів звіт генерувався."""
+    __tablename__ = "export_jobs"
+
+    kind: str = Field(sa_column=Column(String(32), nullable=False), description="Тип звіту")
+    params: str = Field(default="{}", description="Параметри звіту (JSON)")
+    status: str = Field(default="queued", sa_column=Column(String(32), default="queued", index=True))
+    progress: int = Field(default=0, description="Прогрес, %")
+    filename: Optional[str] = Field(default=None, description="Ім'я файлу для скачування")
+    file_path: Optional[str] = Field(default=None, description="Шлях до готового файлу")
+    file_size: Optional[int] = Field(default=None, description="Розмір файлу, байт")
+    error: Optional[str] = Field(default=None, description="Текст помилки")
+    created_by_user_id: int = Field(foreign_key="users.id")
+    started_at: Optional[datetime] = Field(default=None)
+    finished_at: Optional[datetime] = Field(default=None)
+
+
+class IdempotencyKey(BaseModel, table=True):
+    """Збережена відповідь на мутуючий запит із заголовком `Idempotency-Key`.
+
+    Повтор того самого запиту (мобільний клієнт на поганому зв'язку) отримує
+    цю відповідь, а не виконує операцію вдруге. `status_code IS NULL` — запит
+    ще виконується. Рядки живуть `idempotency_ttl_hours` (див. `backend/idempotency.py`)."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("scope", "key", name="uq_idempotency_scope_key"),
+    )
+
+    scope: str = Field(sa_column=Column(String(64), nullable=False), description="Хеш токена клієнта")
+    key: str = Field(sa_column=Column(String(128), nullable=False), description="Значення Idempotency-Key")
+    method: str = Field(sa_column=Column(String(8), nullable=False))
+    path: str = Field(description="Шлях запиту")
+    request_hash: str = Field(sa_column=Column(String(64), nullable=False), description="Хеш методу, шляху і тіла")
+    status_code: Optional[int] = Field(default=None, description="HTTP-статус збереженої відповіді")
+    response_headers: Optional[str] = Field(default=None, description="Заголовки відповіді (JSON)")
+    response_body: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))
+    expires_at: datetime = Field(index=True, description="Після цього часу ключ видаляється")
+
+
+class JobRunStatus(str, Enum):
+    """Статус запуску періодичної задачі"""
+    RUNNING = "running"        # Виконується
+    SUCCESS = "success"        # Завершено
+    FAILED = "failed"          # Помилка (див. error)
+    CANCELLED = "cancelled"    # Перервано (зупинка воркера / втрата лідерства)
+
+
+class JobRun(BaseModel, table=True):
+    """Запуск періодичної задачі планувальника (`backend/scheduler.py`):
+    бекап, прибирання експортів і ключів ідемпотентності тощо. Останній
+    запуск задачі визначає, коли її виконати наступного разу — і після
+    перезапуску, і на іншому воркері-лідері."""
+    __tablename__ = "job_runs"
+
+    job: str = Field(sa_column=Column(String(64), nullable=False, index=True), description="Назва задачі")
+    status: str = Field(default="running", sa_column=Column(String(32), default="running", nullable=False))
+    worker: Optional[str] = Field(default=None, description="Хост:PID воркера-лідера")
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = Field(default=None)
+    duration_ms: Optional[int] = Field(default=None, description="Тривалість, мс")
+    error: Optional[str] = Field(default=None, description="Текст помилки")
+    details: Optional[str] = Field(default=None, description="Підсумок запуску від задачі (JSON)")
@@ -0,0 +1,92 @@
+"""Keyset-пагінація журналів (приходи, відправки, каса, закупівлі, переміщення).
+
+`limit/offset` на глибоких сторінках змушує Postgres прочитати й відкинути
+всі попередні рядки, а `count(*)` на кожну сторінку — ще раз пройти весь
+діапазон. Тут сторінка береться від останнього показаного запису:
+
+    WHERE (created_at, id) < (:ts, :id) ORDER BY created_at DESC, id DESC LIMIT n
+
+що йде по індексам `(created_at DESC, id DESC)` і коштує однаково на будь-якій
+глибині. Клієнт отримує непрозорий курсор у заголовку `X-Next-Cursor` і передає
+його як `?cursor=` за наступною сторінкою. `offset` лишається для сумісності,
+але з курсором ігнорується. Загальна кількість (`X-Total-Count`) рахується
+лише на запит — `with_total=true` (фронтенд просить її тільки для першої сторінки).
+"""
+import base64
+import binascii
+from datetime import date, datetime, time
+from typing import Optional
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import func, tuple_
+from sqlmodel import Session, select
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def parse_date(value: Optional[str], end: bool = False) -> Optional[datetime]:
+    """`YYYY-MM-DD` з query -> межа періоду (початок або, з `end`, кінець дня);
+    некоректна дата — 400."""
+    if not value:
+        return None
+    try:
+        d = date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Некоректна дата: {value}"
+        )
+    return datetime.combine(d, time.max if end else time.min)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некоректний курсор пагінації"
+        )
+
+
+def paginate(
+    session: Session,
+    response: Response,
+    query,
+    model,
+    *,
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    with_total: bool = False,
+) -> list:
+    """Сторінка `query` (select моделі з `created_at` та `id`) від новіших до старіших.
+
+    Порядок задається тут — у `query` лише фільтри. Береться `limit + 1` рядок:
+    зайвий означає, що є наступна сторінка, і тоді виставляється `X-Next-Cursor`.
+    """
+    if with_total:
+        total = session.exec(select(func.count()).select_from(query.subquery())).one()
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
+
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    elif offset:
+        query = query.offset(offset)
+
+    rows = session.exec(query.limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return rows
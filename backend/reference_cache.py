@@ -0,0 +1,231 @@
+"""Кеш довідників у процесі воркера з інвалідацією через Postgres LISTEN/NOTIFY.
+
+Звіти й журнали підставляють назви з довідників (культури, транспорт, водії,
+поля, фермери, люди, користувачі; телефони водіїв) і раніше кожен handler сам будував
+`{c.id: c.name for c in select(GrainCulture)}` — повне сканування таблиці на
+кожен запит. Тут мапи `id → назва` живуть у пам'яті воркера:
+
+    cultures = reference_names(session, "cultures")
+
+Інвалідація між воркерами uvicorn:
+
+* будь-яка ORM-зміна довідника (flush нового/зміненого/видаленого об'єкта або
+  `update()`/`delete()` по моделі) виконує `pg_notify` у тій самій транзакції —
+  Postgres доставить повідомлення лише після commit і відкине при rollback;
+* кожен воркер тримає окреме LISTEN-з'єднання (`start_reference_listener`) і
+  скидає відповідну мапу; свій воркер скидає її одразу в `after_commit`.
+
+Якщо LISTEN-з'єднання рвалося, після перепідключення кеш скидається повністю, а
+`CACHE_TTL_SEC` — страховка від пропущених повідомлень. Лічильники попадань /
+промахів — `reference_cache.stats()` (`GET /api/admin/cache/stats`).
+"""
+import logging
+import select as select_module
+import threading
+import time
+from itertools import chain
+from types import MappingProxyType
+from typing import Callable, Mapping
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from backend.database import engine
+from backend.models import AgriField, Driver, GrainCulture, GrainOwner, Person, User, VehicleType
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "zerno_cache"
+CACHE_TTL_SEC = 300
+LISTEN_RECONNECT_SEC = 5
+LISTEN_POLL_SEC = 60
+
+# kind → (модель, колонка з назвою)
+REFERENCE_TABLES = {
+    "cultures": (GrainCulture, "name"),
+    "vehicle_types": (VehicleType, "name"),
+    "drivers": (Driver, "full_name"),
+    "driver_phones": (Driver, "phone"),
+    "fields": (AgriField, "name"),
+    "owners": (GrainOwner, "full_name"),
+    "people": (Person, "full_name"),
+    "users": (User, "full_name"),
+}
+_MODEL_KINDS: dict[type, set] = {}
+for _kind, (_model, _) in REFERENCE_TABLES.items():
+    _MODEL_KINDS.setdefault(_model, set()).add(_kind)
+# Ключ у `session.info`: довідники, змінені в поточній транзакції.
+_PENDING_KEY = "reference_cache_pending"
+
+
+class ReferenceCache:
+    """Мапи `id → назва` по довідниках; потокобезпечний (threadpool FastAPI)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._maps: dict[str, tuple[float, Mapping[int, str]]] = {}
+        # Номер версії на kind: інвалідація під час читання з БД не дає
+        # покласти в кеш уже застарілий знімок.
+        self._generations = {kind: 0 for kind in REFERENCE_TABLES}
+        self._hits = {kind: 0 for kind in REFERENCE_TABLES}
+        self._misses = {kind: 0 for kind in REFERENCE_TABLES}
+        self._invalidations = {kind: 0 for kind in REFERENCE_TABLES}
+        self._subscribers: list[Callable[[set], None]] = []
+
+    def names(self, session: Session, kind: str) -> Mapping[int, str]:
+        model, column = REFERENCE_TABLES[kind]
+        # Транзакція вже змінила цей довідник — читаємо напряму і не кешуємо
+        # (незакомічені зміни не мають потрапити іншим запитам).
+        if kind in session.info.get(_PENDING_KEY, ()):
+            return self._load(session, model, column)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._maps.get(kind)
+            if entry and now - entry[0] < CACHE_TTL_SEC:
+                self._hits[kind] += 1
+                return entry[1]
+            self._misses[kind] += 1
+            generation = self._generations[kind]
+
+        names = self._load(session, model, column)
+        with self._lock:
+            if self._generations[kind] == generation:
+                self._maps[kind] = (now, names)
+        return names
+
+    @staticmethod
+    def _load(session: Session, model, column: str) -> Mapping[int, str]:
+        rows = session.exec(select(model.id, getattr(model, column))).all()
+        # Спільна для всіх потоків мапа — лише для читання.
+        return MappingProxyType({row_id: name for row_id, name in rows})
+
+    def subscribe(self, callback: Callable[[set], None]) -> None:
+        """`callback(kinds)` після кожної інвалідації — для інших кешів, що
+        залежать від тих самих таблиць (напр. кеш користувачів у `backend.auth`)."""
+        self._subscribers.append(callback)
+
+    def invalidate(self, *kinds: str) -> None:
+        """Скинути мапи `kinds` (без аргументів — усі)."""
+        kinds = {kind for kind in kinds or REFERENCE_TABLES if kind in self._generations}
+        with self._lock:
+            for kind in kinds:
+                self._maps.pop(kind, None)
+                self._generations[kind] += 1
+                self._invalidations[kind] += 1
+        for callback in self._subscribers:
+            callback(kinds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                kind: {
+                    "hits": self._hits[kind],
+                    "misses": self._misses[kind],
+                    "invalidations": self._invalidations[kind],
+                    "cached": kind in self._maps,
+                    "size": len(self._maps[kind][1]) if kind in self._maps else 0,
+                }
+                for kind in REFERENCE_TABLES
+            }
+
+
+reference_cache = ReferenceCache()
+
+
+def reference_names(session: Session, kind: str) -> Mapping[int, str]:
+    """`id → назва` для довідника `kind` (ключ `REFERENCE_TABLES`) з кешу воркера."""
+    return reference_cache.names(session, kind)
+
+
+# ─── Інвалідація при записі ─────────────────────────────────────────────────
+
+def _notify(session: OrmSession, kinds: set) -> None:
+    pending = session.info.setdefault(_PENDING_KEY, set())
+    for kind in kinds - pending:
+        session.connection().execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": NOTIFY_CHANNEL, "payload": kind},
+        )
+    pending.update(kinds)
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _after_flush(session, flush_context):
+    kinds = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        kinds |= _MODEL_KINDS.get(type(obj), set())
+    if kinds:
+        _notify(session, kinds)
+
+
+@event.listens_for(OrmSession, "do_orm_execute")
+def _on_orm_execute(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    kinds = _MODEL_KINDS.get(mapper.class_) if mapper is not None else None
+    if kinds:
+        _notify(orm_execute_state.session, kinds)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _after_commit(session):
+    kinds = session.info.pop(_PENDING_KEY, None)
+    if kinds:
+        # Свій воркер — одразу, не чекаючи на власний NOTIFY.
+        reference_cache.invalidate(*kinds)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# ─── LISTEN у кожному воркері ───────────────────────────────────────────────
+
+_listener_started = False
+_listener_lock = threading.Lock()
+
+
+def _listen_forever() -> None:
+    while True:
+        conn = None
+        try:
+            # Окреме з'єднання поза пулом: LISTEN живе, поки живе з'єднання.
+            proxied = engine.raw_connection()
+            proxied.detach()
+            conn = proxied.dbapi_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            # Поки не слухали (старт, обрив), повідомлення могли загубитися.
+            reference_cache.invalidate()
+            while True:
+                if select_module.select([conn], [], [], LISTEN_POLL_SEC) == ([], [], []):
+                    continue
+                conn.poll()
+                kinds = set()
+                while conn.notifies:
+                    kinds.add(conn.notifies.pop(0).payload)
+                if kinds:
+                    reference_cache.invalidate(*kinds)
+        except Exception as e:
+            logger.warning("LISTEN %s обірвано, перепідключення: %s", NOTIFY_CHANNEL, e)
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            time.sleep(LISTEN_RECONNECT_SEC)
+
+
+def start_reference_listener() -> None:
+    """Запускає фоновий потік LISTEN (один на воркер; повторний виклик — no-op)."""
+    global _listener_started
+    with _listener_lock:
+        if _listener_started:
+            return
+        _listener_started = True
+    threading.Thread(target=_listen_forever, name="reference-cache-listen", daemon=True).start()
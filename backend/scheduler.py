@@ -0,0 +1,279 @@
+"""Періодичні задачі з одним лідером на всі воркери uvicorn.
+
+Раніше кожен воркер запускав власні цикли `backup_scheduler`,
+`export_cleanup_scheduler`, `idempotency_cleanup_scheduler` — з
+`--workers 2` два `pg_dump` знімалися одночасно на кожному старті й щодоби.
+
+Тут задачі реєструються в одному `scheduler` (`register`), а виконує їх лише
+воркер-лідер:
+
+* лідерство — `pg_try_advisory_lock` на окремому з'єднанні поза пулом;
+  блокування живе, поки живе з'єднання, тож якщо лідер впав (процес убито,
+  з'єднання обірвалося), Postgres сам його знімає, і інший воркер стає
+  лідером при наступній спробі (`LEADER_RETRY_SEC`);
+* кожен запуск записується в `job_runs` (статус, тривалість, помилка;
+  dict, який повернула задача, — у `details`);
+  наступний запуск — через `interval_sec` від початку останнього, тож
+  перезапуск воркерів чи зміна лідера не повторюють щойно виконану задачу;
+* `stop()` скасовує цикл і задачі, що виконуються (запуск позначається
+  `cancelled`), і звільняє блокування.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Union
+
+from sqlalchemy import delete, func, update
+from sqlmodel import Session, select
+
+from backend.database import engine
+from backend.models import JobRun, JobRunStatus
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_lock лідера ("sched" у hex) — інший, ніж у міграцій.
+LEADER_LOCK_ID = 0x7363686564
+# Як часто не-лідер пробує перехопити лідерство.
+LEADER_RETRY_SEC = 30
+# Як часто лідер перевіряє з'єднання з блокуванням і строки задач.
+TICK_SEC = 15
+JOB_RUNS_RETENTION_DAYS = 30
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+JobFunc = Callable[[], Union[Awaitable[object], object]]
+
+
+@dataclass
+class Job:
+    name: str
+    interval_sec: int
+    func: JobFunc
+    next_run: Optional[datetime] = None
+    task: Optional[asyncio.Task] = None
+
+
+# ─── Журнал запусків (sync, виконується у threadpool) ───────────────────────
+
+def _start_run(job: str) -> int:
+    with Session(engine) as session:
+        run = JobRun(job=job, status=JobRunStatus.RUNNING.value, worker=WORKER_ID)
+        session.add(run)
+        session.commit()
+        return run.id
+
+
+def _finish_run(
+    run_id: int,
+    status: JobRunStatus,
+    duration_ms: int,
+    error: Optional[str] = None,
+    details: Optional[dict] = None,
+) -> None:
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        session.exec(
+            update(JobRun)
+            .where(JobRun.id == run_id)
+            .values(
+                status=status.value,
+                finished_at=now,
+                updated_at=now,
+                duration_ms=duration_ms,
+                error=error,
+                details=json.dumps(details, ensure_ascii=False, default=str) if details is not None else None,
+            )
+        )
+        session.commit()
+
+
+def _last_starts() -> dict[str, datetime]:
+    with Session(engine) as session:
+        rows = session.exec(select(JobRun.job, func.max(JobRun.started_at)).group_by(JobRun.job)).all()
+    return {job: started_at for job, started_at in rows}
+
+
+def cleanup_job_runs() -> int:
+    """Видаляє записи запусків, старші за `JOB_RUNS_RETENTION_DAYS`."""
+    before = datetime.utcnow() - timedelta(days=JOB_RUNS_RETENTION_DAYS)
+    with Session(engine) as session:
+        result = session.exec(delete(JobRun).where(JobRun.started_at < before))
+        session.commit()
+    return result.rowcount or 0
+
+
+# ─── Лідерство ──────────────────────────────────────────────────────────────
+
+def _try_acquire_leadership():
+    """DBAPI-з'єднання з утриманим блокуванням лідера або None."""
+    # Окреме з'єднання поза пулом: блокування живе, поки живе з'єднання.
+    proxied = engine.raw_connection()
+    proxied.detach()
+    conn = proxied.dbapi_connection
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (LEADER_LOCK_ID,))
+            acquired = cursor.fetchone()[0]
+    except Exception:
+        conn.close()
+        raise
+    if not acquired:
+        conn.close()
+        return None
+    return conn
+
+
+def _check_leadership(conn) -> None:
+    """Падає, якщо з'єднання з блокуванням обірвалося (лідерство втрачено)."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def _release_leadership(conn) -> None:
+    try:
+        # Закриття з'єднання знімає і блокування.
+        conn.close()
+    except Exception:
+        pass
+
+
+# ─── Планувальник ───────────────────────────────────────────────────────────
+
+class Scheduler:
+    def __init__(self):
+        self._jobs: dict[str, Job] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.is_leader = False
+
+    def register(self, name: str, interval_sec: int, func: JobFunc) -> None:
+        """Періодична задача: `func` — корутинна функція або звичайна (тоді
+        виконується у threadpool). Перший запуск — одразу, якщо задача ще
+        ніколи не виконувалась або з останнього запуску минуло `interval_sec`."""
+        self._jobs[name] = Job(name=name, interval_sec=interval_sec, func=func)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="scheduler")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                conn = await asyncio.to_thread(_try_acquire_leadership)
+            except Exception as e:
+                logger.warning("Не вдалося перевірити лідерство планувальника: %s", e)
+                conn = None
+            if conn is None:
+                await asyncio.sleep(LEADER_RETRY_SEC)
+                continue
+
+            self.is_leader = True
+            logger.info("Воркер %s — лідер планувальника", WORKER_ID)
+            try:
+                await self._lead(conn)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Лідерство планувальника втрачено: %s", e)
+            finally:
+                self.is_leader = False
+                await self._cancel_jobs()
+                await asyncio.to_thread(_release_leadership, conn)
+            await asyncio.sleep(LEADER_RETRY_SEC)
+
+    async def _lead(self, conn) -> None:
+        last_starts = await asyncio.to_thread(_last_starts)
+        now = datetime.utcnow()
+        for job in self._jobs.values():
+            last = last_starts.get(job.name)
+            job.next_run = last + timedelta(seconds=job.interval_sec) if last else now
+
+        while True:
+            await asyncio.to_thread(_check_leadership, conn)
+            now = datetime.utcnow()
+            for job in self._jobs.values():
+                if job.task is None and job.next_run <= now:
+                    job.next_run = now + timedelta(seconds=job.interval_sec)
+                    job.task = asyncio.create_task(self._execute(job), name=f"job:{job.name}")
+            await asyncio.sleep(TICK_SEC)
+
+    async def _cancel_jobs(self) -> None:
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _execute(self, job: Job) -> None:
+        started = time.monotonic()
+        run_id = None
+        try:
+            run_id = await asyncio.to_thread(_start_run, job.name)
+            if asyncio.iscoroutinefunction(job.func):
+                result = await job.func()
+            else:
+                result = await asyncio.to_thread(job.func)
+        except asyncio.CancelledError:
+            if run_id is not None:
+                await asyncio.shield(asyncio.to_thread(
+                    _finish_run, run_id, JobRunStatus.CANCELLED, _elapsed_ms(started)
+                ))
+            raise
+        except Exception as e:
+            logger.error("Задача %s завершилась помилкою: %s", job.name, e)
+            if run_id is not None:
+                await self._record(run_id, JobRunStatus.FAILED, started, str(e)[:1000])
+        else:
+            # dict від задачі (напр. файл і розмір бекапу) — у job_runs.details
+            details = result if isinstance(result, dict) else None
+            await self._record(run_id, JobRunStatus.SUCCESS, started, details=details)
+        finally:
+            job.task = None
+
+    @staticmethod
+    async def _record(
+        run_id: int,
+        status: JobRunStatus,
+        started: float,
+        error: Optional[str] = None,
+        details: Optional[dict] = None,
+    ) -> None:
+        try:
+            await asyncio.to_thread(_finish_run, run_id, status, _elapsed_ms(started), error, details)
+        except Exception as e:
+            logger.error("Не вдалося записати запуск задачі #%s: %s", run_id, e)
+
+    def status(self) -> dict:
+        return {
+            "worker": WORKER_ID,
+            "is_leader": self.is_leader,
+            "jobs": {
+                job.name: {
+                    "interval_sec": job.interval_sec,
+                    "next_run": job.next_run if self.is_leader else None,
+                    "running": job.task is not None,
+                }
+                for job in self._jobs.values()
+            },
+        }
+
+
+def _elapsed_ms(started: float) -> int:
+    return int((time.monotonic() - started) * 1000)
+
+
+scheduler = Scheduler()
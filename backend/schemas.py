@@ -1,9 +1,23 @@
-from pydantic import BaseModel, Field, EmailStr, model_validator
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, EmailStr, PlainSerializer, model_validator
+from typing import Annotated, Optional
+from datetime import datetime, timezone
 from backend.models import UserRole, Currency, TransactionType, PurchaseCategory, StockAdjustmentType, FarmerContractType, FarmerContractStatus, FarmerContractItemType, FarmerContractPaymentType, FarmerContractItemDirection
 
 
+def utc_isoformat(value: datetime) -> str:
+    """ISO-рядок з маркером `Z`. У БД час зберігається naive-UTC
+    (`datetime.utcnow()`), і без зони браузер прочитав би його як місцевий —
+    таблиці відставали б на TZ-офсет (3 години у Києві влітку)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat() + "Z"
+
+
+# datetime у відповідях API: серіалізується одразу як UTC при побудові JSON,
+# без окремого проходу по готовому payload.
+UTCDateTime = Annotated[datetime, PlainSerializer(utc_isoformat, return_type=str, when_used="json")]
+
+
 # Схемы для аутентификации
 
 class LoginRequest(BaseModel):
@@ -36,8 +50,8 @@ class UserResponse(BaseModel):
     role: UserRole
     is_active: bool
     password_plain: Optional[str] = None
-    created_at: datetime
-    updated_at: Optional[datetime]
+    created_at: UTCDateTime
+    updated_at: Optional[UTCDateTime]
     
     class Config:
         from_attributes = True
@@ -59,7 +73,7 @@ class CashRegisterResponse(BaseModel):
     uah_balance: float
     usd_balance: float
     eur_balance: float
-    updated_at: Optional[datetime]
+    updated_at: Optional[UTCDateTime]
     
     class Config:
         from_attributes = True
@@ -85,7 +99,7 @@ class TransactionResponse(BaseModel):
     uah_balance_after: float
     usd_balance_after: float
     eur_balance_after: float
-    created_at: datetime
+    created_at: UTCDateTime
     
     class Config:
         from_attributes = True
@@ -184,7 +198,7 @@ class PersonResponse(BaseModel):
     id: int
     full_name: str
     phone: Optional[str]
-    created_at: datetime
+    created_at: UTCDateTime
 
     class Config:
         from_attributes = True
@@ -201,7 +215,7 @@ class PersonActionResponse(BaseModel):
     quantity_kg: Optional[float] = None
     culture_name: Optional[str] = None
     note: Optional[str] = None
-    created_at: datetime
+    created_at: UTCDateTime
     related_id: Optional[int] = None
 
 
@@ -259,7 +273,7 @@ class FarmerGrainMovementResponse(BaseModel):
     quantity_kg: float
     note: Optional[str]
     created_by_user_id: Optional[int]
-    created_at: datetime
+    created_at: UTCDateTime
 
     class Config:
         from_attributes = True
@@ -328,7 +342,7 @@ class FarmerContractResponse(BaseModel):
     exchange_rate: Optional[float] = None
     was_reserve: bool = False
     note: Optional[str]
-    created_at: datetime
+    created_at: UTCDateTime
 
     class Config:
         from_attributes = True
@@ -360,7 +374,7 @@ class FarmerContractPaymentResponse(BaseModel):
     amount_uah: float
     culture_id: Optional[int]
     quantity_kg: Optional[float]
-    payment_date: datetime
+    payment_date: UTCDateTime
     is_cancelled: bool
 
     class Config:
@@ -440,7 +454,7 @@ class GrainShipmentResponse(BaseModel):
     driver_id: Optional[int]
     vehicle_type_id: Optional[int]
     created_by_user_id: Optional[int]
-    created_at: datetime
+    created_at: UTCDateTime
 
     class Config:
         from_attributes = True
@@ -470,12 +484,29 @@ class GrainIntakeResponse(BaseModel):
     accepted_weight_kg: float
     note: Optional[str]
     is_farmer_transfer: bool = False
-    created_at: datetime
+    created_at: UTCDateTime
     
     class Config:
         from_attributes = True
 
 
+class GrainIntakeBatchCreate(BaseModel):
+    """Схема пакетного створення карток приходу (черга на вагах)"""
+    items: list[GrainIntakeCreate] = Field(..., min_length=1, max_length=1000, description="Картки приходу")
+
+
+class GrainIntakeBatchError(BaseModel):
+    """Помилка окремої картки пакета"""
+    index: int = Field(..., description="Позиція картки в `items`")
+    detail: str
+
+
+class GrainIntakeBatchResponse(BaseModel):
+    """Схема відповіді пакетного створення: створені картки + відхилені з причиною"""
+    created: list[GrainIntakeResponse]
+    errors: list[GrainIntakeBatchError]
+
+
 # Схеми для закупівель (не зерно)
 
 class PurchaseStockResponse(BaseModel):
@@ -518,7 +549,7 @@ class StockAdjustmentResponse(BaseModel):
     user_full_name: str
     source: Optional[str]
     destination: Optional[str]
-    created_at: datetime
+    created_at: UTCDateTime
 
     class Config:
         from_attributes = True
@@ -544,7 +575,7 @@ class PurchaseResponse(BaseModel):
     quantity_kg: float
     total_amount: float
     is_free: bool
-    created_at: datetime
+    created_at: UTCDateTime
 
     class Config:
         from_attributes = True
@@ -605,8 +636,8 @@ class AgriFieldResponse(BaseModel):
     name: str
     owner_name: str
     note: Optional[str] = None
-    created_at: datetime
-    updated_at: Optional[datetime] = None
+    created_at: UTCDateTime
+    updated_at: Optional[UTCDateTime] = None
 
     class Config:
         from_attributes = True
@@ -623,8 +654,8 @@ class LandlordResponse(BaseModel):
     id: int
     full_name: str
     phone: Optional[str]
-    created_at: datetime
-    updated_at: Optional[datetime]
+    created_at: UTCDateTime
+    updated_at: Optional[UTCDateTime]
 
     class Config:
         from_attributes = True
@@ -687,8 +718,8 @@ class LeasePeriodResponse(BaseModel):
     id: int
     parcel_id: int
     year: int
-    period_start: datetime
-    period_end: datetime
+    period_start: UTCDateTime
+    period_end: UTCDateTime
     cash_amount: float = 0.0
     cash_currency: Optional[str] = "UAH"
     cash_rate: float = 1.0
@@ -700,7 +731,7 @@ class LeasePeriodResponse(BaseModel):
     # Сумарно по періоду (зерно по поточній ціні + гроші)
     grain_remaining_cash_uah: float = 0.0
     remaining_cash_uah: float = 0.0
-    created_at: datetime
+    created_at: UTCDateTime
 
     class Config:
         from_attributes = True
@@ -735,13 +766,13 @@ class LeaseParcelResponse(BaseModel):
     area_ha: float
     label: Optional[str] = None
     payment_terms: str
-    start_date: datetime
+    start_date: UTCDateTime
     is_active: bool
     note: Optional[str] = None
     periods: list[LeasePeriodResponse] = Field(default_factory=list)
     cumulative_balance_uah: float = 0.0
-    created_at: datetime
-    updated_at: Optional[datetime] = None
+    created_at: UTCDateTime
+    updated_at: Optional[UTCDateTime] = None
 
     class Config:
         from_attributes = True
@@ -800,13 +831,37 @@ class LeasePaymentResponse(BaseModel):
     amount: Optional[float]
     exchange_rate: Optional[float] = None
     amount_uah: Optional[float] = None
-    payment_date: datetime
+    payment_date: UTCDateTime
     note: Optional[str]
     created_by_user_id: Optional[int]
     created_by_user_full_name: Optional[str] = None
-    created_at: datetime
+    created_at: UTCDateTime
     is_cancelled: bool = False
 
     class Config:
         from_attributes = True
 
+
+
+class ExportJobCreate(BaseModel):
+    """Схема створення фонового експорту"""
+    kind: str = Field(..., description="Тип звіту: intakes_summary | period_report")
+    start_date: Optional[str] = Field(default=None, description="ISO YYYY-MM-DD")
+    end_date: Optional[str] = Field(default=None, description="ISO YYYY-MM-DD включно")
+
+
+class ExportJobResponse(BaseModel):
+    """Схема відповіді зі статусом фонового експорту"""
+    id: int
+    kind: str
+    status: str
+    progress: int
+    filename: Optional[str] = None
+    file_size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: UTCDateTime
+    started_at: Optional[UTCDateTime] = None
+    finished_at: Optional[UTCDateTime] = None
+
+    class Config:
+        from_attributes = True
@@ -24,6 +24,7 @@ from backend.models import (
     FarmerContractPaymentType,
 )
 from backend.auth import get_password_hash
+from backend.balances import rebuild_farmer_balances, rebuild_person_balances
 
 R = Random(42)  # фіксований seed → відтворюваність
 
@@ -341,6 +342,11 @@ def seed():
         print(f'  ✓ {lease_count} орендних ділянок')
 
         session.commit()
+
+        # Сід пише картки/списання напряму — матеріалізовані баланси будуємо з історії
+        rebuild_farmer_balances(session)
+        rebuild_person_balances(session)
+        print('  ✓ farmer_balances / person_grain_balances перебудовано')
         print('\n🎉 Сід завершено\n')
 
 
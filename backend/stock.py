@@ -0,0 +1,132 @@
+"""Атомарні мутації складу зерна (`grain_stock`).
+
+Раніше кожен handler читав рядок `GrainStock` у Python, змінював
+`quantity_kg`/`own_quantity_kg`/... і записував назад. Без блокування рядка
+два одночасні запити (дві ваги + офіс) перезаписували зміни один одного.
+
+Тут кожна зміна — один statement:
+
+    UPDATE grain_stock SET quantity_kg = quantity_kg + :d, ...
+    WHERE culture_id = :id [AND <умова достатності>]
+    RETURNING *
+
+Postgres блокує рядок до кінця транзакції, а конкурентний UPDATE чекає і
+перевіряє WHERE вже на новій версії рядка — тож перевірка «чи вистачає зерна»
+і списання не розходяться. Значення «до/після» для `StockAdjustmentLog`
+беруться з RETURNING-рядка (`before = after - дельта`), а не з того, що
+handler прочитав раніше. Без commit — виконується в транзакції виклику.
+"""
+from datetime import datetime
+from typing import Iterable, Optional, Union
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import Session, select
+
+from backend.models import GrainStock
+
+STOCK_COLUMNS = (
+    "quantity_kg",
+    "own_quantity_kg",
+    "farmer_quantity_kg",
+    "person_quantity_kg",
+    "reserved_kg",
+)
+
+Delta = Union[float, ColumnElement]
+
+
+def ensure_grain_stock(session: Session, culture_id: int) -> None:
+    """INSERT ... ON CONFLICT DO NOTHING — рядок складу культури без гонки
+    «двоє одночасно не знайшли і обидва створили»."""
+    stmt = pg_insert(GrainStock).values(
+        culture_id=culture_id,
+        quantity_kg=0.0,
+        own_quantity_kg=0.0,
+        farmer_quantity_kg=0.0,
+        person_quantity_kg=0.0,
+        reserved_kg=0.0,
+        created_at=datetime.utcnow(),
+    )
+    session.exec(stmt.on_conflict_do_nothing(index_elements=["culture_id"]))
+
+
+def get_grain_stock(session: Session, culture_id: int) -> Optional[GrainStock]:
+    """Свіжий стан рядка (для повідомлень про нестачу після відхиленого UPDATE)."""
+    return session.exec(
+        select(GrainStock)
+        .where(GrainStock.culture_id == culture_id)
+        .execution_options(populate_existing=True)
+    ).first()
+
+
+def change_grain_stock(
+    session: Session,
+    culture_id: int,
+    *,
+    where: Iterable[ColumnElement] = (),
+    clamp: Iterable[str] = (),
+    create: bool = True,
+    **deltas: Delta,
+) -> Optional[GrainStock]:
+    """Атомарно додає дельти до колонок складу культури і повертає оновлений рядок.
+
+    `deltas` — `quantity_kg=...`, `own_quantity_kg=...` тощо: число або
+    SQL-вираз над *старими* значеннями рядка (`GrainStock.farmer_quantity_kg`).
+    `where` — умови достатності; якщо не виконались, рядок не змінюється і
+    повертається None. `clamp` — колонки, що не опускаються нижче нуля
+    (як старі `max(0.0, ...)`). `create=False` — не створювати рядок, якщо
+    культури на складі ще немає (тоді теж None).
+    """
+    unknown = set(deltas) - set(STOCK_COLUMNS)
+    if unknown:
+        raise ValueError(f"Невідомі колонки складу: {', '.join(sorted(unknown))}")
+    if create:
+        ensure_grain_stock(session, culture_id)
+
+    clamp = set(clamp)
+    values = {}
+    for name, delta in deltas.items():
+        column = getattr(GrainStock, name)
+        expr = func.coalesce(column, 0.0) + delta
+        values[name] = func.greatest(expr, 0.0) if name in clamp else expr
+    values["updated_at"] = datetime.utcnow()
+
+    stmt = (
+        update(GrainStock)
+        .where(GrainStock.culture_id == culture_id, *where)
+        .values(**values)
+        .returning(GrainStock)
+        .execution_options(synchronize_session="fetch", populate_existing=True)
+    )
+    return session.exec(stmt).scalar_one_or_none()
+
+
+def farmer_cover(qty: float) -> ColumnElement:
+    """Частина `qty`, що «віртуально» списується з-під невикупленого у фермерів
+    (farmer_quantity_kg — лічильник боргу, сам не змінюється)."""
+    return func.least(qty, func.greatest(func.coalesce(GrainStock.farmer_quantity_kg, 0.0), 0.0))
+
+
+def deduct_shipped_grain(
+    session: Session,
+    culture_id: int,
+    qty: float,
+    *,
+    where: Iterable[ColumnElement] = (),
+    clamp: Iterable[str] = (),
+    create: bool = True,
+) -> Optional[GrainStock]:
+    """Фізичне списання зерна (відправка, виплата оренди): спочатку з-під
+    невикупленого у фермерів, решта — з own_quantity_kg. Усе рахується від
+    значень рядка в момент UPDATE, а не від прочитаних раніше."""
+    return change_grain_stock(
+        session,
+        culture_id,
+        where=where,
+        clamp=clamp,
+        create=create,
+        quantity_kg=-qty,
+        own_quantity_kg=-(qty - farmer_cover(qty)),
+    )
@@ -0,0 +1,151 @@
+"""FIFO-розподіл виплат по талонах на зерно.
+
+Виплата по талонах гасить загальний борг: сума розходиться по талонах від
+найстаріших (`created_at`, `id`). Раніше кожна виплата і кожне скасування
+завантажували всі талони й усі виплати і перераховували розподіл з нуля.
+
+Розподіл зберігається в самих талонах (`paid_value_uah`, `remaining_value_uah`,
+`is_closed`): закриті — сплачена голова черги, перший відкритий — вказівник
+розподілу (може бути частково сплачений), за ним — несплачені. Тому:
+
+* виплата (`allocate_voucher_payment`) проходить лише відкриті талони від
+  вказівника, поки не вичерпається сума (частковий індекс
+  `ix_grain_vouchers_open_fifo`);
+* скасування (`release_voucher_payment`) знімає суму з хвоста сплачених —
+  від новіших до старіших (`ix_grain_vouchers_paid_fifo`);
+* залишок боргу (`voucher_debt_remaining`) — SUM по відкритих талонах.
+
+Зміни розподілу серіалізуються `pg_advisory_xact_lock` до кінця транзакції.
+`rebuild_voucher_allocation` — повний перерахунок з історії виплат (міграція).
+"""
+from typing import Iterator, Optional
+
+from sqlalchemy import func, text, true, tuple_
+from sqlmodel import Session, select
+
+from backend.models import GrainVoucher, GrainVoucherPayment
+
+# Ключ pg_advisory_xact_lock розподілу ("vouch" у hex).
+VOUCHER_LOCK_ID = 0x766F756368
+# Талон вважається сплаченим, якщо недоплата менша за копійку.
+VOUCHER_EPS_UAH = 0.01
+FIFO_BATCH_SIZE = 100
+
+
+def lock_voucher_allocation(session: Session) -> None:
+    """Блокування розподілу до кінця поточної транзакції (повторний виклик
+    у тій самій транзакції не блокує)."""
+    session.exec(text("SELECT pg_advisory_xact_lock(:key)"), params={"key": VOUCHER_LOCK_ID})
+
+
+def _fifo_page_query(condition, newest_first: bool = False, after: Optional[tuple] = None):
+    """Порція черги FIFO: `condition`, keyset після `after` = (created_at, id)."""
+    key = tuple_(GrainVoucher.created_at, GrainVoucher.id)
+    if newest_first:
+        order = (GrainVoucher.created_at.desc(), GrainVoucher.id.desc())
+    else:
+        order = (GrainVoucher.created_at.asc(), GrainVoucher.id.asc())
+    query = select(GrainVoucher).where(condition)
+    if after is not None:
+        query = query.where(key < tuple_(*after) if newest_first else key > tuple_(*after))
+    return query.order_by(*order).limit(FIFO_BATCH_SIZE)
+
+
+def _iter_fifo(session: Session, condition, newest_first: bool = False) -> Iterator[GrainVoucher]:
+    """Талони в порядку FIFO порціями по `FIFO_BATCH_SIZE` (keyset по
+    `created_at, id`) — щоб не вантажити хвіст, до якого розподіл не дійде."""
+    last = None
+    while True:
+        batch = session.exec(_fifo_page_query(condition, newest_first, last)).all()
+        if not batch:
+            return
+        yield from batch
+        last = (batch[-1].created_at, batch[-1].id)
+
+
+def _set_paid(voucher: GrainVoucher, paid_uah: float) -> None:
+    total = voucher.total_value_uah
+    if paid_uah >= total - VOUCHER_EPS_UAH:
+        voucher.paid_value_uah = total
+        voucher.remaining_value_uah = 0.0
+        voucher.is_closed = True
+    else:
+        voucher.paid_value_uah = max(0.0, paid_uah)
+        voucher.remaining_value_uah = round(total - voucher.paid_value_uah, 2)
+        voucher.is_closed = False
+
+
+def voucher_debt_remaining(session: Session) -> float:
+    """Загальний залишок боргу по талонах, грн."""
+    remaining = session.exec(
+        select(func.coalesce(func.sum(GrainVoucher.remaining_value_uah), 0.0))
+        .where(GrainVoucher.is_closed == False)
+    ).one()
+    return max(0.0, float(remaining))
+
+
+def frontier_voucher_id(session: Session) -> Optional[int]:
+    """Перший відкритий талон у черзі (або перший талон, якщо всі закриті)."""
+    voucher_id = session.exec(
+        select(GrainVoucher.id)
+        .where(GrainVoucher.is_closed == False)
+        .order_by(GrainVoucher.created_at.asc(), GrainVoucher.id.asc())
+        .limit(1)
+    ).first()
+    if voucher_id is None:
+        voucher_id = session.exec(select(GrainVoucher.id).order_by(GrainVoucher.id).limit(1)).first()
+    return voucher_id
+
+
+def allocate_voucher_payment(session: Session, amount_uah: float) -> float:
+    """Розподіляє `amount_uah` по відкритих талонах від вказівника. Без commit —
+    у транзакції виклику. Повертає суму, яку не було куди розподілити."""
+    lock_voucher_allocation(session)
+    left = amount_uah
+    for voucher in _iter_fifo(session, GrainVoucher.is_closed == False):
+        if left <= 0:
+            break
+        need = voucher.total_value_uah - voucher.paid_value_uah
+        if left >= need - VOUCHER_EPS_UAH:
+            _set_paid(voucher, voucher.total_value_uah)
+            left -= need
+        else:
+            _set_paid(voucher, voucher.paid_value_uah + left)
+            left = 0.0
+        session.add(voucher)
+    return max(0.0, left)
+
+
+def release_voucher_payment(session: Session, amount_uah: float) -> None:
+    """Знімає `amount_uah` з розподілу — з найновіших сплачених талонів.
+    Без commit — у транзакції виклику."""
+    lock_voucher_allocation(session)
+    left = amount_uah
+    for voucher in _iter_fifo(session, GrainVoucher.paid_value_uah > 0, newest_first=True):
+        if left <= 0:
+            break
+        take = min(voucher.paid_value_uah, left)
+        _set_paid(voucher, voucher.paid_value_uah - take)
+        left -= take
+        session.add(voucher)
+
+
+def rebuild_voucher_allocation(session: Session) -> int:
+    """Повний FIFO-перерахунок з суми не скасованих виплат (як було до
+    інкрементального розподілу). Без commit. Повертає кількість талонів."""
+    lock_voucher_allocation(session)
+    left = float(session.exec(
+        select(func.coalesce(func.sum(GrainVoucherPayment.amount_uah), 0.0))
+        .where(GrainVoucherPayment.is_cancelled == False)
+    ).one())
+    count = 0
+    for voucher in _iter_fifo(session, true()):
+        if left >= voucher.total_value_uah - VOUCHER_EPS_UAH:
+            _set_paid(voucher, voucher.total_value_uah)
+            left -= voucher.total_value_uah
+        else:
+            _set_paid(voucher, left)
+            left = 0.0
+        session.add(voucher)
+        count += 1
+    return count
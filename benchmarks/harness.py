@@ -0,0 +1,199 @@
+"""Інструменти бенчмарків: застосунок у процесі (ASGI), перцентилі, масові дані."""
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlencode
+
+from sqlmodel import text
+
+from backend.auth import create_access_token
+from backend.main import app, configure_threadpool
+
+
+def percentiles(samples: list[float]) -> dict:
+    """p50 / p95 / p99 / max вибірки (секунди)."""
+    ordered = sorted(samples)
+
+    def at(share: float) -> float:
+        return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+    return {
+        "n": len(ordered),
+        "p50": statistics.median(ordered),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": ordered[-1],
+    }
+
+
+def timed(call) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = call()
+    return time.perf_counter() - started, result
+
+
+# ─── Застосунок у процесі ───────────────────────────────────────────────────
+
+class ApiClient:
+    """Запити до `backend.main.app` через ASGI — без мережі й uvicorn, з
+    усіма middleware, залежностями та threadpool, як у воркері. Викликати з
+    `run_app` (один event loop на весь сценарій)."""
+
+    def __init__(self, user=None):
+        self.token = create_access_token(user) if user is not None else None
+
+    async def request(self, method: str, path: str, json_body=None, params: dict | None = None,
+                      headers: dict | None = None) -> tuple[int, dict, bytes]:
+        body = json.dumps(json_body).encode() if json_body is not None else b""
+        raw_headers = [(b"content-type", b"application/json")]
+        if self.token:
+            raw_headers.append((b"authorization", f"Bearer {self.token}".encode()))
+        for name, value in (headers or {}).items():
+            raw_headers.append((name.lower().encode(), str(value).encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": urlencode(params or {}).encode(),
+            "headers": raw_headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        messages = []
+        finished = asyncio.Event()
+        sent_body = False
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # StreamingResponse слухає disconnect, поки віддає тіло.
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished.set()
+
+        await app(scope, receive, send)
+        finished.set()
+        start = messages[0]
+        response_headers = {name.decode(): value.decode() for name, value in start.get("headers", [])}
+        return start["status"], response_headers, b"".join(m.get("body", b"") for m in messages[1:])
+
+    async def timed(self, method: str, path: str, **kwargs) -> tuple[float, int, bytes]:
+        started = time.perf_counter()
+        status_code, _, body = await self.request(method, path, **kwargs)
+        return time.perf_counter() - started, status_code, body
+
+
+def run_app(scenario):
+    """`asyncio.run(scenario())` з threadpool, обмеженим як у startup
+    застосунку (`configure_threadpool` налаштовує ліміт поточного loop)."""
+    async def main():
+        configure_threadpool()
+        return await scenario()
+
+    return asyncio.run(main())
+
+
+# ─── Обсяги даних ───────────────────────────────────────────────────────────
+
+def insert_intakes(session, refs, count: int, days: int = 365) -> None:
+    """`count` підтверджених і pending карток приходу одним INSERT ... SELECT
+    (без складу й балансів — для звітів і експортів, що читають картки)."""
+    session.exec(text("""
+        INSERT INTO grain_intakes (
+            created_at, culture_id, vehicle_type_id, is_own_grain, field_id, owner_id,
+            owner_full_name, is_internal_driver, driver_id, has_trailer, is_own_combine,
+            gross_weight_kg, tare_weight_kg, net_weight_kg, impurity_percent,
+            pending_quality, pending_tare, accepted_weight_kg, is_farmer_transfer
+        )
+        SELECT
+            TIMESTAMP '2025-01-01' + (n % :days) * INTERVAL '1 day' + (n * 37 % 86400) * INTERVAL '1 second',
+            CASE WHEN n % 2 = 0 THEN :wheat ELSE :barley END,
+            :truck,
+            n % 5 = 0,
+            CASE WHEN n % 5 = 0 THEN :field END,
+            CASE WHEN n % 5 = 0 THEN NULL WHEN n % 3 = 0 THEN :farmer2 ELSE :farmer END,
+            CASE WHEN n % 5 = 0 THEN NULL ELSE 'Фермер' END,
+            true, :driver, n % 4 = 0, false,
+            15000 + n % 9000, 5000, 10000 + n % 9000, 1.0,
+            n % 50 = 0, n % 70 = 0, (10000 + n % 9000) * 0.99, n % 97 = 0
+        FROM generate_series(1, :count) AS n
+    """).bindparams(
+        count=count, days=days, wheat=refs["wheat"].id, barley=refs["barley"].id,
+        truck=refs["truck"].id, field=refs["field"].id, farmer=refs["farmer"].id,
+        farmer2=refs["farmer2"].id, driver=refs["driver"].id,
+    ))
+    session.exec(text("ANALYZE grain_intakes"))
+    session.commit()
+
+
+def insert_contracts(session, refs, count: int) -> None:
+    """`count` контрактів фермерів (кожен четвертий закритий) і по дві оплати
+    на контракт — грошова та прийом товару — одним INSERT ... SELECT."""
+    session.exec(text("""
+        INSERT INTO farmer_contracts (
+            created_at, owner_id, contract_type, status, total_value_uah, balance_uah, was_reserve
+        )
+        SELECT
+            TIMESTAMP '2025-01-01' + n * INTERVAL '1 minute',
+            CASE WHEN n % 3 = 0 THEN :farmer2 ELSE :farmer END,
+            CASE WHEN n % 2 = 0 THEN 'payment' ELSE 'debt' END,
+            CASE WHEN n % 4 = 0 THEN 'closed' ELSE 'open' END,
+            10000, CASE WHEN n % 4 = 0 THEN 0 ELSE 2500 END, false
+        FROM generate_series(1, :count) AS n
+    """).bindparams(count=count, farmer=refs["farmer"].id, farmer2=refs["farmer2"].id))
+    session.exec(text("""
+        INSERT INTO farmer_contract_payments (
+            created_at, contract_id, payment_type, amount, currency, amount_uah,
+            culture_id, quantity_kg, payment_date, is_cancelled
+        )
+        SELECT
+            c.created_at, c.id,
+            CASE WHEN k = 1 THEN 'cash' ELSE 'goods_receive' END,
+            3750, 'UAH', 3750,
+            CASE WHEN k = 2 THEN :wheat END,
+            CASE WHEN k = 2 THEN 500 END,
+            c.created_at, false
+        FROM farmer_contracts c CROSS JOIN generate_series(1, 2) AS k
+    """).bindparams(wheat=refs["wheat"].id))
+    session.exec(text("ANALYZE farmer_contracts"))
+    session.exec(text("ANALYZE farmer_contract_payments"))
+    session.commit()
+
+
+def insert_vouchers(session, refs, count: int, value_uah: float = 1000.0) -> None:
+    """`count` несплачених талонів одного контракту обміну (INSERT ... SELECT),
+    новіші за вже наявні — у кінець черги FIFO."""
+    contract_id = session.exec(text("""
+        INSERT INTO farmer_contracts (created_at, owner_id, contract_type, status, total_value_uah,
+                                      balance_uah, was_reserve)
+        VALUES (NOW() AT TIME ZONE 'utc', :farmer, 'exchange', 'open', 0, 0, false)
+        RETURNING id
+    """).bindparams(farmer=refs["farmer"].id)).scalar_one()
+    session.exec(text("""
+        INSERT INTO grain_vouchers (
+            created_at, farmer_contract_id, owner_id, culture_id, quantity_kg, price_per_kg,
+            total_value_uah, paid_value_uah, remaining_value_uah, is_closed
+        )
+        SELECT
+            COALESCE((SELECT MAX(created_at) FROM grain_vouchers), TIMESTAMP '2025-01-01')
+                + n * INTERVAL '1 second',
+            :contract, :farmer, :wheat, :value / 8.0, 8.0, :value, 0, :value, false
+        FROM generate_series(1, :count) AS n
+    """).bindparams(
+        count=count, value=value_uah, contract=contract_id,
+        farmer=refs["farmer"].id, wheat=refs["wheat"].id,
+    ))
+    session.exec(text("ANALYZE grain_vouchers"))
+    session.commit()
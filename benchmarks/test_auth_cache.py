@@ -0,0 +1,36 @@
+"""Простий автентифікований запит (`GET /api/users/me`) з кешем користувачів
+і без нього (TTL 0 — як до кешу: запит до users на кожен виклик)."""
+from backend.auth import user_cache_stats
+from backend.config import settings
+from benchmarks.harness import percentiles, run_app
+
+REQUESTS = 1000
+
+
+def _measure(api) -> list[float]:
+    async def scenario():
+        latencies = []
+        for _ in range(REQUESTS):
+            elapsed, status_code, _ = await api.timed("GET", "/api/users/me")
+            assert status_code == 200
+            latencies.append(elapsed)
+        return latencies
+
+    return run_app(scenario)
+
+
+def test_authenticated_request_with_and_without_user_cache(api, bench_report, monkeypatch):
+    monkeypatch.setattr(settings, "auth_user_cache_ttl_sec", 0)
+    before = user_cache_stats()
+    uncached = percentiles(_measure(api))
+    assert user_cache_stats()["misses"] - before["misses"] == REQUESTS
+
+    monkeypatch.setattr(settings, "auth_user_cache_ttl_sec", 60)
+    _measure(api)  # прогрів кешу
+    before = user_cache_stats()
+    cached = percentiles(_measure(api))
+    assert user_cache_stats()["hits"] - before["hits"] == REQUESTS
+
+    bench_report("users/me without cache", **uncached)
+    bench_report("users/me with cache", **cached)
+    assert cached["p50"] < uncached["p50"]
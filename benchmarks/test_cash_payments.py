@@ -0,0 +1,63 @@
+"""Паралельні рухи каси через `POST /api/cash/update-balance`: атомарний
+UPDATE тримає блокування рядка каси лише до коміту, тож запити з threadpool
+проходять паралельно, а баланс лишається точним."""
+import asyncio
+import time
+
+import pytest
+from sqlmodel import Session
+
+from backend.models import CashRegister
+from benchmarks.harness import percentiles, run_app
+
+PAYMENTS = 400
+CONCURRENCY = 20
+AMOUNT = 12.34
+
+
+def _payment() -> dict:
+    return {"currency": "UAH", "amount": AMOUNT, "transaction_type": "add", "description": "бенчмарк"}
+
+
+def test_parallel_cash_payments(engine, session, cash_register, api, bench_report):
+    async def sequential():
+        # Прогрів (кеш користувача, з'єднання пулу) — поза заміром.
+        await api.request("POST", "/api/cash/update-balance", json_body=_payment())
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(PAYMENTS // 4):
+            elapsed, status_code, body = await api.timed("POST", "/api/cash/update-balance", json_body=_payment())
+            assert status_code == 200, body
+            latencies.append(elapsed)
+        return latencies, time.perf_counter() - started
+
+    async def parallel():
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def one():
+            async with semaphore:
+                elapsed, status_code, body = await api.timed(
+                    "POST", "/api/cash/update-balance", json_body=_payment()
+                )
+                assert status_code == 200, body
+                return elapsed
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(PAYMENTS)))
+        return latencies, time.perf_counter() - started
+
+    sequential_latencies, sequential_seconds = run_app(sequential)
+    parallel_latencies, parallel_seconds = run_app(parallel)
+
+    sequential_rate = len(sequential_latencies) / sequential_seconds
+    parallel_rate = PAYMENTS / parallel_seconds
+    bench_report("cash payments sequential", per_s=sequential_rate, **percentiles(sequential_latencies))
+    bench_report(f"cash payments x{CONCURRENCY}", per_s=parallel_rate, **percentiles(parallel_latencies))
+
+    with Session(engine) as check:
+        register = check.get(CashRegister, cash_register.id)
+        assert register.uah_balance == pytest.approx((PAYMENTS + PAYMENTS // 4 + 1) * AMOUNT)
+    # Рядок каси не серіалізує весь запит: паралельно — приблизно як по одному.
+    # Більшого в одному процесі не буде (запити ділять один GIL), тож поріг
+    # ловить лише обвал — черги на блокуванні рядка, — а не шум вимірювання.
+    assert parallel_rate >= 0.6 * sequential_rate
@@ -0,0 +1,60 @@
+"""1 000 карток приходу: по одній через `POST /api/grain/intakes` проти одного
+`POST /api/grain/intakes/batch` (одна транзакція, одне оновлення складу на
+культуру)."""
+import time
+
+import pytest
+from sqlmodel import Session, func, select
+
+from backend.models import GrainIntake, GrainStock
+from benchmarks.harness import percentiles, run_app
+
+INTAKES = 1000
+
+
+def _card(refs, n: int) -> dict:
+    return {
+        "culture_id": refs["wheat"].id if n % 2 else refs["barley"].id,
+        "vehicle_type_id": refs["truck"].id,
+        "owner_id": refs["farmer"].id if n % 3 else refs["farmer2"].id,
+        "driver_id": refs["driver"].id,
+        "gross_weight_kg": 15000 + n,
+        "tare_weight_kg": 5000,
+    }
+
+
+def _stock_total(engine) -> float:
+    with Session(engine) as check:
+        return check.exec(select(func.sum(GrainStock.quantity_kg))).one()
+
+
+def test_batch_vs_single_intakes(engine, session, refs, api, bench_report):
+    cards = [_card(refs, n) for n in range(INTAKES)]
+
+    async def singles():
+        latencies = []
+        for card in cards:
+            elapsed, status_code, body = await api.timed("POST", "/api/grain/intakes", json_body=card)
+            assert status_code == 200, body
+            latencies.append(elapsed)
+        return latencies
+
+    async def batch():
+        return await api.timed("POST", "/api/grain/intakes/batch", json_body={"items": cards})
+
+    started = time.perf_counter()
+    single_latencies = run_app(singles)
+    single_seconds = time.perf_counter() - started
+    single_stock = _stock_total(engine)
+
+    batch_seconds, status_code, body = run_app(batch)
+    assert status_code == 200, body
+    batch_stock = _stock_total(engine) - single_stock
+
+    bench_report("intakes one by one", total_s=single_seconds, **percentiles(single_latencies))
+    bench_report("intakes batch", total_s=batch_seconds, speedup=single_seconds / batch_seconds)
+
+    with Session(engine) as check:
+        assert check.exec(select(func.count()).select_from(GrainIntake)).one() == 2 * INTAKES
+    assert batch_stock == pytest.approx(single_stock)
+    assert batch_seconds < single_seconds / 2
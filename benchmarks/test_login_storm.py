@@ -0,0 +1,65 @@
+"""Зміна змін: 20 операторів логіняться одночасно, а `GET /api/grain/stock`
+тим часом має відповідати. bcrypt іде в обмеженому пулі хешування, а логін
+не тримає з'єднання з БД, поки чекає на нього, — пул з'єднань лишається
+вільним для інших запитів."""
+import asyncio
+import time
+
+from backend.auth import get_password_hash
+from backend.database import engine
+from backend.models import User
+from benchmarks.harness import ApiClient, percentiles, run_app
+
+OPERATORS = 20
+PASSWORD = "зміна-пароль"
+
+
+def test_stock_latency_during_login_storm(session, refs, api, bench_report):
+    password_hash = get_password_hash(PASSWORD)
+    session.add_all(
+        User(username=f"operator{n}", password_hash=password_hash, full_name=f"Оператор {n}")
+        for n in range(OPERATORS)
+    )
+    session.commit()
+    anonymous = ApiClient()
+
+    async def scenario():
+        baseline = []
+        for _ in range(20):
+            elapsed, status_code, _ = await api.timed("GET", "/api/grain/stock")
+            assert status_code == 200
+            baseline.append(elapsed)
+
+        started = time.perf_counter()
+        logins = [
+            asyncio.create_task(anonymous.timed(
+                "POST", "/api/auth/login", json_body={"username": f"operator{n}", "password": PASSWORD},
+            ))
+            for n in range(OPERATORS)
+        ]
+        under_load, checked_out = [], []
+        while not all(task.done() for task in logins):
+            checked_out.append(engine.pool.checkedout())
+            elapsed, status_code, _ = await api.timed("GET", "/api/grain/stock")
+            assert status_code == 200
+            under_load.append(elapsed)
+            await asyncio.sleep(0.01)
+        storm_seconds = time.perf_counter() - started
+        login_latencies = []
+        for task in logins:
+            elapsed, status_code, body = task.result()
+            assert status_code == 200, body
+            login_latencies.append(elapsed)
+        return baseline, under_load, checked_out, login_latencies, storm_seconds
+
+    baseline, under_load, checked_out, login_latencies, storm_seconds = run_app(scenario)
+    loaded = percentiles(under_load)
+    bench_report("stock idle", **percentiles(baseline))
+    bench_report(f"stock during {OPERATORS} logins", storm_s=storm_seconds,
+                 max_checked_out=max(checked_out), **loaded)
+    bench_report(f"login x{OPERATORS}", **percentiles(login_latencies))
+
+    # Якби логіни тримали з'єднання на час bcrypt, їх було б зайнято стільки,
+    # скільки логінів чекає, а склад стояв би в черзі за вільним з'єднанням.
+    assert max(checked_out) < OPERATORS // 2
+    assert loaded["p99"] < storm_seconds / 4
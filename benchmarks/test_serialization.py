@@ -0,0 +1,78 @@
+"""Серіалізація сторінки журналу максимального розміру (`limit=1000`):
+`GET /api/grain/intakes` і `GET /api/cash/transactions`.
+
+Поруч — рендер того самого вмісту попереднім способом (`_LegacyUTCResponse`:
+рекурсивний regex-обхід payload + stdlib json) і поточним (`ORJSONResponse`;
+`Z` дописує сама схема через `UTCDateTime`)."""
+import json
+import re
+import statistics
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from backend.models import Currency, Transaction, TransactionType
+from benchmarks.harness import insert_intakes, percentiles, run_app, timed
+
+PAGE = 1000
+RUNS = 20
+ENDPOINTS = ["/api/grain/intakes", "/api/cash/transactions"]
+
+_NAIVE_ISO_RE = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?$")
+
+
+def _add_z_to_naive_datetimes(obj):
+    """Попередня реалізація: обхід усього payload після серіалізації."""
+    if isinstance(obj, str):
+        if _NAIVE_ISO_RE.match(obj):
+            return obj + "Z"
+        return obj
+    if isinstance(obj, dict):
+        return {k: _add_z_to_naive_datetimes(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_add_z_to_naive_datetimes(v) for v in obj]
+    return obj
+
+
+class _LegacyUTCResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return super().render(_add_z_to_naive_datetimes(content))
+
+
+def _median_seconds(call) -> float:
+    return statistics.median(timed(call)[0] for _ in range(RUNS))
+
+
+def test_max_page_serialization(session, refs, admin, api, bench_report):
+    insert_intakes(session, refs, PAGE + 200)
+    session.add_all(
+        Transaction(
+            currency=Currency.UAH, amount=100.0 + n, transaction_type=TransactionType.ADD,
+            user_id=admin.id, description=f"Надходження {n}",
+            uah_balance_after=100.0 * n, usd_balance_after=0.0, eur_balance_after=0.0,
+        )
+        for n in range(PAGE + 200)
+    )
+    session.commit()
+
+    async def scenario():
+        results = {}
+        for path in ENDPOINTS:
+            await api.request("GET", path, params={"limit": PAGE})  # прогрів
+            latencies, body = [], b""
+            for _ in range(RUNS):
+                elapsed, status_code, body = await api.timed("GET", path, params={"limit": PAGE})
+                assert status_code == 200
+                latencies.append(elapsed)
+            results[path] = (latencies, body)
+        return results
+
+    for path, (latencies, body) in run_app(scenario).items():
+        rows = json.loads(body)
+        assert len(rows) == PAGE
+        assert all(row["created_at"].endswith("Z") for row in rows)
+
+        current = _median_seconds(lambda: ORJSONResponse(rows).body)
+        legacy = _median_seconds(lambda: _LegacyUTCResponse(rows).body)
+        bench_report(f"GET {path}?limit={PAGE}", **percentiles(latencies))
+        bench_report(f"render {path} page", orjson_s=current, legacy_walk_s=legacy, speedup=legacy / current)
+        assert current < legacy
@@ -0,0 +1,50 @@
+"""`GET /api/grain/stock` під час `GET /api/grain/intakes/export` в тому ж
+воркері: sync-хендлери виконуються в threadpool, тож експорт не тримає event
+loop і склад відповідає, не чекаючи на генерацію книги."""
+import asyncio
+import time
+
+from benchmarks.harness import insert_intakes, percentiles, run_app
+
+EXPORT_INTAKES = 10_000
+PARALLEL_EXPORTS = 2
+BASELINE_REQUESTS = 50
+
+
+def test_stock_p99_during_intake_export(session, refs, api, bench_report):
+    insert_intakes(session, refs, EXPORT_INTAKES)
+
+    async def scenario():
+        baseline = []
+        for _ in range(BASELINE_REQUESTS):
+            elapsed, status_code, _ = await api.timed("GET", "/api/grain/stock")
+            assert status_code == 200
+            baseline.append(elapsed)
+
+        started = time.perf_counter()
+        exports = [
+            asyncio.create_task(api.request("GET", "/api/grain/intakes/export"))
+            for _ in range(PARALLEL_EXPORTS)
+        ]
+        under_load = []
+        while not all(task.done() for task in exports):
+            elapsed, status_code, _ = await api.timed("GET", "/api/grain/stock")
+            assert status_code == 200
+            under_load.append(elapsed)
+            await asyncio.sleep(0.01)
+        export_seconds = time.perf_counter() - started
+        for task in exports:
+            status_code, _, body = task.result()
+            assert status_code == 200 and body[:2] == b"PK"
+        return baseline, under_load, export_seconds
+
+    baseline, under_load, export_seconds = run_app(scenario)
+    idle = percentiles(baseline)
+    loaded = percentiles(under_load)
+    bench_report("stock idle", **idle)
+    bench_report("stock during export", export_s=export_seconds, **loaded)
+
+    # Якби експорт ішов на event loop, запит складу чекав би на нього цілком:
+    # один-два виміри на весь експорт, кожен — порядку його тривалості.
+    assert loaded["n"] >= 20
+    assert loaded["p99"] < export_seconds / 5
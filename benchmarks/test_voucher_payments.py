@@ -0,0 +1,37 @@
+"""`POST /api/vouchers/payments` на 100 і на 10 000 талонів: виплата проходить
+лише відкриті талони від вказівника FIFO, тож її час не залежить від того,
+скільки талонів у черзі (раніше — завантаження всіх талонів і виплат)."""
+from benchmarks.harness import insert_vouchers, percentiles, run_app
+
+SMALL, LARGE = 100, 10_000
+PAYMENTS = 30
+# Кожна виплата закриває два талони й частково третій.
+AMOUNT = 2500.0
+
+
+def _measure(api) -> list[float]:
+    async def scenario():
+        await api.request("POST", "/api/vouchers/payments", json_body={"amount": AMOUNT})  # прогрів
+        latencies = []
+        for _ in range(PAYMENTS):
+            elapsed, status_code, body = await api.timed(
+                "POST", "/api/vouchers/payments", json_body={"amount": AMOUNT},
+            )
+            assert status_code == 200, body
+            latencies.append(elapsed)
+        return latencies
+
+    return run_app(scenario)
+
+
+def test_voucher_payment_latency_is_flat(session, refs, cash_register, api, bench_report):
+    insert_vouchers(session, refs, SMALL)
+    small = percentiles(_measure(api))
+
+    insert_vouchers(session, refs, LARGE - SMALL)
+    large = percentiles(_measure(api))
+
+    bench_report(f"voucher payment, {SMALL} vouchers", **small)
+    bench_report(f"voucher payment, {LARGE} vouchers", **large)
+    # 100× більше талонів — а медіана виплати майже та сама.
+    assert large["p50"] < small["p50"] * 3
@@ -54,11 +54,9 @@ async function loadCashBalance() {
 }
 
 async function loadCashTransactions({ append = false } = {}) {
-    if (!append) { cashTransactionsState.offset = 0; cashTransactionsState.items = []; }
+    if (!append) cashTransactionsState.reset();
     const path = '/cash/transactions' + cashTransactionsState.toQuery();
-    const { data, total } = await apiFetchCached(path, { force: !append });
-    cashTransactionsState.total = total ?? data.length;
-    cashTransactionsState.items = append ? cashTransactionsState.items.concat(data) : data.slice();
+    cashTransactionsState.accept(await apiFetchCached(path, { force: !append }));
     const transactions = cashTransactionsState.items;
     renderPagedHint('cash-transactions-period-hint', cashTransactionsState, loadCashTransactions, 'операцій');
     const tableBody = document.querySelector('#cash-transactions-table tbody');
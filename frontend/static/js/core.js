@@ -11,19 +11,64 @@
 // При локальной разработке можно использовать 'http://localhost:8000/api'
 const API_BASE_URL = '/api';
 
-function apiFetch(path, options = {}) {
+// Мутуючі запити несуть Idempotency-Key: якщо зв'язок обірвався або
+// спроба не вклалась у MUTATION_TIMEOUT_MS, запит повторюється з тим самим
+// ключем — сервер поверне збережену відповідь, а не проведе картку / рух
+// коштів удруге. 409 з Retry-After означає, що попередня спроба з цим ключем
+// ще виконується на сервері: чекаємо і питаємо знову, поки не отримаємо її
+// результат.
+const MUTATING_METHODS = new Set(['POST', 'PUT', 'PATCH', 'DELETE']);
+const MUTATION_RETRIES = 3;
+const MUTATION_TIMEOUT_MS = 15000;
+const MUTATION_CONFLICT_RETRIES = 10;
+
+function newIdempotencyKey() {
+    if (window.crypto?.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+async function apiFetch(path, options = {}) {
     const token = localStorage.getItem('token');
     const headers = {
         'Content-Type': 'application/json',
         ...(options.headers || {}),
         'Authorization': `Bearer ${token}`
     };
-
-    return fetch(`${API_BASE_URL}${path}`, {
+    const request = (signal) => fetch(`${API_BASE_URL}${path}`, {
         ...options,
         headers,
-        cache: 'no-store'
+        cache: 'no-store',
+        ...(signal ? { signal } : {})
     });
+
+    if (!MUTATING_METHODS.has((options.method || 'GET').toUpperCase())) {
+        return request();
+    }
+    headers['Idempotency-Key'] = headers['Idempotency-Key'] || newIdempotencyKey();
+    const wait = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+    let failures = 0;
+    let conflicts = 0;
+    for (;;) {
+        const controller = new AbortController();
+        const timer = setTimeout(() => controller.abort(), MUTATION_TIMEOUT_MS);
+        let response;
+        try {
+            response = await request(controller.signal);
+        } catch (err) {
+            // Мережева помилка або таймаут спроби — інші HTTP-відповіді не повторюємо.
+            if (failures >= MUTATION_RETRIES) throw err;
+            await wait(500 * 2 ** failures++);
+            continue;
+        } finally {
+            clearTimeout(timer);
+        }
+        if (response.status === 409 && response.headers.has('Retry-After')
+                && conflicts++ < MUTATION_CONFLICT_RETRIES) {
+            await wait((Number(response.headers.get('Retry-After')) || 1) * 1000);
+            continue;
+        }
+        return response;
+    }
 }
 
 function apiFetchBlob(path) {
@@ -399,15 +444,20 @@ async function apiFetchCached(path, opts = {}) {
     const now = Date.now();
     const cached = __apiCache.get(path);
     if (!force && cached && (now - cached.fetchedAt) < ttl) {
-        return { data: cached.data, total: cached.total, fromCache: true };
+        return { data: cached.data, total: cached.total, nextCursor: cached.nextCursor, fromCache: true };
     }
     const response = await apiFetch(path);
     if (!response.ok) throw new Error(`HTTP ${response.status}`);
     const data = await response.json();
     const total = parseInt(response.headers.get('X-Total-Count') || '', 10);
-    const entry = { data, total: Number.isFinite(total) ? total : null, fetchedAt: now };
+    const entry = {
+        data,
+        total: Number.isFinite(total) ? total : null,
+        nextCursor: response.headers.get('X-Next-Cursor') || null,
+        fetchedAt: now,
+    };
     __apiCache.set(path, entry);
-    return { data, total: entry.total, fromCache: false };
+    return { data, total: entry.total, nextCursor: entry.nextCursor, fromCache: false };
 }
 
 function invalidateApiCache(prefix) {
@@ -422,28 +472,40 @@ function invalidateApiCache(prefix) {
 
 
 // ── Пагінація з "Load more" для журнальних таблиць ─────────────
-// Підтримує стан: { offset, pageSize, total, period }.
+// Keyset: сервер віддає курсор наступної сторінки у X-Next-Cursor, ми
+// передаємо його назад як ?cursor=. Загальну кількість (X-Total-Count)
+// просимо лише для першої сторінки — на наступних вона не змінюється.
+// Стан: { cursor, nextCursor, pageSize, total, period }.
 // Юзер може клацнути «Завантажити ще N» — наступна сторінка дописується у cache.
 function createPaginatedState({ pageSize = 100, periodDays = 90 } = {}) {
     return {
         period: createPeriodState(periodDays),
-        offset: 0,
+        cursor: null,       // курсор поточного запиту (null = перша сторінка)
+        nextCursor: null,   // курсор наступної сторінки з останньої відповіді
         pageSize,
         total: null,    // null = не знаємо (ще не зробили fetch)
         items: [],      // накопичений буфер сторінок
         reset() {
-            this.offset = 0;
+            this.cursor = null;
+            this.nextCursor = null;
             this.total = null;
             this.items = [];
         },
         hasMore() {
-            return this.total != null && this.items.length < this.total;
+            return this.nextCursor != null;
+        },
+        /** Зберегти відповідь apiFetchCached: total приходить лише з першою сторінкою. */
+        accept({ data, total, nextCursor }) {
+            if (total != null) this.total = total;
+            this.nextCursor = nextCursor ?? null;
+            this.items = this.cursor ? this.items.concat(data) : data.slice();
+            if (this.total == null) this.total = this.items.length;
         },
         toQuery() {
-            return this.period.toQueryParams({
-                limit: String(this.pageSize),
-                offset: String(this.offset),
-            });
+            const params = { limit: String(this.pageSize) };
+            if (this.cursor) params.cursor = this.cursor;
+            else params.with_total = 'true';
+            return this.period.toQueryParams(params);
         },
     };
 }
@@ -458,14 +520,14 @@ function renderPagedHint(hintId, state, reloadFn, labelNoun = 'записів')
         : 'за весь час';
     let html = `Показано <strong>${shown}</strong> з ${total} ${labelNoun} ${periodLabel}.`;
     if (state.hasMore()) {
-        const more = Math.min(state.pageSize, total - shown);
+        const more = total > shown ? Math.min(state.pageSize, total - shown) : state.pageSize;
         html += ` <button type="button" class="link-btn" data-pg="more">Завантажити ще ${more}</button>`;
     }
     const otherLabel = state.period.days ? 'Завантажити всю історію' : 'Лише останні 3 міс';
     html += ` <button type="button" class="link-btn" data-pg="toggle">${otherLabel}</button>`;
     hint.innerHTML = html;
     hint.querySelector('[data-pg="more"]')?.addEventListener('click', async () => {
-        state.offset += state.pageSize;
+        state.cursor = state.nextCursor;
         await reloadFn({ append: true });
     });
     hint.querySelector('[data-pg="toggle"]')?.addEventListener('click', async () => {
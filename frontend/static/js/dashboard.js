@@ -1306,14 +1306,9 @@ const stockAdjustmentsState = createPaginatedState({ pageSize: 100, periodDays:
 let _intakesBackfillRunning = false;
 
 async function loadAllIntakes({ append = false } = {}) {
-    if (!append) {
-        intakesState.offset = 0;
-        intakesState.items = [];
-    }
+    if (!append) intakesState.reset();
     const path = '/grain/intakes' + intakesState.toQuery();
-    const { data, total } = await apiFetchCached(path, { force: !append });
-    intakesState.total = total ?? data.length;
-    intakesState.items = append ? intakesState.items.concat(data) : data.slice();
+    intakesState.accept(await apiFetchCached(path, { force: !append }));
     intakesCache = intakesState.items;
     renderIntakeTable(applyIntakeFilters(intakesCache));
     renderDriverDeliveriesTable(applyDriverDeliveryFilters());
@@ -1334,7 +1329,7 @@ async function backfillAllIntakesInBackground() {
     _intakesBackfillRunning = true;
     try {
         while (intakesState.hasMore()) {
-            intakesState.offset = intakesState.items.length;
+            intakesState.cursor = intakesState.nextCursor;
             const path = '/grain/intakes' + intakesState.toQuery();
             let chunk;
             try {
@@ -1345,6 +1340,7 @@ async function backfillAllIntakesInBackground() {
                 break;
             }
             const data = chunk?.data || [];
+            intakesState.nextCursor = chunk?.nextCursor ?? null;
             if (!data.length) break;
             // Дедуп за id — на випадок гонок із refreshAfterMutation під час backfill.
             const seen = new Set(intakesState.items.map(i => i.id));
@@ -2267,11 +2263,9 @@ function initFarmerDeductModal() {
 let farmerMovementsCache = [];
 
 async function loadFarmerMovements({ append = false } = {}) {
-    if (!append) { farmerMovementsState.offset = 0; farmerMovementsState.items = []; }
+    if (!append) farmerMovementsState.reset();
     const path = '/grain/farmer-movements' + farmerMovementsState.toQuery();
-    const { data, total } = await apiFetchCached(path, { force: !append });
-    farmerMovementsState.total = total ?? data.length;
-    farmerMovementsState.items = append ? farmerMovementsState.items.concat(data) : data.slice();
+    farmerMovementsState.accept(await apiFetchCached(path, { force: !append }));
     farmerMovementsCache = farmerMovementsState.items;
     renderFarmerMovementsTable(applyFarmerMovementFilters());
     renderPagedHint('farmer-movements-period-hint', farmerMovementsState, loadFarmerMovements, 'переміщень');
@@ -3895,11 +3889,9 @@ function openCulturePriceModal({ id, label, price }) {
     modal.classList.remove('hidden');
 }
 async function loadPurchases({ append = false } = {}) {
-    if (!append) { purchasesState.offset = 0; purchasesState.items = []; }
+    if (!append) purchasesState.reset();
     const path = '/purchases' + purchasesState.toQuery();
-    const { data, total } = await apiFetchCached(path, { force: !append });
-    purchasesState.total = total ?? data.length;
-    purchasesState.items = append ? purchasesState.items.concat(data) : data.slice();
+    purchasesState.accept(await apiFetchCached(path, { force: !append }));
     purchasesCache = purchasesState.items;
     renderPagedHint('purchases-period-hint', purchasesState, loadPurchases, 'закупівель');
     const tableBody = document.querySelector('#purchases-table tbody');
@@ -3928,11 +3920,9 @@ async function loadPurchases({ append = false } = {}) {
 }
 
 async function loadShipments({ append = false } = {}) {
-    if (!append) { shipmentsState.offset = 0; shipmentsState.items = []; }
+    if (!append) shipmentsState.reset();
     const path = '/grain/shipments' + shipmentsState.toQuery();
-    const { data, total } = await apiFetchCached(path, { force: !append });
-    shipmentsState.total = total ?? data.length;
-    shipmentsState.items = append ? shipmentsState.items.concat(data) : data.slice();
+    shipmentsState.accept(await apiFetchCached(path, { force: !append }));
     shipmentsCache = shipmentsState.items;
     renderShipmentsTable(shipmentsCache);
     renderPagedHint('shipments-period-hint', shipmentsState, loadShipments, 'відправок');
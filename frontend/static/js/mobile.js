@@ -10,14 +10,58 @@ let culturesCache = [];
 let purchaseStockCache = [];
 
 // ── Auth & API helpers ─────────────────────────────────────────────
-function apiFetch(path, options = {}) {
+// Мутуючі запити несуть Idempotency-Key і повторюються з тим самим ключем
+// при обриві зв'язку, таймауті спроби та 409 «ще виконується» — сервер не
+// виконає операцію вдруге (див. core.js).
+const MUTATING_METHODS = new Set(['POST', 'PUT', 'PATCH', 'DELETE']);
+const MUTATION_RETRIES = 3;
+const MUTATION_TIMEOUT_MS = 15000;
+const MUTATION_CONFLICT_RETRIES = 10;
+
+function newIdempotencyKey() {
+    if (window.crypto?.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+async function apiFetch(path, options = {}) {
     const token = localStorage.getItem('token');
     const headers = {
         'Content-Type': 'application/json',
         ...(options.headers || {}),
         'Authorization': `Bearer ${token}`
     };
-    return fetch(`${API_BASE_URL}${path}`, { ...options, headers, cache: 'no-store' });
+    const request = (signal) => fetch(`${API_BASE_URL}${path}`, {
+        ...options, headers, cache: 'no-store', ...(signal ? { signal } : {})
+    });
+
+    if (!MUTATING_METHODS.has((options.method || 'GET').toUpperCase())) {
+        return request();
+    }
+    headers['Idempotency-Key'] = headers['Idempotency-Key'] || newIdempotencyKey();
+    const wait = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+    let failures = 0;
+    let conflicts = 0;
+    for (;;) {
+        const controller = new AbortController();
+        const timer = setTimeout(() => controller.abort(), MUTATION_TIMEOUT_MS);
+        let response;
+        try {
+            response = await request(controller.signal);
+        } catch (err) {
+            // Мережева помилка або таймаут спроби — інші HTTP-відповіді не повторюємо.
+            if (failures >= MUTATION_RETRIES) throw err;
+            await wait(500 * 2 ** failures++);
+            continue;
+        } finally {
+            clearTimeout(timer);
+        }
+        if (response.status === 409 && response.headers.has('Retry-After')
+                && conflicts++ < MUTATION_CONFLICT_RETRIES) {
+            await wait((Number(response.headers.get('Retry-After')) || 1) * 1000);
+            continue;
+        }
+        return response;
+    }
 }
 
 async function apiJson(path, options) {
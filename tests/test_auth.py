@@ -0,0 +1,122 @@
+"""`backend.auth`: кеш автентифікованих користувачів, пул хешування паролів."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from fastapi_jwt import JwtAuthorizationCredentials
+
+from backend import auth
+from backend.api.auth import login
+from backend.auth import (
+    get_current_user, get_password_hash, get_password_hash_async, user_cache_stats, verify_password,
+    verify_password_async,
+)
+from backend.config import settings
+from backend.database import assert_max_queries
+from backend.models import User
+from backend.schemas import LoginRequest
+
+
+def _credentials(user) -> JwtAuthorizationCredentials:
+    return JwtAuthorizationCredentials({"username": user.username, "role": user.role, "user_id": user.id})
+
+
+def test_cached_user_needs_no_query(session, admin):
+    get_current_user(credentials=_credentials(admin), session=session)
+    hits = user_cache_stats()["hits"]
+
+    with assert_max_queries(0):
+        user = get_current_user(credentials=_credentials(admin), session=session)
+    assert user.id == admin.id and user.username == "admin"
+    assert user_cache_stats()["hits"] == hits + 1
+
+
+def test_user_change_invalidates_cache(session, admin):
+    get_current_user(credentials=_credentials(admin), session=session)
+
+    admin.full_name = "Перейменований"
+    session.add(admin)
+    session.commit()
+    assert get_current_user(credentials=_credentials(admin), session=session).full_name == "Перейменований"
+
+    admin.is_active = False
+    session.add(admin)
+    session.commit()
+    with pytest.raises(HTTPException) as exc:
+        get_current_user(credentials=_credentials(admin), session=session)
+    assert exc.value.status_code == 401
+
+
+def test_cache_is_keyed_by_token_username(session, admin):
+    """Токен з чужим username для того ж user_id не бере запис з кешу."""
+    get_current_user(credentials=_credentials(admin), session=session)
+    forged = JwtAuthorizationCredentials({"username": "ghost", "user_id": admin.id})
+    with pytest.raises(HTTPException) as exc:
+        get_current_user(credentials=forged, session=session)
+    assert exc.value.status_code == 401
+
+
+def test_password_hash_round_trip():
+    hashed = get_password_hash("секрет")
+    assert verify_password("секрет", hashed)
+    assert not verify_password("інший", hashed)
+    assert asyncio.run(verify_password_async("секрет", asyncio.run(get_password_hash_async("секрет"))))
+
+
+class _SlowContext:
+    """Замість bcrypt: фіксує потік і кількість одночасних перевірок."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.threads = set()
+
+    def verify(self, plain, hashed):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.threads.add(threading.current_thread().name)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return plain == hashed
+
+
+def test_logins_are_bounded_by_hash_pool(monkeypatch):
+    context = _SlowContext()
+    monkeypatch.setattr(auth, "_get_pwd_context", lambda: context)
+
+    # 12 одночасних логінів з потоків threadpool.
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        results = list(pool.map(lambda i: verify_password(str(i), str(i)), range(12)))
+    assert all(results)
+    assert context.peak <= max(1, settings.password_hash_workers)
+    assert all(name.startswith("password-hash") for name in context.threads)
+
+    async def many():
+        return await asyncio.gather(*(verify_password_async("a", "a") for _ in range(6)))
+
+    assert all(asyncio.run(many()))
+    assert context.peak <= max(1, settings.password_hash_workers)
+
+
+def test_login_returns_connection_before_password_check(engine, session, monkeypatch):
+    """Поки логін чекає на bcrypt, з'єднання з БД уже повернуто в пул."""
+    session.add(User(username="operator", password_hash="пароль", full_name="Оператор"))
+    session.commit()
+    session.close()
+    checked_out = []
+
+    class _Context:
+        def verify(self, plain, hashed):
+            checked_out.append(engine.pool.checkedout())
+            return plain == hashed
+
+    monkeypatch.setattr(auth, "_get_pwd_context", lambda: _Context())
+    token = asyncio.run(login(LoginRequest(username="operator", password="пароль")))
+    assert token.access_token
+    assert checked_out == [0]
@@ -0,0 +1,56 @@
+"""Каса під паралельними рухами коштів (`backend.cash_ledger`)."""
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from backend.api.cash import update_balance
+from backend.models import CashRegister, Currency, Transaction, TransactionType
+from backend.schemas import BalanceUpdateRequest
+
+
+def _move(currency: Currency, amount: float, kind: TransactionType) -> BalanceUpdateRequest:
+    return BalanceUpdateRequest(currency=currency, amount=amount, transaction_type=kind, description="тест")
+
+
+def test_parallel_cash_movements_are_exact(engine, session, admin, cash_register, run_parallel):
+    add_uah = _move(Currency.UAH, 125.35, TransactionType.ADD)
+    sub_uah = _move(Currency.UAH, 300.10, TransactionType.SUBTRACT)
+    add_usd = _move(Currency.USD, 10.5, TransactionType.ADD)
+    calls = (
+        [lambda s: update_balance(add_uah, session=s, current_admin=admin)] * 40
+        + [lambda s: update_balance(sub_uah, session=s, current_admin=admin)] * 30
+        + [lambda s: update_balance(add_usd, session=s, current_admin=admin)] * 20
+    )
+    # Перемішуємо надходження й витрати, щоб витрати конкурували з ними.
+    order = [i for pair in zip(range(40), range(40, 70)) for i in pair] + list(range(30, 40)) + list(range(70, 90))
+    results = dict(zip(order, run_parallel([calls[i] for i in order], workers=16)))
+
+    for i in list(range(40)) + list(range(70, 90)):
+        assert not isinstance(results[i], Exception), repr(results[i])
+    withdrawals = [results[i] for i in range(40, 70)]
+    for result in withdrawals:
+        if isinstance(result, Exception):
+            assert isinstance(result, HTTPException) and result.status_code == 400
+            assert result.detail.startswith("Недостатньо коштів")
+    withdrawn = sum(not isinstance(r, Exception) for r in withdrawals)
+    assert withdrawn > 0
+
+    with Session(engine) as check:
+        register = check.get(CashRegister, cash_register.id)
+        assert register.uah_balance == pytest.approx(40 * 125.35 - withdrawn * 300.10)
+        assert register.usd_balance == pytest.approx(20 * 10.5)
+        assert register.uah_balance >= 0
+
+        uah = check.exec(select(Transaction).where(Transaction.currency == Currency.UAH)).all()
+        assert len(uah) == 40 + withdrawn
+        # Кожна операція бачила баланс після попередньої: «загублене»
+        # оновлення дало б два однакові `uah_balance_after`, а послідовність
+        # балансів — розрив.
+        after = {round(t.uah_balance_after, 2) for t in uah}
+        assert len(after) == len(uah)
+        for t in uah:
+            signed = t.amount if t.transaction_type == TransactionType.ADD else -t.amount
+            before = round(t.uah_balance_after - signed, 2)
+            assert before == 0.0 or before in after
+            assert t.uah_balance_after >= 0
+        assert round(register.uah_balance, 2) in after
@@ -0,0 +1,40 @@
+"""`dashboard.get_dashboard_stats`: фіксований набір агрегатних запитів."""
+import random
+from datetime import datetime
+
+from backend.api.dashboard import get_dashboard_stats
+from backend.database import assert_max_queries
+from backend.models import GrainIntake
+
+# Каса, склад, контракти, фермери, приходи/відправки за сьогодні, останні
+# транзакції, закупівлі, зерно у фермерів (2), талони.
+DASHBOARD_STATS_QUERY_BUDGET = 11
+
+
+def _intakes_today(session, refs, count: int) -> None:
+    for _ in range(count):
+        session.add(GrainIntake(
+            culture_id=refs["wheat"].id, vehicle_type_id=refs["truck"].id, owner_id=refs["farmer"].id,
+            gross_weight_kg=15000, tare_weight_kg=5000, net_weight_kg=10000, accepted_weight_kg=10000,
+            created_at=datetime.utcnow(),
+        ))
+    session.commit()
+
+
+def test_dashboard_stats_query_count_does_not_grow(session, refs, admin, cash_register, seed_activity):
+    seed_activity(random.Random(1))
+    _intakes_today(session, refs, 3)
+    with assert_max_queries(DASHBOARD_STATS_QUERY_BUDGET) as small:
+        small_stats = get_dashboard_stats(session=session, current_user=admin)
+
+    for seed in (2, 3, 4, 5):
+        seed_activity(random.Random(seed))
+    _intakes_today(session, refs, 30)
+    with assert_max_queries(DASHBOARD_STATS_QUERY_BUDGET) as large:
+        large_stats = get_dashboard_stats(session=session, current_user=admin)
+
+    assert large.count == small.count
+    # Дані справді виросли — інакше порівняння нічого не доводить.
+    assert (small_stats.intakes_today, large_stats.intakes_today) == (3, 33)
+    assert large_stats.contracts_total == 5 * small_stats.contracts_total
+    assert large_stats.vouchers_count == 5 * small_stats.vouchers_count > 0
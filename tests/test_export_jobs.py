@@ -0,0 +1,120 @@
+"""`backend.export_jobs`: які задачі прибирання визнає втраченими і що
+втрачена задача вже не стає готовою."""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from openpyxl import Workbook
+from sqlmodel import Session
+
+from backend import export_jobs
+from backend.config import settings
+from backend.export_jobs import cleanup_export_jobs, run_export_job
+from backend.models import ExportJob, ExportJobStatus
+
+
+def _job(session, admin, status: ExportJobStatus, created_at: datetime, updated_at=None, kind="test") -> ExportJob:
+    job = ExportJob(kind=kind, status=status.value, created_by_user_id=admin.id,
+                    created_at=created_at, updated_at=updated_at)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def _status(engine, job_id: int) -> ExportJob:
+    with Session(engine) as check:
+        return check.get(ExportJob, job_id)
+
+
+def test_cleanup_fails_only_lost_jobs(engine, session, admin):
+    now = datetime.utcnow()
+    past_stale = now - timedelta(minutes=settings.export_stale_minutes + 1)
+    past_queue = now - timedelta(minutes=settings.export_queue_timeout_minutes + 1)
+    jobs = {
+        # Чекає в черзі за іншими довше, ніж живе running без heartbeat.
+        "waiting": _job(session, admin, ExportJobStatus.QUEUED, past_stale),
+        "lost_in_queue": _job(session, admin, ExportJobStatus.QUEUED, past_queue),
+        "alive": _job(session, admin, ExportJobStatus.RUNNING, past_queue, updated_at=now),
+        "no_heartbeat": _job(session, admin, ExportJobStatus.RUNNING, past_queue, updated_at=past_stale),
+    }
+
+    cleanup_export_jobs(session)
+
+    statuses = {name: _status(engine, job.id).status for name, job in jobs.items()}
+    assert statuses == {
+        "waiting": ExportJobStatus.QUEUED.value,
+        "lost_in_queue": ExportJobStatus.FAILED.value,
+        "alive": ExportJobStatus.RUNNING.value,
+        "no_heartbeat": ExportJobStatus.FAILED.value,
+    }
+
+
+@pytest.fixture
+def export_kind(monkeypatch, tmp_path):
+    """Тип звіту `test`: будівник виконує `hooks["build"](job_id)`."""
+    hooks = {"build": lambda job_id: None}
+
+    def build(session, params, progress):
+        hooks["build"](params["job_id"])
+        progress(50)
+        return Workbook(), "test.xlsx"
+
+    monkeypatch.setitem(export_jobs.EXPORT_KINDS, "test", build)
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", tmp_path)
+    return hooks
+
+
+def _queued(session, admin) -> ExportJob:
+    job = _job(session, admin, ExportJobStatus.QUEUED, datetime.utcnow())
+    job.params = f'{{"job_id": {job.id}}}'
+    session.commit()
+    return job
+
+
+def test_job_completes(engine, session, admin, export_kind, tmp_path):
+    job = _queued(session, admin)
+    run_export_job(job.id)
+    done = _status(engine, job.id)
+    assert done.status == ExportJobStatus.DONE.value
+    assert done.progress == 100
+    assert list(tmp_path.iterdir()) == [tmp_path / done.file_path.rsplit("/", 1)[-1]]
+
+
+def test_job_failed_by_cleanup_does_not_become_done(engine, session, admin, export_kind, tmp_path):
+    def swept_during_build(job_id):
+        # Прибирання в іншому воркері визнало задачу втраченою.
+        with Session(engine) as other:
+            other.get(ExportJob, job_id).updated_at = datetime.utcnow() - timedelta(
+                minutes=settings.export_stale_minutes + 1
+            )
+            other.commit()
+            cleanup_export_jobs(other)
+
+    export_kind["build"] = swept_during_build
+    job = _queued(session, admin)
+    run_export_job(job.id)
+
+    failed = _status(engine, job.id)
+    assert failed.status == ExportJobStatus.FAILED.value
+    assert failed.file_path is None
+    assert failed.progress < 100
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_heartbeat_keeps_slow_job_alive(engine, session, admin, export_kind, monkeypatch):
+    monkeypatch.setattr(export_jobs, "HEARTBEAT_INTERVAL_SEC", 0.05)
+    beats = []
+
+    def slow_build(job_id):
+        started = _status(engine, job_id).updated_at
+        for _ in range(40):
+            time.sleep(0.02)
+            beats.append(_status(engine, job_id).updated_at)
+        assert max(beats) > started
+
+    export_kind["build"] = slow_build
+    job = _queued(session, admin)
+    run_export_job(job.id)
+    assert _status(engine, job.id).status == ExportJobStatus.DONE.value
+    assert len(set(beats)) > 1
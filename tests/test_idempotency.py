@@ -0,0 +1,134 @@
+"""`IdempotencyMiddleware`: що зберігається, що звільняє ключ, покинуті ключі."""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from sqlmodel import select
+
+from backend.config import settings
+from backend.idempotency import (
+    CLAIM_RETRY_AFTER_SEC, IDEMPOTENCY_HEADER, MAX_STORED_BODY, REPLAYED_HEADER, TOO_LARGE_BODY,
+    IdempotencyMiddleware, _sha256,
+)
+from backend.models import IdempotencyKey
+
+TOKEN = "Bearer test-token"
+
+
+class CountingApp:
+    """ASGI-застосунок: відповідь залежить від шляху, рахує виконання."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await receive()
+        if scope["path"] == "/big":
+            status, body = 200, b"x" * (MAX_STORED_BODY + 1)
+        elif scope["path"] == "/fail":
+            status, body = 500, b"{}"
+        else:
+            status, body = 201, json.dumps({"call": self.calls}).encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _request(app, path: str, key: str = "key-1", body: bytes = b'{"a": 1}'):
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": path,
+        "query_string": b"",
+        "headers": [(b"authorization", TOKEN.encode()), (IDEMPOTENCY_HEADER.lower().encode(), key.encode())],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(IdempotencyMiddleware(app)(scope, receive, send))
+    start = messages[0]
+    headers = {name.decode(): value.decode() for name, value in start.get("headers", [])}
+    return start["status"], headers, b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def test_replays_stored_response(session):
+    app = CountingApp()
+    first = _request(app, "/intakes")
+    second = _request(app, "/intakes")
+    assert app.calls == 1
+    assert second[0] == first[0] == 201
+    assert second[2] == first[2]
+    assert second[1][REPLAYED_HEADER.lower()] == "true"
+
+
+def test_too_large_response_is_stored_with_marker(session):
+    app = CountingApp()
+    status, _, body = _request(app, "/big")
+    assert status == 200 and len(body) > MAX_STORED_BODY
+
+    status, headers, body = _request(app, "/big")
+    assert app.calls == 1
+    assert status == 200
+    assert body == TOO_LARGE_BODY
+    assert headers[REPLAYED_HEADER.lower()] == "true"
+
+
+def test_same_key_with_other_body_is_rejected(session):
+    app = CountingApp()
+    first = _request(app, "/intakes", body=b'{"a": 1}')
+    status, headers, body = _request(app, "/intakes", body=b'{"a": 2}')
+    assert app.calls == 1
+    assert status == 422
+    assert REPLAYED_HEADER.lower() not in headers
+    assert body != first[2]
+    # Збережена відповідь першого запиту нікуди не ділась.
+    assert _request(app, "/intakes", body=b'{"a": 1}')[2] == first[2]
+
+
+def test_server_error_releases_key(session):
+    app = CountingApp()
+    assert _request(app, "/fail")[0] == 500
+    assert _request(app, "/fail")[0] == 500
+    assert app.calls == 2
+    assert session.exec(select(IdempotencyKey)).all() == []
+
+
+def _pending_claim(session, created_at: datetime, body: bytes = b'{"a": 1}') -> None:
+    session.add(IdempotencyKey(
+        scope=_sha256(TOKEN.encode()),
+        key="key-1",
+        method="POST",
+        path="/intakes",
+        request_hash=_sha256(b"POST", b"/intakes", b"", body),
+        created_at=created_at,
+        expires_at=datetime.utcnow() + timedelta(hours=settings.idempotency_ttl_hours),
+    ))
+    session.commit()
+
+
+def test_running_claim_answers_conflict(session):
+    _pending_claim(session, datetime.utcnow())
+    app = CountingApp()
+    status, headers, _ = _request(app, "/intakes")
+    assert status == 409
+    assert headers["retry-after"] == str(CLAIM_RETRY_AFTER_SEC)
+    assert app.calls == 0
+
+
+def test_stale_claim_is_reclaimed(session):
+    stale = datetime.utcnow() - timedelta(minutes=settings.idempotency_stale_claim_minutes + 1)
+    _pending_claim(session, stale)
+    app = CountingApp()
+    assert _request(app, "/intakes")[0] == 201
+    assert app.calls == 1
+
+    session.expire_all()
+    record = session.exec(select(IdempotencyKey)).one()
+    assert record.status_code == 201
+    assert record.created_at > stale
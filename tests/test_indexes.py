@@ -0,0 +1,108 @@
+"""Гарячі запити йдуть по індексах з `backend.database`.
+
+На порожніх тестових таблицях планувальник завжди обрав би seq scan, тому
+він вимикається разом з bitmap scan (`enable_seqscan/enable_bitmapscan = off`):
+перевіряємо, що індекс придатний для запиту (порядок, partial-предикат), а не
+вартісну модель.
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, tuple_
+from sqlalchemy.exc import ProgrammingError
+from sqlmodel import select, text
+
+from backend.database import INDEXES_V11, VOUCHER_FIFO_INDEXES, ensure_indexes, explain_plan
+from backend.models import (
+    FarmerGrainMovement, GrainIntake, GrainShipment, GrainVoucher, GrainVoucherPayment,
+    PurchaseRecord, StockAdjustmentLog, Transaction,
+)
+from backend.voucher_allocation import _fifo_page_query
+
+PAGE_LIMIT = 50
+CURSOR = (datetime(2025, 7, 15, 12, 0), 1000)
+
+
+@pytest.fixture
+def planner(session):
+    session.exec(text("SET enable_seqscan = off"))
+    session.exec(text("SET enable_bitmapscan = off"))
+    yield session
+    session.exec(text("RESET ALL"))
+
+
+def test_migrations_create_frozen_index_sets(session):
+    names = set(session.exec(text("SELECT indexname FROM pg_indexes WHERE schemaname = 'public'")).scalars())
+    v11 = {name for name, _ in INDEXES_V11}
+    voucher_fifo = {name for name, _ in VOUCHER_FIFO_INDEXES}
+    # Кожен індекс належить рівно одній міграції.
+    assert not v11 & voucher_fifo
+    assert v11 | voucher_fifo <= names
+
+
+def test_failed_index_is_not_swallowed(engine):
+    # Міграція з помилкою не потрапляє в журнал і повториться на наступному старті.
+    with engine.connect() as conn:
+        with pytest.raises(ProgrammingError):
+            ensure_indexes(conn, [("ix_missing_table_probe", "no_such_table (id)")])
+
+
+def _page(model, cursor=None):
+    """Запит сторінки журналу так, як його будує `pagination.paginate`."""
+    query = select(model).order_by(model.created_at.desc(), model.id.desc())
+    if cursor:
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(*cursor))
+    return query.limit(PAGE_LIMIT + 1)
+
+
+@pytest.mark.parametrize("model,index", [
+    (GrainIntake, "ix_grain_intakes_created_at"),
+    (GrainShipment, "ix_grain_shipments_created_at"),
+    (Transaction, "ix_transactions_created_at"),
+    (PurchaseRecord, "ix_purchase_records_created_at"),
+    (StockAdjustmentLog, "ix_stock_adjustments_created_at"),
+    (FarmerGrainMovement, "ix_farmer_grain_movements_created_at"),
+    (GrainVoucherPayment, "ix_grain_voucher_payments_created_at"),
+])
+@pytest.mark.parametrize("cursor", [None, CURSOR], ids=["first-page", "keyset"])
+def test_journal_pages_use_created_at_index(planner, model, index, cursor):
+    plan = explain_plan(planner, _page(model, cursor))
+    assert index in plan
+    # Порядок віддає сам індекс — без окремого сортування.
+    assert "Sort" not in plan
+
+
+def test_farmer_balance_uses_partial_on_stock_index(planner):
+    query = (
+        select(GrainIntake.culture_id, func.sum(GrainIntake.accepted_weight_kg))
+        .where(
+            GrainIntake.owner_id == 1,
+            GrainIntake.is_own_grain == False,
+            GrainIntake.pending_quality == False,
+            GrainIntake.pending_tare == False,
+        )
+        .group_by(GrainIntake.culture_id)
+    )
+    assert "ix_grain_intakes_owner_culture_on_stock" in explain_plan(planner, query)
+
+
+def test_pending_intake_does_not_match_on_stock_index(planner):
+    """Partial-індекс не покриває pending-картки — запит по них його не бере."""
+    query = select(GrainIntake).where(GrainIntake.owner_id == 1, GrainIntake.pending_quality == True)
+    assert "ix_grain_intakes_owner_culture_on_stock" not in explain_plan(planner, query)
+
+
+@pytest.mark.parametrize("after", [None, CURSOR], ids=["head", "next-batch"])
+def test_voucher_fifo_uses_open_index(planner, after):
+    plan = explain_plan(planner, _fifo_page_query(GrainVoucher.is_closed == False, after=after))
+    assert "ix_grain_vouchers_open_fifo" in plan
+    assert "Sort" not in plan
+
+
+@pytest.mark.parametrize("after", [None, CURSOR], ids=["tail", "next-batch"])
+def test_voucher_release_uses_paid_index(planner, after):
+    plan = explain_plan(
+        planner, _fifo_page_query(GrainVoucher.paid_value_uah > 0, newest_first=True, after=after)
+    )
+    assert "ix_grain_vouchers_paid_fifo" in plan
+    assert "Sort" not in plan
@@ -0,0 +1,102 @@
+"""Пакет карток приходу = ті самі картки, проведені по одній.
+
+Пакет іде на пшеницю / фермера Коваля / водія Петренка, одиничні картки —
+дзеркально на ячмінь / Мельника / Іваненка, тож обидва проходи живуть в одній
+БД і порівнюються по своїх ключах складу, балансів і статистики водіїв.
+"""
+import pytest
+from fastapi import HTTPException
+from sqlmodel import select
+
+from backend.api.grain import create_intake, create_intakes_batch
+from backend.models import DriverStat, FarmerBalance, GrainIntake, GrainOwner, GrainStock, StockAdjustmentLog
+from backend.schemas import GrainIntakeBatchCreate, GrainIntakeCreate
+
+
+def _items(refs, culture, farmer, driver, new_owner_name: str) -> list[GrainIntakeCreate]:
+    common = {"culture_id": culture.id, "vehicle_type_id": refs["truck"].id, "driver_id": driver.id}
+    return [
+        GrainIntakeCreate(**common, owner_id=farmer.id, gross_weight_kg=15000, tare_weight_kg=5000),
+        GrainIntakeCreate(**common, owner_id=farmer.id, gross_weight_kg=18000, tare_weight_kg=6000,
+                          impurity_percent=2.5, has_trailer=True),
+        GrainIntakeCreate(**common, is_own_grain=True, field_id=refs["field"].id,
+                          gross_weight_kg=21000, tare_weight_kg=7000),
+        # Некоректні картки
+        GrainIntakeCreate(**common, owner_id=999999, gross_weight_kg=15000, tare_weight_kg=5000),
+        GrainIntakeCreate(**common, is_own_grain=True, gross_weight_kg=15000, tare_weight_kg=5000),
+        GrainIntakeCreate(**common, is_own_grain=True, field_id=999999, gross_weight_kg=15000, tare_weight_kg=5000),
+        GrainIntakeCreate(culture_id=culture.id, vehicle_type_id=refs["truck"].id, owner_id=farmer.id,
+                          gross_weight_kg=15000, tare_weight_kg=5000),
+        GrainIntakeCreate(**{**common, "culture_id": 999999}, owner_id=farmer.id,
+                          gross_weight_kg=15000, tare_weight_kg=5000),
+        # Не лягають на склад, але створюються
+        GrainIntakeCreate(**common, owner_id=farmer.id, gross_weight_kg=15000, tare_weight_kg=5000,
+                          pending_quality=True),
+        GrainIntakeCreate(**common, owner_id=farmer.id, gross_weight_kg=15000, pending_tare=True),
+        # Новий власник за ПІБ — двічі: другий раз має знайтись уже створений
+        GrainIntakeCreate(**common, owner_full_name=new_owner_name, owner_phone="0990000000",
+                          gross_weight_kg=12000, tare_weight_kg=4000),
+        GrainIntakeCreate(**common, owner_full_name=new_owner_name, owner_phone="0990000000",
+                          gross_weight_kg=13000, tare_weight_kg=4000, impurity_percent=1.0),
+        # Сторонній водій — без статистики
+        GrainIntakeCreate(culture_id=culture.id, vehicle_type_id=refs["truck"].id, owner_id=farmer.id,
+                          is_internal_driver=False, external_driver_name="Сидоренко",
+                          gross_weight_kg=16000, tare_weight_kg=5000),
+    ]
+
+
+def _snapshot(session, culture, farmer, driver, new_owner_name: str) -> dict:
+    session.expire_all()
+    stock = session.exec(select(GrainStock).where(GrainStock.culture_id == culture.id)).one()
+    balances = {
+        ("farmer" if b.owner_id == farmer.id else "new"): round(b.qty_kg, 2)
+        for b in session.exec(select(FarmerBalance).where(FarmerBalance.culture_id == culture.id)).all()
+    }
+    stats = {
+        (s.vehicle_type_id, s.has_trailer): (s.trips, round(s.total_net_weight_kg, 2), round(s.total_accepted_weight_kg, 2))
+        for s in session.exec(select(DriverStat).where(DriverStat.driver_id == driver.id)).all()
+    }
+    intakes = session.exec(select(GrainIntake).where(GrainIntake.culture_id == culture.id)).all()
+    logs = session.exec(select(StockAdjustmentLog).where(StockAdjustmentLog.culture_id == culture.id)).all()
+    return {
+        "stock": (round(stock.quantity_kg, 2), round(stock.own_quantity_kg, 2), round(stock.farmer_quantity_kg, 2)),
+        "balances": balances,
+        "driver_stats": stats,
+        "intakes": sorted(
+            (i.owner_full_name == new_owner_name, i.is_own_grain, i.accepted_weight_kg, i.net_weight_kg,
+             i.pending_quality, i.pending_tare)
+            for i in intakes
+        ),
+        "logs": sorted((log.amount, log.quantity_after) for log in logs),
+    }
+
+
+def test_batch_matches_single_intakes(session, refs, admin):
+    wheat, barley = refs["wheat"], refs["barley"]
+
+    batch_items = _items(refs, wheat, refs["farmer"], refs["driver"], "Новий фермер А")
+    response = create_intakes_batch(GrainIntakeBatchCreate(items=batch_items), session=session, current_user=admin)
+
+    single_errors = []
+    for index, item in enumerate(_items(refs, barley, refs["farmer2"], refs["driver2"], "Новий фермер Б")):
+        try:
+            create_intake(item, session=session, current_user=admin)
+        except HTTPException as exc:
+            session.rollback()
+            single_errors.append((index, str(exc.detail)))
+
+    assert [(e.index, e.detail) for e in response.errors] == single_errors
+    assert [e.index for e in response.errors] == [3, 4, 5, 6, 7]
+    assert len(response.created) == len(batch_items) - len(response.errors)
+
+    batch = _snapshot(session, wheat, refs["farmer"], refs["driver"], "Новий фермер А")
+    single = _snapshot(session, barley, refs["farmer2"], refs["driver2"], "Новий фермер Б")
+    assert batch == single
+    # Порівняння не порожнє: склад, обидва фермери й дві позиції статистики.
+    assert batch["stock"][0] > 0
+    assert set(batch["balances"]) == {"farmer", "new"}
+    assert len(batch["driver_stats"]) == 2
+    # Останній запис журналу складу — поточний залишок.
+    assert max(after for _, after in batch["logs"]) == pytest.approx(batch["stock"][0])
+    for name in ("Новий фермер А", "Новий фермер Б"):
+        assert len(session.exec(select(GrainOwner).where(GrainOwner.full_name == name)).all()) == 1
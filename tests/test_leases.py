@@ -0,0 +1,181 @@
+"""`leases.list_parcels` і `leases.list_payments`: баланси ділянок і довідники
+виплат вантажаться пакетно (`load_lease_balances`, `_load_payment_refs`) —
+кількість запитів не залежить від кількості орендодавців, ділянок і виплат."""
+from datetime import datetime
+
+import pytest
+from fastapi import Response
+from sqlmodel import select
+
+from backend.api.leases import list_parcels, list_payments
+from backend.database import assert_max_queries
+from backend.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+from backend.models import (
+    Landlord, LeaseParcel, LeasePayment, LeasePaymentGrainItem, LeasePeriod, LeasePeriodGrainItem,
+)
+
+# Ділянки + пакетне завантаження періодів, зернових позицій, виплачених кг і грошей.
+LIST_PARCELS_QUERY_BUDGET = 5
+# Сторінка виплат + ділянки, періоди й зернові позиції сторінки; +1 — X-Total-Count.
+LIST_PAYMENTS_QUERY_BUDGET = 5
+# Залишок ділянки з `_add_landlords`, пораховано вручну за обидва роки: пшениця
+# (1000 - 400) кг × 8.5 (ціна найновішого періоду) + ячмінь 500 кг × 6.0
+# [+ гроші 5000 - 2000] = 8100 [+ 3000] грн на період.
+EXPECTED_CUMULATIVE_UAH = {"grain": 16200.0, "grain_cash": 22200.0}
+
+
+def _add_landlords(session, refs, count: int) -> None:
+    wheat, barley = refs["wheat"], refs["barley"]
+    for n in range(count):
+        landlord = Landlord(full_name=f"Орендодавець {n}")
+        session.add(landlord)
+        session.flush()
+        for terms in ("grain", "grain_cash"):
+            parcel = LeaseParcel(
+                landlord_id=landlord.id, landlord_full_name=landlord.full_name, area_ha=3.5,
+                payment_terms=terms, start_date=datetime(2023, 9, 1),
+            )
+            session.add(parcel)
+            session.flush()
+            for year in (2024, 2025):
+                period = LeasePeriod(
+                    parcel_id=parcel.id, year=year, period_start=datetime(year, 1, 1),
+                    period_end=datetime(year, 12, 31),
+                    cash_amount=5000.0 if terms == "grain_cash" else 0.0,
+                )
+                session.add(period)
+                session.flush()
+                session.add_all([
+                    LeasePeriodGrainItem(period_id=period.id, culture_id=wheat.id,
+                                         quantity_kg=1000.0, price_per_kg_uah=7.5 + year - 2024),
+                    LeasePeriodGrainItem(period_id=period.id, culture_id=barley.id,
+                                         quantity_kg=500.0, price_per_kg_uah=6.0),
+                ])
+                grain = LeasePayment(parcel_id=parcel.id, period_id=period.id, payment_type="grain",
+                                     payment_date=datetime(year, 10, 1))
+                cancelled = LeasePayment(parcel_id=parcel.id, period_id=period.id, payment_type="grain",
+                                         payment_date=datetime(year, 10, 2), is_cancelled=True)
+                session.add_all([grain, cancelled])
+                if terms == "grain_cash":
+                    session.add(LeasePayment(
+                        parcel_id=parcel.id, period_id=period.id, payment_type="cash", applies_to="cash",
+                        currency="UAH", amount=2000.0, exchange_rate=1.0, amount_uah=2000.0,
+                        payment_date=datetime(year, 11, 1),
+                    ))
+                session.flush()
+                session.add_all([
+                    LeasePaymentGrainItem(payment_id=grain.id, culture_id=wheat.id, quantity_kg=400.0),
+                    LeasePaymentGrainItem(payment_id=cancelled.id, culture_id=wheat.id, quantity_kg=999.0),
+                ])
+    session.commit()
+
+
+def _reference_balances(session, parcel_id: int) -> dict:
+    """Попередня реалізація (`current_price`, `grain_paid_kg_map`,
+    `cash_paid_uah`): окремі запити на кожен період і культуру.
+    period_id -> (оплачено кг і залишок кг по культурах, сплачено грн, залишок грн)."""
+    def current_price(culture_id):
+        row = session.exec(
+            select(LeasePeriodGrainItem.price_per_kg_uah)
+            .join(LeasePeriod, LeasePeriod.id == LeasePeriodGrainItem.period_id)
+            .where(LeasePeriod.parcel_id == parcel_id, LeasePeriodGrainItem.culture_id == culture_id)
+            .order_by(LeasePeriod.year.desc(), LeasePeriod.id.desc())
+        ).first()
+        return float(row) if row is not None else 0.0
+
+    balances = {}
+    for period in session.exec(select(LeasePeriod).where(LeasePeriod.parcel_id == parcel_id)).all():
+        paid_map = {}
+        for item in session.exec(
+            select(LeasePaymentGrainItem)
+            .join(LeasePayment, LeasePayment.id == LeasePaymentGrainItem.payment_id)
+            .where(LeasePayment.period_id == period.id, LeasePayment.is_cancelled == False)
+        ).all():
+            paid_map[item.culture_id] = paid_map.get(item.culture_id, 0.0) + float(item.quantity_kg or 0.0)
+        cash_paid = sum(float(payment.amount_uah or 0.0) for payment in session.exec(
+            select(LeasePayment).where(
+                LeasePayment.period_id == period.id, LeasePayment.is_cancelled == False,
+                LeasePayment.applies_to == "cash",
+            )
+        ).all())
+
+        grain, grain_remaining_cash = {}, 0.0
+        for item in session.exec(
+            select(LeasePeriodGrainItem).where(LeasePeriodGrainItem.period_id == period.id)
+        ).all():
+            paid = paid_map.get(item.culture_id, 0.0)
+            remaining_kg = max(0.0, float(item.quantity_kg or 0.0) - paid)
+            grain[item.culture_id] = (round(paid, 2), round(remaining_kg, 2))
+            grain_remaining_cash += remaining_kg * current_price(item.culture_id)
+        cash_remaining = max(0.0, float(period.cash_amount or 0.0) * float(period.cash_rate or 1.0) - cash_paid)
+        balances[period.id] = (grain, round(cash_paid, 2), round(grain_remaining_cash + cash_remaining, 2))
+    return balances
+
+
+def test_list_parcels_query_count_is_constant(session, refs, admin):
+    _add_landlords(session, refs, 2)
+    # Перший виклик прогріває кеш довідників (назви культур).
+    list_parcels(session=session, current_user=admin, landlord_id=None, is_active=None)
+
+    with assert_max_queries(LIST_PARCELS_QUERY_BUDGET) as small:
+        small_result = list_parcels(session=session, current_user=admin, landlord_id=None, is_active=None)
+
+    _add_landlords(session, refs, 10)
+    with assert_max_queries(LIST_PARCELS_QUERY_BUDGET) as large:
+        large_result = list_parcels(session=session, current_user=admin, landlord_id=None, is_active=None)
+
+    assert large.count == small.count
+    assert (len(small_result), len(large_result)) == (4, 24)
+    # Пакетні баланси збігаються з попереднім розрахунком по кожному періоду.
+    for parcel in large_result:
+        reference = _reference_balances(session, parcel.id)
+        assert {
+            period.id: (
+                {item.culture_id: (item.paid_kg, item.remaining_kg) for item in period.grain_items},
+                period.cash_paid_uah,
+                period.remaining_cash_uah,
+            )
+            for period in parcel.periods
+        } == reference
+        assert parcel.cumulative_balance_uah == pytest.approx(EXPECTED_CUMULATIVE_UAH[parcel.payment_terms])
+
+
+def _list_payments(session, admin, **params) -> tuple[list, Response]:
+    response = Response()
+    params = {"parcel_id": None, "period_id": None, "landlord_id": None, "start_date": None,
+              "end_date": None, "limit": None, "offset": 0, "cursor": None, "with_total": False, **params}
+    return list_payments(response, session=session, current_user=admin, **params), response
+
+
+def test_list_payments_query_count_is_constant(session, refs, admin):
+    _add_landlords(session, refs, 2)
+    _list_payments(session, admin)  # прогрів кешу довідників
+
+    with assert_max_queries(LIST_PAYMENTS_QUERY_BUDGET) as small:
+        small_result, _ = _list_payments(session, admin)
+
+    _add_landlords(session, refs, 10)
+    with assert_max_queries(LIST_PAYMENTS_QUERY_BUDGET) as large:
+        large_result, _ = _list_payments(session, admin)
+    assert large.count == small.count
+    # На орендодавця: 2 роки × (2 виплати на ділянці grain + 3 на grain_cash).
+    assert (len(small_result), len(large_result)) == (20, 120)
+    # Без limit — спершу активні, далі від новіших за датою виплати.
+    assert [p.is_cancelled for p in large_result] == sorted(p.is_cancelled for p in large_result)
+
+    # Сторінками — keyset з тим самим бюджетом на кожну сторінку.
+    seen, cursor = [], None
+    while True:
+        with assert_max_queries(LIST_PAYMENTS_QUERY_BUDGET):
+            page, response = _list_payments(session, admin, limit=25, cursor=cursor, with_total=cursor is None)
+        if cursor is None:
+            assert response.headers[TOTAL_COUNT_HEADER] == str(len(large_result))
+        seen.extend(payment.id for payment in page)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(payment.id for payment in large_result)
+
+    # Фільтр за датою виплати (межа — кінець дня включно).
+    filtered, _ = _list_payments(session, admin, start_date="2025-10-01", end_date="2025-10-02")
+    assert {p.payment_date.date().isoformat() for p in filtered} == {"2025-10-01", "2025-10-02"}
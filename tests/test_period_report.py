@@ -0,0 +1,160 @@
+"""`dashboard.period_report`: агрегація в SQL дає ті самі цифри, що й
+попередній прохід по всіх рядках у Python (`_reference_totals`)."""
+import random
+import pytest
+
+from backend.api.dashboard import period_report
+from backend.database import assert_max_queries
+from backend.pagination import parse_date
+from backend.models import (
+    FarmerContract, FarmerContractItem, FarmerContractItemDirection, FarmerContractItemType,
+    FarmerContractPayment, FarmerContractPaymentType, FarmerContractType, FarmerGrainMovement,
+    GrainIntake, GrainShipment, LeasePayment, LeasePaymentGrainItem,
+)
+from sqlmodel import select
+
+# Запитів на звіт: фіксований набір агрегатів, не залежить від кількості рядків.
+PERIOD_REPORT_QUERY_BUDGET = 12
+PERIODS = [
+    (None, None),
+    ("2025-07-10", None),
+    (None, "2025-07-20"),
+    ("2025-07-05", "2025-07-25"),
+    ("2025-08-01", "2025-08-31"),  # порожній період
+]
+
+
+def _add(target: dict, key, value: float) -> None:
+    target[key] = target.get(key, 0.0) + value
+
+
+def _reference_totals(session, start_dt, end_dt) -> dict:
+    """Попередня реалізація: повні таблиці в Python, фільтр періоду в циклі."""
+    def in_period(ts):
+        if start_dt and (ts is None or ts < start_dt):
+            return False
+        if end_dt and (ts is None or ts > end_dt):
+            return False
+        return True
+
+    t = {name: {} for name in (
+        "rec_farmers", "rec_own", "losses", "ship_total", "ship_cash", "ship_cashless",
+        "issued", "bought", "lease", "to_people", "between", "deducted",
+    )}
+    land_service = 0.0
+
+    for i in session.exec(select(GrainIntake).where(
+        GrainIntake.pending_quality == False, GrainIntake.pending_tare == False,
+    )).all():
+        if not in_period(i.created_at) or i.is_farmer_transfer:
+            continue
+        kg = i.accepted_weight_kg or 0.0
+        _add(t["rec_own"] if i.is_own_grain else t["rec_farmers"], i.culture_id, kg)
+        loss = (i.net_weight_kg or 0.0) - kg
+        if loss > 0:
+            _add(t["losses"], i.culture_id, loss)
+
+    for s in session.exec(select(GrainShipment)).all():
+        if not in_period(s.created_at):
+            continue
+        _add(t["ship_total"], s.culture_id, s.quantity_kg or 0.0)
+        fmt = (s.payment_format or "none").lower()
+        if fmt == "cash":
+            _add(t["ship_cash"], s.culture_id, s.quantity_kg or 0.0)
+        elif fmt == "cashless":
+            _add(t["ship_cashless"], s.culture_id, s.quantity_kg or 0.0)
+
+    for p in session.exec(select(FarmerContractPayment).where(FarmerContractPayment.is_cancelled == False)).all():
+        if not in_period(p.payment_date or p.created_at):
+            continue
+        if p.payment_type == FarmerContractPaymentType.GOODS_ISSUE.value:
+            if p.culture_id and p.quantity_kg:
+                _add(t["issued"], p.culture_id, p.quantity_kg)
+            if (p.item_name or "").startswith("Обробка землі"):
+                land_service += p.amount_uah or 0.0
+        elif p.payment_type in (FarmerContractPaymentType.GRAIN.value, FarmerContractPaymentType.GOODS_RECEIVE.value):
+            if p.culture_id and p.quantity_kg:
+                _add(t["bought"], p.culture_id, p.quantity_kg)
+
+    contract_ids = [
+        c.id for c in session.exec(select(FarmerContract).where(
+            FarmerContract.contract_type == FarmerContractType.PAYMENT.value
+        )).all()
+        if in_period(c.created_at)
+    ]
+    for it in session.exec(select(FarmerContractItem)).all():
+        if (it.contract_id in contract_ids
+                and it.direction == FarmerContractItemDirection.FROM_FARMER.value
+                and it.item_type == FarmerContractItemType.GRAIN.value
+                and it.culture_id and it.quantity_kg):
+            _add(t["bought"], it.culture_id, it.quantity_kg)
+
+    for li in session.exec(select(LeasePaymentGrainItem)).all():
+        parent = session.get(LeasePayment, li.payment_id)
+        if parent and not parent.is_cancelled and in_period(parent.payment_date):
+            _add(t["lease"], li.culture_id, li.quantity_kg or 0.0)
+
+    for m in session.exec(select(FarmerGrainMovement)).all():
+        if not in_period(m.created_at):
+            continue
+        target = t["to_people"] if m.to_person_id else t["between"] if m.to_owner_id else t["deducted"]
+        _add(target, m.culture_id, m.quantity_kg or 0.0)
+
+    t["land_service"] = land_service
+    return t
+
+
+@pytest.mark.parametrize("start_date,end_date", PERIODS)
+def test_period_report_matches_python_aggregation(session, refs, seed_activity, start_date, end_date):
+    seed_activity(random.Random(4))
+    report = period_report(session=session, current_user=None, start_date=start_date, end_date=end_date)
+    expected = _reference_totals(session, parse_date(start_date), parse_date(end_date, end=True))
+
+    def r(name, cid):
+        return round(expected[name].get(cid, 0.0), 2)
+
+    assert report["land_service_total_uah"] == round(expected["land_service"], 2)
+    assert [row["culture_id"] for row in report["movements"]] == sorted(
+        [refs["wheat"].id, refs["barley"].id], key=lambda cid: session.get(type(refs["wheat"]), cid).name
+    )
+    for row in report["movements"]:
+        cid = row["culture_id"]
+        assert row["received_from_farmers_kg"] == r("rec_farmers", cid)
+        assert row["received_from_own_kg"] == r("rec_own", cid)
+        assert row["losses_kg"] == r("losses", cid)
+        assert row["shipped_total_kg"] == r("ship_total", cid)
+        assert row["shipped_cash_kg"] == r("ship_cash", cid)
+        assert row["shipped_cashless_kg"] == r("ship_cashless", cid)
+        assert row["issued_via_contracts_kg"] == r("issued", cid)
+        assert row["lease_payments_kg"] == r("lease", cid)
+        assert row["transfer_to_people_kg"] == r("to_people", cid)
+    for row in report["farmer_settlements"]:
+        cid = row["culture_id"]
+        assert row["bought_back_kg"] == r("bought", cid)
+        assert row["transfer_between_farmers_kg"] == r("between", cid)
+        assert row["deduct_kg"] == r("deducted", cid)
+
+
+def test_period_report_has_data_in_fixture(session, seed_activity):
+    """Захист від порожнього порівняння: фікстура справді дає ненульові суми."""
+    seed_activity(random.Random(4))
+    report = period_report(session=session, current_user=None, start_date=None, end_date=None)
+    assert sum(row["received_total_kg"] for row in report["movements"]) > 0
+    assert sum(row["shipped_cash_kg"] for row in report["movements"]) > 0
+    assert sum(row["lease_payments_kg"] for row in report["movements"]) > 0
+    assert sum(row["bought_back_kg"] for row in report["farmer_settlements"]) > 0
+    assert report["land_service_total_uah"] > 0
+
+
+def test_period_report_query_count_does_not_grow(session, seed_activity):
+    seed_activity(random.Random(5))
+    # Перший виклик прогріває кеш довідників (`reference_cache`).
+    period_report(session=session, current_user=None, start_date=None, end_date=None)
+
+    with assert_max_queries(PERIOD_REPORT_QUERY_BUDGET) as small:
+        period_report(session=session, current_user=None, start_date="2025-07-05", end_date=None)
+    for seed in (6, 7, 8):
+        seed_activity(random.Random(seed))
+    with assert_max_queries(PERIOD_REPORT_QUERY_BUDGET) as large:
+        period_report(session=session, current_user=None, start_date="2025-07-05", end_date=None)
+    assert large.count == small.count
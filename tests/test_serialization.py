@@ -0,0 +1,59 @@
+"""Час у відповідях API — ISO з маркером `Z` (naive-UTC з БД)."""
+import json
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+import backend.main  # noqa: F401  — реєструє datetime-енкодер для dict-відповідей
+from backend.api.dashboard import get_dashboard_stats
+from backend.models import Currency, Transaction, TransactionType
+from backend.schemas import TransactionResponse, utc_isoformat
+
+NAIVE_UTC = datetime(2025, 7, 1, 12, 30, 5, 123456)
+
+
+def test_utc_isoformat():
+    assert utc_isoformat(NAIVE_UTC) == "2025-07-01T12:30:05.123456Z"
+    kyiv = datetime(2025, 7, 1, 15, 30, 5, 123456, tzinfo=timezone(timedelta(hours=3)))
+    assert utc_isoformat(kyiv) == "2025-07-01T12:30:05.123456Z"
+
+
+def test_response_model_serializes_utc():
+    response = TransactionResponse(
+        id=1, currency=Currency.UAH, amount=10.0, transaction_type=TransactionType.ADD,
+        user_id=1, user_full_name="Адмін", description=None,
+        uah_balance_after=10.0, usd_balance_after=0.0, eur_balance_after=0.0,
+        created_at=NAIVE_UTC,
+    )
+    assert json.loads(response.model_dump_json())["created_at"] == "2025-07-01T12:30:05.123456Z"
+    # Python-режим лишає datetime — для коду, що працює з моделлю напряму.
+    assert response.model_dump()["created_at"] == NAIVE_UTC
+
+
+def test_dict_endpoint_serializes_utc():
+    """Ендпоінти без response_model (дашборд, талони) віддають dict з datetime."""
+    payload = jsonable_encoder({"items": [{"created_at": NAIVE_UTC, "note": "2025-07-01T12:30:05"}]})
+    assert payload["items"][0]["created_at"] == "2025-07-01T12:30:05.123456Z"
+    # Рядки, схожі на дату, не чіпаються (раніше їх правив regex по payload).
+    assert payload["items"][0]["note"] == "2025-07-01T12:30:05"
+
+
+def test_model_with_nested_rows_serializes_utc(session, admin, cash_register):
+    """Модель відповіді jsonable_encoder серіалізує через
+    `model_dump(mode="json")`, повз ENCODERS_BY_TYPE: datetime у `dict`-полі
+    моделі лишився б без `Z`. Тому рядки дашборда типізовані схемою з
+    `UTCDateTime`."""
+    class Rows(BaseModel):
+        rows: list[dict]
+
+    nested = jsonable_encoder(Rows(rows=[{"created_at": NAIVE_UTC}]))
+    assert nested["rows"][0]["created_at"] == "2025-07-01T12:30:05.123456"
+
+    session.add(Transaction(
+        currency=Currency.UAH, amount=10.0, transaction_type=TransactionType.ADD, user_id=admin.id,
+        uah_balance_after=10.0, usd_balance_after=0.0, eur_balance_after=0.0, created_at=NAIVE_UTC,
+    ))
+    session.commit()
+    stats = jsonable_encoder(get_dashboard_stats(session=session, current_user=admin))
+    assert stats["recent_transactions"][0]["created_at"] == "2025-07-01T12:30:05.123456Z"
@@ -0,0 +1,113 @@
+"""Склад під паралельними приходами й відправками (`backend.stock`): жодна
+зміна не губиться, а відправка не проводиться на більше, ніж є на складі."""
+import random
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from backend.api.grain import create_intake, create_shipment
+from backend.models import FarmerBalance, GrainShipment, GrainStock, StockAdjustmentLog
+from backend.schemas import GrainIntakeCreate, GrainShipmentCreate
+
+INTAKE_NET_KG = 10000.0
+SHIPMENT_KG = 7000.0
+
+
+def _intake(refs, culture, *, own: bool) -> GrainIntakeCreate:
+    return GrainIntakeCreate(
+        culture_id=culture.id,
+        vehicle_type_id=refs["truck"].id,
+        is_own_grain=own,
+        field_id=refs["field"].id if own else None,
+        owner_id=None if own else refs["farmer"].id,
+        driver_id=refs["driver"].id,
+        gross_weight_kg=INTAKE_NET_KG + 5000.0,
+        tare_weight_kg=5000.0,
+    )
+
+
+def _shipment(culture, qty: float = SHIPMENT_KG) -> GrainShipmentCreate:
+    return GrainShipmentCreate(culture_id=culture.id, destination="Елеватор", quantity_kg=qty)
+
+
+def _stock(engine, culture) -> GrainStock:
+    with Session(engine) as session:
+        return session.exec(select(GrainStock).where(GrainStock.culture_id == culture.id)).one()
+
+
+def _assert_rejected_for_stock(results):
+    for result in results:
+        if isinstance(result, Exception):
+            assert isinstance(result, HTTPException), repr(result)
+            assert result.status_code == 400
+            assert result.detail == "Недостатньо залишку для відправки"
+
+
+def test_parallel_intakes_and_shipments_keep_exact_totals(engine, session, refs, admin, run_parallel):
+    wheat, barley = refs["wheat"], refs["barley"]
+    # Пшениця: фермерське й наше зерно; фермерського завжди вистачає, щоб
+    # покрити відправку (`farmer_cover`), тож own_quantity_kg її не віддає.
+    seed = create_intake(_intake(refs, wheat, own=False), session=session, current_user=admin)
+    assert seed.accepted_weight_kg == INTAKE_NET_KG
+
+    calls = (
+        [lambda s: create_intake(_intake(refs, wheat, own=False), session=s, current_user=admin)] * 12
+        + [lambda s: create_intake(_intake(refs, wheat, own=True), session=s, current_user=admin)] * 12
+        + [lambda s: create_shipment(_shipment(wheat), session=s, current_user=admin)] * 20
+        # Ячмінь: лише наше зерно, попит більший за прихід — частина відправок
+        # має бути відхилена.
+        + [lambda s: create_intake(_intake(refs, barley, own=True), session=s, current_user=admin)] * 10
+        + [lambda s: create_shipment(_shipment(barley), session=s, current_user=admin)] * 25
+    )
+    order = list(range(len(calls)))
+    random.Random(11).shuffle(order)
+    results = dict(zip(order, run_parallel([calls[i] for i in order], workers=12)))
+    results = [results[i] for i in range(len(calls))]
+
+    for result in results[:24] + results[44:54]:
+        assert not isinstance(result, Exception), repr(result)
+    wheat_shipments, barley_shipments = results[24:44], results[54:]
+    _assert_rejected_for_stock(wheat_shipments + barley_shipments)
+    wheat_shipped = sum(not isinstance(r, Exception) for r in wheat_shipments)
+    barley_shipped = sum(not isinstance(r, Exception) for r in barley_shipments)
+
+    wheat_stock = _stock(engine, wheat)
+    assert wheat_stock.farmer_quantity_kg == pytest.approx(13 * INTAKE_NET_KG)
+    assert wheat_stock.own_quantity_kg == pytest.approx(12 * INTAKE_NET_KG)
+    assert wheat_stock.quantity_kg == pytest.approx(25 * INTAKE_NET_KG - wheat_shipped * SHIPMENT_KG)
+    assert wheat_stock.quantity_kg >= 0
+
+    barley_stock = _stock(engine, barley)
+    assert barley_stock.farmer_quantity_kg == 0
+    assert barley_stock.own_quantity_kg == pytest.approx(10 * INTAKE_NET_KG - barley_shipped * SHIPMENT_KG)
+    assert barley_stock.quantity_kg == pytest.approx(barley_stock.own_quantity_kg)
+    assert barley_stock.quantity_kg >= 0
+    assert barley_shipped < 25
+
+    with Session(engine) as check:
+        balance = check.exec(select(FarmerBalance).where(
+            FarmerBalance.owner_id == refs["farmer"].id, FarmerBalance.culture_id == wheat.id,
+        )).one()
+        assert balance.qty_kg == pytest.approx(13 * INTAKE_NET_KG)
+        assert len(check.exec(select(GrainShipment)).all()) == wheat_shipped + barley_shipped
+        logs = check.exec(select(StockAdjustmentLog).where(StockAdjustmentLog.source == "shipment")).all()
+        assert len(logs) == wheat_shipped + barley_shipped
+        assert all(log.quantity_after >= 0 for log in logs)
+
+
+def test_parallel_shipments_never_oversell(engine, session, refs, admin, run_parallel):
+    barley = refs["barley"]
+    for _ in range(3):
+        create_intake(_intake(refs, barley, own=True), session=session, current_user=admin)
+    # 30 000 кг на складі — рівно 10 відправок по 3 000 з 30 паралельних.
+    results = run_parallel(
+        [lambda s: create_shipment(_shipment(barley, 3000.0), session=s, current_user=admin)] * 30,
+        workers=15,
+    )
+    _assert_rejected_for_stock(results)
+    assert sum(not isinstance(r, Exception) for r in results) == 10
+
+    stock = _stock(engine, barley)
+    assert stock.quantity_kg == pytest.approx(0.0)
+    assert stock.own_quantity_kg == pytest.approx(0.0)
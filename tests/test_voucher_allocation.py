@@ -0,0 +1,122 @@
+"""Інкрементальний FIFO-розподіл виплат по талонах (`backend.voucher_allocation`):
+після будь-якої послідовності виплат і скасувань стан талонів збігається з
+повним перерахунком з історії (`rebuild_voucher_allocation`)."""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import select
+
+from backend.api.vouchers import (
+    VoucherPaymentCreate, cancel_voucher_payment, create_voucher_payment, vouchers_summary,
+)
+from backend.models import FarmerContract, GrainVoucher, GrainVoucherPayment
+from backend.voucher_allocation import rebuild_voucher_allocation, voucher_debt_remaining
+
+
+def _add_vouchers(session, refs, totals: list[float]) -> None:
+    contract = FarmerContract(owner_id=refs["farmer"].id, contract_type="exchange")
+    session.add(contract)
+    session.flush()
+    start = datetime(2025, 8, 1)
+    for n, total in enumerate(totals):
+        session.add(GrainVoucher(
+            farmer_contract_id=contract.id,
+            owner_id=refs["farmer"].id,
+            culture_id=refs["wheat"].id,
+            quantity_kg=total / 8.0,
+            price_per_kg=8.0,
+            total_value_uah=total,
+            remaining_value_uah=total,
+            # Однаковий час у пар талонів — порядок FIFO тоді вирішує id.
+            created_at=start + timedelta(hours=n // 2),
+        ))
+    session.commit()
+
+
+def _state(session) -> list[tuple]:
+    session.expire_all()
+    vouchers = session.exec(select(GrainVoucher).order_by(GrainVoucher.id)).all()
+    return [(v.id, round(v.paid_value_uah, 2), round(v.remaining_value_uah, 2), v.is_closed) for v in vouchers]
+
+
+def _rebuilt_state(session) -> list[tuple]:
+    rebuild_voucher_allocation(session)
+    session.flush()
+    state = _state(session)
+    session.rollback()
+    return state
+
+
+def _pay(session, admin, amount: float):
+    return create_voucher_payment(VoucherPaymentCreate(amount=amount), session=session, current_user=admin)
+
+
+def test_allocate_and_release_round_trip(session, refs, admin, cash_register):
+    totals = [1000.0, 250.5, 4000.0, 125.25, 3000.0, 800.0, 60.0, 2200.0]
+    _add_vouchers(session, refs, totals)
+    initial = _state(session)
+
+    _pay(session, admin, 1100.0)  # закриває перший, частково другий
+    after_one = _state(session)
+    assert after_one[0][1:] == (1000.0, 0.0, True)
+    assert after_one[1][1:] == (100.0, 150.5, False)
+    assert after_one[2][1] == 0.0
+
+    _pay(session, admin, 5000.0)
+    assert _state(session) == _rebuilt_state(session)
+
+    payments = session.exec(select(GrainVoucherPayment).order_by(GrainVoucherPayment.id)).all()
+    # Скасування в зворотному порядку повертає талони до стану після першої
+    # виплати, а потім — до початкового.
+    cancel_voucher_payment(payments[1].id, session=session, current_user=admin)
+    assert _state(session) == after_one
+    cancel_voucher_payment(payments[0].id, session=session, current_user=admin)
+    assert _state(session) == initial
+
+
+def test_random_payments_match_full_rebuild(session, refs, admin, cash_register):
+    rng = random.Random(25)
+    _add_vouchers(session, refs, [round(rng.uniform(50, 3000), 2) for _ in range(40)])
+
+    for _ in range(60):
+        active = session.exec(select(GrainVoucherPayment).where(GrainVoucherPayment.is_cancelled == False)).all()
+        remaining = voucher_debt_remaining(session)
+        if active and rng.random() < 0.35:
+            cancel_voucher_payment(rng.choice(active).id, session=session, current_user=admin)
+        elif remaining > 1:
+            _pay(session, admin, round(rng.uniform(1, min(remaining, 6000)), 2))
+        assert _state(session) == _rebuilt_state(session)
+
+    summary = vouchers_summary(session=session, current_user=admin)
+    state = _state(session)
+    assert summary["total_remaining_uah"] == round(sum(remaining for _, _, remaining, _ in state), 2)
+    assert summary["total_remaining_uah"] == pytest.approx(summary["total_debt_uah"] - summary["total_paid_uah"], abs=0.05)
+
+
+def test_payment_above_remaining_debt_is_rejected(session, refs, admin, cash_register):
+    _add_vouchers(session, refs, [500.0, 700.0])
+    _pay(session, admin, 1000.0)
+    with pytest.raises(HTTPException) as exc:
+        _pay(session, admin, 300.0)
+    assert exc.value.status_code == 400
+    session.rollback()
+    assert voucher_debt_remaining(session) == pytest.approx(200.0)
+    assert vouchers_summary(session=session, current_user=admin)["total_remaining_uah"] == 200.0
+
+
+def test_parallel_cancels_of_one_payment_release_once(engine, session, refs, admin, cash_register, run_parallel):
+    _add_vouchers(session, refs, [500.0, 700.0])
+    _pay(session, admin, 900.0)
+    payment_id = session.exec(select(GrainVoucherPayment.id)).one()
+
+    results = run_parallel(
+        [lambda s: cancel_voucher_payment(payment_id, session=s, current_user=admin)] * 6, workers=6,
+    )
+    rejected = [r for r in results if isinstance(r, Exception)]
+    assert len(rejected) == 5
+    assert all(isinstance(r, HTTPException) and r.detail == "Виплату вже скасовано" for r in rejected)
+    # Сума знята з розподілу один раз, а не шість.
+    assert _state(session) == _rebuilt_state(session)
+    assert voucher_debt_remaining(session) == pytest.approx(1200.0)